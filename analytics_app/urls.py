@@ -1,9 +1,10 @@
 from django.urls import path
-from .views import IncrementViewAPI, RequestsByTypeAPI, RequestsByStatusAPI
+from .views import IncrementViewAPI, RequestsByTypeAPI, RequestsByStatusAPI, ResponseCacheStatsAPI
 
 urlpatterns = [
     path('increment-view/', IncrementViewAPI.as_view(), name='increment-view'),
     path('requests/by-type/', RequestsByTypeAPI.as_view(), name='requests-by-type'),
     path('requests/by-status/', RequestsByStatusAPI.as_view(), name='requests-by-status'),
+    path('response-cache/', ResponseCacheStatsAPI.as_view(), name='response-cache-stats'),
     # Сюда добавим URL для статистики по заявкам позже
 ] 
\ No newline at end of file
@@ -6,6 +6,7 @@ from django.db.models import F, Count
 from drf_spectacular.utils import extend_schema
 from .serializers import IncrementViewSerializer
 from requests_app.models import Request
+from catalog.caching import get_response_cache_stats
 
 @extend_schema(
     tags=["Аналитика"],
@@ -63,3 +64,15 @@ class RequestsByStatusAPI(APIView):
              if code not in summary:
                  summary[code] = 0
         return Response(summary)
+
+@extend_schema(
+    tags=["Аналитика"],
+    summary="Статистика кэша ответов API",
+    description="Попадания и промахи кэша ответов на анонимные GET-запросы (каталог, новости, квизы) по представлениям и в сумме. Доступно только администраторам.",
+    responses={200: {"type": "object", "example": {"hits": 120, "misses": 30, "hit_rate": 0.8, "views": {"catalog.LandPlotViewSet": {"hits": 100, "misses": 20, "hit_rate": 0.8333}}}}}
+)
+class ResponseCacheStatsAPI(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(get_response_cache_stats())
@@ -10,6 +10,23 @@ from .models import (
     Location, Feature, LandUseType, LandCategory, MediaFile,
     LandPlot, PropertyType, GenericProperty
 )
+from .pagination import CachedCountPaginator, count_cache_key
+
+class CachedCountAdminMixin:
+    """ Кэширует количество строк в changelist по отпечатку фильтров (общий механизм с API). """
+    paginator = CachedCountPaginator
+    show_full_result_count = False # Не считаем COUNT(*) по всей таблице на каждой странице
+    count_cache_dependencies = (Location,)
+    count_signature_ignored_params = ("p", "o", "_changelist_filters")
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        cache_key = count_cache_key(
+            f"admin.{self.__class__.__name__}", queryset, request.GET,
+            dependencies=self.count_cache_dependencies,
+            ignored=self.count_signature_ignored_params,
+            scope=request.path,
+        )
+        return self.paginator(queryset, per_page, orphans, allow_empty_first_page, cache_key=cache_key)
 
 # --- Инлайны и Админки справочников (без изменений) --- #
 class MediaFileInline(GenericTabularInline):
@@ -57,7 +74,7 @@ class LandCategoryAdmin(admin.ModelAdmin):
 
 # --- Админки для основных моделей --- #
 @admin.register(LandPlot)
-class LandPlotAdmin(admin.ModelAdmin):
+class LandPlotAdmin(CachedCountAdminMixin, admin.ModelAdmin):
     list_display = (
         "title", "land_type", "area", "price",
         "plot_status", "listing_status", "view_count",
@@ -115,7 +132,7 @@ class PropertyTypeAdmin(admin.ModelAdmin):
     )
 
 @admin.register(GenericProperty)
-class GenericPropertyAdmin(admin.ModelAdmin):
+class GenericPropertyAdmin(CachedCountAdminMixin, admin.ModelAdmin):
     list_display = (
         "title", "property_type", "parent",
         "price", "listing_status", "view_count",
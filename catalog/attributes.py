@@ -0,0 +1,146 @@
+"""
+Типизированный индекс атрибутов объектов (PropertyAttributeValue) и запросы по нему.
+
+Каждый атрибут из схемы типа объекта раскладывается в одну из колонок:
+integer/number -> num_value, boolean -> bool_value, остальное -> str_value.
+Атрибуты, которых нет в схеме типа, не индексируются.
+"""
+import threading
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Subquery
+
+from .caching import get_generations
+from .models import GenericProperty, PropertyAttributeValue, PropertyType
+
+NUMERIC_TYPES = ("integer", "number")
+COLUMN_NUM = "num_value"
+COLUMN_STR = "str_value"
+COLUMN_BOOL = "bool_value"
+STR_MAX_LENGTH = 255
+
+TRUE_VALUES = {"true", "1", "yes", "on", "да"}
+FALSE_VALUES = {"false", "0", "no", "off", "нет"}
+
+
+def column_for_type(attr_type):
+    if attr_type in NUMERIC_TYPES:
+        return COLUMN_NUM
+    if attr_type == "boolean":
+        return COLUMN_BOOL
+    return COLUMN_STR
+
+
+def parse_bool(value):
+    """ True/False для булевых значений (в т.ч. строк "true"/"false"), иначе None. """
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    return None
+
+
+def coerce_value(column, value):
+    """ Значение для колонки индекса или None, если его нельзя привести к типу. """
+    if value is None or isinstance(value, (dict, list)):
+        return None
+    if column == COLUMN_NUM:
+        if isinstance(value, bool):
+            return None
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    if column == COLUMN_BOOL:
+        return parse_bool(value)
+    return str(value)[:STR_MAX_LENGTH]
+
+
+def build_attribute_values(prop, properties=None):
+    """ Строки индекса для объекта по схеме его типа (без сохранения). """
+    if properties is None:
+        properties = prop.property_type.get_attribute_properties()
+    attributes = prop.attributes if isinstance(prop.attributes, dict) else {}
+    rows = []
+    for key, props in properties.items():
+        if key not in attributes:
+            continue
+        column = column_for_type(props.get("type"))
+        value = coerce_value(column, attributes[key])
+        if value is not None:
+            rows.append(PropertyAttributeValue(property_id=prop.pk, key=key, **{column: value}))
+    return rows
+
+
+def sync_attribute_values(prop):
+    """ Перезаписывает строки индекса одного объекта. """
+    rows = build_attribute_values(prop)
+    with transaction.atomic():
+        PropertyAttributeValue.objects.filter(property_id=prop.pk).delete()
+        PropertyAttributeValue.objects.bulk_create(rows)
+
+
+def rebuild_attribute_values(queryset=None, batch_size=500):
+    """
+    Пересобирает индекс для объектов queryset (по умолчанию - всех).
+    Возвращает количество записанных строк.
+    """
+    if queryset is None:
+        queryset = GenericProperty.objects.all()
+    queryset = queryset.select_related("property_type").only("pk", "attributes", "property_type")
+    schemas = {}
+    rows = []
+    with transaction.atomic():
+        PropertyAttributeValue.objects.filter(property__in=queryset.values("pk")).delete()
+        for prop in queryset.iterator(chunk_size=batch_size):
+            type_id = prop.property_type_id
+            if type_id not in schemas:
+                schemas[type_id] = prop.property_type.get_attribute_properties()
+            rows.extend(build_attribute_values(prop, schemas[type_id]))
+        PropertyAttributeValue.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+# --- Типы атрибутов по всем схемам ---
+
+_types_lock = threading.Lock()
+_types_cache = {}
+
+
+def get_attribute_types():
+    """
+    {атрибут: тип схемы} по всем типам объектов. Кэшируется в процессе до изменения PropertyType.
+    Если тип атрибута в разных схемах расходится, числовой тип имеет приоритет.
+    """
+    generation = get_generations(PropertyType)
+    cached = _types_cache.get("types")
+    if cached and cached[0] == generation:
+        return cached[1]
+    with _types_lock:
+        types = {}
+        for prop_type in PropertyType.objects.only("attribute_schema"):
+            for key, props in prop_type.get_attribute_properties().items():
+                attr_type = props.get("type") or "string"
+                if types.get(key) not in NUMERIC_TYPES:
+                    types[key] = attr_type
+        _types_cache["types"] = (generation, types)
+    return types
+
+
+# --- Выражения для запросов ---
+
+def attribute_exists(key, lookups):
+    """ Exists по индексу атрибутов: lookups вида {"num_value__gte": 50}. """
+    return Exists(
+        PropertyAttributeValue.objects.filter(property=OuterRef("pk"), key=key, **lookups)
+    )
+
+
+def attribute_value(key, column):
+    """ Значение атрибута объекта (для сортировки) - подзапрос по индексу (key, значение). """
+    return Subquery(
+        PropertyAttributeValue.objects.filter(property=OuterRef("pk"), key=key).values(column)[:1]
+    )
@@ -0,0 +1,388 @@
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import request_finished, request_started
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Sum
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from django.utils.text import compress_string
+
+from .models import CacheGeneration
+
+# Поколения моделей: любое изменение строк модели увеличивает счетчик,
+# и все кэш-ключи, построенные на старом поколении, просто перестают использоваться.
+# Счетчики хранятся в БД (CacheGeneration): кэш бывает своим у каждого воркера (LocMemCache)
+# и вытесняет ключи, а сброшенный счетчик снова совпал бы со старыми ключами.
+# Журнал изменений: под каждым поколением - pk строк, изменение которых его породило
+CHANGE_JOURNAL_PREFIX = 'catalog:changes:'
+CHANGE_JOURNAL_TIMEOUT = 60 * 60
+CHANGE_JOURNAL_MAX_GAP = 500
+UNKNOWN_CHANGES = '*'
+# Кэш ответов API для анонимных GET/HEAD (ResponseCacheMixin) и его счетчики попаданий/промахов
+RESPONSE_CACHE_STATS_PREFIX = 'catalog:response-cache-stats:'
+RESPONSE_CACHE_METHODS = ('GET', 'HEAD')
+# Кэшируются только ответы этих форматов: страница Browsable API содержит CSRF-токен и форму входа
+RESPONSE_CACHE_FORMATS = ('json',)
+# Ответы меньше этого размера (байт) не сжимаются: выигрыш меньше накладных расходов gzip
+RESPONSE_COMPRESS_MIN_SIZE = 1024
+# Пространства имен представлений с кэшем ответов - для статистики (заполняется при объявлении классов)
+response_cache_namespaces = set()
+
+# Поколения, прочитанные в текущем запросе: все счетчики читаются одним запросом на HTTP-запрос
+_request_state = threading.local()
+
+
+def _start_request(**kwargs):
+    _request_state.active, _request_state.generations = True, None
+
+
+def _finish_request(**kwargs):
+    _request_state.active, _request_state.generations = False, None
+
+
+request_started.connect(_start_request, dispatch_uid='catalog.caching.start_request')
+request_finished.connect(_finish_request, dispatch_uid='catalog.caching.finish_request')
+
+
+def _generation_key(model):
+    return model._meta.label_lower
+
+
+def _read_generations(keys):
+    if not getattr(_request_state, 'active', False):
+        return dict(CacheGeneration.objects.filter(key__in=keys).values_list('key', 'generation'))
+    if _request_state.generations is None:
+        # Таблица маленькая (строка на модель) - берем ее целиком
+        _request_state.generations = dict(CacheGeneration.objects.values_list('key', 'generation'))
+    return _request_state.generations
+
+
+def get_generations(*models):
+    """ Возвращает кортеж текущих поколений для переданных моделей (0 - модель еще не менялась). """
+    keys = [_generation_key(model) for model in models]
+    values = _read_generations(keys)
+    return tuple(values.get(key, 0) for key in keys)
+
+
+def _journal_key(model, generation):
+    return f"{CHANGE_JOURNAL_PREFIX}{model._meta.label_lower}:{generation}"
+
+
+def _increment_generation(key):
+    with transaction.atomic():
+        if not CacheGeneration.objects.filter(key=key).update(generation=F('generation') + 1):
+            try:
+                with transaction.atomic():
+                    CacheGeneration.objects.create(key=key, generation=1)
+            except IntegrityError: # строку успел создать параллельный процесс
+                CacheGeneration.objects.filter(key=key).update(generation=F('generation') + 1)
+        return CacheGeneration.objects.values_list('generation', flat=True).get(key=key)
+
+
+def bump_generation(*models, changed=None):
+    """
+    Инвалидирует все кэшированные данные, зависящие от моделей.
+    changed - pk измененных строк: они записываются в журнал под новым поколением,
+    чтобы кэши в памяти процессов могли обновиться инкрементально (см. get_changes).
+    """
+    entry = sorted(changed) if changed is not None else UNKNOWN_CHANGES
+    for model in models:
+        key = _generation_key(model)
+        generation = _increment_generation(key)
+        if getattr(_request_state, 'generations', None) is not None:
+            _request_state.generations[key] = generation
+        cache.set(_journal_key(model, generation), entry, CHANGE_JOURNAL_TIMEOUT)
+
+
+def get_changes(model, since, until):
+    """
+    Множество pk строк модели, измененных между поколениями since и until,
+    или None, если журнал неполон (вытеснен из кэша, изменения без pk, слишком большой разрыв).
+    """
+    if until - since > CHANGE_JOURNAL_MAX_GAP:
+        return None
+    keys = [_journal_key(model, generation) for generation in range(since + 1, until + 1)]
+    entries = cache.get_many(keys)
+    if len(entries) != len(keys) or any(entry == UNKNOWN_CHANGES for entry in entries.values()):
+        return None
+    return {pk for entry in entries.values() for pk in entry}
+
+
+def filter_signature(params, ignored=(), scope=''):
+    """
+    Канонический отпечаток набора фильтров: порядок параметров и значений не важен,
+    пустые значения и служебные параметры (пагинация, сортировка) отбрасываются.
+    scope отделяет одинаковые фильтры на разных URL (например, поддеревья разных комплексов).
+    """
+    items = [scope]
+    for key in sorted(params.keys()):
+        if key in ignored:
+            continue
+        values = sorted(value for value in params.getlist(key) if value != '')
+        if values:
+            items.append(f"{key}={','.join(values)}")
+    return hashlib.sha1('&'.join(items).encode('utf-8')).hexdigest()
+
+
+def build_cache_key(namespace, models, *parts):
+    """ Ключ вида namespace:поколения:части - устаревает сам при изменении любой из моделей. """
+    generations = '.'.join(str(generation) for generation in get_generations(*models))
+    return ':'.join(['catalog', namespace, generations, *[str(part) for part in parts]])
+
+
+def _increment(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def record_response_cache(namespace, hit):
+    _increment(f"{RESPONSE_CACHE_STATS_PREFIX}{namespace}:{'hits' if hit else 'misses'}")
+
+
+def get_response_cache_stats():
+    """ Попадания и промахи кэша ответов по представлениям и в сумме. """
+    keys = [
+        f"{RESPONSE_CACHE_STATS_PREFIX}{namespace}:{counter}"
+        for namespace in sorted(response_cache_namespaces) for counter in ('hits', 'misses')
+    ]
+    values = cache.get_many(keys)
+    views = {}
+    for namespace in sorted(response_cache_namespaces):
+        hits = values.get(f"{RESPONSE_CACHE_STATS_PREFIX}{namespace}:hits", 0)
+        misses = values.get(f"{RESPONSE_CACHE_STATS_PREFIX}{namespace}:misses", 0)
+        views[namespace] = {'hits': hits, 'misses': misses, 'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None}
+    hits = sum(view['hits'] for view in views.values())
+    misses = sum(view['misses'] for view in views.values())
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None,
+        'views': views,
+    }
+
+
+def accepts_encoding(request, encoding):
+    """ Разрешает ли Accept-Encoding клиента кодировку (с учетом q=0 и "*"). """
+    accepted = {}
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.lower()] = quality
+    return accepted.get(encoding, accepted.get('*', 0.0)) > 0
+
+
+def compress_response_content(content):
+    """ {кодировка: сжатое тело} - пусто для маленьких ответов и если сжатие не уменьшает размер. """
+    if len(content) < getattr(settings, 'CATALOG_RESPONSE_COMPRESS_MIN_SIZE', RESPONSE_COMPRESS_MIN_SIZE):
+        return {}
+    compressed = compress_string(content)
+    return {'gzip': compressed} if len(compressed) < len(content) else {}
+
+
+def get_response_cache_timeout():
+    """ Срок жизни ответа в кэше (секунды); 0 выключает кэш ответов. """
+    return getattr(settings, 'CATALOG_RESPONSE_CACHE_TIMEOUT', 0)
+
+
+class ResponseCacheMixin:
+    """
+    Кэш готовых ответов для анонимных GET/HEAD-запросов к представлению.
+
+    Ключ - хост, путь, параметры запроса (в каноническом порядке) и заголовок Accept,
+    плюс поколения моделей response_cache_dependencies: сигналы сохранения/удаления этих моделей
+    увеличивают поколение, и старые ответы перестают находиться. Кэшируются только ответы 200
+    в JSON (RESPONSE_CACHE_FORMATS); запросы с Authorization или авторизованной сессией идут мимо кэша.
+    В ответе заголовок X-Cache: HIT/MISS; счетчики - get_response_cache_stats().
+    Если у закэшированного ответа есть ETag (ConditionalGetMixin), совпавший If-None-Match получает 304.
+    Вместе с ответом хранится его gzip-вариант (если ответ не меньше CATALOG_RESPONSE_COMPRESS_MIN_SIZE):
+    клиенту с Accept-Encoding: gzip попадание отдает готовые сжатые байты без повторного сжатия.
+    Миксин ставится первым в списке базовых классов (оборачивает dispatch).
+    """
+    response_cache_dependencies = ()
+    response_cache_namespace = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.response_cache_dependencies:
+            response_cache_namespaces.add(cls.get_response_cache_namespace())
+
+    @classmethod
+    def get_response_cache_namespace(cls):
+        return cls.response_cache_namespace or f"{cls.__module__.partition('.')[0]}.{cls.__name__}"
+
+    def get_response_cache_key(self, request):
+        """ Ключ кэша для запроса или None, если запрос кэшировать нельзя. """
+        if not self.response_cache_dependencies or not get_response_cache_timeout():
+            return None
+        if request.method not in RESPONSE_CACHE_METHODS or 'HTTP_AUTHORIZATION' in request.META:
+            return None
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return None
+        query = '&'.join(
+            f"{key}={','.join(values)}" for key, values in sorted(request.GET.lists())
+        )
+        accept = ','.join(part.strip() for part in request.META.get('HTTP_ACCEPT', '').split(','))
+        # Хост входит в ключ: сериализаторы строят абсолютные URL медиа и пагинации
+        canonical = '\n'.join([request.get_host(), request.path, query, accept])
+        return build_cache_key(
+            'response', self.response_cache_dependencies, self.get_response_cache_namespace(),
+            hashlib.sha1(canonical.encode('utf-8')).hexdigest(),
+        )
+
+    def dispatch(self, request, *args, **kwargs):
+        key = self.get_response_cache_key(request)
+        if key is None:
+            return super().dispatch(request, *args, **kwargs)
+        namespace = self.get_response_cache_namespace()
+        cached = cache.get(key)
+        if cached is not None:
+            record_response_cache(namespace, hit=True)
+            headers = dict(cached['headers'])
+            etag = headers.get('ETag')
+            not_modified = etag and get_conditional_response(request, etag=etag)
+            if not_modified:
+                not_modified['ETag'] = etag
+                vary = [header.strip() for header in headers.get('Vary', '').split(',') if header.strip()]
+                patch_vary_headers(not_modified, (*vary, 'Accept-Encoding'))
+                not_modified['X-Cache'] = 'HIT'
+                return not_modified
+            response = HttpResponse(status=cached['status'])
+            for header, value in cached['headers']:
+                response[header] = value
+            self.set_cached_content(request, response, cached)
+            response['X-Cache'] = 'HIT'
+            return response
+        record_response_cache(namespace, hit=False)
+        response = super().dispatch(request, *args, **kwargs)
+        if self.is_response_cacheable(response):
+            if not getattr(response, 'is_rendered', True):
+                response.render()
+            cached = {
+                'status': response.status_code,
+                'content': response.content,
+                'encodings': compress_response_content(response.content),
+                'headers': list(response.items()),
+            }
+            cache.set(key, cached, get_response_cache_timeout())
+            # Сжатый вариант уже посчитан - отдаем его и текущему клиенту
+            self.set_cached_content(request, response, cached)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def is_response_cacheable(self, response):
+        renderer = getattr(response, 'accepted_renderer', None)
+        return (
+            response.status_code == 200 and not response.streaming and not response.has_header('Content-Encoding')
+            and getattr(renderer, 'format', None) in RESPONSE_CACHE_FORMATS
+        )
+
+    def set_cached_content(self, request, response, cached):
+        """ Тело ответа из кэша: сжатый вариант, если клиент его принимает, иначе исходное. """
+        patch_vary_headers(response, ('Accept-Encoding',))
+        for encoding, content in cached.get('encodings', {}).items():
+            if accepts_encoding(request, encoding):
+                response.content = content
+                response['Content-Encoding'] = encoding
+                break
+        else:
+            response.content = cached['content']
+        response['Content-Length'] = str(len(response.content))
+
+
+class ConditionalGetMixin:
+    """
+    Условные GET-запросы для list/retrieve: ETag и Last-Modified считаются одним легким запросом
+    до сериализации, и совпавшие If-None-Match/If-Modified-Since получают 304 без выборки объектов.
+
+    Список: MAX(updated_at), COUNT(*) и SUM(media_version) по отфильтрованному queryset (без пагинации
+    и сортировки). Деталь: updated_at и media_version объекта (манифест медиа обновляется мимо updated_at).
+    В ETag также входят поколения response_cache_dependencies: M2M-связи, местоположения и справочники
+    в ответе меняются мимо updated_at. Поколения общие для всех воркеров (таблица CacheGeneration,
+    читается один раз за запрос), поэтому воркер, не обработавший изменение, тоже отдает новый ETag. Поэтому 304 решается только
+    по ETag, а Last-Modified отдается справочно. Поля, которые пишутся в обход updated_at,
+    перечисляются в conditional_detail_fields.
+    """
+    conditional_updated_field = 'updated_at'
+    conditional_version_field = 'media_version'
+    # Поля, которые меняются мимо updated_at (bulk_update/update) и входят в ETag детали
+    conditional_detail_fields = ()
+
+    def _build_etag(self, request, *parts):
+        # Один и тот же URL отдается в разных представлениях (JSON, browsable API)
+        dependencies = getattr(self, 'response_cache_dependencies', None) or ()
+        generations = get_generations(*dependencies) if dependencies else ()
+        parts = [request.META.get('HTTP_ACCEPT', ''), *[str(part) for part in (*parts, *generations)]]
+        digest = hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+        return f'W/{quote_etag(digest)}'
+
+    def get_list_validators(self, request):
+        """ (etag, last_modified) для отфильтрованного списка. """
+        values = self.filter_queryset(self.get_queryset()).order_by().aggregate(
+            last_modified=Max(self.conditional_updated_field),
+            total=Count('pk'),
+            media_version=Sum(self.conditional_version_field),
+        )
+        etag = self._build_etag(request, 'list', values['last_modified'], values['total'], values['media_version'])
+        return etag, values['last_modified']
+
+    def get_detail_validators(self, request):
+        """ (etag, last_modified) объекта или (None, None), если его нет (404 отдаст retrieve). """
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        values = self.filter_queryset(self.get_queryset()).filter(
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        ).values(
+            'pk', self.conditional_updated_field, self.conditional_version_field, *self.conditional_detail_fields,
+        ).first()
+        if values is None:
+            return None, None
+        last_modified = values[self.conditional_updated_field]
+        etag = self._build_etag(
+            request, 'detail', values['pk'], last_modified, values[self.conditional_version_field],
+            *[values[field] for field in self.conditional_detail_fields],
+        )
+        return etag, last_modified
+
+    def conditional_response(self, request, handler, etag, last_modified):
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        if etag is not None:
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                not_modified['ETag'] = etag
+                if timestamp is not None:
+                    not_modified['Last-Modified'] = http_date(timestamp)
+                return not_modified
+        response = handler()
+        if response.status_code == 200 and etag is not None:
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        etag, last_modified = self.get_list_validators(request)
+        return self.conditional_response(
+            request, lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs),
+            etag, last_modified,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        etag, last_modified = self.get_detail_validators(request)
+        return self.conditional_response(
+            request, lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs),
+            etag, last_modified,
+        )
@@ -0,0 +1,19 @@
+""" Системные проверки настроек каталога. """
+from django.conf import settings
+from django.core.checks import Warning, register
+
+LOCAL_CACHE_BACKEND = "django.core.cache.backends.locmem.LocMemCache"
+
+
+@register()
+def check_response_cache_backend(app_configs, **kwargs):
+    """ Кэш ответов в памяти процесса: у каждого воркера своя копия и свои счетчики попаданий. """
+    backend = settings.CACHES.get("default", {}).get("BACKEND")
+    if getattr(settings, "CATALOG_RESPONSE_CACHE_TIMEOUT", 0) and backend == LOCAL_CACHE_BACKEND:
+        return [Warning(
+            "CATALOG_RESPONSE_CACHE_TIMEOUT is enabled with LocMemCache.",
+            hint="Each worker process keeps its own copy of cached responses; "
+                 "use a shared cache backend (Redis, Memcached) or set CATALOG_RESPONSE_CACHE_TIMEOUT=0.",
+            id="catalog.W001",
+        )]
+    return []
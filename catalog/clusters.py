@@ -0,0 +1,168 @@
+"""
+Кластеры карты по предвычисленным ячейкам geohash (MapCell).
+
+Опубликованные карточки ленты (CatalogListing) агрегируются по ячейкам geohash нескольких точностей:
+число карточек, сумма координат (для центроида) и минимальная цена. Каждая точность обслуживает
+группу масштабов карты - ячейка занимает примерно 1/8 тайла. Агрегаты обновляются инкрементально
+при синхронизации карточек (catalog.listings): карточка вычитается из старых ячеек и добавляется
+в новые. Минимальная цена пересчитывается по ленте только для ячеек, из которых ушла карточка
+с минимальной ценой.
+
+Начиная с MAP_POINTS_ZOOM кластеры не строятся - отдаются сами карточки в рамке.
+"""
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Min, Q, Sum, Value
+from django.db.models.functions import Cast, Coalesce, Least, Substr
+
+from .geo import GEOHASH_RANGE_END, bbox_q, cell_size, geohash_q, in_bbox
+from .models import CatalogListing, MapCell
+
+PUBLISHED = "published"
+CLUSTER_PRECISIONS = (1, 2, 3, 4, 5, 6)
+MAX_ZOOM = 22
+MAP_POINTS_ZOOM = 14
+MAP_POINTS_LIMIT = 2000
+# Ширина ячейки относительно тайла: 1/2**CELLS_PER_TILE_BITS
+CELLS_PER_TILE_BITS = 3
+
+
+def precision_for_zoom(zoom):
+    """ Самая мелкая точность, ячейка которой не уже 1/8 тайла масштаба zoom. """
+    tile_width = 360.0 / 2 ** zoom
+    precision = CLUSTER_PRECISIONS[0]
+    for candidate in CLUSTER_PRECISIONS:
+        if cell_size(candidate)[1] >= tile_width / 2 ** CELLS_PER_TILE_BITS:
+            precision = candidate
+    return precision
+
+
+def listing_point(values):
+    """
+    Вклад карточки в агрегаты: (вид, geohash, широта, долгота, цена)
+    или None, если карточка не опубликована или без координат.
+    """
+    if not values or values.get("listing_status") != PUBLISHED or not values.get("geohash"):
+        return None
+    return (
+        values["kind"], values["geohash"],
+        float(values["latitude"]), float(values["longitude"]), values["price"],
+    )
+
+
+POINT_FIELDS = ("kind", "geohash", "latitude", "longitude", "price", "listing_status")
+
+
+def _cells_q(kind, geohash):
+    return Q(kind=kind) & Q(*[
+        Q(precision=precision, cell=geohash[:precision]) for precision in CLUSTER_PRECISIONS
+    ], _connector=Q.OR)
+
+
+def _add(point):
+    kind, geohash, lat, lon, price = point
+    MapCell.objects.bulk_create(
+        [MapCell(precision=precision, cell=geohash[:precision], kind=kind) for precision in CLUSTER_PRECISIONS],
+        ignore_conflicts=True,
+    )
+    MapCell.objects.filter(_cells_q(kind, geohash)).update(
+        count=F("count") + 1,
+        latitude_sum=F("latitude_sum") + lat,
+        longitude_sum=F("longitude_sum") + lon,
+        price_min=Coalesce(Least(F("price_min"), Value(price)), Value(price)),
+    )
+
+
+def _remove(point):
+    kind, geohash, lat, lon, price = point
+    cells = MapCell.objects.filter(_cells_q(kind, geohash))
+    cells.update(
+        count=F("count") - 1,
+        latitude_sum=F("latitude_sum") - lat,
+        longitude_sum=F("longitude_sum") - lon,
+    )
+    cells.filter(count__lte=0).delete()
+    # Ушла карточка с минимальной ценой - минимум ячейки пересчитывается по ленте (диапазон индекса geohash)
+    for cell in cells.filter(price_min__gte=price):
+        cell.price_min = CatalogListing.objects.filter(
+            listing_status=PUBLISHED, kind=kind,
+            geohash__gte=cell.cell, geohash__lt=cell.cell + GEOHASH_RANGE_END,
+        ).aggregate(price_min=Min("price"))["price_min"]
+        cell.save(update_fields=["price_min"])
+
+
+def apply_change(old, new):
+    """ Переносит вклад карточки из старого состояния old в новое new (оба - listing_point или None). """
+    if old == new:
+        return
+    with transaction.atomic():
+        if old is not None:
+            _remove(old)
+        if new is not None:
+            _add(new)
+
+
+def rebuild_map_cells(listing_model=CatalogListing, cell_model=MapCell):
+    """
+    Полный пересчет агрегатов по ленте. Возвращает число ячеек.
+    Модели передаются явно из миграции (исторические версии).
+    """
+    published = listing_model.objects.filter(listing_status=PUBLISHED).exclude(geohash="")
+    cells = []
+    for precision in CLUSTER_PRECISIONS:
+        rows = published.order_by().annotate(cell=Substr("geohash", 1, precision)).values("cell", "kind").annotate(
+            total=Count("pk"),
+            lat_total=Sum(Cast("latitude", FloatField())),
+            lon_total=Sum(Cast("longitude", FloatField())),
+            lowest=Min("price"),
+        )
+        cells.extend(
+            cell_model(
+                precision=precision, cell=row["cell"], kind=row["kind"], count=row["total"],
+                latitude_sum=row["lat_total"], longitude_sum=row["lon_total"], price_min=row["lowest"],
+            )
+            for row in rows
+        )
+    with transaction.atomic():
+        cell_model.objects.all().delete()
+        cell_model.objects.bulk_create(cells, batch_size=1000)
+    return len(cells)
+
+
+def get_clusters(bbox, zoom, kinds=None):
+    """
+    Кластеры в рамке для масштаба zoom: [{"cell", "count", "latitude", "longitude", "price_min"}].
+    Ячейки выбираются диапазонами индекса (precision, cell); в ответ попадают те, чей центроид в рамке.
+    """
+    precision = precision_for_zoom(zoom)
+    cells = MapCell.objects.filter(geohash_q(bbox, field="cell", max_precision=precision), precision=precision)
+    if kinds:
+        cells = cells.filter(kind__in=kinds)
+    rows = cells.order_by("cell").values("cell").annotate(
+        total=Sum("count"), lat_total=Sum("latitude_sum"), lon_total=Sum("longitude_sum"), lowest=Min("price_min"),
+    )
+    clusters = []
+    for row in rows:
+        if not row["total"]:
+            continue
+        latitude, longitude = row["lat_total"] / row["total"], row["lon_total"] / row["total"]
+        if not in_bbox(bbox, latitude, longitude):
+            continue
+        clusters.append({
+            "cell": row["cell"],
+            "count": row["total"],
+            "latitude": round(latitude, 6),
+            "longitude": round(longitude, 6),
+            "price_min": row["lowest"],
+        })
+    return precision, clusters
+
+
+def get_points(bbox, kinds=None, limit=MAP_POINTS_LIMIT):
+    """ Опубликованные карточки в рамке (не больше limit) и признак, что их больше. """
+    listings = CatalogListing.objects.filter(
+        geohash_q(bbox), bbox_q(bbox, "latitude", "longitude"), listing_status=PUBLISHED,
+    )
+    if kinds:
+        listings = listings.filter(kind__in=kinds)
+    points = list(listings.order_by("geohash")[:limit + 1])
+    return points[:limit], len(points) > limit
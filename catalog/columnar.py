@@ -0,0 +1,544 @@
+"""
+Колоночный движок запросов по опубликованным объявлениям (опционально, в памяти воркера).
+
+Опубликованные участки и объекты хранятся массивами numpy: числовые колонки (цена, площадь,
+даты как микросекунды эпохи), коды строковых/FK-колонок (регион, статус, категория, тип)
+и битовые множества для M2M (характеристики, ВРИ). Параметры LandPlotFilter/GenericPropertyFilter
+и сортировка вычисляются векторно, движок возвращает упорядоченные id, из БД загружается
+только текущая страница.
+
+Включается настройкой CATALOG_COLUMNAR_ENGINE (и требует numpy). Если в запросе есть то,
+что движок не умеет (полнотекстовый поиск, keyset-пагинация, фильтр с method=...), или данные
+не проходят валидацию фильтров, запрос целиком уходит по обычному ORM-пути.
+
+Движок обновляется по счетчикам поколений (catalog.caching): из журнала изменений берутся pk
+измененных строк, и перечитываются только они. Если журнал неполон - полная перезагрузка.
+Совпадение результатов с ORM проверяют тесты (ColumnarEngineTests) и команда verify_columnar_engine.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection
+from django_filters.constants import EMPTY_VALUES
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework.filters import OrderingFilter, SearchFilter
+
+from .attributes import COLUMN_BOOL, COLUMN_NUM, COLUMN_STR, column_for_type, get_attribute_types
+from .caching import get_changes, get_generations
+from .filters import (
+    M2M_MODE_ALL, AttributeFilterMixin, BoundingBoxFilter, FuzzyMatchFilter,
+    GeoCoordinateFilter, M2MFilter, M2MModeFilter, RadiusFilter,
+)
+from .models import GenericProperty, LandPlot, Location, PropertyAttributeValue, PropertyType
+from .trigram import get_index
+
+try:
+    import numpy as np
+except ImportError: # numpy - необязательная зависимость, без нее движок выключен
+    np = None
+
+logger = logging.getLogger(__name__)
+
+NUM = "num" # float64, NULL -> NaN
+CODE = "code" # int32-коды по словарю значений, NULL -> -1
+BITS = "bits" # матрица uint64 (строки x слова), бит на id связанного объекта
+
+ATTRIBUTE_PREFIX = "attr:"
+# Поля фильтров django-filter -> колонки движка
+FIELD_COLUMNS = {
+    "land_category": "land_category_id",
+    "land_use_types__id": "land_use_types",
+    "features__id": "features",
+    "location__region": "region",
+    "location__locality": "locality",
+    "property_type__slug": "property_type",
+}
+
+
+def is_enabled():
+    return np is not None and getattr(settings, "CATALOG_COLUMNAR_ENGINE", False)
+
+
+def _timestamp(value):
+    return None if value is None else value.timestamp() * 1_000_000
+
+
+def _fold(text):
+    """ Сравнение без учета регистра так же, как icontains в текущей СУБД. """
+    if connection.vendor == "sqlite":
+        # LIKE в SQLite не учитывает регистр только для ASCII
+        return "".join(char.lower() if char.isascii() else char for char in text)
+    return text.upper()
+
+
+class ColumnarTable:
+    """ Набор выровненных колонок: pk + числовые, кодовые и битовые колонки. """
+
+    def __init__(self):
+        self.pk = np.empty(0, dtype=np.int64)
+        self.columns = {}
+        self.kinds = {}
+        self.vocab = {} # колонка -> {значение: код}
+        self.bit_index = {} # битовая колонка -> {id: номер бита}
+
+    def __len__(self):
+        return len(self.pk)
+
+    def clone(self):
+        """ Копия для обновления: читатели продолжают работать со старой таблицей. """
+        table = ColumnarTable()
+        table.pk = self.pk
+        table.columns = dict(self.columns)
+        table.kinds = dict(self.kinds)
+        table.vocab = {name: dict(vocab) for name, vocab in self.vocab.items()}
+        table.bit_index = {name: dict(index) for name, index in self.bit_index.items()}
+        return table
+
+    def _empty(self, kind, size, width=1):
+        if kind == NUM:
+            return np.full(size, np.nan)
+        if kind == CODE:
+            return np.full(size, -1, dtype=np.int32)
+        return np.zeros((size, width), dtype=np.uint64)
+
+    def encode(self, batch):
+        """ batch: {"pk": [...], колонка: (вид, [значения])} -> {колонка: массив}. """
+        size = len(batch["pk"])
+        arrays = {"pk": np.asarray(batch["pk"], dtype=np.int64)}
+        for name, column in batch.items():
+            if name == "pk":
+                continue
+            kind, values = column
+            self.kinds.setdefault(name, kind)
+            if kind == NUM:
+                arrays[name] = np.array([np.nan if value is None else float(value) for value in values], dtype=np.float64)
+            elif kind == CODE:
+                vocab = self.vocab.setdefault(name, {})
+                arrays[name] = np.array(
+                    [-1 if value is None else vocab.setdefault(value, len(vocab)) for value in values],
+                    dtype=np.int32,
+                ).reshape(size)
+            else:
+                index = self.bit_index.setdefault(name, {})
+                for related in values:
+                    for related_id in related:
+                        index.setdefault(related_id, len(index))
+                matrix = np.zeros((size, max(1, (len(index) + 63) // 64)), dtype=np.uint64)
+                for row, related in enumerate(values):
+                    for related_id in related:
+                        bit = index[related_id]
+                        matrix[row, bit // 64] |= np.uint64(1) << np.uint64(bit % 64)
+                arrays[name] = matrix
+        return arrays
+
+    def replace(self, remove_pks, arrays):
+        """ Убирает строки remove_pks и добавляет закодированные строки arrays. """
+        keep = ~np.isin(self.pk, np.fromiter(remove_pks, dtype=np.int64)) if remove_pks else np.ones(len(self), bool)
+        size = len(arrays["pk"])
+        self.pk = np.concatenate([self.pk[keep], arrays["pk"]])
+        for name in set(self.columns) | (set(arrays) - {"pk"}):
+            kind = self.kinds[name]
+            old = self.columns.get(name)
+            if old is None:
+                old = self._empty(kind, int(keep.sum()) if len(keep) else 0, self._width(arrays.get(name)))
+            else:
+                old = old[keep]
+            new = arrays.get(name)
+            if new is None:
+                new = self._empty(kind, size, old.shape[1] if kind == BITS else 1)
+            if kind == BITS and old.shape[1] != new.shape[1]:
+                width = max(old.shape[1], new.shape[1])
+                old = np.pad(old, ((0, 0), (0, width - old.shape[1])))
+                new = np.pad(new, ((0, 0), (0, width - new.shape[1])))
+            self.columns[name] = np.concatenate([old, new])
+
+    @staticmethod
+    def _width(array):
+        return array.shape[1] if array is not None and array.ndim == 2 else 1
+
+    # --- Предикаты ---
+
+    def bitmask(self, name, related_ids):
+        """ Вектор-маска слов для набора id или None, если ни одного id нет в индексе. """
+        index = self.bit_index.get(name, {})
+        matrix = self.columns.get(name)
+        width = matrix.shape[1] if matrix is not None else 1
+        mask = np.zeros(width, dtype=np.uint64)
+        found = False
+        for related_id in related_ids:
+            bit = index.get(related_id)
+            if bit is not None:
+                mask[bit // 64] |= np.uint64(1) << np.uint64(bit % 64)
+                found = True
+        return mask if found else None
+
+    def codes_for(self, name, values):
+        vocab = self.vocab.get(name, {})
+        return np.array([vocab[value] for value in values if value in vocab], dtype=np.int32)
+
+    def codes_containing(self, name, text):
+        needle = _fold(str(text))
+        vocab = self.vocab.get(name, {})
+        return np.array([code for value, code in vocab.items() if needle in _fold(str(value))], dtype=np.int32)
+
+    def sort_key(self, name):
+        """ Числовой ключ сортировки колонки (коды строк - по рангу значения), NULL -> NaN. """
+        column = self.columns[name]
+        if self.kinds[name] == NUM:
+            return column
+        vocab = self.vocab.get(name, {})
+        ranks = np.full(len(vocab) + 1, np.nan)
+        for rank, (value, code) in enumerate(sorted(vocab.items(), key=lambda item: item[0])):
+            ranks[code] = rank
+        return ranks[column] # код -1 попадает в последний элемент - NaN
+
+
+class ColumnarEngine:
+    """
+    Колоночная копия опубликованных объявлений одной модели.
+    Подклассы описывают загрузку строк (load_batch) и зависимости (dependencies).
+    """
+    model = None
+    dependencies = ()
+    # Модель зависимости -> поле строки, по которому находятся затронутые строки
+    dependency_fields = {}
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.table = None
+        self.generations = None
+
+    def base_queryset(self):
+        return self.model.objects.filter(listing_status="published")
+
+    def load_batch(self, pks=None):
+        raise NotImplementedError
+
+    # --- Обновление ---
+
+    def ensure_fresh(self):
+        generations = get_generations(*self.dependencies)
+        if generations == self.generations:
+            return
+        with self.lock:
+            if generations == self.generations:
+                return
+            affected = self._affected_pks(generations)
+            if affected is None:
+                table = ColumnarTable()
+                table.replace(set(), table.encode(self.load_batch()))
+                self.table = table
+            elif affected:
+                table = self.table.clone()
+                table.replace(affected, table.encode(self.load_batch(affected)))
+                self.table = table
+            self.generations = generations
+
+    def _affected_pks(self, generations):
+        """ pk строк для перечитывания или None, если нужна полная перезагрузка. """
+        if self.table is None or self.generations is None:
+            return None
+        affected = set()
+        for model, old, new in zip(self.dependencies, self.generations, generations):
+            if old == new:
+                continue
+            changed = get_changes(model, old, new)
+            if changed is None:
+                return None
+            if model is self.model:
+                affected |= changed
+            elif model in self.dependency_fields:
+                column = self.table.columns[self.dependency_fields[model]]
+                mask = np.isin(column, np.fromiter(changed, dtype=np.float64))
+                affected |= set(self.table.pk[mask].tolist())
+                # Строки, которые еще не в таблице, не затронуты: их запись уже в журнале модели
+            else:
+                return None
+        return affected
+
+    # --- Запрос ---
+
+    def get_filterset(self, view, request):
+        for backend_class in view.filter_backends:
+            if issubclass(backend_class, DjangoFilterBackend):
+                filterset_class = backend_class().get_filterset_class(view, self.model.objects.none())
+                if filterset_class is None:
+                    return None
+                return filterset_class(data=request.query_params, queryset=self.model.objects.none(), request=request)
+        return None
+
+    def get_ordering_terms(self, view, request):
+        for backend_class in view.filter_backends:
+            if issubclass(backend_class, OrderingFilter):
+                return backend_class().get_ordering(request, self.model.objects.none(), view) or []
+        return list(getattr(view, "ordering", None) or [])
+
+    def query(self, view, request):
+        """ Упорядоченный массив pk или None, если запрос должен идти через ORM. """
+        for backend_class in view.filter_backends:
+            if issubclass(backend_class, SearchFilter) and request.query_params.get(backend_class.search_param, "").strip():
+                return None
+        filterset = self.get_filterset(view, request)
+        if filterset is None or not filterset.is_valid():
+            return None
+        self.ensure_fresh()
+        table = self.table
+        mask = np.ones(len(table), dtype=bool)
+        for name, filter_ in filterset.filters.items():
+            value = filterset.form.cleaned_data.get(name)
+            if value in EMPTY_VALUES:
+                continue
+            predicate = self.filter_mask(table, filter_, value)
+            if predicate is None:
+                return None
+            mask &= predicate
+        order = self.order(table, np.flatnonzero(mask), self.get_ordering_terms(view, request))
+        return None if order is None else table.pk[order]
+
+    def filter_mask(self, table, filter_, value):
+        """ Булев вектор для одного фильтра или None, если фильтр не поддерживается. """
+        if getattr(filter_, "exclude", False) or getattr(filter_, "method", None):
+            return None
+        if isinstance(filter_, (BoundingBoxFilter, RadiusFilter, GeoCoordinateFilter)):
+            return None # геопоиск идет через ORM и geohash-индекс
+        if isinstance(filter_, M2MModeFilter):
+            return np.ones(len(table), dtype=bool) # режим читает сам M2MFilter
+        if isinstance(filter_, M2MFilter):
+            name = FIELD_COLUMNS[filter_.field_name]
+            return self.bits_mask(table, name, value, require_all=filter_.get_mode() == M2M_MODE_ALL)
+        if isinstance(filter_, FuzzyMatchFilter):
+            ids = np.asarray(get_index(filter_.index_name).match_ids(value), dtype=np.float64)
+            column = table.pk if filter_.field_name == "pk" else table.columns.get(filter_.field_name)
+            return None if column is None else np.isin(column, ids)
+        if isinstance(filter_, AttributeFilterMixin):
+            name = f"{ATTRIBUTE_PREFIX}{filter_.attribute}"
+            if name not in table.columns:
+                return np.zeros(len(table), dtype=bool) # атрибута нет ни у одного объекта
+            return self.column_mask(table, name, filter_.lookup_expr, value)
+        name = FIELD_COLUMNS.get(filter_.field_name, filter_.field_name)
+        if name not in table.columns:
+            return None
+        return self.column_mask(table, name, filter_.lookup_expr, value)
+
+    def column_mask(self, table, name, lookup, value):
+        column, kind = table.columns[name], table.kinds[name]
+        if kind == NUM:
+            if lookup == "in":
+                return np.isin(column, [float(item) for item in value])
+            number = float(value)
+            with np.errstate(invalid="ignore"):
+                return {
+                    "exact": lambda: column == number,
+                    "gte": lambda: column >= number,
+                    "lte": lambda: column <= number,
+                    "gt": lambda: column > number,
+                    "lt": lambda: column < number,
+                }.get(lookup, lambda: None)()
+        if kind == CODE:
+            if lookup == "icontains":
+                return np.isin(column, table.codes_containing(name, value))
+            values = value if lookup == "in" else [value]
+            values = [getattr(item, "pk", item) for item in values]
+            if lookup not in ("exact", "in"):
+                return None
+            if name.endswith("_id"):
+                try:
+                    values = [int(item) for item in values]
+                except (TypeError, ValueError):
+                    return None
+            return np.isin(column, table.codes_for(name, values))
+        if kind == BITS and lookup == "in":
+            return self.bits_mask(table, name, value)
+        return None
+
+    def bits_mask(self, table, name, value, require_all=False):
+        """ Строки, у которых есть любой (или каждый при require_all) из id связанных объектов. """
+        if name not in table.columns:
+            return None
+        try:
+            related_ids = {int(item) for item in value}
+        except (TypeError, ValueError):
+            return None
+        if require_all and not related_ids <= table.bit_index.get(name, {}).keys():
+            return np.zeros(len(table), dtype=bool) # какого-то id нет ни у одной строки
+        mask = table.bitmask(name, related_ids)
+        if mask is None:
+            return np.zeros(len(table), dtype=bool)
+        column = table.columns[name]
+        if require_all:
+            return ((column & mask) == mask).all(axis=1)
+        return (column & mask).any(axis=1)
+
+    def order(self, table, rows, terms):
+        """ Индексы строк в порядке сортировки (как ORDER BY в БД) с добором по pk. """
+        asc_nulls_first = connection.vendor in ("sqlite", "mysql")
+        keys = [table.pk[rows]]
+        for term in reversed(terms):
+            descending = term.startswith("-")
+            field = term.lstrip("-")
+            explicit_nulls_last = False
+            if field.startswith("attr_"):
+                # AttributeOrderingFilter всегда ставит объекты без атрибута в конец
+                name, explicit_nulls_last = f"{ATTRIBUTE_PREFIX}{field[len('attr_'):]}", True
+            else:
+                name = FIELD_COLUMNS.get(field, "pk" if field in ("pk", "id") else field)
+            if name == "pk":
+                values = table.pk[rows].astype(np.float64)
+            elif name in table.columns and table.kinds[name] != BITS:
+                values = table.sort_key(name)[rows]
+            elif name.startswith(ATTRIBUTE_PREFIX):
+                values = np.full(len(rows), np.nan)
+            else:
+                return None
+            nulls_first = False if explicit_nulls_last else (asc_nulls_first != descending)
+            values = -values if descending else values
+            keys.append(np.where(np.isnan(values), -np.inf if nulls_first else np.inf, values))
+        return rows[np.lexsort(keys)]
+
+    def verify(self, view, request, orm_queryset):
+        """ (совпало, ids движка, ids ORM) для одного запроса; orm_queryset - отфильтрованный вьюсетом. """
+        ids = self.query(view, request)
+        if ids is None:
+            return None, None, None
+        order_by = list(orm_queryset.query.order_by) or list(self.model._meta.ordering)
+        orm_ids = list(orm_queryset.order_by(*order_by, "pk").values_list("pk", flat=True))
+        engine_ids = ids.tolist()
+        return engine_ids == orm_ids, engine_ids, orm_ids
+
+
+class LandPlotEngine(ColumnarEngine):
+    model = LandPlot
+    dependencies = (LandPlot, Location)
+    dependency_fields = {Location: "location_id"}
+
+    def load_batch(self, pks=None):
+        queryset = self.base_queryset()
+        if pks is not None:
+            queryset = queryset.filter(pk__in=list(pks))
+        rows = list(queryset.order_by().values_list(
+            "pk", "price", "area", "price_per_are", "created_at", "updated_at", "view_count",
+            "location_id", "location__region", "location__locality",
+            "land_category_id", "plot_status", "land_type", "listing_status",
+        ))
+        row_pks = [row[0] for row in rows]
+        related = {}
+        for name in ("features", "land_use_types"):
+            field = LandPlot._meta.get_field(name)
+            source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+            links = {}
+            for owner_id, related_id in field.remote_field.through.objects.filter(
+                **{f"{source}__in": queryset.values("pk")}
+            ).values_list(f"{source}_id", f"{target}_id"):
+                links.setdefault(owner_id, []).append(related_id)
+            related[name] = [links.get(pk, []) for pk in row_pks]
+        column = lambda index: [row[index] for row in rows] # noqa: E731
+        return {
+            "pk": row_pks,
+            "price": (NUM, column(1)),
+            "area": (NUM, column(2)),
+            "price_per_are": (NUM, column(3)),
+            "created_at": (NUM, [_timestamp(value) for value in column(4)]),
+            "updated_at": (NUM, [_timestamp(value) for value in column(5)]),
+            "view_count": (NUM, column(6)),
+            "location_id": (NUM, column(7)),
+            "region": (CODE, column(8)),
+            "locality": (CODE, column(9)),
+            "land_category_id": (CODE, column(10)),
+            "plot_status": (CODE, column(11)),
+            "land_type": (CODE, column(12)),
+            "listing_status": (CODE, column(13)),
+            "features": (BITS, related["features"]),
+            "land_use_types": (BITS, related["land_use_types"]),
+        }
+
+
+class GenericPropertyEngine(ColumnarEngine):
+    model = GenericProperty
+    dependencies = (GenericProperty, Location, PropertyType)
+    dependency_fields = {Location: "location_id"}
+
+    def load_batch(self, pks=None):
+        queryset = self.base_queryset()
+        if pks is not None:
+            queryset = queryset.filter(pk__in=list(pks))
+        rows = list(queryset.order_by().values_list(
+            "pk", "price", "created_at", "updated_at", "view_count",
+            "location_id", "location__region", "location__locality",
+            "property_type__slug", "listing_status",
+        ))
+        row_pks = [row[0] for row in rows]
+        positions = {pk: position for position, pk in enumerate(row_pks)}
+        attr_types = get_attribute_types()
+        attributes = {}
+        for property_id, key, num_value, str_value, bool_value in PropertyAttributeValue.objects.filter(
+            property__in=queryset.values("pk")
+        ).values_list("property_id", "key", "num_value", "str_value", "bool_value"):
+            # Вид колонки - по типу атрибута в схемах (как в AttributeOrderingFilter)
+            column_name = column_for_type(attr_types.get(key))
+            kind = NUM if column_name == COLUMN_NUM else CODE
+            value = {COLUMN_NUM: num_value, COLUMN_STR: str_value, COLUMN_BOOL: bool_value}[column_name]
+            if value is None:
+                continue
+            name = f"{ATTRIBUTE_PREFIX}{key}"
+            entry = attributes.setdefault(name, (kind, [None] * len(row_pks)))
+            entry[1][positions[property_id]] = value
+        column = lambda index: [row[index] for row in rows] # noqa: E731
+        return {
+            "pk": row_pks,
+            "price": (NUM, column(1)),
+            "created_at": (NUM, [_timestamp(value) for value in column(2)]),
+            "updated_at": (NUM, [_timestamp(value) for value in column(3)]),
+            "view_count": (NUM, column(4)),
+            "location_id": (NUM, column(5)),
+            "region": (CODE, column(6)),
+            "locality": (CODE, column(7)),
+            "property_type": (CODE, column(8)),
+            "listing_status": (CODE, column(9)),
+            **attributes,
+        }
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+ENGINE_CLASSES = {LandPlot: LandPlotEngine, GenericProperty: GenericPropertyEngine}
+
+
+def get_engine(model):
+    """ Движок воркера для модели (создается при первом обращении). """
+    engine = _engines.get(model)
+    if engine is None:
+        with _engines_lock:
+            engine = _engines.setdefault(model, ENGINE_CLASSES[model]())
+    return engine
+
+
+class ColumnarListMixin:
+    """
+    list() через колоночный движок: фильтры и сортировка в памяти,
+    из БД загружается только текущая страница (по id из движка).
+    Включается CATALOG_COLUMNAR_ENGINE; без него и для неподдерживаемых запросов - обычный ORM-путь.
+    """
+
+    def list(self, request, *args, **kwargs):
+        ids = None
+        paginator = self.paginator
+        keyset = paginator is not None and hasattr(paginator, "use_keyset") and paginator.use_keyset(request)
+        if is_enabled() and not keyset and hasattr(paginator, "paginate_ids"):
+            try:
+                ids = get_engine(self.get_queryset().model).query(self, request)
+            except Exception: # движок - оптимизация, его сбой не должен ронять список
+                if settings.DEBUG: # при разработке расхождение с ORM-путем не должно прятаться
+                    raise
+                logger.exception("Columnar engine failed, falling back to ORM")
+                ids = None
+        if ids is None:
+            return super().list(request, *args, **kwargs)
+        page = paginator.paginate_ids(ids, self.hydrate_ids, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def hydrate_ids(self, ids):
+        # filter вместо in_bulk: для list queryset отдает строки catalog.rows, с которыми in_bulk не работает
+        objects = {obj.pk: obj for obj in self.get_queryset().filter(pk__in=ids).order_by()}
+        return [objects[pk] for pk in ids if pk in objects]
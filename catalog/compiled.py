@@ -0,0 +1,220 @@
+"""
+Скомпилированный путь чтения сериализаторов (объект -> dict).
+
+ModelSerializer.to_representation на каждый объект и каждое поле проходит через get_attribute,
+проверку PKOnlyObject и to_representation поля; вложенные сериализаторы - тот же цикл.
+Здесь по набору читаемых полей сериализатора генерируется функция вида
+
+    def row(obj):
+        return {'id': None if (v := obj.id) is None else int(v), 'title': ..., 'location': ...}
+
+с прямым чтением атрибутов, словарем вместо get_FOO_display, готовыми функциями для вложенных
+сериализаторов и встроенными str/int/float для простых полей. Код генерируется и компилируется один
+раз на класс сериализатора и набор полей (?fields=/?omit= дают свой набор); функции полей с контекстом
+запроса подставляются при создании функции для конкретного экземпляра сериализатора.
+
+Поля, семантику которых нельзя повторить без DRF (вложенные источники "a.b", нестандартные связи),
+читаются обычным get_attribute/to_representation, включая пропуск поля при SkipField, - результат
+всегда совпадает с DRF (проверяют тесты catalog, news и quizzes).
+Включается настройкой CATALOG_COMPILED_SERIALIZERS (по умолчанию включено).
+"""
+import threading
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject, PrimaryKeyRelatedField
+
+# Значение-метка для поля, которое DRF пропустил бы (SkipField)
+_SKIP = object()
+
+# Стандартные to_representation, которые заменяются встроенными преобразованиями
+_BUILTIN_CONVERTERS = {
+    serializers.CharField.to_representation: "str",
+    serializers.IntegerField.to_representation: "int",
+    serializers.FloatField.to_representation: "float",
+}
+
+_code_cache = {}
+_code_lock = threading.Lock()
+
+
+def is_enabled():
+    return getattr(settings, "CATALOG_COMPILED_SERIALIZERS", True)
+
+
+def _model_field(model, name):
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+
+
+def _is_compilable(serializer):
+    """ Стандартный цикл ModelSerializer.to_representation (без переопределений в классе). """
+    method = type(serializer).to_representation
+    return isinstance(serializer, serializers.ModelSerializer) and method in (
+        serializers.Serializer.to_representation, CompiledSerializerMixin.to_representation,
+    )
+
+
+def _fallback(field):
+    """ Поле через обычный путь DRF (get_attribute + проверка None + to_representation). """
+    get_attribute, to_representation = field.get_attribute, field.to_representation
+
+    def represent(obj):
+        try:
+            attribute = get_attribute(obj)
+        except SkipField:
+            return _SKIP
+        check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+        return None if check_for_none is None else to_representation(attribute)
+    return represent
+
+
+def _plan_field(model, field):
+    """
+    План поля: (вид, атрибут). Вид определяет шаблон выражения в генерируемом коде,
+    функции для него берутся из экземпляра поля в _bind_field.
+    """
+    source = field.source
+    if isinstance(field, serializers.SerializerMethodField):
+        return "method", None
+    if type(field).get_attribute is not serializers.Field.get_attribute and not isinstance(field, PrimaryKeyRelatedField):
+        return "fallback", None
+    if source == "*":
+        return "star", None
+    if len(field.source_attrs) != 1 or not source.isidentifier():
+        return "fallback", None
+    model_field = _model_field(model, source)
+    if model_field is None:
+        prefix, suffix = "get_", "_display"
+        if source.startswith(prefix) and source.endswith(suffix):
+            choice_field = _model_field(model, source[len(prefix):-len(suffix)])
+            if choice_field is not None and choice_field.concrete and choice_field.flatchoices \
+                    and type(field).to_representation is serializers.CharField.to_representation:
+                return "display", choice_field.attname
+        return "fallback", None
+    if model_field.is_relation:
+        if model_field.many_to_many or model_field.one_to_many:
+            if isinstance(field, serializers.ListSerializer) and _is_compilable(field.child) \
+                    and type(field).to_representation is serializers.ListSerializer.to_representation:
+                return "many", source
+            return "fallback", None
+        if not (model_field.many_to_one or model_field.one_to_one) or not model_field.concrete:
+            return "fallback", None
+        if isinstance(field, PrimaryKeyRelatedField) and field.pk_field is None and field.use_pk_only_optimization():
+            return "pk", model_field.attname
+        if _is_compilable(field):
+            return "nested", source
+        return "fallback", None
+    if not model_field.concrete:
+        return "fallback", None
+    converter = _BUILTIN_CONVERTERS.get(type(field).to_representation)
+    if converter is not None:
+        return converter, source
+    if isinstance(field, serializers.ReadOnlyField) or (
+        isinstance(field, serializers.JSONField) and not field.binary
+    ) or (
+        type(field) is serializers.BooleanField and model_field.get_internal_type() == "BooleanField"
+    ):
+        return "identity", source
+    return "convert", source
+
+
+def _expression(kind, attribute, index):
+    """ Выражение генерируемого кода для поля с планом (kind, attribute); _cN - функция поля. """
+    helper = f"_c{index}"
+    if kind == "identity" or kind == "pk":
+        return f"obj.{attribute}"
+    if kind in ("str", "int", "float"):
+        return f"None if (v := obj.{attribute}) is None else {kind}(v)"
+    if kind in ("convert", "nested"):
+        return f"None if (v := obj.{attribute}) is None else {helper}(v)"
+    if kind == "display":
+        return f"None if (v := {helper}.get(obj.{attribute}, obj.{attribute})) is None else str(v)"
+    if kind == "many":
+        return f"[{helper}(item) for item in obj.{attribute}.all()]"
+    # method, star, fallback: функция получает весь объект
+    return f"{helper}(obj)"
+
+
+def _generate(plans):
+    """ Исходный код фабрики функции строки для списка планов [(имя, вид, атрибут)]. """
+    helpers = ", ".join(f"_c{index}" for index in range(len(plans)))
+    lines = [f"def make({helpers}):", "    def row(obj):", "        data = {"]
+    for index, (name, kind, attribute) in enumerate(plans):
+        lines.append(f"            {name!r}: {_expression(kind, attribute, index)},")
+    lines.append("        }")
+    for index, (name, kind, attribute) in enumerate(plans):
+        if kind == "fallback":
+            lines.append(f"        if data[{name!r}] is _SKIP:")
+            lines.append(f"            del data[{name!r}]")
+    lines += ["        return data", "    return row"]
+    return "\n".join(lines)
+
+
+def _bind_field(kind, field):
+    """ Функция _cN для поля конкретного экземпляра сериализатора (с его контекстом). """
+    if kind == "display":
+        choice_field = field.parent.Meta.model._meta.get_field(field.source[len("get_"):-len("_display")])
+        return {value: str(label) for value, label in choice_field.flatchoices}
+    if kind == "nested":
+        return compile_serializer(field)
+    if kind == "many":
+        return compile_serializer(field.child)
+    if kind == "method":
+        return getattr(field.parent, field.method_name)
+    if kind in ("convert", "star"):
+        return field.to_representation
+    if kind == "fallback":
+        return _fallback(field)
+    return None
+
+
+def compile_serializer(serializer):
+    """
+    Функция объект -> dict, эквивалентная serializer.to_representation.
+    Код кэшируется по классу сериализатора и набору читаемых полей.
+    """
+    model = serializer.Meta.model
+    fields = list(serializer._readable_fields)
+    key = (type(serializer), tuple((field.field_name, field.source, type(field)) for field in fields))
+    compiled = _code_cache.get(key)
+    if compiled is None:
+        with _code_lock:
+            compiled = _code_cache.get(key)
+            if compiled is None:
+                plans = [(field.field_name, *_plan_field(model, field)) for field in fields]
+                namespace = {"_SKIP": _SKIP}
+                exec(compile(_generate(plans), f"<compiled {type(serializer).__name__}>", "exec"), namespace)
+                compiled = _code_cache[key] = (namespace["make"], [kind for _, kind, _ in plans])
+    make, kinds = compiled
+    return make(*[_bind_field(kind, field) for kind, field in zip(kinds, fields)])
+
+
+def get_source(serializer):
+    """ Сгенерированный код для сериализатора (для отладки и проверки). """
+    fields = list(serializer._readable_fields)
+    return _generate([(field.field_name, *_plan_field(serializer.Meta.model, field)) for field in fields])
+
+
+class CompiledSerializerMixin:
+    """
+    Чтение через скомпилированную функцию (compile_serializer) вместо поля-за-полем DRF.
+    Функция создается один раз на экземпляр сериализатора - для many=True это один раз на список.
+    Запись и валидация не меняются.
+    """
+
+    def to_representation(self, instance):
+        if not is_enabled():
+            return super().to_representation(instance)
+        row = self.__dict__.get("_compiled_row")
+        if row is None:
+            row = self.__dict__["_compiled_row"] = compile_serializer(self)
+        return row(instance)
+
+    def drf_representation(self, instance):
+        """ Представление обычным путем DRF (для сравнения с компилированным). """
+        return super().to_representation(instance)
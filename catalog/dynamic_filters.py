@@ -0,0 +1,178 @@
+"""
+Фильтры по атрибутам, скомпилированные из PropertyType.attribute_schema.
+
+Для каждого типа объекта один раз строится подкласс GenericPropertyFilter с фильтрами
+attr_<ключ>[_min|_max|_in] по его схеме. Классы кэшируются в процессе по версии схемы
+(хэш ее содержимого) и пересобираются, только когда схема меняется. Для запросов без
+?property_type= используется общий класс по атрибутам всех типов (кэш по поколению PropertyType).
+Эти же описания отдает PropertyTypeSerializer.available_filters, поэтому объявленные
+фильтры всегда совпадают с работающими.
+"""
+import hashlib
+import json
+import threading
+
+from django_filters.rest_framework import DjangoFilterBackend
+
+from .attributes import NUMERIC_TYPES
+from .caching import get_generations
+from .filters import (
+    AttributeBooleanFilter, AttributeCharFilter, AttributeCharInFilter,
+    AttributeNumberFilter, AttributeNumberInFilter, GenericPropertyFilter,
+)
+from .models import PropertyType
+
+PROPERTY_TYPE_PARAM = "property_type"
+
+
+def schema_version(schema):
+    """ Версия схемы - хэш ее канонического JSON. """
+    return hashlib.sha1(json.dumps(schema, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+
+def get_enum_options(attr_props):
+    """ Допустимые значения строкового атрибута (enum JSON Schema или choices упрощенной схемы). """
+    options = attr_props.get("enum") or attr_props.get("choices")
+    return list(options) if isinstance(options, (list, tuple)) else None
+
+
+def attribute_filter_specs(properties):
+    """
+    Описания фильтров для атрибутов схемы в формате available_filters.
+    Числа - диапазон (_min/_max), boolean - да/нет, строки с enum/choices - выбор (_in).
+    """
+    specs = []
+    for attr_name, attr_props in properties.items():
+        label = attr_props.get("title", attr_props.get("label", attr_name))
+        attr_type = attr_props.get("type")
+        param_base = f"attr_{attr_name}"
+        if attr_type in NUMERIC_TYPES:
+            specs.append({
+                "param_min": f"{param_base}_min",
+                "param_max": f"{param_base}_max",
+                "label": label,
+                "type": "range",
+                "units": attr_props.get("units", ""),
+            })
+        elif attr_type == "boolean":
+            specs.append({"param": param_base, "label": label, "type": "boolean"})
+        elif attr_type == "string" and get_enum_options(attr_props) is not None:
+            specs.append({
+                "param": f"{param_base}_in",
+                "label": label,
+                "type": "select",
+                "options": get_enum_options(attr_props),
+            })
+    return specs
+
+
+def build_attribute_filters(properties):
+    """ {параметр: фильтр} для атрибутов схемы: диапазоны и списки для чисел, да/нет, подстрока и списки для строк. """
+    declared = {}
+    for attr_name, attr_props in properties.items():
+        label = attr_props.get("title", attr_props.get("label", attr_name))
+        attr_type = attr_props.get("type")
+        param_base = f"attr_{attr_name}"
+        if attr_type in NUMERIC_TYPES:
+            units = f", {attr_props['units']}" if attr_props.get("units") else ""
+            declared[f"{param_base}_min"] = AttributeNumberFilter(
+                attribute=attr_name, lookup_expr="gte", label=f"{label}{units}: от"
+            )
+            declared[f"{param_base}_max"] = AttributeNumberFilter(
+                attribute=attr_name, lookup_expr="lte", label=f"{label}{units}: до"
+            )
+            declared[f"{param_base}_in"] = AttributeNumberInFilter(
+                attribute=attr_name, lookup_expr="in", label=f"{label}: одно из значений (через запятую)"
+            )
+        elif attr_type == "boolean":
+            declared[param_base] = AttributeBooleanFilter(attribute=attr_name, label=label)
+        else:
+            options = get_enum_options(attr_props)
+            hint = f" ({', '.join(str(option) for option in options)})" if options else ""
+            declared[param_base] = AttributeCharFilter(
+                attribute=attr_name, lookup_expr="icontains", label=f"{label} (часть значения)"
+            )
+            declared[f"{param_base}_in"] = AttributeCharInFilter(
+                attribute=attr_name, lookup_expr="in", label=f"{label}: одно из значений через запятую{hint}"
+            )
+    return declared
+
+
+def compile_filterset(name, properties):
+    """ Подкласс GenericPropertyFilter с фильтрами по атрибутам схемы. """
+    declared = build_attribute_filters(properties)
+    meta = type("Meta", (GenericPropertyFilter.Meta,), {
+        "fields": list(dict.fromkeys([*GenericPropertyFilter.Meta.fields, *declared])),
+    })
+    return type(name, (GenericPropertyFilter,), {**declared, "Meta": meta, "__module__": __name__})
+
+
+def _class_name(slug):
+    return "".join(part.capitalize() for part in str(slug).replace("_", "-").split("-") if part.isascii()) or "Type"
+
+
+_lock = threading.Lock()
+_by_type = {} # pk типа -> (версия схемы, класс)
+_compiled = {} # "types" -> (поколение PropertyType, {slug: класс}, общий класс)
+
+
+def get_type_filterset(property_type):
+    """ Скомпилированный класс фильтров для типа; пересобирается только при смене версии схемы. """
+    version = schema_version(property_type.attribute_schema)
+    cached = _by_type.get(property_type.pk)
+    if cached and cached[0] == version:
+        return cached[1]
+    filterset_class = compile_filterset(
+        f"{_class_name(property_type.slug)}{property_type.pk}PropertyFilter",
+        property_type.get_attribute_properties(),
+    )
+    _by_type[property_type.pk] = (version, filterset_class)
+    return filterset_class
+
+
+def merge_attribute_properties(property_types):
+    """ Атрибуты всех схем; при расхождении типов числовой тип имеет приоритет. """
+    merged = {}
+    for property_type in property_types:
+        for key, props in property_type.get_attribute_properties().items():
+            if key not in merged or (props.get("type") in NUMERIC_TYPES and merged[key].get("type") not in NUMERIC_TYPES):
+                merged[key] = props
+    return merged
+
+
+def get_compiled_filtersets():
+    """
+    ({slug типа: класс}, общий класс по всем типам). Пока поколение PropertyType не изменилось,
+    запросов к БД и разбора схем нет; после изменения перекомпилируются только типы с новой схемой.
+    """
+    generation = get_generations(PropertyType)
+    cached = _compiled.get("types")
+    if cached and cached[0] == generation:
+        return cached[1], cached[2]
+    with _lock:
+        property_types = list(PropertyType.objects.only("pk", "slug", "attribute_schema"))
+        by_slug = {property_type.slug: get_type_filterset(property_type) for property_type in property_types}
+        combined = compile_filterset("AllTypesPropertyFilter", merge_attribute_properties(property_types))
+        alive = {property_type.pk for property_type in property_types}
+        for pk in list(_by_type):
+            if pk not in alive:
+                del _by_type[pk]
+        _compiled["types"] = (generation, by_slug, combined)
+    return by_slug, combined
+
+
+class PropertyTypeFilterBackend(DjangoFilterBackend):
+    """
+    Подставляет класс фильтров, скомпилированный для ?property_type=<slug>,
+    или общий класс по всем типам. На схеме OpenAPI показываются фильтры всех типов.
+    """
+
+    def get_filterset_class(self, view, queryset=None):
+        base_class = super().get_filterset_class(view, queryset)
+        if base_class is None or not issubclass(base_class, GenericPropertyFilter):
+            return base_class
+        by_slug, combined = get_compiled_filtersets()
+        request = getattr(view, "request", None)
+        params = getattr(request, "query_params", None)
+        slug = params.get(PROPERTY_TYPE_PARAM) if params is not None else None
+        return by_slug.get(slug, combined) if slug else combined
@@ -0,0 +1,194 @@
+"""
+Фасетные количества для боковой панели фильтров каталога.
+
+Количества фасета учитывают все остальные активные фильтры, но не собственный фильтр фасета
+(дизъюнктивная семантика: выбранная категория не обнуляет счетчики соседних категорий).
+Все фасеты считаются за один проход по отфильтрованному набору:
+выборка строк (id + колонки фасетов) одним запросом и по запросу на каждую M2M-связь,
+далее для каждой строки проверяются фильтры фасетов и увеличиваются нужные счетчики.
+Результат кэшируется по каноническому отпечатку фильтров и поколениям моделей.
+"""
+from collections import Counter, defaultdict
+
+from django.core.cache import cache
+from django_filters.rest_framework import DjangoFilterBackend
+from django_filters.utils import translate_validation
+from rest_framework.filters import OrderingFilter
+
+from .caching import build_cache_key, filter_signature
+from .filters import M2M_MODE_ALL
+
+FACETS_CACHE_TIMEOUT = 600
+FACETS_IGNORED_PARAMS = ('page', 'page_size', 'ordering', 'cursor', 'pagination', 'fields', 'omit')
+
+
+class Facet:
+    """
+    Описание фасета.
+    column - колонка строки (путь ORM) или m2m - имя M2M-связи модели;
+    param - параметр фильтра, который выбирает значения фасета;
+    match - 'exact' (значения через запятую) или 'icontains' (как фильтры location_region);
+    mode_param - параметр режима M2M-фильтра (?features_mode=all: строка должна иметь все выбранные значения);
+    labels - модель-справочник (подпись по id), словарь подписей или поле подписи ('self' - само значение).
+    """
+    def __init__(self, name, param, column=None, m2m=None, match='exact', label_model=None,
+                 label_field='name', label_key='pk', choices=None, mode_param=None):
+        self.name = name
+        self.param = param
+        self.column = column
+        self.m2m = m2m
+        self.match = match
+        self.label_model = label_model
+        self.label_field = label_field
+        self.label_key = label_key
+        self.choices = dict(choices) if choices else None
+        self.mode_param = mode_param
+
+    def selected(self, params):
+        """ Выбранные значения фасета (строки) или None, если фильтр не активен. """
+        values = [value for raw in params.getlist(self.param) for value in raw.split(',') if value.strip()]
+        return {value.strip() for value in values} or None
+
+    def require_all(self, params):
+        return bool(self.mode_param) and params.get(self.mode_param) == M2M_MODE_ALL
+
+    def accepts(self, values, selected, require_all=False):
+        """ Проходит ли строка фильтр фасета (values - значения строки для фасета). """
+        if require_all:
+            return selected <= {str(value) for value in values}
+        if self.match == 'icontains':
+            needles = [value.lower() for value in selected]
+            return any(needle in str(value).lower() for value in values for needle in needles)
+        return any(str(value) in selected for value in values)
+
+    def get_labels(self, keys):
+        if self.choices is not None:
+            return {key: str(self.choices.get(key, key)) for key in keys}
+        if self.label_model is not None:
+            rows = self.label_model.objects.filter(**{f'{self.label_key}__in': list(keys)})
+            return {key: label for key, label in rows.values_list(self.label_key, self.label_field)}
+        return {key: key for key in keys}
+
+
+def filter_without_facets(view, request, queryset, facets):
+    """
+    Применяет фильтры вьюсета ко всему, кроме параметров фасетов.
+    Сортировка пропускается - для подсчета она не нужна.
+    """
+    facet_params = {facet.param for facet in facets}
+    params = request.query_params.copy()
+    for param in facet_params:
+        params.pop(param, None)
+    for backend_class in view.filter_backends:
+        backend = backend_class()
+        if isinstance(backend, OrderingFilter):
+            continue
+        if isinstance(backend, DjangoFilterBackend):
+            filterset_class = backend.get_filterset_class(view, queryset)
+            if filterset_class is None:
+                continue
+            filterset = filterset_class(data=params, queryset=queryset, request=request)
+            if not filterset.is_valid():
+                raise translate_validation(filterset.errors)
+            queryset = filterset.qs
+            continue
+        queryset = backend.filter_queryset(request, queryset, view)
+    return queryset
+
+
+def compute_facets(queryset, facets, params):
+    """
+    {"total": N, "facets": {имя: [{"value", "label", "count", "selected"}]}} для набора queryset,
+    отфильтрованного всем, кроме фасетов; выбор фасетов берется из params.
+    """
+    model = queryset.model
+    ids = queryset.order_by().values('pk')
+    scalar = [facet for facet in facets if facet.column]
+    rows = list(queryset.order_by().distinct().values_list('pk', *[facet.column for facet in scalar]))
+
+    # Значения строки по каждому фасету: скалярные - из выборки, M2M - из таблиц связей
+    values = {facet.name: {} for facet in facets}
+    for row in rows:
+        for facet, value in zip(scalar, row[1:]):
+            values[facet.name][row[0]] = () if value is None else (value,)
+    for facet in facets:
+        if not facet.m2m:
+            continue
+        field = model._meta.get_field(facet.m2m)
+        through = field.remote_field.through
+        source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+        related = defaultdict(list)
+        for owner_id, related_id in through.objects.filter(**{f'{source}__in': ids}).values_list(
+            f'{source}_id', f'{target}_id'
+        ):
+            related[owner_id].append(related_id)
+        values[facet.name] = related
+
+    selections = {facet.name: facet.selected(params) for facet in facets}
+    require_all = {facet.name: facet.require_all(params) for facet in facets}
+    counts = {facet.name: Counter() for facet in facets}
+    total = 0
+    for row in rows:
+        pk = row[0]
+        failed = []
+        for facet in facets:
+            selected = selections[facet.name]
+            if selected is not None and not facet.accepts(values[facet.name].get(pk, ()), selected, require_all[facet.name]):
+                failed.append(facet)
+                if len(failed) > 1:
+                    break
+        if len(failed) > 1:
+            continue
+        # Строка учитывается в фасете, если проходит все остальные фильтры
+        targets = failed or facets
+        if not failed:
+            total += 1
+        for facet in targets:
+            for value in set(values[facet.name].get(pk, ())):
+                counts[facet.name][value] += 1
+
+    result = {}
+    for facet in facets:
+        selected = selections[facet.name] or set()
+        labels = facet.get_labels(set(counts[facet.name]))
+        buckets = [
+            {
+                'value': value,
+                'label': labels.get(value, value),
+                'count': count,
+                'selected': str(value) in selected,
+            }
+            for value, count in counts[facet.name].items()
+        ]
+        buckets.sort(key=lambda bucket: (-bucket['count'], str(bucket['label'])))
+        result[facet.name] = buckets
+    return {'total': total, 'facets': result}
+
+
+class FacetedViewSetMixin:
+    """
+    Добавляет вьюсету вычисление фасетов по facet_definitions.
+    Результат кэшируется по отпечатку фильтров и поколениям cache_dependencies
+    и моделей подписей фасетов (переименование характеристики меняет label в ответе).
+    """
+    facet_definitions = ()
+
+    def get_facet_dependencies(self, queryset):
+        models = [queryset.model, *getattr(self, 'cache_dependencies', ())]
+        models.extend(facet.label_model for facet in self.facet_definitions if facet.label_model is not None)
+        return list(dict.fromkeys(models))
+
+    def get_facets(self, request):
+        queryset = self.get_queryset()
+        key = build_cache_key(
+            'facets',
+            self.get_facet_dependencies(queryset),
+            self.__class__.__name__,
+            filter_signature(request.query_params, FACETS_IGNORED_PARAMS, request.path),
+        )
+        data = cache.get(key)
+        if data is None:
+            facets = list(self.facet_definitions)
+            data = compute_facets(filter_without_facets(self, request, queryset, facets), facets, request.query_params)
+            cache.set(key, data, FACETS_CACHE_TIMEOUT)
+        return data
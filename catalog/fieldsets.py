@@ -0,0 +1,155 @@
+""" Разреженные наборы полей (?fields= / ?omit=) и обрезка запроса под них. """
+from functools import lru_cache
+
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.serializers import ListSerializer
+
+FIELDS_PARAM = 'fields'
+OMIT_PARAM = 'omit'
+
+SPARSE_FIELDSET_PARAMETERS = [
+    OpenApiParameter(
+        FIELDS_PARAM, OpenApiTypes.STR, OpenApiParameter.QUERY,
+        description='Вернуть только перечисленные поля (через запятую), например: id,title,slug,price',
+    ),
+    OpenApiParameter(
+        OMIT_PARAM, OpenApiTypes.STR, OpenApiParameter.QUERY,
+        description='Исключить перечисленные поля (через запятую), например: description,media_files',
+    ),
+]
+
+
+def _split(value):
+    return {name.strip() for name in value.split(',') if name.strip()} if value else set()
+
+
+def get_sparse_fieldset(request):
+    """ Возвращает (запрошенные поля или None, исключенные поля) для безопасных запросов. """
+    if request is None or request.method not in SAFE_METHODS:
+        return None, set()
+    params = request.query_params
+    requested = _split(params.get(FIELDS_PARAM)) or None
+    return requested, _split(params.get(OMIT_PARAM))
+
+
+class SparseFieldsetSerializerMixin:
+    """
+    Оставляет в ответе только поля из ?fields= и убирает поля из ?omit=.
+    Применяется только к корневому сериализатору (вложенные не трогаем).
+    Поля с source='*' (SerializerMethodField, вычисляемые поля) читают неизвестные атрибуты:
+    их атрибуты модели указываются в sparse_sources поля или в sparse_field_sources сериализатора,
+    иначе queryset под такой набор полей не обрезается (отложенные колонки дали бы N+1).
+    """
+    sparse_field_sources = {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self._is_sparse_root():
+            return fields
+        requested, omitted = get_sparse_fieldset(self.context.get('request'))
+        if requested is None and not omitted:
+            return fields
+        return {
+            name: field for name, field in fields.items()
+            if (requested is None or name in requested) and name not in omitted
+        }
+
+    def _is_sparse_root(self):
+        parent = self.parent
+        return parent is None or (isinstance(parent, ListSerializer) and parent.parent is None)
+
+
+def _field_sources(name, field, overrides):
+    """ Корневые атрибуты модели, которые читает поле; None - неизвестно. """
+    if field.write_only:
+        return set()
+    if name in overrides:
+        sources = overrides[name]
+        return {sources} if isinstance(sources, str) else set(sources)
+    if getattr(field, 'sparse_sources', None) is not None:
+        return set(field.sparse_sources)
+    if field.source == '*':
+        return None
+    attr = field.source.split('.')[0]
+    if attr.startswith('get_') and attr.endswith('_display'):
+        attr = attr[len('get_'):-len('_display')]
+    return {attr}
+
+
+@lru_cache(maxsize=None)
+def _serializer_field_sources(serializer_class):
+    """ {имя поля: атрибуты модели или None} по классу сериализатора (поля строятся один раз). """
+    overrides = getattr(serializer_class, 'sparse_field_sources', {})
+    fields = serializer_class(context={}).fields
+    return {name: _field_sources(name, field, overrides) for name, field in fields.items()}
+
+
+@lru_cache(maxsize=256)
+def get_sparse_field_sources(serializer_class, requested, omitted):
+    """
+    Корневые атрибуты модели для набора полей (requested - frozenset или None, omitted - frozenset)
+    или None, если набор включает поле с неизвестными атрибутами.
+    """
+    sources = set()
+    for name, field_sources in _serializer_field_sources(serializer_class).items():
+        if (requested is not None and name not in requested) or name in omitted:
+            continue
+        if field_sources is None:
+            return None
+        sources |= field_sources
+    return frozenset(sources)
+
+
+def prune_queryset(queryset, sources, keep=()):
+    """
+    Убирает из queryset select_related/prefetch_related для невостребованных связей
+    и откладывает (defer) колонки, которые сериализатор не прочитает.
+    keep - поля, которые нужны вьюсету независимо от сериализатора (lookup, сортировка).
+    """
+    opts = queryset.model._meta
+    needed = set(sources) | {name.split('__')[0] for name in keep} | {opts.pk.name}
+
+    select_related = queryset.query.select_related
+    if isinstance(select_related, dict):
+        kept = [name for name in select_related if name in needed]
+        queryset = queryset.select_related(None)
+        if kept:
+            queryset = queryset.select_related(*kept)
+
+    prefetch = queryset._prefetch_related_lookups
+    if prefetch:
+        kept = [
+            lookup for lookup in prefetch
+            if (lookup if isinstance(lookup, str) else lookup.prefetch_to).split('__')[0] in needed
+        ]
+        queryset = queryset.prefetch_related(None).prefetch_related(*kept)
+
+    deferred = [field.name for field in opts.concrete_fields if field.name not in needed]
+    if deferred:
+        queryset = queryset.defer(*deferred)
+    return queryset
+
+
+class SparseFieldsetViewSetMixin:
+    """
+    Применяет ?fields=/?omit= к запросу: невостребованные связи и колонки не загружаются.
+    Нужные атрибуты берутся из класса сериализатора и кэшируются по набору полей.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        requested, omitted = get_sparse_fieldset(getattr(self, 'request', None))
+        if requested is None and not omitted:
+            return queryset
+        serializer_class = self.get_serializer_class()
+        if not issubclass(serializer_class, SparseFieldsetSerializerMixin):
+            return queryset
+        sources = get_sparse_field_sources(
+            serializer_class, frozenset(requested) if requested is not None else None, frozenset(omitted),
+        )
+        if sources is None:
+            return queryset
+        keep = [self.lookup_field, *(getattr(self, 'ordering_fields', None) or [])]
+        return prune_queryset(queryset, sources, keep=keep)
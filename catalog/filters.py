@@ -1,6 +1,17 @@
 import django_filters
-from django.db.models import Q
-from .models import LandPlot, GenericProperty, Feature, LandUseType, LandCategory, PropertyType
+from django import forms
+from django.db.models import Count, Exists, F, OuterRef, Q
+from django_filters.constants import EMPTY_VALUES
+
+from . import geo
+
+from .attributes import (
+    COLUMN_BOOL, COLUMN_NUM, COLUMN_STR,
+    attribute_exists, attribute_value, column_for_type, get_attribute_types,
+)
+from .search import RelevanceOrderingFilter
+from .models import LandPlot, GenericProperty, Feature, LandUseType, LandCategory, Location, PropertyType, CatalogListing, PriceStatistic
+from .trigram import get_index
 
 class BaseRangeFilter(django_filters.FilterSet):
     """ Базовый класс для добавления фильтров по диапазону """
@@ -10,56 +21,254 @@ class BaseRangeFilter(django_filters.FilterSet):
     class Meta:
         abstract = True
 
-class LandPlotFilter(BaseRangeFilter):
+class FuzzyMatchFilter(django_filters.CharFilter):
+    """
+    Нечеткий поиск с опечатками по триграммному индексу (catalog.trigram).
+    index_name - имя индекса, field_name - поле, по которому фильтруются найденные id
+    (не больше trigram.MAX_MATCH_IDS лучших совпадений).
+    """
+    def __init__(self, *args, index_name, **kwargs):
+        self.index_name = index_name
+        super().__init__(*args, **kwargs)
+
+    def filter(self, qs, value):
+        if not value or not value.strip():
+            return qs
+        ids = get_index(self.index_name).match_ids(value)
+        return qs.filter(**{f"{self.field_name}__in": ids})
+
+class AttributeFilterMixin:
+    """ Фильтр по атрибуту объекта через индекс PropertyAttributeValue (EXISTS по (key, значение)). """
+    column = COLUMN_STR
+
+    def __init__(self, *args, attribute, **kwargs):
+        self.attribute = attribute
+        kwargs.setdefault("field_name", f"attr_{attribute}")
+        super().__init__(*args, **kwargs)
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        return qs.filter(attribute_exists(self.attribute, {f"{self.column}__{self.lookup_expr}": value}))
+
+class AttributeNumberFilter(AttributeFilterMixin, django_filters.NumberFilter):
+    column = COLUMN_NUM
+
+class AttributeBooleanFilter(AttributeFilterMixin, django_filters.BooleanFilter):
+    column = COLUMN_BOOL
+
+class AttributeCharFilter(AttributeFilterMixin, django_filters.CharFilter):
+    column = COLUMN_STR
+
+class AttributeCharInFilter(AttributeFilterMixin, django_filters.BaseInFilter, django_filters.CharFilter):
+    column = COLUMN_STR
+
+class AttributeNumberInFilter(AttributeFilterMixin, django_filters.BaseInFilter, django_filters.NumberFilter):
+    column = COLUMN_NUM
+
+M2M_MODE_ANY = "any"
+M2M_MODE_ALL = "all"
+M2M_MODE_CHOICES = (
+    (M2M_MODE_ANY, "Любое из значений"),
+    (M2M_MODE_ALL, "Все значения"),
+)
+
+def m2m_condition(model, relation, ids, mode=M2M_MODE_ANY):
+    """
+    Условие по M2M-связи без JOIN-а основной таблицы (строки не размножаются):
+    any - EXISTS по таблице связей, all - pk IN (GROUP BY объекту HAVING COUNT = числу значений).
+    """
+    field = model._meta.get_field(relation)
+    through = field.remote_field.through
+    source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+    ids = sorted({int(value) for value in ids})
+    links = through.objects.filter(**{f"{target}_id__in": ids})
+    if mode == M2M_MODE_ALL:
+        matched = links.values(f"{source}_id").annotate(matched=Count(f"{target}_id")).filter(matched=len(ids))
+        return Q(pk__in=matched.values(f"{source}_id"))
+    return Exists(links.filter(**{f"{source}_id": OuterRef("pk")}))
+
+class M2MModeFilter(django_filters.ChoiceFilter):
+    """ Режим M2M-фильтра (?features_mode=all); сам набор не фильтрует, его читает M2MFilter. """
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("choices", M2M_MODE_CHOICES)
+        super().__init__(*args, **kwargs)
+
+    def filter(self, qs, value):
+        return qs
+
+class M2MFilter(django_filters.BaseInFilter, django_filters.NumberFilter):
+    """
+    Фильтр по нескольким id M2M-связи (?features=1,2) через m2m_condition.
+    Семантика задается параметром mode_param: any (по умолчанию) или all.
+    """
+    def __init__(self, *args, relation, mode_param, **kwargs):
+        self.relation = relation
+        self.mode_param = mode_param
+        kwargs.setdefault("field_name", f"{relation}__id")
+        kwargs.setdefault("lookup_expr", "in")
+        super().__init__(*args, **kwargs)
+
+    def get_mode(self):
+        form = getattr(getattr(self, "parent", None), "form", None)
+        cleaned_data = getattr(form, "cleaned_data", None) or {}
+        return cleaned_data.get(self.mode_param) or M2M_MODE_ANY
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        return qs.filter(m2m_condition(qs.model, self.relation, value, self.get_mode()))
+
+# --- Геопоиск (catalog.geo) ---
+
+LOCATION_COORDINATES = ("location__latitude", "location__longitude")
+MAX_RADIUS_KM = 1000
+
+class BoundingBoxField(forms.CharField):
+    """ "запад,юг,восток,север" в градусах -> кортеж float; запад > востока - рамка через 180-й меридиан. """
+    def clean(self, value):
+        value = super().clean(value)
+        if value in EMPTY_VALUES:
+            return None
+        try:
+            west, south, east, north = (float(part) for part in value.split(","))
+        except ValueError:
+            raise forms.ValidationError("Ожидается bbox=запад,юг,восток,север (4 числа через запятую).")
+        if not (-180 <= west <= 180 and -180 <= east <= 180 and -90 <= south <= north <= 90):
+            raise forms.ValidationError("Координаты рамки вне допустимого диапазона или юг больше севера.")
+        return west, south, east, north
+
+class GeoFilterForm(forms.Form):
+    """ Форма фильтров с геопоиском: lat и lon задаются вместе, radius_km - только вместе с ними. """
+    def clean(self):
+        cleaned_data = super().clean()
+        center = [cleaned_data.get("lat"), cleaned_data.get("lon")]
+        if center.count(None) == 1:
+            raise forms.ValidationError("Центр задается двумя параметрами: lat и lon.")
+        if cleaned_data.get("radius_km") is not None and None in center:
+            raise forms.ValidationError("Для поиска по радиусу нужны все параметры: lat, lon и radius_km.")
+        return cleaned_data
+
+class GeoCoordinateFilter(django_filters.NumberFilter):
+    """ Координата центра для radius_km и сортировки по расстоянию; сама набор не фильтрует. """
+    def filter(self, qs, value):
+        return qs
+
+class BoundingBoxFilter(django_filters.Filter):
+    """
+    ?bbox=запад,юг,восток,север: кандидаты - по диапазонам geohash местоположений,
+    затем точная проверка координат.
+    """
+    field_class = BoundingBoxField
+
+    def __init__(self, *args, coordinates=LOCATION_COORDINATES, **kwargs):
+        self.coordinates = coordinates
+        kwargs.setdefault("field_name", "location_id")
+        super().__init__(*args, **kwargs)
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        candidates = Location.objects.filter(geo.geohash_q(value)).values("pk")
+        return qs.filter(geo.bbox_q(value, *self.coordinates), **{f"{self.field_name}__in": candidates})
+
+class RadiusFilter(django_filters.NumberFilter):
+    """
+    ?lat=&lon=&radius_km=: кандидаты - по диапазонам geohash рамки вокруг круга,
+    затем точное расстояние по гаверсинусу (аннотация distance_km).
+    """
+    def __init__(self, *args, coordinates=LOCATION_COORDINATES, **kwargs):
+        self.coordinates = coordinates
+        kwargs.setdefault("field_name", "location_id")
+        kwargs.setdefault("min_value", 0)
+        kwargs.setdefault("max_value", MAX_RADIUS_KM)
+        super().__init__(*args, **kwargs)
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        cleaned_data = self.parent.form.cleaned_data
+        lat, lon = cleaned_data["lat"], cleaned_data["lon"]
+        candidates = Location.objects.filter(geo.geohash_q(geo.radius_bbox(lat, lon, float(value)))).values("pk")
+        return qs.filter(**{f"{self.field_name}__in": candidates}).alias(
+            distance_km=geo.distance_expression(lat, lon, *self.coordinates)
+        ).filter(distance_km__lte=float(value))
+
+class GeoFilterSet(BaseRangeFilter):
+    """ Поиск по области (?bbox=) и по радиусу (?lat=&lon=&radius_km=) через Location.geohash """
+    bbox = BoundingBoxFilter(label='Рамка карты: запад,юг,восток,север (градусы)')
+    lat = GeoCoordinateFilter(min_value=-90, max_value=90, label='Широта центра (для radius_km и ?ordering=distance)')
+    lon = GeoCoordinateFilter(min_value=-180, max_value=180, label='Долгота центра (для radius_km и ?ordering=distance)')
+    radius_km = RadiusFilter(label=f'Радиус поиска от lat/lon, км (до {MAX_RADIUS_KM})')
+
+    class Meta:
+        abstract = True
+
+GEO_FILTER_FIELDS = ["bbox", "lat", "lon", "radius_km"]
+
+class LandPlotFilter(GeoFilterSet):
     area_min = django_filters.NumberFilter(field_name="area", lookup_expr="gte")
     area_max = django_filters.NumberFilter(field_name="area", lookup_expr="lte")
 
     # Фильтр для выбора нескольких ВРИ (передавать ID через запятую: ?land_use_types=1,2)
-    land_use_types = django_filters.BaseInFilter(field_name="land_use_types__id", lookup_expr="in")
+    # ?land_use_types_mode=all - участок должен иметь все перечисленные ВРИ (по умолчанию any - любой из них)
+    land_use_types = M2MFilter(relation="land_use_types", mode_param="land_use_types_mode", label='ВРИ (ID через запятую)')
+    land_use_types_mode = M2MModeFilter(label='Режим фильтра ВРИ: any - любой, all - все')
 
     # Фильтр для выбора нескольких Особенностей (передавать ID: ?features=1,2)
-    features = django_filters.BaseInFilter(field_name="features__id", lookup_expr="in")
+    # ?features_mode=all - "есть вода И свет", any - "вода ИЛИ свет"
+    features = M2MFilter(relation="features", mode_param="features_mode", label='Характеристики (ID через запятую)')
+    features_mode = M2MModeFilter(label='Режим фильтра характеристик: any - любая, all - все')
 
     # Фильтр по местоположению
     location_region = django_filters.CharFilter(field_name="location__region", lookup_expr="icontains", label='Регион (часть названия)')
     location_locality = django_filters.CharFilter(field_name="location__locality", lookup_expr="icontains", label='Населенный пункт (часть названия)')
+    # Нечеткий поиск, устойчивый к опечаткам: ?location_fuzzy=Чимал найдет участки в Чемале
+    location_fuzzy = FuzzyMatchFilter(field_name="location_id", index_name="location", label='Регион/населенный пункт (нечеткий поиск)')
+    title_fuzzy = FuzzyMatchFilter(field_name="pk", index_name="land_plot_title", label='Заголовок (нечеткий поиск)')
 
     class Meta:
         model = LandPlot
         fields = [
             "price_min", "price_max",
             "area_min", "area_max",
-            "listing_status", "plot_status", "land_category",
-            "land_use_types", "features",
+            "listing_status", "plot_status", "land_type", "land_category",
+            "land_use_types", "land_use_types_mode", "features", "features_mode",
             "location_region", "location_locality",
+            "location_fuzzy", "title_fuzzy",
+            *GEO_FILTER_FIELDS,
         ]
+        form = GeoFilterForm
 
-class GenericPropertyFilter(BaseRangeFilter):
+class GenericPropertyFilter(GeoFilterSet):
     # Фильтр по типу объекта через slug
     property_type = django_filters.CharFilter(field_name="property_type__slug", lookup_expr="exact")
 
-    # Фильтры по атрибутам (примеры для общих ключей)
-    # Для них требуются GIN индексы в PostgreSQL для производительности!
+    # Фильтры по атрибутам идут через типизированный индекс PropertyAttributeValue (catalog.attributes).
+    # Здесь объявлены частые ключи; фильтры по всем атрибутам схем добавляются в подклассах,
+    # скомпилированных для каждого типа объекта (catalog.dynamic_filters).
     # Площадь (кв.м.)
-    attr_area_sqm_min = django_filters.NumberFilter(field_name="attributes__area_sqm", lookup_expr="gte")
-    attr_area_sqm_max = django_filters.NumberFilter(field_name="attributes__area_sqm", lookup_expr="lte")
+    attr_area_sqm_min = AttributeNumberFilter(attribute="area_sqm", lookup_expr="gte")
+    attr_area_sqm_max = AttributeNumberFilter(attribute="area_sqm", lookup_expr="lte")
     # Количество комнат
-    attr_rooms_min = django_filters.NumberFilter(field_name="attributes__rooms", lookup_expr="gte")
-    attr_rooms_max = django_filters.NumberFilter(field_name="attributes__rooms", lookup_expr="lte")
+    attr_rooms_min = AttributeNumberFilter(attribute="rooms", lookup_expr="gte")
+    attr_rooms_max = AttributeNumberFilter(attribute="rooms", lookup_expr="lte")
     # Этаж
-    attr_floor_min = django_filters.NumberFilter(field_name="attributes__floor", lookup_expr="gte")
-    attr_floor_max = django_filters.NumberFilter(field_name="attributes__floor", lookup_expr="lte")
+    attr_floor_min = AttributeNumberFilter(attribute="floor", lookup_expr="gte")
+    attr_floor_max = AttributeNumberFilter(attribute="floor", lookup_expr="lte")
     # Этажность дома
-    attr_total_floors_min = django_filters.NumberFilter(field_name="attributes__total_floors", lookup_expr="gte")
-    attr_total_floors_max = django_filters.NumberFilter(field_name="attributes__total_floors", lookup_expr="lte")
+    attr_total_floors_min = AttributeNumberFilter(attribute="total_floors", lookup_expr="gte")
+    attr_total_floors_max = AttributeNumberFilter(attribute="total_floors", lookup_expr="lte")
     # Наличие балкона
-    attr_has_balcony = django_filters.BooleanFilter(field_name="attributes__has_balcony")
+    attr_has_balcony = AttributeBooleanFilter(attribute="has_balcony")
     # Материал стен (если строка)
-    attr_material = django_filters.CharFilter(field_name="attributes__material", lookup_expr="icontains")
+    attr_material = AttributeCharFilter(attribute="material", lookup_expr="icontains")
 
     # Фильтр по местоположению
     location_region = django_filters.CharFilter(field_name="location__region", lookup_expr="icontains")
     location_locality = django_filters.CharFilter(field_name="location__locality", lookup_expr="icontains")
+    location_fuzzy = FuzzyMatchFilter(field_name="location_id", index_name="location", label='Регион/населенный пункт (нечеткий поиск)')
+    title_fuzzy = FuzzyMatchFilter(field_name="pk", index_name="property_title", label='Заголовок (нечеткий поиск)')
 
     class Meta:
         model = GenericProperty
@@ -67,6 +276,8 @@ class GenericPropertyFilter(BaseRangeFilter):
             "price_min", "price_max",
             "listing_status", "property_type",
             "location_region", "location_locality",
+            "location_fuzzy", "title_fuzzy",
+            *GEO_FILTER_FIELDS,
             # Атрибуты
             "attr_area_sqm_min", "attr_area_sqm_max",
             "attr_rooms_min", "attr_rooms_max",
@@ -74,6 +285,122 @@ class GenericPropertyFilter(BaseRangeFilter):
             "attr_total_floors_min", "attr_total_floors_max",
             "attr_has_balcony", "attr_material",
         ]
+        form = GeoFilterForm
+
+class CatalogListingFilter(BaseRangeFilter):
+    """ Фильтры общей ленты: работают по колонкам CatalogListing без JOIN-ов """
+    area_min = django_filters.NumberFilter(field_name="area", lookup_expr="gte")
+    area_max = django_filters.NumberFilter(field_name="area", lookup_expr="lte")
+    location_region = django_filters.CharFilter(field_name="region", lookup_expr="icontains", label='Регион (часть названия)')
+    location_locality = django_filters.CharFilter(field_name="locality", lookup_expr="icontains", label='Населенный пункт (часть названия)')
+    location_fuzzy = FuzzyMatchFilter(field_name="location_id", index_name="location", label='Регион/населенный пункт (нечеткий поиск)')
+
+    class Meta:
+        model = CatalogListing
+        fields = [
+            "kind", "property_type",
+            "price_min", "price_max",
+            "area_min", "area_max",
+            "location_region", "location_locality", "location_fuzzy",
+        ]
+
+class PriceStatisticFilter(django_filters.FilterSet):
+    """ Фильтры статистики цен: срез задается точными значениями, scope - уровень географии """
+    SCOPE_CHOICES = (
+        ("all", "Все регионы"),
+        ("region", "Регион"),
+        ("locality", "Населенный пункт"),
+    )
+    scope = django_filters.ChoiceFilter(choices=SCOPE_CHOICES, method="filter_scope", label='Уровень: all, region или locality')
+
+    class Meta:
+        model = PriceStatistic
+        fields = ["kind", "region", "locality", "property_type", "scope"]
+
+    def filter_scope(self, queryset, name, value):
+        if value == "all":
+            return queryset.filter(region="")
+        if value == "region":
+            return queryset.exclude(region="").filter(locality="")
+        return queryset.exclude(locality="")
 
 # TODO: Добавить новый FilterSet для GenericProperty, когда он понадобится
-# Он должен будет уметь фильтровать по общим полям и по полям внутри JSON 'attributes' 
\ No newline at end of file
+# Он должен будет уметь фильтровать по общим полям и по полям внутри JSON 'attributes' 
+
+class DistanceOrderingFilter(RelevanceOrderingFilter):
+    """
+    Сортировка по расстоянию от точки ?lat=&lon=: ?ordering=distance (ближние первыми) или -distance.
+    Без координат центра параметр игнорируется. Объекты без координат - в конце.
+    """
+    distance_term = "distance"
+    coordinates = LOCATION_COORDINATES
+
+    def get_center(self, request):
+        try:
+            lat, lon = float(request.query_params["lat"]), float(request.query_params["lon"])
+        except (KeyError, ValueError):
+            return None
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            return None
+        return lat, lon
+
+    def remove_invalid_fields(self, queryset, fields, view, request):
+        distance = [term for term in fields if term.lstrip("-") == self.distance_term]
+        regular = super().remove_invalid_fields(
+            queryset, [term for term in fields if term not in distance], view, request
+        )
+        if distance and self.get_center(request) is None:
+            distance = []
+        return [term for term in fields if term in regular or term in distance]
+
+    def order_expression(self, queryset, term, request):
+        """ (queryset, выражение) для терма сортировки по расстоянию или None для остальных. """
+        if term.lstrip("-") != self.distance_term:
+            return None
+        center = self.get_center(request)
+        expression = geo.distance_expression(*center, *self.coordinates)
+        return queryset, (expression.desc(nulls_last=True) if term.startswith("-") else expression.asc(nulls_last=True))
+
+    def filter_queryset(self, request, queryset, view):
+        ordering = self.get_ordering(request, queryset, view)
+        if not ordering:
+            return queryset
+        order_by = []
+        for term in ordering:
+            ordered = self.order_expression(queryset, term, request)
+            if ordered is None:
+                order_by.append(term)
+                continue
+            queryset, expression = ordered
+            order_by.append(expression)
+        return queryset.order_by(*order_by)
+
+class AttributeOrderingFilter(DistanceOrderingFilter):
+    """
+    Сортировка по атрибутам схем: ?ordering=attr_area_sqm или ?ordering=-attr_rooms
+    (значение берется из индекса PropertyAttributeValue; объекты без атрибута - в конце).
+    """
+    attribute_prefix = "attr_"
+
+    def _attribute_key(self, term):
+        name = term.lstrip("-")
+        if name.startswith(self.attribute_prefix):
+            key = name[len(self.attribute_prefix):]
+            if key in get_attribute_types():
+                return key
+        return None
+
+    def remove_invalid_fields(self, queryset, fields, view, request):
+        regular = super().remove_invalid_fields(
+            queryset, [term for term in fields if self._attribute_key(term) is None], view, request
+        )
+        return [term for term in fields if term in regular or self._attribute_key(term) is not None]
+
+    def order_expression(self, queryset, term, request):
+        key = self._attribute_key(term)
+        if key is None:
+            return super().order_expression(queryset, term, request)
+        alias = f"attr_sort_{key}"
+        queryset = queryset.annotate(**{alias: attribute_value(key, column_for_type(get_attribute_types()[key]))})
+        expression = F(alias)
+        return queryset, (expression.desc(nulls_last=True) if term.startswith("-") else expression.asc(nulls_last=True))
@@ -0,0 +1,178 @@
+"""
+Геопоиск по координатам Location.
+
+У каждого местоположения при сохранении вычисляется geohash (Location.geohash, индекс B-tree).
+Ячейки geohash с общим префиксом образуют непрерывный диапазон строк, поэтому прямоугольная
+область покрывается несколькими префиксами, а запрос превращается в несколько сканирований
+диапазонов индекса (geohash >= префикс AND geohash < префикс + '{').
+Покрытие с запасом: после выборки кандидатов точное условие проверяется по координатам
+(рамка - сравнением широты/долготы, радиус - расстоянием по гаверсинусу в SQL).
+"""
+import math
+
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import ASin, Cast, Cos, Least, Power, Radians, Sin, Sqrt
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 9 # ~5 м - точнее, чем нужно для покрытия любой области
+# Символ сразу после последнего символа алфавита ('z'): граница диапазона префикса
+GEOHASH_RANGE_END = "{"
+# Наибольшее число ячеек в покрытии области: выбирается самая мелкая точность, при которой их не больше
+MAX_COVER_CELLS = 32
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def encode_geohash(lat, lon, precision=GEOHASH_PRECISION):
+    """ Geohash точки (строка из precision символов). """
+    lat, lon = float(lat), float(lon)
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        bounds, coordinate = (lon_range, lon) if even else (lat_range, lat)
+        middle = (bounds[0] + bounds[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            bounds[0] = middle
+        else:
+            bounds[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def cell_size(precision):
+    """ (высота, ширина) ячейки geohash в градусах для точности precision. """
+    total = 5 * precision
+    lon_bits = (total + 1) // 2
+    lat_bits = total // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def split_bbox(bbox):
+    """
+    Рамка (запад, юг, восток, север) в градусах -> список рамок без перехода через 180-й меридиан.
+    Если запад > востока, рамка пересекает антимеридиан и делится на две.
+    """
+    west, south, east, north = bbox
+    if west <= east:
+        return [(west, south, east, north)]
+    return [(west, south, 180.0, north), (-180.0, south, east, north)]
+
+
+def _cell_indexes(low, high, size, origin, count):
+    first = min(int((low - origin) // size), count - 1)
+    last = min(int((high - origin) // size), count - 1)
+    return range(max(first, 0), max(last, 0) + 1)
+
+
+def cover_cells(bbox, max_precision=GEOHASH_PRECISION):
+    """
+    Префиксы geohash одной длины, покрывающие рамку (без перехода через антимеридиан).
+    Берется самая мелкая точность (не больше max_precision), при которой ячеек не больше MAX_COVER_CELLS.
+    """
+    west, south, east, north = bbox
+    for precision in range(max_precision, 0, -1):
+        height, width = cell_size(precision)
+        rows = _cell_indexes(south, north, height, -90.0, round(180.0 / height))
+        columns = _cell_indexes(west, east, width, -180.0, round(360.0 / width))
+        if len(rows) * len(columns) <= MAX_COVER_CELLS or precision == 1:
+            return sorted({
+                encode_geohash(-90.0 + (row + 0.5) * height, -180.0 + (column + 0.5) * width, precision)
+                for row in rows for column in columns
+            })
+    return []
+
+
+def cover_ranges(bbox, max_precision=GEOHASH_PRECISION):
+    """
+    Диапазоны строк geohash [начало, конец), покрывающие рамку.
+    Соседние в порядке geohash ячейки сливаются в один диапазон.
+    max_precision ограничивает длину префиксов - для поиска по ячейкам не длиннее этой точности.
+    """
+    ranges = []
+    for part in split_bbox(bbox):
+        cells = cover_cells(part, max_precision)
+        previous = None
+        for cell in cells:
+            number = _geohash_number(cell)
+            if ranges and previous is not None and number == previous + 1 and len(ranges[-1][0]) == len(cell):
+                ranges[-1] = (ranges[-1][0], cell + GEOHASH_RANGE_END)
+            else:
+                ranges.append((cell, cell + GEOHASH_RANGE_END))
+            previous = number
+    return ranges
+
+
+def _geohash_number(cell):
+    number = 0
+    for char in cell:
+        number = number * 32 + GEOHASH_ALPHABET.index(char)
+    return number
+
+
+def geohash_q(bbox, field="geohash", max_precision=GEOHASH_PRECISION):
+    """ Условие по индексу geohash: объединение сканирований диапазонов, покрывающих рамку. """
+    condition = Q(pk__in=[])
+    for start, end in cover_ranges(bbox, max_precision):
+        condition |= Q(**{f"{field}__gte": start, f"{field}__lt": end})
+    return condition
+
+
+def radius_bbox(lat, lon, radius_km):
+    """ Рамка (запад, юг, восток, север), описанная вокруг круга радиуса radius_km. """
+    lat, lon = float(lat), float(lon)
+    delta_lat = radius_km / KM_PER_DEGREE
+    south, north = max(lat - delta_lat, -90.0), min(lat + delta_lat, 90.0)
+    # У полюса круг накрывает все долготы
+    cos_lat = math.cos(math.radians(max(abs(south), abs(north))))
+    if cos_lat <= 1e-9 or radius_km / (KM_PER_DEGREE * cos_lat) >= 180.0:
+        return (-180.0, south, 180.0, north)
+    delta_lon = radius_km / (KM_PER_DEGREE * cos_lat)
+    west, east = lon - delta_lon, lon + delta_lon
+    if west < -180.0:
+        west += 360.0
+    if east > 180.0:
+        east -= 360.0
+    return (west, south, east, north)
+
+
+def in_bbox(bbox, lat, lon):
+    """ Попадает ли точка в рамку (с учетом перехода через антимеридиан). """
+    west, south, east, north = bbox
+    if not south <= lat <= north:
+        return False
+    return west <= lon <= east if west <= east else (lon >= west or lon <= east)
+
+
+def bbox_q(bbox, lat_field, lon_field):
+    """ Точное условие попадания координат в рамку (с учетом перехода через антимеридиан). """
+    west, south, east, north = bbox
+    condition = Q(**{f"{lat_field}__gte": south, f"{lat_field}__lte": north})
+    if west <= east:
+        return condition & Q(**{f"{lon_field}__gte": west, f"{lon_field}__lte": east})
+    return condition & (Q(**{f"{lon_field}__gte": west}) | Q(**{f"{lon_field}__lte": east}))
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """ Расстояние между точками по сфере, км. """
+    lat1, lon1, lat2, lon2 = map(math.radians, (float(lat1), float(lon1), float(lat2), float(lon2)))
+    value = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(value)))
+
+
+def distance_expression(lat, lon, lat_field, lon_field):
+    """ SQL-выражение расстояния (км) от точки (lat, lon) до координат lat_field/lon_field. """
+    lat_rad = math.radians(float(lat))
+    lon_rad = math.radians(float(lon))
+    row_lat = Radians(Cast(F(lat_field), FloatField()))
+    row_lon = Radians(Cast(F(lon_field), FloatField()))
+    value = (
+        Power(Sin((row_lat - Value(lat_rad)) / Value(2.0)), Value(2.0))
+        + Value(math.cos(lat_rad)) * Cos(row_lat) * Power(Sin((row_lon - Value(lon_rad)) / Value(2.0)), Value(2.0))
+    )
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Least(Sqrt(value), Value(1.0)), output_field=FloatField())
@@ -0,0 +1,227 @@
+"""
+Границы участков: GeoJSON-полигоны без пространственной СУБД.
+
+Граница хранится в LandPlot.boundary как геометрия GeoJSON (Polygon или MultiPolygon, координаты
+[долгота, широта]). При сохранении участка для нее заранее считаются упрощенные версии
+(Дуглас-Пекер с допуском в размер пикселя для нескольких масштабов карты) и рамка
+(колонки boundary_min_lon/.../boundary_max_lat), по которой поиск "в какой участок попал клик"
+отбирает кандидатов в SQL; точная проверка точка-в-полигоне - здесь же, в Python.
+numpy ускоряет упрощение и проверку, но не обязателен.
+"""
+import math
+
+try:
+    import numpy as np
+except ImportError: # numpy - необязательная зависимость, без нее используются циклы Python
+    np = None
+
+GEOMETRY_TYPES = ("Polygon", "MultiPolygon")
+# Масштаб карты -> допуск упрощения (градусы): примерно размер пикселя тайла 256px на этом масштабе
+SIMPLIFY_ZOOMS = (10, 13, 16)
+MAX_VERTICES = 20000
+
+
+def zoom_tolerance(zoom):
+    return 360.0 / (256 * 2 ** zoom)
+
+
+class GeometryError(ValueError):
+    """ Геометрия не является корректным Polygon/MultiPolygon GeoJSON. """
+
+
+# --- Разбор и проверка ---
+
+def _parse_ring(ring):
+    if not isinstance(ring, (list, tuple)):
+        raise GeometryError("Кольцо полигона должно быть списком точек [долгота, широта].")
+    points = []
+    for point in ring:
+        if not isinstance(point, (list, tuple)) or len(point) < 2:
+            raise GeometryError("Точка должна быть парой [долгота, широта].")
+        try:
+            lon, lat = float(point[0]), float(point[1])
+        except (TypeError, ValueError):
+            raise GeometryError("Координаты точки должны быть числами.")
+        if not (-180 <= lon <= 180 and -90 <= lat <= 90) or math.isnan(lon) or math.isnan(lat):
+            raise GeometryError("Координаты точки вне допустимого диапазона.")
+        points.append([lon, lat])
+    if points and points[0] != points[-1]:
+        points.append(list(points[0])) # Замыкаем кольцо
+    if len(points) < 4:
+        raise GeometryError("Кольцо полигона должно содержать не меньше трех различных точек.")
+    return points
+
+
+def normalize_geometry(value):
+    """
+    Проверенная геометрия GeoJSON (Polygon/MultiPolygon) с замкнутыми кольцами.
+    Принимает и Feature - из него берется geometry. Пустое значение -> None.
+    """
+    if value in (None, "", {}):
+        return None
+    if not isinstance(value, dict):
+        raise GeometryError("Граница должна быть объектом GeoJSON.")
+    if value.get("type") == "Feature":
+        return normalize_geometry(value.get("geometry"))
+    geometry_type = value.get("type")
+    if geometry_type not in GEOMETRY_TYPES:
+        raise GeometryError("Поддерживаются только геометрии Polygon и MultiPolygon.")
+    coordinates = value.get("coordinates")
+    polygons = [coordinates] if geometry_type == "Polygon" else coordinates
+    if not isinstance(polygons, list) or not polygons:
+        raise GeometryError("Пустые координаты геометрии.")
+    parsed = []
+    for polygon in polygons:
+        if not isinstance(polygon, list) or not polygon:
+            raise GeometryError("Полигон должен состоять из внешнего кольца и (необязательно) дыр.")
+        parsed.append([_parse_ring(ring) for ring in polygon])
+    if sum(len(ring) for polygon in parsed for ring in polygon) > MAX_VERTICES:
+        raise GeometryError(f"Слишком много вершин (больше {MAX_VERTICES}).")
+    if geometry_type == "Polygon":
+        return {"type": "Polygon", "coordinates": parsed[0]}
+    return {"type": "MultiPolygon", "coordinates": parsed}
+
+
+def iter_polygons(geometry):
+    """ Полигоны геометрии: списки колец (первое - внешнее). """
+    if geometry["type"] == "Polygon":
+        return [geometry["coordinates"]]
+    return geometry["coordinates"]
+
+
+def bounding_box(geometry):
+    """ (запад, юг, восток, север) по внешним кольцам. """
+    lons = [point[0] for polygon in iter_polygons(geometry) for point in polygon[0]]
+    lats = [point[1] for polygon in iter_polygons(geometry) for point in polygon[0]]
+    return min(lons), min(lats), max(lons), max(lats)
+
+
+# --- Упрощение (Дуглас-Пекер) ---
+
+def _segment_distances(points, start, end):
+    """ Расстояния точек points до отрезка start-end (плоская метрика в градусах). """
+    if np is not None:
+        points = np.asarray(points, dtype=np.float64)
+        start, end = np.asarray(start, dtype=np.float64), np.asarray(end, dtype=np.float64)
+        delta = end - start
+        length = float(delta @ delta)
+        if length == 0:
+            return np.hypot(*(points - start).T)
+        t = np.clip(((points - start) @ delta) / length, 0.0, 1.0)
+        projection = start + t[:, None] * delta
+        return np.hypot(*(points - projection).T)
+    dx, dy = end[0] - start[0], end[1] - start[1]
+    length = dx * dx + dy * dy
+    distances = []
+    for x, y in points:
+        t = 0.0 if length == 0 else max(0.0, min(1.0, ((x - start[0]) * dx + (y - start[1]) * dy) / length))
+        distances.append(math.hypot(x - start[0] - t * dx, y - start[1] - t * dy))
+    return distances
+
+
+def simplify_line(points, tolerance):
+    """ Дуглас-Пекер для ломаной (итеративно, без рекурсии). Концы сохраняются. """
+    if len(points) < 3:
+        return [list(point) for point in points]
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        distances = _segment_distances(points[first + 1:last], points[first], points[last])
+        if np is not None:
+            index = int(np.argmax(distances))
+            distance = float(distances[index])
+        else:
+            index = max(range(len(distances)), key=distances.__getitem__)
+            distance = distances[index]
+        if distance > tolerance:
+            split = first + 1 + index
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return [list(point) for point, kept in zip(points, keep) if kept]
+
+
+def simplify_ring(ring, tolerance):
+    """
+    Упрощение замкнутого кольца: оно делится в самой дальней от начала точке на две ломаные,
+    поэтому от кольца всегда остается не меньше трех различных точек.
+    """
+    points = ring[:-1]
+    if len(points) <= 3:
+        return [list(point) for point in ring]
+    far = max(range(len(points)), key=lambda index: math.hypot(points[index][0] - points[0][0], points[index][1] - points[0][1]))
+    if far == 0:
+        return [list(point) for point in ring]
+    first = simplify_line(points[:far + 1], tolerance)
+    second = simplify_line(points[far:] + [points[0]], tolerance)
+    simplified = first + second[1:]
+    if len(simplified) < 4:
+        # Обе половины схлопнулись в отрезок начало-дальняя точка: оставляем самую далекую от него точку
+        others = [index for index in range(1, len(points)) if index != far]
+        distances = _segment_distances([points[index] for index in others], points[0], points[far])
+        third = others[max(range(len(others)), key=distances.__getitem__)]
+        corners = sorted((0, far, third))
+        simplified = [list(points[index]) for index in corners] + [list(points[0])]
+    return simplified
+
+
+def simplify_geometry(geometry, tolerance):
+    """ Упрощенная копия геометрии; дыры, схлопнувшиеся до размера допуска, отбрасываются. """
+    polygons = []
+    for polygon in iter_polygons(geometry):
+        outer = simplify_ring(polygon[0], tolerance)
+        holes = []
+        for hole in polygon[1:]:
+            west, south, east, north = bounding_box({"type": "Polygon", "coordinates": [hole]})
+            if max(east - west, north - south) > tolerance:
+                holes.append(simplify_ring(hole, tolerance))
+        polygons.append([outer, *holes])
+    if geometry["type"] == "Polygon":
+        return {"type": "Polygon", "coordinates": polygons[0]}
+    return {"type": "MultiPolygon", "coordinates": polygons}
+
+
+def build_simplified(geometry):
+    """ {"масштаб": упрощенная геометрия} для SIMPLIFY_ZOOMS. """
+    return {str(zoom): simplify_geometry(geometry, zoom_tolerance(zoom)) for zoom in SIMPLIFY_ZOOMS}
+
+
+def pick_simplified(simplified, geometry, zoom=None):
+    """ Геометрия для масштаба: ближайшая упрощенная не грубее нужной, иначе исходная. """
+    if zoom is None:
+        return geometry
+    for level in SIMPLIFY_ZOOMS:
+        if zoom <= level and str(level) in (simplified or {}):
+            return simplified[str(level)]
+    return geometry
+
+
+# --- Точка в полигоне ---
+
+def _point_in_ring(lon, lat, ring):
+    """ Четно-нечетное правило (луч вдоль параллели). """
+    if np is not None:
+        coords = np.asarray(ring, dtype=np.float64)
+        x1, y1 = coords[:-1, 0], coords[:-1, 1]
+        x2, y2 = coords[1:, 0], coords[1:, 1]
+        crosses = (y1 > lat) != (y2 > lat)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_cross = x1 + (lat - y1) * (x2 - x1) / (y2 - y1)
+        return bool(np.count_nonzero(crosses & (lon < x_cross)) % 2)
+    inside = False
+    for (x1, y1), (x2, y2) in zip(ring, ring[1:]):
+        if (y1 > lat) != (y2 > lat) and lon < x1 + (lat - y1) * (x2 - x1) / (y2 - y1):
+            inside = not inside
+    return inside
+
+
+def contains_point(geometry, lon, lat):
+    """ Лежит ли точка внутри полигона (внутри внешнего кольца и вне дыр). """
+    for polygon in iter_polygons(geometry):
+        if _point_in_ring(lon, lat, polygon[0]) and not any(_point_in_ring(lon, lat, hole) for hole in polygon[1:]):
+            return True
+    return False
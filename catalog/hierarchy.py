@@ -0,0 +1,124 @@
+""" Поддержка closure-таблицы PropertyHierarchy и агрегатов поддерева GenericProperty. """
+from collections import defaultdict
+
+from django.db.models import Count, Max, Min, Q
+
+from .models import GenericProperty, PropertyHierarchy
+
+
+AGGREGATE_FIELDS = [
+    "children_count", "descendant_count",
+    "descendant_price_min", "descendant_price_max", "descendant_status_counts",
+]
+# Поля потомка, от которых зависят агрегаты предков
+TRACKED_FIELDS = ("parent_id", "price", "listing_status")
+
+
+class HierarchyCycleError(ValueError):
+    """ Объект переносится под самого себя или под своего потомка. """
+
+
+def check_parent(prop):
+    """ Проверка перед сохранением нового parent (проверки clean()/сериализатора можно обойти). """
+    if not prop.is_valid_parent(prop.parent):
+        raise HierarchyCycleError(f"GenericProperty #{prop.pk} cannot be moved under its own subtree")
+
+
+def get_ancestor_ids(property_id):
+    """ Все предки объекта (без него самого). """
+    return list(
+        PropertyHierarchy.objects.filter(descendant_id=property_id, depth__gt=0)
+        .values_list("ancestor_id", flat=True)
+    )
+
+
+def insert_node(prop):
+    """ Новая вершина: ссылка на себя + ссылки от всех предков родителя. """
+    links = [PropertyHierarchy(ancestor_id=prop.pk, descendant_id=prop.pk, depth=0)]
+    if prop.parent_id:
+        links.extend(
+            PropertyHierarchy(ancestor_id=ancestor_id, descendant_id=prop.pk, depth=depth + 1)
+            for ancestor_id, depth in PropertyHierarchy.objects.filter(descendant_id=prop.parent_id)
+            .values_list("ancestor_id", "depth")
+        )
+    PropertyHierarchy.objects.bulk_create(links, ignore_conflicts=True)
+
+
+def move_node(prop):
+    """ Переносит поддерево prop под его текущего родителя (после смены parent). """
+    subtree = list(
+        PropertyHierarchy.objects.filter(ancestor_id=prop.pk).values_list("descendant_id", "depth")
+    )
+    subtree_ids = [descendant_id for descendant_id, _ in subtree]
+    if prop.parent_id in subtree_ids:
+        raise HierarchyCycleError(f"GenericProperty #{prop.pk} cannot be moved under its own subtree")
+    # Отрываем поддерево от старых предков
+    PropertyHierarchy.objects.filter(descendant_id__in=subtree_ids).exclude(ancestor_id__in=subtree_ids).delete()
+    if not prop.parent_id:
+        return
+    ancestors = list(
+        PropertyHierarchy.objects.filter(descendant_id=prop.parent_id).values_list("ancestor_id", "depth")
+    )
+    PropertyHierarchy.objects.bulk_create([
+        PropertyHierarchy(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=ancestor_depth + depth + 1)
+        for ancestor_id, ancestor_depth in ancestors
+        for descendant_id, depth in subtree
+    ], ignore_conflicts=True)
+
+
+def refresh_aggregates(property_ids=None):
+    """
+    Пересчитывает агрегаты поддерева (два сгруппированных запроса по closure-таблице).
+    property_ids=None - пересчет для всех объектов.
+    """
+    links = PropertyHierarchy.objects.filter(depth__gt=0)
+    if property_ids is not None:
+        property_ids = set(property_ids)
+        if not property_ids:
+            return
+        links = links.filter(ancestor_id__in=property_ids)
+    else:
+        property_ids = set(GenericProperty.objects.values_list("pk", flat=True))
+
+    totals = {
+        row["ancestor_id"]: row
+        for row in links.values("ancestor_id").annotate(
+            children=Count("id", filter=Q(depth=1)),
+            total=Count("id"),
+            price_min=Min("descendant__price", filter=Q(descendant__listing_status="published")),
+            price_max=Max("descendant__price", filter=Q(descendant__listing_status="published")),
+        )
+    }
+    statuses = defaultdict(dict)
+    for row in links.values("ancestor_id", "descendant__listing_status").annotate(total=Count("id")):
+        statuses[row["ancestor_id"]][row["descendant__listing_status"]] = row["total"]
+
+    objects = []
+    for property_id in property_ids:
+        row = totals.get(property_id, {})
+        objects.append(GenericProperty(
+            pk=property_id,
+            children_count=row.get("children", 0),
+            descendant_count=row.get("total", 0),
+            descendant_price_min=row.get("price_min"),
+            descendant_price_max=row.get("price_max"),
+            descendant_status_counts=statuses.get(property_id, {}),
+        ))
+    GenericProperty.objects.bulk_update(objects, AGGREGATE_FIELDS, batch_size=500)
+
+
+def rebuild_hierarchy():
+    """ Полная пересборка closure-таблицы и агрегатов по полю parent. """
+    parents = dict(GenericProperty.objects.values_list("pk", "parent_id"))
+    links = []
+    for property_id in parents:
+        # Поднимаемся по цепочке родителей (с защитой от циклов)
+        current, depth, seen = property_id, 0, set()
+        while current is not None and current not in seen:
+            seen.add(current)
+            links.append(PropertyHierarchy(ancestor_id=current, descendant_id=property_id, depth=depth))
+            current, depth = parents.get(current), depth + 1
+    PropertyHierarchy.objects.all().delete()
+    PropertyHierarchy.objects.bulk_create(links, batch_size=1000)
+    refresh_aggregates()
+    return len(parents)
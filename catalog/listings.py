@@ -0,0 +1,132 @@
+""" Синхронизация денормализованной ленты CatalogListing с исходными объявлениями. """
+from decimal import Decimal, InvalidOperation
+
+from . import clusters, price_stats
+from .caching import bump_generation
+from .models import CatalogListing, GenericProperty, LandPlot
+
+
+def get_listing_kind(obj):
+    if isinstance(obj, LandPlot):
+        return CatalogListing.KIND_LAND_PLOT
+    if isinstance(obj, GenericProperty):
+        return CatalogListing.KIND_PROPERTY
+    return None
+
+
+def _property_area(prop):
+    value = (prop.attributes or {}).get("area_sqm") if isinstance(prop.attributes, dict) else None
+    try:
+        return Decimal(str(value)).quantize(Decimal("0.01")) if value is not None else None
+    except (InvalidOperation, ValueError):
+        return None
+
+
+def build_listing_values(obj):
+    """ Плоские поля карточки для LandPlot или GenericProperty. """
+    location = obj.location
+    values = {
+        "title": obj.title,
+        "slug": obj.slug,
+        "price": obj.price,
+        "location_id": location.pk,
+        "region": location.region,
+        "locality": location.locality,
+        "latitude": location.latitude,
+        "longitude": location.longitude,
+        "geohash": location.geohash,
+        "cover_url": obj.cover_image, # Поддерживается манифестом медиа (MediaManifestModel)
+        "listing_status": obj.listing_status,
+        "created_at": obj.created_at,
+        "updated_at": obj.updated_at,
+    }
+    if isinstance(obj, LandPlot):
+        values.update(property_type="", area=obj.area, price_per_are=obj.price_per_are)
+    else:
+        values.update(property_type=obj.property_type.slug, area=_property_area(obj), price_per_are=None)
+    return values
+
+
+# Поля карточки, от которых зависят кластеры карты и статистика цен
+TRACKED_FIELDS = tuple(dict.fromkeys(clusters.POINT_FIELDS + price_stats.STAT_FIELDS))
+
+
+def _tracked_values(kind, object_id):
+    return CatalogListing.objects.filter(kind=kind, object_id=object_id).values(*TRACKED_FIELDS).first()
+
+
+def sync_listing(obj):
+    kind = get_listing_kind(obj)
+    if kind is None or obj.pk is None:
+        return
+    old_values = _tracked_values(kind, obj.pk)
+    values = {**build_listing_values(obj), "kind": kind}
+    CatalogListing.objects.update_or_create(kind=kind, object_id=obj.pk, defaults=values)
+    clusters.apply_change(clusters.listing_point(old_values), clusters.listing_point(values))
+    price_stats.apply_changes([(old_values, values)])
+    bump_generation(CatalogListing)
+
+
+def delete_listing(obj):
+    kind = get_listing_kind(obj)
+    if kind is None:
+        return
+    old_values = _tracked_values(kind, obj.pk)
+    CatalogListing.objects.filter(kind=kind, object_id=obj.pk).delete()
+    clusters.apply_change(clusters.listing_point(old_values), None)
+    price_stats.apply_changes([(old_values, None)])
+    bump_generation(CatalogListing)
+
+
+def sync_location(location):
+    """ Переносит изменения местоположения во все карточки, которые на него ссылаются. """
+    listings = CatalogListing.objects.filter(location_id=location.pk)
+    old_values = {values["pk"]: values for values in listings.values("pk", *TRACKED_FIELDS)}
+    updated = listings.update(
+        region=location.region,
+        locality=location.locality,
+        latitude=location.latitude,
+        longitude=location.longitude,
+        geohash=location.geohash,
+    )
+    if updated:
+        changes = []
+        for values in listings.values("pk", *TRACKED_FIELDS):
+            old = old_values.get(values["pk"])
+            clusters.apply_change(clusters.listing_point(old), clusters.listing_point(values))
+            changes.append((old, values))
+        price_stats.apply_changes(changes)
+        bump_generation(CatalogListing)
+
+
+def sync_property_type(property_type):
+    listings = CatalogListing.objects.filter(
+        kind=CatalogListing.KIND_PROPERTY,
+        object_id__in=property_type.properties.values("pk"),
+    ).exclude(property_type=property_type.slug)
+    old_values = {values["pk"]: values for values in listings.values("pk", *price_stats.STAT_FIELDS)}
+    updated = listings.update(property_type=property_type.slug)
+    if updated:
+        price_stats.apply_changes(
+            (old, {**old, "property_type": property_type.slug}) for old in old_values.values()
+        )
+        bump_generation(CatalogListing)
+
+
+def rebuild_listings():
+    """ Полная пересборка ленты (для существующих данных и после ручных правок в БД). """
+    count = 0
+    querysets = (
+        (CatalogListing.KIND_LAND_PLOT, LandPlot.objects.select_related("location")),
+        (CatalogListing.KIND_PROPERTY, GenericProperty.objects.select_related("location", "property_type")),
+    )
+    for kind, queryset in querysets:
+        for obj in queryset.iterator():
+            CatalogListing.objects.update_or_create(kind=kind, object_id=obj.pk, defaults=build_listing_values(obj))
+            count += 1
+        # Удаляем карточки, исходные объявления которых исчезли мимо сигналов
+        CatalogListing.objects.filter(kind=kind).exclude(object_id__in=queryset.values("pk")).delete()
+    clusters.rebuild_map_cells()
+    price_stats.rebuild_price_statistics()
+    bump_generation(CatalogListing)
+    return count
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from catalog.models import GenericProperty, LandPlot, MediaManifestModel
+from news.models import NewsArticle
+
+
+class Command(BaseCommand):
+    help = 'Populates cover image, media count and media manifest for existing listings and news articles'
+
+    def handle(self, *args, **options):
+        for model in (LandPlot, GenericProperty, NewsArticle):
+            updated = 0
+            for obj in model.objects.prefetch_related('media_files').only('pk').iterator(chunk_size=500):
+                values = MediaManifestModel.build_media_values(obj.media_files.all())
+                model.objects.filter(pk=obj.pk).update(**values)
+                updated += 1
+            self.stdout.write(f'{model._meta.label}: {updated} objects updated.')
+        self.stdout.write(self.style.SUCCESS('Media manifests backfilled.'))
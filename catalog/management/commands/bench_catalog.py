@@ -0,0 +1,390 @@
+import json
+import random
+import time
+import tracemalloc
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from catalog import similar, slugs, trigram
+from catalog.caching import bump_generation, compress_response_content
+from catalog.filters import LandPlotFilter
+from catalog.models import Feature, LandPlot, LandUseType, Location
+from catalog.rows import as_rows
+from catalog.serializers import LandPlotSerializer
+from catalog.views import LandPlotViewSet
+from core import renderers
+
+try:
+    import numpy as np
+except ImportError: # numpy - необязательная зависимость (секция similar)
+    np = None
+
+LOCALITY_SYLLABLES = ['че', 'мал', 'бе', 'ло', 'ку', 'ри', 'ха', 'ай', 'ка', 'тунь', 'ту', 'рак', 'эли', 'ман', 'ар', 'ор', 'го', 'но', 'сть']
+REGIONS = ['Республика Алтай', 'Алтайский край', 'Новосибирская область', 'Кемеровская область']
+QUERIES = ['Чемал', 'чемальский', 'Чимал', 'Белокуриха', 'Билокуриха']
+RENDER_PAGE_SIZES = (20, 100, 500)
+
+
+def _timed(func, repeat=1):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - started) / repeat * 1000, result
+
+
+def _timed_requests(func, repeat=1):
+    """
+    _timed для HTTP-запросов тестового клиента с числом SQL-запросов на вызов. Запросы считаются
+    через execute_wrapper: CaptureQueriesContext сбивается, т.к. каждый запрос клиента очищает журнал.
+    """
+    executed = []
+
+    def count(execute, sql, params, many, context):
+        executed.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count):
+        elapsed_ms, result = _timed(func, repeat)
+    return elapsed_ms, result, len(executed) // repeat
+
+
+def _traced(func):
+    """ (пик, остаток после вызова) выделенной памяти в КиБ по tracemalloc и результат func. """
+    tracemalloc.start()
+    try:
+        result = func()
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1024, retained / 1024, result
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmarks for catalog search and listing internals (synthetic in-memory data)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--section', action='append', choices=sorted(self.sections()), help='Benchmark section to run (default: all)')
+        parser.add_argument('--sizes', default='1000,10000,50000', help='Comma-separated dataset sizes')
+        parser.add_argument('--seed', type=int, default=42)
+
+    @classmethod
+    def sections(cls):
+        return {
+            'trigram': cls.bench_trigram,
+            'm2m_filters': cls.bench_m2m_filters,
+            'response_cache': cls.bench_response_cache,
+            'json_renderer': cls.bench_json_renderer,
+            'compiled_serializers': cls.bench_compiled_serializers,
+            'row_objects': cls.bench_row_objects,
+            'similar': cls.bench_similar,
+            'slugs': cls.bench_slugs,
+        }
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        sections = self.sections()
+        for name in options['section'] or sorted(sections):
+            random.seed(options['seed'])
+            self.stdout.write(self.style.MIGRATE_HEADING(f'== {name} =='))
+            sections[name](self, sizes)
+
+    def bench_trigram(self, sizes):
+        """ Нечеткий поиск мест: триграммный индекс против полного перебора с тем же сходством. """
+        for size in sizes:
+            documents = [(1, 'Республика Алтай Чемал'), (2, 'Алтайский край Белокуриха')]
+            for doc_id in range(3, size + 1):
+                name = ''.join(random.choice(LOCALITY_SYLLABLES) for _ in range(random.randint(2, 4)))
+                documents.append((doc_id, f'{random.choice(REGIONS)} {name.capitalize()}'))
+
+            build_ms, index = _timed(lambda: trigram.TrigramIndex(documents))
+            indexed_ms = sum(_timed(lambda q=query: index.search(q), repeat=5)[0] for query in QUERIES) / len(QUERIES)
+            scan_ms = sum(
+                _timed(lambda q=query: [d for d, text in documents if trigram.similarity(q, text) >= trigram.DEFAULT_THRESHOLD])[0]
+                for query in QUERIES
+            ) / len(QUERIES)
+            found = {query: [doc_id for doc_id, _ in index.search(query)[:3]] for query in QUERIES}
+            self.stdout.write(
+                f'locations={size:>7}  build={build_ms:8.1f} ms  query(index)={indexed_ms:7.2f} ms  '
+                f'query(scan)={scan_ms:9.2f} ms  top={found}'
+            )
+
+    def bench_m2m_filters(self, sizes):
+        """
+        Фильтры по характеристикам: старый JOIN (features__id__in) против EXISTS (any) и HAVING COUNT (all).
+        Данные создаются в транзакции и откатываются; для каждого варианта - число строк, запросов и время
+        (count + первая страница).
+        """
+        for size in sizes:
+            with transaction.atomic():
+                features = self._seed_land_plots(size)
+                wanted = [feature.pk for feature in features[:3]]
+                queryset = LandPlot.objects.all()
+                variants = {
+                    'join(any)': lambda: queryset.filter(features__id__in=wanted),
+                    'exists(any)': lambda: LandPlotFilter({'features': ','.join(map(str, wanted))}, queryset).qs,
+                    'having(all)': lambda: LandPlotFilter(
+                        {'features': ','.join(map(str, wanted)), 'features_mode': 'all'}, queryset
+                    ).qs,
+                }
+                self.stdout.write(f'land plots={size:>7}  features={wanted}')
+                for name, build in variants.items():
+                    def run():
+                        filtered = build()
+                        return filtered.count(), list(filtered.values_list('pk', flat=True)[:20])
+                    with CaptureQueriesContext(connection) as queries:
+                        elapsed_ms, (count, page) = _timed(run, repeat=3)
+                    distinct = len(set(build().values_list('pk', flat=True)))
+                    self.stdout.write(
+                        f'  {name:<12} rows={count:>7}  distinct={distinct:>7}  page_duplicates={len(page) - len(set(page)):>2}  '
+                        f'queries={len(queries.captured_queries) // 3}  time={elapsed_ms:8.2f} ms'
+                    )
+                transaction.set_rollback(True)
+
+    def bench_response_cache(self, sizes):
+        """
+        Кэш ответов анонимным клиентам: первый запрос списка участков (промах - ORM и сериализаторы)
+        против повторного (попадание, в том числе готовый gzip-вариант против сжатия на каждый ответ)
+        и условного запроса с If-None-Match мимо кэша (304).
+        Данные создаются в транзакции и откатываются. Кэш ответов включается на время замера
+        (по умолчанию он выключен без общего бэкенда кэша).
+        """
+        with override_settings(CATALOG_RESPONSE_CACHE_TIMEOUT=300):
+            self._bench_response_cache(sizes)
+
+    def _bench_response_cache(self, sizes):
+        client = APIClient()
+        urls = ['/api/v1/catalog/land-plots/?ordering=-price', '/api/v1/catalog/land-plots/?features_mode=all&page=2']
+        for size in sizes:
+            with transaction.atomic():
+                self._seed_land_plots(size)
+                bump_generation(LandPlot) # bulk_create не отправляет сигналов
+                self.stdout.write(f'land plots={size:>7}')
+                for url in urls:
+                    miss_ms, response, miss_queries = _timed_requests(lambda: client.get(url))
+                    hit_ms, cached, hit_queries = _timed_requests(lambda: client.get(url), repeat=20)
+                    gzip_hit_ms, compressed = _timed(lambda: client.get(url, HTTP_ACCEPT_ENCODING='gzip'), repeat=20)
+                    compress_ms, _ = _timed(lambda: compress_response_content(cached.content), repeat=20)
+                    # Условный запрос без кэша ответов: валидаторы одним агрегатом, 304 без сериализации
+                    with override_settings(CATALOG_RESPONSE_CACHE_TIMEOUT=0):
+                        conditional_ms, not_modified, conditional_queries = _timed_requests(
+                            lambda: client.get(url, HTTP_IF_NONE_MATCH=response['ETag']), repeat=5,
+                        )
+                    self.stdout.write(
+                        f'  {url:<55} miss={miss_ms:8.2f} ms ({miss_queries} queries, {response.get("X-Cache")})  '
+                        f'hit={hit_ms:6.2f} ms ({hit_queries} queries, {cached.get("X-Cache")})  '
+                        f'304={conditional_ms:6.2f} ms ({conditional_queries} queries, {not_modified.status_code})  '
+                        f'gzip hit={gzip_hit_ms:6.2f} ms (compress pass {compress_ms:5.2f} ms)  '
+                        f'bytes={len(cached.content)} gzip={len(compressed.content)} ({compressed.get("Content-Encoding")})'
+                    )
+                transaction.set_rollback(True)
+            bump_generation(LandPlot)
+
+    def bench_json_renderer(self, sizes):
+        """
+        Рендеринг страниц LandPlotSerializer (RENDER_PAGE_SIZES участков с манифестом медиа и кириллицей):
+        стандартный JSONRenderer против FastJSONRenderer на каждом доступном бэкенде. Отдельно - строки values()
+        с Decimal/datetime, которые кодирует сам рендерер. sizes не используется.
+        """
+        request = Request(APIRequestFactory().get('/api/v1/catalog/land-plots/'))
+        backends = [renderers.BACKEND_JSON] + ([renderers.BACKEND_ORJSON] if renderers.orjson is not None else [])
+        with transaction.atomic():
+            plots = self._seed_rendered_land_plots(max(RENDER_PAGE_SIZES))
+            for page_size in RENDER_PAGE_SIZES:
+                payloads = {
+                    'serializer': LandPlotSerializer(plots[:page_size], many=True, context={'request': request}).data,
+                    'values()': list(plots.values('pk', 'title', 'price', 'area', 'created_at', 'updated_at')[:page_size]),
+                }
+                for name, data in payloads.items():
+                    stock_ms, expected = _timed(lambda: JSONRenderer().render(data), repeat=20)
+                    results = []
+                    for backend in backends:
+                        with override_settings(API_JSON_BACKEND=backend):
+                            elapsed_ms, content = _timed(lambda: renderers.FastJSONRenderer().render(data), repeat=20)
+                        same = json.loads(content) == json.loads(expected)
+                        results.append(f'{backend}={elapsed_ms:7.3f} ms (x{stock_ms / elapsed_ms:4.1f}, same={same})')
+                    self.stdout.write(
+                        f'page={page_size:>4}  {name:<10} bytes={len(expected):>8}  JSONRenderer={stock_ms:7.3f} ms  '
+                        + '  '.join(results)
+                    )
+            transaction.set_rollback(True)
+
+    def bench_compiled_serializers(self, sizes):
+        """
+        Сериализация страниц RENDER_PAGE_SIZES участков: поле-за-полем DRF против скомпилированной функции
+        строки (catalog.compiled), с запросом с координатами и без. Время - только to_representation,
+        объекты и связи загружены заранее. sizes не используется.
+        """
+        factory = APIRequestFactory()
+        with transaction.atomic():
+            plots = list(self._seed_rendered_land_plots(max(RENDER_PAGE_SIZES)))
+            for params in ({}, {'lat': '51.4', 'lon': '86.0'}):
+                request = Request(factory.get('/api/v1/catalog/land-plots/', params))
+                for page_size in RENDER_PAGE_SIZES:
+                    page = plots[:page_size]
+
+                    def serialize(compiled):
+                        with override_settings(CATALOG_COMPILED_SERIALIZERS=compiled):
+                            return LandPlotSerializer(page, many=True, context={'request': request}).data
+
+                    drf_ms, expected = _timed(lambda: serialize(False), repeat=10)
+                    compiled_ms, data = _timed(lambda: serialize(True), repeat=10)
+                    self.stdout.write(
+                        f'page={page_size:>4}  distance={"yes" if params else "no ":<3}  DRF={drf_ms:8.3f} ms  '
+                        f'compiled={compiled_ms:8.3f} ms (x{drf_ms / compiled_ms:4.1f}, same={data == expected})'
+                    )
+            transaction.set_rollback(True)
+
+    def bench_row_objects(self, sizes):
+        """
+        Экземпляры моделей (select_related/prefetch_related) против строк catalog.rows на queryset списка
+        участков: страница из 100 с сериализацией и загрузка всех опубликованных участков. Память -
+        tracemalloc (пик и остаток, пока результат жив), время - без трассировки.
+        """
+        request = Request(APIRequestFactory().get('/api/v1/catalog/land-plots/'))
+        for size in sizes:
+            with transaction.atomic():
+                self._seed_rendered_land_plots(size)
+                base = LandPlotViewSet.queryset.order_by('-created_at')
+                variants = {'models': base, 'rows': as_rows(base)}
+                for label, load in (
+                    ('page=100', lambda queryset: LandPlotSerializer(
+                        list(queryset[:100]), many=True, context={'request': request}).data),
+                    ('all rows', lambda queryset: list(queryset.all())),
+                ):
+                    results = {}
+                    for name, queryset in variants.items():
+                        elapsed_ms, _ = _timed(lambda: load(queryset), repeat=3)
+                        peak_kib, retained_kib, result = _traced(lambda: load(queryset))
+                        results[name] = (elapsed_ms, peak_kib, retained_kib, result)
+                    models, rows = results['models'], results['rows']
+                    same = models[3] == rows[3] if label.startswith('page') else len(models[3]) == len(rows[3])
+                    self.stdout.write(
+                        f'n={size:>6}  {label:<9} models={models[0]:9.1f} ms peak={models[1]:9.0f} KiB '
+                        f'kept={models[2]:9.0f} KiB  rows={rows[0]:9.1f} ms peak={rows[1]:9.0f} KiB '
+                        f'kept={rows[2]:9.0f} KiB  (time x{models[0] / rows[0]:3.1f}, peak x{models[1] / rows[1]:3.1f}, '
+                        f'same={same})'
+                    )
+                transaction.set_rollback(True)
+
+    def bench_similar(self, sizes):
+        """
+        Индекс похожих участков: полная сборка (признаки + TOP_K соседей), инкрементальное обновление
+        после изменения 1 и 1% участков против пересборки и поиск соседей. same - совпадение расстояний
+        до соседей с пересборкой при той же нормировке (при равных расстояниях порядок pk может отличаться
+        из-за округления float32).
+        """
+        if not similar.is_available():
+            self.stdout.write('numpy is not installed, skipping')
+            return
+        for size in sizes:
+            with transaction.atomic():
+                self._seed_land_plots(size)
+                index = similar.LandPlotSimilarityIndex()
+                batch_ms, batch = _timed(index.load_batch)
+                build_ms, state = _timed(lambda: index.build(batch))
+                lookup_ms, _ = _timed(lambda: state.neighbors[state.positions[int(state.pk[size // 2])], :similar.SIMILAR_LIMIT].tolist(), repeat=1000)
+                self.stdout.write(
+                    f'n={size:>6}  load={batch_ms:8.1f} ms  build={build_ms:9.1f} ms  lookup={lookup_ms * 1000:6.1f} us'
+                )
+                pks = state.pk.tolist()
+                for changed in (1, max(1, size // 100)):
+                    affected = set(random.sample(pks, changed))
+                    LandPlot.objects.filter(pk__in=affected).update(price=F('price') * 2)
+                    update_ms, state = _timed(lambda: index.update(state, affected, index.load_batch(affected)))
+                    expected = index.build(index.load_batch(), encoder=state.encoder)
+                    order, expected_order = np.argsort(state.pk), np.argsort(expected.pk)
+                    same = bool(np.allclose(state.distances[order], expected.distances[expected_order], atol=1e-4))
+                    self.stdout.write(
+                        f'n={size:>6}  changed={changed:>4}  incremental={update_ms:9.1f} ms  '
+                        f'(x{(batch_ms + build_ms) / update_ms:5.1f} vs rebuild, same={same})'
+                    )
+                transaction.set_rollback(True)
+
+    def bench_slugs(self, sizes):
+        """
+        Slug популярного заголовка, когда уже заняты base, base-1, ..., base-(size-1): старый цикл exists()
+        (запрос на суффикс) против allocate_slug (один запрос) и allocate_slugs для пачки из 1000 заголовков
+        (половина - тот же заголовок) против 1000 вызовов allocate_slug без сохранения.
+        """
+        title = 'Участок в Чемале'
+        titles = [title if index % 2 else f'Участок {index} в Чемале' for index in range(1000)]
+        for size in sizes:
+            with transaction.atomic():
+                location = Location.objects.create(region='Республика Алтай', locality='Чемал')
+                base = slugs.slugify(title)
+                LandPlot.objects.bulk_create([
+                    LandPlot(
+                        title=title, slug=f'{base}-{index}' if index else base, location=location,
+                        area=Decimal(10), price=Decimal(100000), listing_status='published',
+                    )
+                    for index in range(size)
+                ], batch_size=2000)
+
+                def exists_loop():
+                    slug, counter = base, 1
+                    while LandPlot.objects.filter(slug=slug).exists():
+                        slug = f'{base}-{counter}'
+                        counter += 1
+                    return slug
+
+                loop_ms, loop_slug = _timed(exists_loop)
+                single_ms, single_slug = _timed(lambda: slugs.allocate_slug(LandPlot, title), repeat=5)
+                batch_ms, batch = _timed(lambda: slugs.allocate_slugs(LandPlot, titles))
+                separate_ms, _ = _timed(lambda: [slugs.allocate_slug(LandPlot, value) for value in titles])
+                self.stdout.write(
+                    f'taken={size:>6}  exists-loop={loop_ms:9.1f} ms  allocate_slug={single_ms:7.2f} ms  '
+                    f'same={loop_slug == single_slug}  batch(1000)={batch_ms:8.1f} ms  '
+                    f'separate(1000)={separate_ms:9.1f} ms  unique={len(set(batch)) == len(batch)}'
+                )
+                transaction.set_rollback(True)
+
+    def _seed_rendered_land_plots(self, size):
+        """ _seed_land_plots с описанием и манифестом медиа из 6 файлов; queryset как в списке участков. """
+        manifest = [
+            {
+                'id': index, 'file_url': f'/media/landplots/bench/photo-{index}.jpg', 'type': 'image',
+                'type_display': 'Изображение', 'is_main': index == 0, 'order': index,
+                'description': 'Вид на реку Катунь', 'uploaded_at': '2024-05-01T10:00:00+03:00',
+            }
+            for index in range(6)
+        ]
+        self._seed_land_plots(size)
+        LandPlot.objects.update(
+            description='Ровный участок у реки, рядом лес, электричество по границе, круглогодичный подъезд.',
+            media_manifest=manifest, media_count=len(manifest),
+        )
+        return LandPlot.objects.select_related('location', 'land_category').prefetch_related(
+            'land_use_types', 'features',
+        ).order_by('pk')
+
+    def _seed_land_plots(self, size):
+        """ size участков с 0-5 характеристиками из 12 и 1-2 ВРИ из 4 (bulk_create, без сигналов). """
+        location = Location.objects.create(region='Республика Алтай', locality='Бенчмарк')
+        features = [Feature.objects.create(name=f'bench-feature-{index}', type='communication') for index in range(12)]
+        land_use_types = [LandUseType.objects.create(name=f'bench-lut-{index}') for index in range(4)]
+        plots = LandPlot.objects.bulk_create([
+            LandPlot(
+                title=f'bench-{index}', slug=f'bench-{index}', location=location,
+                area=Decimal(random.randint(5, 50)), price=Decimal(random.randint(1, 100) * 10000),
+                listing_status='published',
+            )
+            for index in range(size)
+        ], batch_size=2000)
+        feature_links = LandPlot.features.through
+        land_use_links = LandPlot.land_use_types.through
+        feature_links.objects.bulk_create([
+            feature_links(landplot_id=plot.pk, feature_id=feature.pk)
+            for plot in plots for feature in random.sample(features, random.randint(0, 5))
+        ], batch_size=5000)
+        land_use_links.objects.bulk_create([
+            land_use_links(landplot_id=plot.pk, landusetype_id=land_use_type.pk)
+            for plot in plots for land_use_type in random.sample(land_use_types, random.randint(1, 2))
+        ], batch_size=5000)
+        return features
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from catalog.listings import rebuild_listings
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the denormalized CatalogListing feed from land plots and properties'
+
+    def handle(self, *args, **options):
+        count = rebuild_listings()
+        self.stdout.write(self.style.SUCCESS(f'Catalog feed rebuilt: {count} listings.'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from catalog.caching import bump_generation
+from catalog.clusters import rebuild_map_cells
+from catalog.models import MapCell
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the map cluster aggregates (MapCell) from the CatalogListing feed'
+
+    def handle(self, *args, **options):
+        count = rebuild_map_cells()
+        bump_generation(MapCell)
+        self.stdout.write(self.style.SUCCESS(f'Map cells rebuilt: {count} cells.'))
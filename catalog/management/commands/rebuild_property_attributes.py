@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from catalog.attributes import rebuild_attribute_values
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the typed PropertyAttributeValue index from GenericProperty.attributes and type schemas'
+
+    def handle(self, *args, **options):
+        count = rebuild_attribute_values()
+        self.stdout.write(self.style.SUCCESS(f'Property attribute index rebuilt: {count} values.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from catalog.hierarchy import rebuild_hierarchy
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the GenericProperty closure table and subtree aggregates from parent links'
+
+    def handle(self, *args, **options):
+        count = rebuild_hierarchy()
+        self.stdout.write(self.style.SUCCESS(f'Property hierarchy rebuilt for {count} objects.'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from catalog import search
+from catalog.models import GenericProperty, LandPlot
+from news.models import NewsArticle
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the FTS5 full-text search index for land plots, properties and news articles'
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('The full-text search index requires SQLite with FTS5.')
+        count = search.rebuild_index([
+            (search.KIND_LAND_PLOT, LandPlot.objects.select_related('location')),
+            (search.KIND_PROPERTY, GenericProperty.objects.select_related('location', 'property_type')),
+            (search.KIND_NEWS, NewsArticle.objects.all()),
+        ])
+        self.stdout.write(self.style.SUCCESS(f'Search index rebuilt: {count} documents.'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from catalog.caching import bump_generation
+from catalog.models import PriceStatistic, StalePriceStatistic
+from catalog.price_stats import rebuild_price_statistics, refresh_stale_statistics
+
+
+class Command(BaseCommand):
+    help = (
+        'Recomputes the price statistics (PriceStatistic) slices marked stale by listing changes. '
+        'Run it periodically (e.g. from cron); --full rebuilds every slice from the CatalogListing feed'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild all slices instead of the stale ones')
+
+    def handle(self, *args, **options):
+        if options['full']:
+            StalePriceStatistic.objects.all().delete()
+            count = rebuild_price_statistics()
+            message = f'Price statistics rebuilt: {count} slices.'
+        else:
+            count = refresh_stale_statistics()
+            message = f'Price statistics refreshed: {count} stale slices.'
+        if count or options['full']:
+            bump_generation(PriceStatistic)
+        self.stdout.write(self.style.SUCCESS(message))
@@ -3,7 +3,6 @@ from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.contrib.contenttypes.models import ContentType
-from django.utils.text import slugify
 from faker import Faker
 import decimal
 import json # Добавим для работы с JSON schema
@@ -239,10 +238,7 @@ class Command(BaseCommand):
         for name, schema in types_data.items():
             prop_type, created = PropertyType.objects.get_or_create(
                 name=name,
-                defaults={
-                    'attribute_schema': schema,
-                    'slug': slugify(name) # Генерируем slug здесь
-                }
+                defaults={'attribute_schema': schema} # slug генерирует модель (транслитерация)
             )
             # Обновляем схему, если объект уже существовал, на всякий случай
             if not created and prop_type.attribute_schema != schema:
@@ -0,0 +1,111 @@
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.test import APIRequestFactory
+
+from catalog import columnar
+from catalog.attributes import NUMERIC_TYPES, get_attribute_types
+from catalog.models import Feature, GenericProperty, LandCategory, LandPlot, LandUseType, PropertyAttributeValue, PropertyType
+from catalog.views import GenericPropertyViewSet, LandPlotViewSet
+
+
+def _quantiles(values, count=3):
+    values = sorted(value for value in values if value is not None)
+    if not values:
+        return []
+    return [values[int(len(values) * (index + 1) / (count + 1))] for index in range(count)]
+
+
+class Command(BaseCommand):
+    help = 'Compares columnar engine results (ids and order) with the ORM path on generated filter combinations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, default=200, help='Random filter combinations per model')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if columnar.np is None:
+            raise CommandError('numpy is not installed; the columnar engine is unavailable.')
+        rng = random.Random(options['seed'])
+        factory = APIRequestFactory()
+        failures = 0
+        for viewset_class, candidates in (
+            (LandPlotViewSet, self.land_plot_params()),
+            (GenericPropertyViewSet, self.property_params()),
+        ):
+            ordering = [''] + [
+                f'{sign}{field}' for field in viewset_class.ordering_fields for sign in ('', '-')
+            ]
+            cases = [{}] + [dict([item]) for item in candidates]
+            for _ in range(options['samples']):
+                case = dict(rng.sample(candidates, k=min(len(candidates), rng.randint(1, 3))))
+                case['ordering'] = rng.choice(ordering)
+                cases.append(case)
+            checked = 0
+            for params in cases:
+                view = viewset_class(action_map={'get': 'list'}, format_kwarg=None, args=(), kwargs={})
+                view.request = request = view.initialize_request(factory.get('/', params))
+                engine = columnar.get_engine(viewset_class.queryset.model)
+                matched, engine_ids, orm_ids = engine.verify(view, request, view.filter_queryset(view.get_queryset()))
+                if matched is None:
+                    continue
+                checked += 1
+                if not matched:
+                    failures += 1
+                    self.stdout.write(self.style.ERROR(
+                        f'{viewset_class.__name__} {params}: engine={engine_ids[:10]} orm={orm_ids[:10]} '
+                        f'({len(engine_ids)} vs {len(orm_ids)})'
+                    ))
+            self.stdout.write(f'{viewset_class.__name__}: {checked} combinations checked')
+        if failures:
+            raise CommandError(f'{failures} combinations differ from the ORM path.')
+        self.stdout.write(self.style.SUCCESS('Columnar engine matches the ORM path.'))
+
+    def land_plot_params(self):
+        plots = LandPlot.objects.filter(listing_status='published')
+        params = []
+        for value in _quantiles(plots.values_list('price', flat=True)):
+            params += [('price_min', str(value)), ('price_max', str(value))]
+        for value in _quantiles(plots.values_list('area', flat=True)):
+            params += [('area_min', str(value)), ('area_max', str(value))]
+        params += [('plot_status', value) for value, _ in LandPlot.PLOT_STATUS_CHOICES]
+        params += [('land_type', value) for value, _ in LandPlot.LAND_TYPE_CHOICES]
+        params += [('land_category', str(pk)) for pk in LandCategory.objects.values_list('pk', flat=True)[:5]]
+        feature_ids = list(Feature.objects.values_list('pk', flat=True)[:6])
+        params += [('features', str(pk)) for pk in feature_ids]
+        params += [('features', ','.join(map(str, feature_ids[:2])))] if len(feature_ids) > 1 else []
+        land_use_type_ids = list(LandUseType.objects.values_list('pk', flat=True)[:4])
+        params += [('land_use_types', str(pk)) for pk in land_use_type_ids]
+        params += [('land_use_types', ','.join(map(str, land_use_type_ids[:2])))] if len(land_use_type_ids) > 1 else []
+        params += [('features_mode', mode) for mode in ('any', 'all')]
+        params += [('land_use_types_mode', mode) for mode in ('any', 'all')]
+        for region, locality in plots.values_list('location__region', 'location__locality').distinct()[:3]:
+            params += [
+                ('location_region', region[:4]), ('location_region', region[:4].lower()),
+                ('location_locality', locality), ('location_fuzzy', locality),
+            ]
+        params += [('title_fuzzy', title) for title in plots.values_list('title', flat=True)[:2]]
+        params += [('listing_status', value) for value, _ in LandPlot.LISTING_STATUS_CHOICES]
+        return params
+
+    def property_params(self):
+        properties = GenericProperty.objects.filter(listing_status='published')
+        params = []
+        for value in _quantiles(properties.values_list('price', flat=True)):
+            params += [('price_min', str(value)), ('price_max', str(value))]
+        params += [('property_type', slug) for slug in PropertyType.objects.values_list('slug', flat=True)[:3]]
+        for region, in properties.values_list('location__region').distinct()[:2]:
+            params.append(('location_region', region[:5]))
+        for key, attr_type in get_attribute_types().items():
+            values = PropertyAttributeValue.objects.filter(key=key)
+            if attr_type in NUMERIC_TYPES:
+                for value in _quantiles(values.values_list('num_value', flat=True), count=2):
+                    params += [(f'attr_{key}_min', str(value)), (f'attr_{key}_max', str(value))]
+            elif attr_type == 'boolean':
+                params += [(f'attr_{key}', 'true'), (f'attr_{key}', 'false')]
+            else:
+                options = list(values.exclude(str_value=None).values_list('str_value', flat=True).distinct()[:2])
+                if options:
+                    params += [(f'attr_{key}_in', ','.join(options)), (f'attr_{key}', options[0][:3])]
+            params.append(('ordering', f'-attr_{key}'))
+        return params
@@ -0,0 +1,146 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:48
+
+import catalog.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0005_remove_genericproperty_owner_remove_landplot_owner"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="mediafile",
+            name="file",
+            field=models.FileField(
+                upload_to=catalog.models.get_media_upload_path, verbose_name="Файл"
+            ),
+        ),
+        migrations.CreateModel(
+            name="CatalogListing",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("land_plot", "Земельный участок"),
+                            ("property", "Объект недвижимости"),
+                        ],
+                        max_length=20,
+                        verbose_name="Вид объявления",
+                    ),
+                ),
+                (
+                    "object_id",
+                    models.PositiveIntegerField(verbose_name="ID исходного объявления"),
+                ),
+                (
+                    "property_type",
+                    models.SlugField(
+                        blank=True, max_length=120, verbose_name="Slug типа объекта"
+                    ),
+                ),
+                ("title", models.CharField(max_length=200, verbose_name="Заголовок")),
+                ("slug", models.SlugField(max_length=220, verbose_name="Slug (ЧПУ)")),
+                (
+                    "price",
+                    models.DecimalField(
+                        decimal_places=2, max_digits=15, verbose_name="Цена (руб.)"
+                    ),
+                ),
+                (
+                    "area",
+                    models.DecimalField(
+                        blank=True,
+                        decimal_places=2,
+                        max_digits=12,
+                        null=True,
+                        verbose_name="Площадь",
+                    ),
+                ),
+                (
+                    "location_id",
+                    models.PositiveIntegerField(
+                        db_index=True, verbose_name="ID местоположения"
+                    ),
+                ),
+                ("region", models.CharField(max_length=100, verbose_name="Регион")),
+                (
+                    "locality",
+                    models.CharField(max_length=100, verbose_name="Населенный пункт"),
+                ),
+                (
+                    "latitude",
+                    models.DecimalField(
+                        blank=True,
+                        decimal_places=6,
+                        max_digits=9,
+                        null=True,
+                        verbose_name="Широта",
+                    ),
+                ),
+                (
+                    "longitude",
+                    models.DecimalField(
+                        blank=True,
+                        decimal_places=6,
+                        max_digits=9,
+                        null=True,
+                        verbose_name="Долгота",
+                    ),
+                ),
+                (
+                    "cover_url",
+                    models.CharField(
+                        blank=True, max_length=500, verbose_name="Обложка (URL)"
+                    ),
+                ),
+                (
+                    "listing_status",
+                    models.CharField(max_length=10, verbose_name="Статус объявления"),
+                ),
+                ("created_at", models.DateTimeField(verbose_name="Дата создания")),
+                ("updated_at", models.DateTimeField(verbose_name="Дата обновления")),
+            ],
+            options={
+                "verbose_name": "Карточка каталога",
+                "verbose_name_plural": "Карточки каталога",
+                "ordering": ["-created_at", "-id"],
+                "indexes": [
+                    models.Index(
+                        fields=["listing_status", "-created_at"],
+                        name="catalog_listing_feed_idx",
+                    ),
+                    models.Index(
+                        fields=["listing_status", "price"],
+                        name="catalog_listing_price_idx",
+                    ),
+                    models.Index(
+                        fields=["listing_status", "area"],
+                        name="catalog_listing_area_idx",
+                    ),
+                    models.Index(
+                        fields=["kind", "listing_status", "-created_at"],
+                        name="catalog_listing_kind_idx",
+                    ),
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("kind", "object_id"),
+                        name="catalog_listing_unique_source",
+                    )
+                ],
+            },
+        ),
+    ]
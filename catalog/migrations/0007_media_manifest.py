@@ -0,0 +1,89 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0006_cataloglisting"),
+        ("contenttypes", "0002_remove_content_type_name"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="genericproperty",
+            name="cover_image",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                max_length=500,
+                verbose_name="Обложка (URL файла)",
+            ),
+        ),
+        migrations.AddField(
+            model_name="genericproperty",
+            name="media_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Количество медиафайлов"
+            ),
+        ),
+        migrations.AddField(
+            model_name="genericproperty",
+            name="media_manifest",
+            field=models.JSONField(
+                blank=True,
+                default=list,
+                editable=False,
+                verbose_name="Манифест медиафайлов",
+            ),
+        ),
+        migrations.AddField(
+            model_name="genericproperty",
+            name="media_version",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Версия медиа"
+            ),
+        ),
+        migrations.AddField(
+            model_name="landplot",
+            name="cover_image",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                max_length=500,
+                verbose_name="Обложка (URL файла)",
+            ),
+        ),
+        migrations.AddField(
+            model_name="landplot",
+            name="media_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Количество медиафайлов"
+            ),
+        ),
+        migrations.AddField(
+            model_name="landplot",
+            name="media_manifest",
+            field=models.JSONField(
+                blank=True,
+                default=list,
+                editable=False,
+                verbose_name="Манифест медиафайлов",
+            ),
+        ),
+        migrations.AddField(
+            model_name="landplot",
+            name="media_version",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Версия медиа"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="mediafile",
+            index=models.Index(
+                fields=["content_type", "object_id", "order"],
+                name="catalog_media_owner_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,111 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0007_media_manifest"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="genericproperty",
+            name="children_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Дочерних объектов"
+            ),
+        ),
+        migrations.AddField(
+            model_name="genericproperty",
+            name="descendant_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Объектов в поддереве"
+            ),
+        ),
+        migrations.AddField(
+            model_name="genericproperty",
+            name="descendant_price_max",
+            field=models.DecimalField(
+                blank=True,
+                decimal_places=2,
+                editable=False,
+                max_digits=15,
+                null=True,
+                verbose_name="Макс. цена в поддереве (опубликованные)",
+            ),
+        ),
+        migrations.AddField(
+            model_name="genericproperty",
+            name="descendant_price_min",
+            field=models.DecimalField(
+                blank=True,
+                decimal_places=2,
+                editable=False,
+                max_digits=15,
+                null=True,
+                verbose_name="Мин. цена в поддереве (опубликованные)",
+            ),
+        ),
+        migrations.AddField(
+            model_name="genericproperty",
+            name="descendant_status_counts",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                editable=False,
+                verbose_name="Объекты поддерева по статусам",
+            ),
+        ),
+        migrations.CreateModel(
+            name="PropertyHierarchy",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("depth", models.PositiveIntegerField(verbose_name="Глубина")),
+                (
+                    "ancestor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="descendant_links",
+                        to="catalog.genericproperty",
+                        verbose_name="Предок",
+                    ),
+                ),
+                (
+                    "descendant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ancestor_links",
+                        to="catalog.genericproperty",
+                        verbose_name="Потомок",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Связь иерархии объектов",
+                "verbose_name_plural": "Связи иерархии объектов",
+                "indexes": [
+                    models.Index(
+                        fields=["ancestor", "depth"],
+                        name="catalog_hierarchy_subtree_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("ancestor", "descendant"),
+                        name="catalog_hierarchy_unique_pair",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,68 @@
+from django.db import migrations
+
+# Схема и заполнение индекса зафиксированы здесь, а не берутся из catalog.search:
+# миграция не должна меняться вместе с кодом поиска
+SEARCH_TABLE = "catalog_search_index"
+CREATE_TABLE_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+    "kind UNINDEXED, object_id UNINDEXED, title, body, location, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4')"
+)
+DROP_TABLE_SQL = f"DROP TABLE IF EXISTS {SEARCH_TABLE}"
+# rowid документа: id * 8 + код вида (1 - участок, 2 - объект, 3 - новость)
+INSERT_SQL = f"INSERT INTO {SEARCH_TABLE} (rowid, kind, object_id, title, body, location) "
+
+
+def _location_text(location):
+    return (
+        f"TRIM(COALESCE({location}.region, '') || ' ' || COALESCE({location}.locality, '') "
+        f"|| ' ' || COALESCE({location}.address_line, ''))"
+    )
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    qn = schema_editor.quote_name
+    land_plot = qn(apps.get_model("catalog", "LandPlot")._meta.db_table)
+    prop = qn(apps.get_model("catalog", "GenericProperty")._meta.db_table)
+    property_type = qn(apps.get_model("catalog", "PropertyType")._meta.db_table)
+    location = qn(apps.get_model("catalog", "Location")._meta.db_table)
+    news = qn(apps.get_model("news", "NewsArticle")._meta.db_table)
+
+    schema_editor.execute(DROP_TABLE_SQL)
+    schema_editor.execute(CREATE_TABLE_SQL)
+    # Индекс сразу заполняется существующими объявлениями и новостями
+    schema_editor.execute(
+        f"{INSERT_SQL}SELECT p.id * 8 + 1, 'land_plot', p.id, p.title, "
+        f"TRIM(COALESCE(p.description, '') || ' ' || COALESCE(p.cadastral_numbers, '')), {_location_text('l')} "
+        f"FROM {land_plot} p JOIN {location} l ON l.id = p.location_id"
+    )
+    # Строковые значения атрибутов тоже ищутся (материал, отделка и т.п.)
+    schema_editor.execute(
+        f"{INSERT_SQL}SELECT p.id * 8 + 2, 'property', p.id, p.title, "
+        f"TRIM(COALESCE(p.description, '') || ' ' || t.name || ' ' || COALESCE(("
+        f"SELECT group_concat(a.value, ' ') FROM json_each(CASE WHEN json_type(p.attributes) = 'object' "
+        f"THEN p.attributes ELSE '{{}}' END) a WHERE a.type = 'text'), '')), {_location_text('l')} "
+        f"FROM {prop} p JOIN {location} l ON l.id = p.location_id JOIN {property_type} t ON t.id = p.property_type_id"
+    )
+    schema_editor.execute(f"{INSERT_SQL}SELECT n.id * 8 + 3, 'news', n.id, n.title, n.content, '' FROM {news} n")
+    schema_editor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')")
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(DROP_TABLE_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0008_property_hierarchy"),
+        ("news", "0004_newsarticle_media_manifest"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
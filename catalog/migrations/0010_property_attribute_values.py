@@ -0,0 +1,79 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0009_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PropertyAttributeValue",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=100, verbose_name="Атрибут")),
+                (
+                    "num_value",
+                    models.FloatField(
+                        blank=True, null=True, verbose_name="Числовое значение"
+                    ),
+                ),
+                (
+                    "str_value",
+                    models.CharField(
+                        blank=True,
+                        max_length=255,
+                        null=True,
+                        verbose_name="Строковое значение",
+                    ),
+                ),
+                (
+                    "bool_value",
+                    models.BooleanField(
+                        blank=True, null=True, verbose_name="Логическое значение"
+                    ),
+                ),
+                (
+                    "property",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="attribute_values",
+                        to="catalog.genericproperty",
+                        verbose_name="Объект",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Значение атрибута объекта",
+                "verbose_name_plural": "Значения атрибутов объектов",
+                "indexes": [
+                    models.Index(
+                        fields=["key", "num_value"], name="catalog_attr_num_idx"
+                    ),
+                    models.Index(
+                        fields=["key", "str_value"], name="catalog_attr_str_idx"
+                    ),
+                    models.Index(
+                        fields=["key", "bool_value"], name="catalog_attr_bool_idx"
+                    ),
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("property", "key"), name="catalog_attr_unique_key"
+                    )
+                ],
+            },
+        ),
+    ]
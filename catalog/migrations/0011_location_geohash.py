@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:10
+
+from django.db import migrations, models
+
+from catalog.geo import encode_geohash
+
+
+def fill_geohash(apps, schema_editor):
+    Location = apps.get_model("catalog", "Location")
+    locations = list(Location.objects.exclude(latitude=None).exclude(longitude=None))
+    for location in locations:
+        location.geohash = encode_geohash(location.latitude, location.longitude)
+    Location.objects.bulk_update(locations, ["geohash"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0010_property_attribute_values"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="location",
+            name="geohash",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                editable=False,
+                max_length=12,
+                verbose_name="Geohash",
+            ),
+        ),
+        migrations.RunPython(fill_geohash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:13
+
+from django.db import migrations, models
+
+from catalog.clusters import rebuild_map_cells
+
+
+def fill_map_cells(apps, schema_editor):
+    CatalogListing = apps.get_model("catalog", "CatalogListing")
+    Location = apps.get_model("catalog", "Location")
+    geohashes = dict(Location.objects.exclude(geohash="").values_list("pk", "geohash"))
+    listings = list(CatalogListing.objects.filter(location_id__in=list(geohashes)))
+    for listing in listings:
+        listing.geohash = geohashes[listing.location_id]
+    CatalogListing.objects.bulk_update(listings, ["geohash"], batch_size=500)
+    rebuild_map_cells(CatalogListing, apps.get_model("catalog", "MapCell"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0011_location_geohash"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MapCell",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "precision",
+                    models.PositiveSmallIntegerField(verbose_name="Точность geohash"),
+                ),
+                (
+                    "cell",
+                    models.CharField(max_length=12, verbose_name="Ячейка geohash"),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("land_plot", "Земельный участок"),
+                            ("property", "Объект недвижимости"),
+                        ],
+                        max_length=20,
+                        verbose_name="Вид объявления",
+                    ),
+                ),
+                (
+                    "count",
+                    models.PositiveIntegerField(default=0, verbose_name="Количество"),
+                ),
+                (
+                    "latitude_sum",
+                    models.FloatField(default=0, verbose_name="Сумма широт"),
+                ),
+                (
+                    "longitude_sum",
+                    models.FloatField(default=0, verbose_name="Сумма долгот"),
+                ),
+                (
+                    "price_min",
+                    models.DecimalField(
+                        blank=True,
+                        decimal_places=2,
+                        max_digits=15,
+                        null=True,
+                        verbose_name="Минимальная цена",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Ячейка карты",
+                "verbose_name_plural": "Ячейки карты",
+            },
+        ),
+        migrations.AddField(
+            model_name="cataloglisting",
+            name="geohash",
+            field=models.CharField(blank=True, max_length=12, verbose_name="Geohash"),
+        ),
+        migrations.AddIndex(
+            model_name="cataloglisting",
+            index=models.Index(
+                fields=["listing_status", "geohash"], name="catalog_listing_geohash_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="mapcell",
+            constraint=models.UniqueConstraint(
+                fields=("precision", "cell", "kind"), name="catalog_mapcell_unique_cell"
+            ),
+        ),
+        migrations.RunPython(fill_map_cells, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0012_map_cells"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="landplot",
+            name="boundary",
+            field=models.JSONField(
+                blank=True, null=True, verbose_name="Граница участка (GeoJSON)"
+            ),
+        ),
+        migrations.AddField(
+            model_name="landplot",
+            name="boundary_max_lat",
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="landplot",
+            name="boundary_max_lon",
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="landplot",
+            name="boundary_min_lat",
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="landplot",
+            name="boundary_min_lon",
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="landplot",
+            name="boundary_simplified",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                editable=False,
+                verbose_name="Упрощенные границы по масштабам",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="landplot",
+            index=models.Index(
+                fields=["boundary_min_lat", "boundary_min_lon"],
+                name="catalog_plot_boundary_idx",
+            ),
+        ),
+    ]
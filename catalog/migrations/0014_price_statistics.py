@@ -0,0 +1,198 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:47
+
+from django.db import migrations, models
+
+from catalog.price_stats import rebuild_price_statistics
+
+
+def fill_price_statistics(apps, schema_editor):
+    CatalogListing = apps.get_model("catalog", "CatalogListing")
+    LandPlot = apps.get_model("catalog", "LandPlot")
+    prices_per_are = dict(
+        LandPlot.objects.exclude(price_per_are=None).values_list("pk", "price_per_are")
+    )
+    listings = list(
+        CatalogListing.objects.filter(
+            kind="land_plot", object_id__in=list(prices_per_are)
+        )
+    )
+    for listing in listings:
+        listing.price_per_are = prices_per_are[listing.object_id]
+    CatalogListing.objects.bulk_update(listings, ["price_per_are"], batch_size=500)
+    rebuild_price_statistics(
+        CatalogListing, apps.get_model("catalog", "PriceStatistic")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0013_land_plot_boundary"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cataloglisting",
+            name="price_per_are",
+            field=models.DecimalField(
+                blank=True,
+                decimal_places=2,
+                max_digits=12,
+                null=True,
+                verbose_name="Цена за сотку",
+            ),
+        ),
+        migrations.CreateModel(
+            name="PriceStatistic",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("land_plot", "Земельный участок"),
+                            ("property", "Объект недвижимости"),
+                        ],
+                        max_length=20,
+                        verbose_name="Вид объявления",
+                    ),
+                ),
+                (
+                    "region",
+                    models.CharField(blank=True, max_length=100, verbose_name="Регион"),
+                ),
+                (
+                    "locality",
+                    models.CharField(
+                        blank=True, max_length=100, verbose_name="Населенный пункт"
+                    ),
+                ),
+                (
+                    "property_type",
+                    models.SlugField(
+                        blank=True, max_length=120, verbose_name="Slug типа объекта"
+                    ),
+                ),
+                (
+                    "count",
+                    models.PositiveIntegerField(default=0, verbose_name="Количество"),
+                ),
+                (
+                    "price_min",
+                    models.DecimalField(
+                        decimal_places=2, max_digits=15, verbose_name="Минимальная цена"
+                    ),
+                ),
+                (
+                    "price_p25",
+                    models.DecimalField(
+                        decimal_places=2,
+                        max_digits=15,
+                        verbose_name="Цена, 25-й перцентиль",
+                    ),
+                ),
+                (
+                    "price_median",
+                    models.DecimalField(
+                        decimal_places=2, max_digits=15, verbose_name="Медианная цена"
+                    ),
+                ),
+                (
+                    "price_p75",
+                    models.DecimalField(
+                        decimal_places=2,
+                        max_digits=15,
+                        verbose_name="Цена, 75-й перцентиль",
+                    ),
+                ),
+                (
+                    "price_max",
+                    models.DecimalField(
+                        decimal_places=2,
+                        max_digits=15,
+                        verbose_name="Максимальная цена",
+                    ),
+                ),
+                (
+                    "price_per_are_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Количество с ценой за сотку"
+                    ),
+                ),
+                (
+                    "price_per_are_min",
+                    models.DecimalField(
+                        blank=True,
+                        decimal_places=2,
+                        max_digits=12,
+                        null=True,
+                        verbose_name="Минимальная цена за сотку",
+                    ),
+                ),
+                (
+                    "price_per_are_p25",
+                    models.DecimalField(
+                        blank=True,
+                        decimal_places=2,
+                        max_digits=12,
+                        null=True,
+                        verbose_name="Цена за сотку, 25-й перцентиль",
+                    ),
+                ),
+                (
+                    "price_per_are_median",
+                    models.DecimalField(
+                        blank=True,
+                        decimal_places=2,
+                        max_digits=12,
+                        null=True,
+                        verbose_name="Медианная цена за сотку",
+                    ),
+                ),
+                (
+                    "price_per_are_p75",
+                    models.DecimalField(
+                        blank=True,
+                        decimal_places=2,
+                        max_digits=12,
+                        null=True,
+                        verbose_name="Цена за сотку, 75-й перцентиль",
+                    ),
+                ),
+                (
+                    "price_per_are_max",
+                    models.DecimalField(
+                        blank=True,
+                        decimal_places=2,
+                        max_digits=12,
+                        null=True,
+                        verbose_name="Максимальная цена за сотку",
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Дата обновления"),
+                ),
+            ],
+            options={
+                "verbose_name": "Статистика цен",
+                "verbose_name_plural": "Статистика цен",
+                "ordering": ["kind", "region", "locality", "property_type"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("kind", "region", "locality", "property_type"),
+                        name="catalog_pricestatistic_unique_slice",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(fill_price_statistics, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0014_price_statistics"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CacheGeneration",
+            fields=[
+                (
+                    "key",
+                    models.CharField(
+                        max_length=100,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="Модель (app_label.model)",
+                    ),
+                ),
+                (
+                    "generation",
+                    models.PositiveBigIntegerField(default=0, verbose_name="Поколение"),
+                ),
+            ],
+            options={
+                "verbose_name": "Поколение кэша",
+                "verbose_name_plural": "Поколения кэша",
+            },
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0015_cache_generations"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StalePriceStatistic",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("land_plot", "Земельный участок"),
+                            ("property", "Объект недвижимости"),
+                        ],
+                        max_length=20,
+                        verbose_name="Вид объявления",
+                    ),
+                ),
+                (
+                    "region",
+                    models.CharField(blank=True, max_length=100, verbose_name="Регион"),
+                ),
+                (
+                    "locality",
+                    models.CharField(
+                        blank=True, max_length=100, verbose_name="Населенный пункт"
+                    ),
+                ),
+                (
+                    "property_type",
+                    models.SlugField(
+                        blank=True, max_length=120, verbose_name="Slug типа объекта"
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Дата изменения"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Устаревший срез статистики цен",
+                "verbose_name_plural": "Устаревшие срезы статистики цен",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("kind", "region", "locality", "property_type"),
+                        name="catalog_stalepricestatistic_unique_slice",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -1,11 +1,16 @@
+from django.core.exceptions import ValidationError
 from django.db import models
-from django.utils.text import slugify
+from django.db.models import F
+from django.utils import timezone
 from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
 from django.contrib.contenttypes.models import ContentType
 from django.conf import settings
-import random
 import os # Импортируем os для работы с путями
 
+from . import geometry
+from .geo import encode_geohash
+from .slugs import UniqueSlugMixin
+
 # --- Вспомогательные модели ---
 
 class Location(models.Model):
@@ -14,11 +19,25 @@ class Location(models.Model):
     address_line = models.CharField(max_length=255, blank=True, verbose_name='Улица, дом и т.д.')
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, verbose_name='Широта')
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, verbose_name='Долгота')
+    # Geohash координат для поиска по области/радиусу диапазонами индекса (catalog.geo); пустой - нет координат
+    geohash = models.CharField(max_length=12, blank=True, editable=False, db_index=True, verbose_name='Geohash')
 
     class Meta:
         verbose_name = 'Местоположение'
         verbose_name_plural = 'Местоположения'
 
+    def save(self, *args, **kwargs):
+        self.geohash = self.compute_geohash()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'geohash'}
+        super().save(*args, **kwargs)
+
+    def compute_geohash(self):
+        if self.latitude is None or self.longitude is None:
+            return ''
+        return encode_geohash(self.latitude, self.longitude)
+
     def __str__(self):
         return f"{self.region}, {self.locality}, {self.address_line}"
 
@@ -115,13 +134,69 @@ class MediaFile(models.Model):
         verbose_name = 'Медиафайл'
         verbose_name_plural = 'Медиафайлы'
         ordering = ['order', 'uploaded_at']
+        indexes = [
+            # Выборка медиа объекта через GenericRelation идет по этой паре
+            models.Index(fields=['content_type', 'object_id', 'order'], name='catalog_media_owner_idx'),
+        ]
 
     def __str__(self):
         return f"{self.get_type_display()} для {self.content_object} (ID: {self.id})"
 
+    def to_manifest_entry(self):
+        """ Запись манифеста в формате ответа MediaFileSerializer (URL относительный). """
+        uploaded_at = None
+        if self.uploaded_at:
+            uploaded_at = timezone.localtime(self.uploaded_at).isoformat()
+            if uploaded_at.endswith('+00:00'):
+                uploaded_at = uploaded_at[:-6] + 'Z'
+        return {
+            'id': self.id,
+            'file_url': self.file.url if self.file else None,
+            'type': self.type,
+            'type_display': self.get_type_display(),
+            'is_main': self.is_main,
+            'order': self.order,
+            'description': self.description,
+            'uploaded_at': uploaded_at,
+        }
+
+class MediaManifestModel(models.Model):
+    """
+    Абстрактная модель с денормализованными медиаданными объекта:
+    обложка, количество файлов и упорядоченный манифест.
+    Поддерживается сигналами MediaFile, поэтому списки не делают запросов к MediaFile.
+    """
+    cover_image = models.CharField(max_length=500, blank=True, editable=False, verbose_name='Обложка (URL файла)')
+    media_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество медиафайлов')
+    media_manifest = models.JSONField(default=list, blank=True, editable=False, verbose_name='Манифест медиафайлов')
+    media_version = models.PositiveIntegerField(default=0, editable=False, verbose_name='Версия медиа')
+
+    class Meta:
+        abstract = True
+
+    @staticmethod
+    def build_media_values(media_files):
+        """ Поля манифеста по списку MediaFile (в порядке сортировки MediaFile). """
+        manifest = [media.to_manifest_entry() for media in media_files]
+        images = [entry for entry in manifest if entry['type'] == 'image' and entry['file_url']]
+        cover = next((entry for entry in images if entry['is_main']), images[0] if images else None)
+        return {
+            'cover_image': cover['file_url'] if cover else '',
+            'media_count': len(manifest),
+            'media_manifest': manifest,
+        }
+
+    def refresh_media_manifest(self):
+        """ Пересчитывает манифест из MediaFile (без изменения updated_at и без сигналов save). """
+        values = self.build_media_values(self.media_files.all())
+        type(self).objects.filter(pk=self.pk).update(media_version=F('media_version') + 1, **values)
+        for field, value in values.items():
+            setattr(self, field, value)
+        self.refresh_from_db(fields=['media_version'])
+
 # --- Основные модели объявлений ---
 
-class LandPlot(models.Model):
+class LandPlot(UniqueSlugMixin, MediaManifestModel):
     LAND_TYPE_CHOICES = (
         ('standard', 'Стандартный участок'),
         ('new_territory', 'Новообразованная территория'),
@@ -153,25 +228,30 @@ class LandPlot(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True, db_index=True)
     view_count = models.PositiveIntegerField(default=0, verbose_name='Счетчик просмотров')
+    # Граница по кадастру: GeoJSON Polygon/MultiPolygon (catalog.geometry). Упрощенные версии для масштабов
+    # карты и рамка пересчитываются при сохранении; рамка нужна для отбора кандидатов в /land-plots/locate/
+    boundary = models.JSONField(null=True, blank=True, verbose_name='Граница участка (GeoJSON)')
+    boundary_simplified = models.JSONField(default=dict, blank=True, editable=False, verbose_name='Упрощенные границы по масштабам')
+    boundary_min_lon = models.FloatField(null=True, blank=True, editable=False)
+    boundary_min_lat = models.FloatField(null=True, blank=True, editable=False)
+    boundary_max_lon = models.FloatField(null=True, blank=True, editable=False)
+    boundary_max_lat = models.FloatField(null=True, blank=True, editable=False)
 
     media_files = GenericRelation(MediaFile) # Связь с медиафайлами
 
+    BOUNDARY_DERIVED_FIELDS = (
+        'boundary_simplified', 'boundary_min_lon', 'boundary_min_lat', 'boundary_max_lon', 'boundary_max_lat',
+    )
+
     class Meta:
         verbose_name = 'Земельный участок'
         verbose_name_plural = 'Земельные участки'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['boundary_min_lat', 'boundary_min_lon'], name='catalog_plot_boundary_idx'),
+        ]
 
     def save(self, *args, **kwargs):
-        if not self.slug:
-            # Улучшенная генерация slug с проверкой уникальности
-            base_slug = slugify(self.title) or f"landplot-{random.randint(1000, 9999)}"
-            slug = base_slug
-            counter = 1
-            while LandPlot.objects.filter(slug=slug).exclude(pk=self.pk).exists():
-                slug = f"{base_slug}-{counter}"
-                counter += 1
-            self.slug = slug
-
         # Рассчитываем цену за сотку, если не указана
         if self.price and self.area and not self.price_per_are:
             try:
@@ -183,14 +263,31 @@ class LandPlot(models.Model):
                  self.price = round(self.price_per_are * self.area, 2)
              except:
                  pass
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'boundary' in update_fields:
+            self.refresh_boundary_geometry()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, *self.BOUNDARY_DERIVED_FIELDS}
         super().save(*args, **kwargs)
 
+    def refresh_boundary_geometry(self):
+        """ Нормализует границу и пересчитывает ее упрощенные версии и рамку. """
+        self.boundary = geometry.normalize_geometry(self.boundary)
+        if self.boundary is None:
+            self.boundary_simplified = {}
+            self.boundary_min_lon = self.boundary_min_lat = self.boundary_max_lon = self.boundary_max_lat = None
+            return
+        self.boundary_simplified = geometry.build_simplified(self.boundary)
+        (self.boundary_min_lon, self.boundary_min_lat,
+         self.boundary_max_lon, self.boundary_max_lat) = geometry.bounding_box(self.boundary)
+
     def __str__(self):
         return self.title
 
 # --- Новые модели для динамических типов недвижимости ---
 
-class PropertyType(models.Model):
+class PropertyType(UniqueSlugMixin, models.Model):
     """ Определяет тип объекта недвижимости (кроме LandPlot) и схему его атрибутов """
     name = models.CharField(max_length=100, unique=True, verbose_name="Название типа")
     slug = models.SlugField(max_length=120, unique=True, blank=True, verbose_name="Slug типа")
@@ -210,10 +307,12 @@ class PropertyType(models.Model):
         verbose_name_plural = "Типы объектов недвижимости"
         ordering = ["name"]
 
+    slug_source = "name"
+
+    def get_slug_fallback(self):
+        return "type"
+
     def save(self, *args, **kwargs):
-        if not self.slug:
-            self.slug = slugify(self.name) or f"type-{self.id or random.randint(1000, 9999)}"
-            # Проверка уникальности slug (можно добавить цикл как в др. моделях)
         super().save(*args, **kwargs)
         # Валидация JSON Schema (опционально, требует jsonschema)
         # self.validate_schema()
@@ -231,10 +330,28 @@ class PropertyType(models.Model):
     #     elif not isinstance(self.attribute_schema, dict):
     #          raise ValidationError("Схема атрибутов должна быть JSON-объектом (словарем).")
 
+    def get_attribute_properties(self):
+        """
+        Описания атрибутов из схемы: {имя: {"type": ..., "label"/"title": ..., ...}}.
+        Поддерживается как JSON Schema ({"properties": {...}}), так и упрощенный вид,
+        где описания лежат прямо в корне схемы.
+        """
+        schema = self.attribute_schema
+        if not isinstance(schema, dict):
+            return {}
+        if isinstance(schema.get('properties'), dict):
+            properties = schema['properties']
+        elif schema and all(isinstance(v, dict) for k, v in schema.items() if k != 'type'):
+            # Эвристика: чтобы случайно не обработать {"type": "object"} как свойство
+            properties = {k: v for k, v in schema.items() if k != 'type'}
+        else:
+            return {}
+        return {name: props for name, props in properties.items() if isinstance(props, dict)}
+
     def __str__(self):
         return self.name
 
-class GenericProperty(models.Model):
+class GenericProperty(UniqueSlugMixin, MediaManifestModel):
     """ Универсальная модель для объектов недвижимости (кроме LandPlot) """
     LISTING_STATUS_CHOICES = (
         ("published", "Опубликовано"),
@@ -288,6 +405,22 @@ class GenericProperty(models.Model):
     updated_at = models.DateTimeField(auto_now=True, db_index=True)
     view_count = models.PositiveIntegerField(default=0, verbose_name="Счетчик просмотров")
 
+    # Агрегаты поддерева (поддерживаются через PropertyHierarchy, см. catalog.hierarchy)
+    children_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Дочерних объектов")
+    descendant_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Объектов в поддереве")
+    descendant_price_min = models.DecimalField(
+        max_digits=15, decimal_places=2, null=True, blank=True, editable=False,
+        verbose_name="Мин. цена в поддереве (опубликованные)"
+    )
+    descendant_price_max = models.DecimalField(
+        max_digits=15, decimal_places=2, null=True, blank=True, editable=False,
+        verbose_name="Макс. цена в поддереве (опубликованные)"
+    )
+    descendant_status_counts = models.JSONField(
+        default=dict, blank=True, editable=False,
+        verbose_name="Объекты поддерева по статусам"
+    )
+
     # Связь с медиафайлами
     media_files = GenericRelation(MediaFile)
 
@@ -296,16 +429,24 @@ class GenericProperty(models.Model):
         verbose_name_plural = "Объекты недвижимости (универсальные)"
         ordering = ["-created_at"]
 
+    def get_slug_fallback(self):
+        return self.property_type.slug
+
+    def is_valid_parent(self, parent):
+        """ Родителем не может быть сам объект или его потомок (иначе в иерархии появится цикл). """
+        if parent is None or self.pk is None:
+            return True
+        return parent.pk != self.pk and not PropertyHierarchy.objects.filter(
+            ancestor_id=self.pk, descendant_id=parent.pk
+        ).exists()
+
+    def clean(self):
+        super().clean()
+        if self.parent_id and not self.is_valid_parent(self.parent):
+            raise ValidationError({"parent": "Объект нельзя вложить в самого себя или в свой дочерний объект."})
+
     def save(self, *args, **kwargs):
-        # Генерация slug (можно улучшить проверкой уникальности)
-        if not self.slug:
-            base_slug = slugify(self.title) or f"{self.property_type.slug}-{random.randint(1000, 9999)}"
-            slug = base_slug
-            counter = 1
-            while GenericProperty.objects.filter(slug=slug).exclude(pk=self.pk).exists():
-                slug = f"{base_slug}-{counter}"
-                counter += 1
-            self.slug = slug
+        # Slug генерирует UniqueSlugMixin
         # Валидация атрибутов по схеме (опционально)
         # self.validate_attributes()
         super().save(*args, **kwargs)
@@ -321,3 +462,217 @@ class GenericProperty(models.Model):
 
     def __str__(self):
         return self.title
+
+class PropertyHierarchy(models.Model):
+    """
+    Closure-таблица иерархии GenericProperty: по строке на каждую пару (предок, потомок),
+    включая саму вершину с depth=0. Поддерево комплекса выбирается одним запросом.
+    """
+    ancestor = models.ForeignKey(
+        GenericProperty, on_delete=models.CASCADE,
+        related_name="descendant_links", verbose_name="Предок"
+    )
+    descendant = models.ForeignKey(
+        GenericProperty, on_delete=models.CASCADE,
+        related_name="ancestor_links", verbose_name="Потомок"
+    )
+    depth = models.PositiveIntegerField(verbose_name="Глубина")
+
+    class Meta:
+        verbose_name = "Связь иерархии объектов"
+        verbose_name_plural = "Связи иерархии объектов"
+        constraints = [
+            models.UniqueConstraint(fields=["ancestor", "descendant"], name="catalog_hierarchy_unique_pair"),
+        ]
+        indexes = [
+            models.Index(fields=["ancestor", "depth"], name="catalog_hierarchy_subtree_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} ({self.depth})"
+
+class PropertyAttributeValue(models.Model):
+    """
+    Типизированный индекс атрибутов GenericProperty.attributes (EAV): по строке на атрибут схемы типа.
+    Фильтры и сортировка по атрибутам идут по индексам (key, значение) вместо json_extract
+    по всей таблице. Поддерживается при сохранении объекта и изменении схемы (см. catalog.attributes).
+    """
+    property = models.ForeignKey(
+        GenericProperty, on_delete=models.CASCADE,
+        related_name="attribute_values", verbose_name="Объект"
+    )
+    key = models.CharField(max_length=100, verbose_name="Атрибут")
+    num_value = models.FloatField(null=True, blank=True, verbose_name="Числовое значение")
+    str_value = models.CharField(max_length=255, null=True, blank=True, verbose_name="Строковое значение")
+    bool_value = models.BooleanField(null=True, blank=True, verbose_name="Логическое значение")
+
+    class Meta:
+        verbose_name = "Значение атрибута объекта"
+        verbose_name_plural = "Значения атрибутов объектов"
+        constraints = [
+            models.UniqueConstraint(fields=["property", "key"], name="catalog_attr_unique_key"),
+        ]
+        indexes = [
+            models.Index(fields=["key", "num_value"], name="catalog_attr_num_idx"),
+            models.Index(fields=["key", "str_value"], name="catalog_attr_str_idx"),
+            models.Index(fields=["key", "bool_value"], name="catalog_attr_bool_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.property_id}.{self.key}"
+
+# --- Денормализованная проекция для общей ленты каталога ---
+
+class CatalogListing(models.Model):
+    """
+    Плоская read-модель карточки объявления (участок или объект) для общей ленты.
+    Заполняется из LandPlot/GenericProperty при сохранении (см. catalog.listings),
+    списки читаются из одной индексированной таблицы без JOIN-ов и prefetch.
+    """
+    KIND_LAND_PLOT = "land_plot"
+    KIND_PROPERTY = "property"
+    KIND_CHOICES = (
+        (KIND_LAND_PLOT, "Земельный участок"),
+        (KIND_PROPERTY, "Объект недвижимости"),
+    )
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name="Вид объявления")
+    object_id = models.PositiveIntegerField(verbose_name="ID исходного объявления")
+    property_type = models.SlugField(max_length=120, blank=True, verbose_name="Slug типа объекта")
+    title = models.CharField(max_length=200, verbose_name="Заголовок")
+    slug = models.SlugField(max_length=220, verbose_name="Slug (ЧПУ)")
+    price = models.DecimalField(max_digits=15, decimal_places=2, verbose_name="Цена (руб.)")
+    # Для участков - сотки, для объектов - атрибут area_sqm (кв.м.)
+    area = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True, verbose_name="Площадь")
+    price_per_are = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True, verbose_name="Цена за сотку") # Только участки
+    location_id = models.PositiveIntegerField(db_index=True, verbose_name="ID местоположения")
+    region = models.CharField(max_length=100, verbose_name="Регион")
+    locality = models.CharField(max_length=100, verbose_name="Населенный пункт")
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, verbose_name="Широта")
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, verbose_name="Долгота")
+    geohash = models.CharField(max_length=12, blank=True, verbose_name="Geohash") # Копия Location.geohash
+    cover_url = models.CharField(max_length=500, blank=True, verbose_name="Обложка (URL)")
+    listing_status = models.CharField(max_length=10, verbose_name="Статус объявления")
+    created_at = models.DateTimeField(verbose_name="Дата создания")
+    updated_at = models.DateTimeField(verbose_name="Дата обновления")
+
+    class Meta:
+        verbose_name = "Карточка каталога"
+        verbose_name_plural = "Карточки каталога"
+        ordering = ["-created_at", "-id"]
+        constraints = [
+            models.UniqueConstraint(fields=["kind", "object_id"], name="catalog_listing_unique_source"),
+        ]
+        indexes = [
+            models.Index(fields=["listing_status", "-created_at"], name="catalog_listing_feed_idx"),
+            models.Index(fields=["listing_status", "price"], name="catalog_listing_price_idx"),
+            models.Index(fields=["listing_status", "area"], name="catalog_listing_area_idx"),
+            models.Index(fields=["kind", "listing_status", "-created_at"], name="catalog_listing_kind_idx"),
+            models.Index(fields=["listing_status", "geohash"], name="catalog_listing_geohash_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.title}"
+
+class MapCell(models.Model):
+    """
+    Агрегат опубликованных карточек ленты в ячейке geohash для кластеров карты (catalog.clusters).
+    Для каждого уровня точности (группы масштабов карты) хранится число карточек, сумма координат
+    (центроид = сумма / число) и минимальная цена. Обновляется инкрементально при изменении карточек.
+    """
+    precision = models.PositiveSmallIntegerField(verbose_name="Точность geohash")
+    cell = models.CharField(max_length=12, verbose_name="Ячейка geohash")
+    kind = models.CharField(max_length=20, choices=CatalogListing.KIND_CHOICES, verbose_name="Вид объявления")
+    count = models.PositiveIntegerField(default=0, verbose_name="Количество")
+    latitude_sum = models.FloatField(default=0, verbose_name="Сумма широт")
+    longitude_sum = models.FloatField(default=0, verbose_name="Сумма долгот")
+    price_min = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True, verbose_name="Минимальная цена")
+
+    class Meta:
+        verbose_name = "Ячейка карты"
+        verbose_name_plural = "Ячейки карты"
+        constraints = [
+            models.UniqueConstraint(fields=["precision", "cell", "kind"], name="catalog_mapcell_unique_cell"),
+        ]
+
+    def __str__(self):
+        return f"{self.cell} ({self.kind}): {self.count}"
+
+class PriceStatistic(models.Model):
+    """
+    Статистика цен опубликованных карточек ленты в срезе: вид объявления, регион, населенный пункт
+    и тип объекта (пустое значение - все). Медиана и квартили цены и цены за сотку хранятся готовыми:
+    затронутые изменением карточек срезы помечаются устаревшими (StalePriceStatistic)
+    и пересчитываются командой refresh_price_statistics.
+    """
+    kind = models.CharField(max_length=20, choices=CatalogListing.KIND_CHOICES, verbose_name="Вид объявления")
+    region = models.CharField(max_length=100, blank=True, verbose_name="Регион") # Пусто - все регионы
+    locality = models.CharField(max_length=100, blank=True, verbose_name="Населенный пункт") # Пусто - весь регион
+    property_type = models.SlugField(max_length=120, blank=True, verbose_name="Slug типа объекта") # Пусто - все типы
+    count = models.PositiveIntegerField(default=0, verbose_name="Количество")
+    price_min = models.DecimalField(max_digits=15, decimal_places=2, verbose_name="Минимальная цена")
+    price_p25 = models.DecimalField(max_digits=15, decimal_places=2, verbose_name="Цена, 25-й перцентиль")
+    price_median = models.DecimalField(max_digits=15, decimal_places=2, verbose_name="Медианная цена")
+    price_p75 = models.DecimalField(max_digits=15, decimal_places=2, verbose_name="Цена, 75-й перцентиль")
+    price_max = models.DecimalField(max_digits=15, decimal_places=2, verbose_name="Максимальная цена")
+    price_per_are_count = models.PositiveIntegerField(default=0, verbose_name="Количество с ценой за сотку")
+    price_per_are_min = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True, verbose_name="Минимальная цена за сотку")
+    price_per_are_p25 = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True, verbose_name="Цена за сотку, 25-й перцентиль")
+    price_per_are_median = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True, verbose_name="Медианная цена за сотку")
+    price_per_are_p75 = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True, verbose_name="Цена за сотку, 75-й перцентиль")
+    price_per_are_max = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True, verbose_name="Максимальная цена за сотку")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+
+    class Meta:
+        verbose_name = "Статистика цен"
+        verbose_name_plural = "Статистика цен"
+        ordering = ["kind", "region", "locality", "property_type"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["kind", "region", "locality", "property_type"], name="catalog_pricestatistic_unique_slice",
+            ),
+        ]
+
+    def __str__(self):
+        scope = ", ".join(part for part in (self.region, self.locality, self.property_type) if part) or "все"
+        return f"{self.get_kind_display()} ({scope}): {self.price_median}"
+
+class StalePriceStatistic(models.Model):
+    """
+    Срез статистики цен, затронутый изменением карточек и ожидающий пересчета
+    (catalog.price_stats.refresh_stale_statistics, команда refresh_price_statistics).
+    """
+    kind = models.CharField(max_length=20, choices=CatalogListing.KIND_CHOICES, verbose_name="Вид объявления")
+    region = models.CharField(max_length=100, blank=True, verbose_name="Регион")
+    locality = models.CharField(max_length=100, blank=True, verbose_name="Населенный пункт")
+    property_type = models.SlugField(max_length=120, blank=True, verbose_name="Slug типа объекта")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата изменения")
+
+    class Meta:
+        verbose_name = "Устаревший срез статистики цен"
+        verbose_name_plural = "Устаревшие срезы статистики цен"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["kind", "region", "locality", "property_type"], name="catalog_stalepricestatistic_unique_slice",
+            ),
+        ]
+
+    def __str__(self):
+        scope = ", ".join(part for part in (self.region, self.locality, self.property_type) if part) or "все"
+        return f"{self.get_kind_display()} ({scope})"
+
+class CacheGeneration(models.Model):
+    """
+    Поколение модели для ключей кэша (catalog.caching): увеличивается при каждом изменении ее строк.
+    Хранится в БД, а не в кэше: поколение общее для всех воркеров, не вытесняется
+    и видно другим процессам только после коммита изменения.
+    """
+    key = models.CharField(max_length=100, primary_key=True, verbose_name="Модель (app_label.model)")
+    generation = models.PositiveBigIntegerField(default=0, verbose_name="Поколение")
+
+    class Meta:
+        verbose_name = "Поколение кэша"
+        verbose_name_plural = "Поколения кэша"
+
+    def __str__(self):
+        return f"{self.key}: {self.generation}"
@@ -0,0 +1,420 @@
+import base64
+import functools
+import json
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, InvalidPage, Page, Paginator
+from django.db.models import F, Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import (
+    BasePagination, PageNumberPagination, _get_displayed_page_numbers, _get_page_links,
+)
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .caching import build_cache_key, filter_signature
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (cursor) пагинация для каталога.
+    Позиция кодируется значением поля сортировки и id последней строки страницы,
+    поэтому нет ни COUNT(*), ни OFFSET-сканирования на глубоких страницах.
+    Поле сортировки берется из параметра ?ordering= (только из ordering_fields вьюсета, иначе 400),
+    id используется как тай-брейкер. Курсор, выданный для другой сортировки, тоже отклоняется с 400.
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering_param = api_settings.ORDERING_PARAM
+    tie_breaker = 'id'
+    invalid_cursor_message = 'Некорректный курсор.'
+    unsupported_ordering_message = 'Сортировка "{term}" недоступна в режиме pagination=cursor.'
+    ordering_mismatch_message = 'Курсор выдан для сортировки "{ordering}" - передайте тот же ?ordering= или начните сначала.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.field, self.descending = self.get_ordering(request, view)
+        self.model_field = queryset.model._meta.get_field(self.field)
+
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor['r'])
+        if cursor is not None:
+            queryset = queryset.filter(self.get_cursor_filter(cursor))
+
+        # При движении назад переворачиваем сортировку и разворачиваем результат
+        queryset = queryset.order_by(*self.get_order_by(reverse))
+        rows = list(queryset[:self.page_size + 1])
+        has_extra = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_extra
+        else:
+            self.has_next, self.has_previous = has_extra, cursor is not None
+        self.page = rows
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, request, view):
+        """
+        Возвращает (поле, по убыванию ли) из ?ordering= или сортировки вьюсета по умолчанию.
+        Сортировки по выражениям (distance, relevance, attr_<ключ>) курсор закодировать не может -
+        для них 400, а не молчаливая подмена сортировкой по умолчанию.
+        """
+        allowed = getattr(view, 'ordering_fields', None) or []
+        candidates = []
+        param = request.query_params.get(self.ordering_param)
+        if param:
+            term = param.split(',')[0].strip()
+            if term and term.lstrip('-') not in allowed:
+                raise ValidationError({self.ordering_param: [self.unsupported_ordering_message.format(term=term)]})
+            candidates.append(term)
+        candidates.extend(getattr(view, 'ordering', None) or [])
+        for term in candidates:
+            if term.lstrip('-') in allowed:
+                return term.lstrip('-'), term.startswith('-')
+        return self.tie_breaker, True
+
+    def get_order_by(self, reverse):
+        descending = self.descending != reverse
+        # NULL-значения всегда в конце прямого порядка (важно для price_per_are)
+        nulls = {'nulls_first': True} if reverse else {'nulls_last': True}
+        if descending:
+            order = [F(self.field).desc(**nulls)]
+        else:
+            order = [F(self.field).asc(**nulls)]
+        if self.field != self.tie_breaker:
+            order.append(f"-{self.tie_breaker}" if descending else self.tie_breaker)
+        return order
+
+    def get_cursor_filter(self, cursor):
+        value = self.model_field.to_python(cursor['v']) if cursor['v'] is not None else None
+        pk = cursor['id']
+        greater = 'lt' if self.descending else 'gt'
+        less = 'gt' if self.descending else 'lt'
+        if self.field == self.tie_breaker:
+            lookup = less if cursor['r'] else greater
+            return Q(**{f"{self.field}__{lookup}": value})
+
+        if not cursor['r']:
+            # Строки после позиции в прямом порядке
+            if value is None:
+                return Q(**{f"{self.field}__isnull": True, f"{self.tie_breaker}__{greater}": pk})
+            return (
+                Q(**{f"{self.field}__{greater}": value})
+                | Q(**{self.field: value, f"{self.tie_breaker}__{greater}": pk})
+                | Q(**{f"{self.field}__isnull": True})
+            )
+        # Строки до позиции в прямом порядке
+        if value is None:
+            return (
+                Q(**{f"{self.field}__isnull": False})
+                | Q(**{f"{self.field}__isnull": True, f"{self.tie_breaker}__{less}": pk})
+            )
+        return (
+            Q(**{f"{self.field}__{less}": value})
+            | Q(**{self.field: value, f"{self.tie_breaker}__{less}": pk})
+        )
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            cursor = {'o': str(data['o']), 'v': data['v'], 'id': int(data['id']), 'r': bool(data['r'])}
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        # Курсор, выданный для другой сортировки, не имеет смысла: ошибка в параметрах запроса, а не "нет страницы"
+        if cursor['o'] != self.get_ordering_token():
+            raise ValidationError({
+                self.cursor_query_param: [self.ordering_mismatch_message.format(ordering=cursor['o'])],
+            })
+        return cursor
+
+    def encode_cursor(self, obj, reverse):
+        value = getattr(obj, self.field)
+        data = {
+            'o': self.get_ordering_token(),
+            'v': None if value is None else self.model_field.value_to_string(obj),
+            'id': getattr(obj, self.tie_breaker),
+            'r': int(reverse),
+        }
+        encoded = base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode('utf-8')).decode('ascii')
+        url = remove_query_param(self.base_url, 'page')
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_ordering_token(self):
+        return f"-{self.field}" if self.descending else self.field
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Непрозрачный курсор из полей next/previous (keyset-режим).',
+                'schema': {'type': 'string'},
+            },
+        ]
+
+
+class CatalogPagination(PageNumberPagination):
+    """
+    Пагинация списков каталога.
+    По умолчанию - обычная постраничная (с count), keyset-режим включается
+    параметром ?pagination=cursor или наличием ?cursor=.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    mode_query_param = 'pagination'
+    keyset_class = KeysetPagination
+
+    def use_keyset(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.keyset_class.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.use_keyset(request):
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters.append({
+            'name': self.mode_query_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Режим пагинации: cursor - без подсчета общего количества.',
+            'schema': {'type': 'string', 'enum': ['page', 'cursor']},
+        })
+        return parameters + self.keyset_class().get_schema_operation_parameters(view)
+
+
+class EstimatedCountPage(Page):
+    """ Страница при приблизительном количестве: наличие следующей страницы известно по лишней строке. """
+
+    def __init__(self, object_list, number, paginator, has_more):
+        super().__init__(object_list, number, paginator)
+        self.has_more = has_more
+
+    def has_next(self):
+        return self.has_more
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Django-пагинатор, который берет общее количество из кэша.
+    Если точный подсчет превышает estimate_threshold, считается только
+    до порога (COUNT по подзапросу с LIMIT), а количество помечается как оценка ("1000+").
+    """
+    count_timeout = 60 * 10
+
+    def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True,
+                 cache_key=None, estimate_threshold=None):
+        super().__init__(object_list, per_page, orphans, allow_empty_first_page)
+        self.cache_key = cache_key
+        self.estimate_threshold = estimate_threshold
+        self.count_is_estimate = False
+
+    @cached_property
+    def count(self):
+        if self.cache_key:
+            cached = cache.get(self.cache_key)
+            if cached is not None:
+                count, self.count_is_estimate = cached
+                return count
+
+        if self.estimate_threshold:
+            count = self.object_list[:self.estimate_threshold + 1].count()
+            if count > self.estimate_threshold:
+                count, self.count_is_estimate = self.estimate_threshold, True
+        else:
+            count = self.object_list.count()
+
+        if self.cache_key:
+            cache.set(self.cache_key, (count, self.count_is_estimate), self.count_timeout)
+        return count
+
+    def validate_number(self, number):
+        self.count  # Заполняет count_is_estimate
+        if not self.count_is_estimate:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            return super().validate_number(number)
+        if number < 1:
+            raise EmptyPage(self.error_messages['min_page'])
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.count_is_estimate:
+            return super().page(number)
+        # За порогом оценки границы страниц неизвестны - берем на одну строку больше
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage(self.error_messages['no_results'])
+        return EstimatedCountPage(rows[:self.per_page], number, self, has_more=len(rows) > self.per_page)
+
+
+def count_cache_key(namespace, queryset, params, dependencies=(), ignored=(), scope=''):
+    """ Ключ кэша количества: модель + поколения зависимых моделей + отпечаток фильтров. """
+    models = [queryset.model, *[model for model in dependencies if model is not queryset.model]]
+    return build_cache_key('count', models, namespace, filter_signature(params, ignored, scope))
+
+
+class CachedCountPagination(CatalogPagination):
+    """
+    Постраничная пагинация с кэшированным количеством.
+    Количество кэшируется по каноническому отпечатку фильтров и сбрасывается
+    при сохранении/удалении объявлений (см. catalog.signals).
+    Для тяжелых выборок отдается оценка: count=1000, count_is_estimate=true. Число страниц
+    при оценке неизвестно: ?page=last отклоняется, дальше ведет только ссылка next.
+    """
+    count_estimate_threshold = 1000
+    estimated_last_page_message = 'Последняя страница неизвестна: количество приблизительное (count_is_estimate).'
+    count_signature_ignored_params = (
+        'page', 'page_size', 'ordering', 'cursor', 'pagination', 'fields', 'omit',
+    )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count_cache_key = count_cache_key(
+            f"{view.__class__.__name__}" if view is not None else queryset.model._meta.label_lower,
+            queryset,
+            request.query_params,
+            dependencies=getattr(view, 'cache_dependencies', ()),
+            ignored=self.count_signature_ignored_params,
+            scope=request.path,
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+    @property
+    def django_paginator_class(self):
+        return functools.partial(
+            CachedCountPaginator,
+            cache_key=self.count_cache_key,
+            estimate_threshold=self.count_estimate_threshold,
+        )
+
+    def get_page_number(self, request, paginator):
+        page_number = request.query_params.get(self.page_query_param) or 1
+        if page_number in self.last_page_strings and getattr(paginator, 'estimate_threshold', None):
+            paginator.count  # Заполняет count_is_estimate
+            if paginator.count_is_estimate:
+                raise NotFound(self.estimated_last_page_message)
+        return super().get_page_number(request, paginator)
+
+    def get_html_context(self):
+        if not self.page.paginator.count_is_estimate:
+            return super().get_html_context()
+        # Номера страниц в Browsable API - только до следующей: num_pages по оценке неверен
+        base_url = self.request.build_absolute_uri()
+
+        def page_number_to_url(page_number):
+            if page_number == 1:
+                return remove_query_param(base_url, self.page_query_param)
+            return replace_query_param(base_url, self.page_query_param, page_number)
+
+        current = self.page.number
+        final = current + 1 if self.page.has_next() else current
+        page_links = _get_page_links(_get_displayed_page_numbers(current, final), current, page_number_to_url)
+        return {
+            'previous_url': self.get_previous_link(),
+            'next_url': self.get_next_link(),
+            'page_links': page_links,
+        }
+
+    def paginate_ids(self, ids, hydrate, request, view=None):
+        """
+        Пагинация готового упорядоченного списка id (колоночный движок, catalog.columnar):
+        количество известно точно, hydrate загружает объекты только для текущей страницы.
+        """
+        self.keyset = None
+        self.request = request
+        page_size = self.get_page_size(request)
+        paginator = Paginator(ids, page_size or len(ids) or 1)
+        paginator.count_is_estimate = False
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        return hydrate([int(pk) for pk in self.page.object_list])
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return Response(OrderedDict([
+            ('count', self.page.paginator.count),
+            ('count_is_estimate', self.page.paginator.count_is_estimate),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count_is_estimate'] = {
+            'type': 'boolean',
+            'example': False,
+            'description': 'true, если count - нижняя оценка (показывать как "1000+"); ?page=last тогда недоступен',
+        }
+        return response_schema
@@ -0,0 +1,189 @@
+"""
+Статистика цен (PriceStatistic) по срезам ленты: вид объявления, регион, населенный пункт, тип объекта.
+
+Опубликованная карточка входит в срезы "все", "регион" и "регион + населенный пункт";
+объект с типом - еще и в те же срезы с этим типом. Для среза хранятся количество, минимум,
+квартили, медиана и максимум цены и цены за сотку (перцентили - с линейной интерполяцией,
+как percentile_cont). Считать перцентили при каждом запросе по ленте в SQLite дорого,
+а при каждом сохранении карточки - тоже: срез "все" охватывает всю ленту. Поэтому изменение
+карточки (catalog.listings) только помечает ее старые и новые срезы устаревшими (StalePriceStatistic,
+после коммита, одной вставкой на пакет изменений), а пересчитывает их refresh_stale_statistics
+(команда refresh_price_statistics по расписанию): количество/минимум/максимум - агрегатом,
+перцентили - срезами [i:i+2] отсортированного запроса, без выгрузки всех цен.
+Полная пересборка - rebuild_price_statistics (refresh_price_statistics --full).
+"""
+from decimal import Decimal
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Count, Max, Min
+
+from .models import CatalogListing, PriceStatistic, StalePriceStatistic
+
+PUBLISHED = "published"
+METRICS = ("price", "price_per_are")
+PERCENTILES = (("p25", Decimal("0.25")), ("median", Decimal("0.5")), ("p75", Decimal("0.75")))
+CENT = Decimal("0.01")
+# Поля карточки, от которых зависят ее срезы и вклад в них
+STAT_FIELDS = ("kind", "region", "locality", "property_type", "price", "price_per_are", "listing_status")
+# Сколько пометок устаревших срезов удаляется одним запросом
+STALE_BATCH_SIZE = 500
+
+
+def listing_groups(values):
+    """ Срезы (вид, регион, населенный пункт, тип) опубликованной карточки; для остальных - пусто. """
+    if not values or values.get("listing_status") != PUBLISHED:
+        return set()
+    kind, region, locality = values["kind"], values["region"], values["locality"]
+    types = {""} | ({values["property_type"]} if values.get("property_type") else set())
+    return {
+        (kind, *scope, property_type)
+        for scope in (("", ""), (region, ""), (region, locality))
+        for property_type in types
+    }
+
+
+def _contribution(values):
+    if not values:
+        return None
+    return tuple(values.get(field) for field in STAT_FIELDS)
+
+
+def _interpolate(lower, upper, fraction):
+    """ Значение между соседними элементами отсортированной выборки (percentile_cont). """
+    value = Decimal(lower) if not fraction else Decimal(lower) + (Decimal(upper) - Decimal(lower)) * fraction
+    return value.quantize(CENT)
+
+
+def _position(count, quantile):
+    """ (индекс нижнего элемента, доля до следующего) для перцентиля выборки из count элементов. """
+    position = quantile * (count - 1)
+    index = int(position)
+    return index, position - index
+
+
+def summarize(values, metric):
+    """ Поля PriceStatistic для метрики по отсортированному списку значений. """
+    stats = {f"{metric}_count": len(values)} if metric != "price" else {"count": len(values)}
+    if not values:
+        stats.update({f"{metric}_{name}": None for name in ("min", "p25", "median", "p75", "max")})
+        return stats
+    stats[f"{metric}_min"], stats[f"{metric}_max"] = Decimal(values[0]).quantize(CENT), Decimal(values[-1]).quantize(CENT)
+    for name, quantile in PERCENTILES:
+        index, fraction = _position(len(values), quantile)
+        stats[f"{metric}_{name}"] = _interpolate(values[index], values[min(index + 1, len(values) - 1)], fraction)
+    return stats
+
+
+def _query_metric(listings, metric):
+    """ summarize для метрики запросами к БД: агрегат и по два соседних значения на перцентиль. """
+    values = listings.filter(**{f"{metric}__isnull": False})
+    totals = values.aggregate(total=Count("pk"), lowest=Min(metric), highest=Max(metric))
+    count = totals["total"]
+    stats = {f"{metric}_count": count} if metric != "price" else {"count": count}
+    if not count:
+        stats.update({f"{metric}_{name}": None for name in ("min", "p25", "median", "p75", "max")})
+        return stats
+    stats[f"{metric}_min"], stats[f"{metric}_max"] = totals["lowest"].quantize(CENT), totals["highest"].quantize(CENT)
+    ordered = values.order_by(metric, "pk").values_list(metric, flat=True)
+    for name, quantile in PERCENTILES:
+        index, fraction = _position(count, quantile)
+        pair = list(ordered[index:index + 2])
+        stats[f"{metric}_{name}"] = _interpolate(pair[0], pair[-1], fraction)
+    return stats
+
+
+def _group_filter(group):
+    kind, region, locality, property_type = group
+    lookups = {"kind": kind}
+    if region:
+        lookups["region"] = region
+    if locality:
+        lookups["locality"] = locality
+    if property_type:
+        lookups["property_type"] = property_type
+    return lookups
+
+
+def refresh_groups(groups):
+    """ Пересчитывает срезы groups по ленте; пустые срезы удаляются. """
+    for group in groups:
+        listings = CatalogListing.objects.filter(listing_status=PUBLISHED, **_group_filter(group))
+        stats = {}
+        for metric in METRICS:
+            stats.update(_query_metric(listings, metric))
+        kind, region, locality, property_type = group
+        key = {"kind": kind, "region": region, "locality": locality, "property_type": property_type}
+        if stats["count"]:
+            PriceStatistic.objects.update_or_create(**key, defaults=stats)
+        else:
+            PriceStatistic.objects.filter(**key).delete()
+
+
+def mark_stale(groups):
+    """ Помечает срезы groups устаревшими (уже помеченные пропускаются). """
+    StalePriceStatistic.objects.bulk_create(
+        [
+            StalePriceStatistic(kind=kind, region=region, locality=locality, property_type=property_type)
+            for kind, region, locality, property_type in groups
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def apply_changes(changes):
+    """
+    changes - пары (старые, новые) значений STAT_FIELDS карточек (None - карточки нет).
+    Помечает устаревшими срезы, в которые карточки входили или вошли, если их вклад изменился;
+    пометка пишется после коммита (при откате изменений ее нет).
+    Возвращает True, если срезы помечались.
+    """
+    groups = set()
+    for old, new in changes:
+        if _contribution(old) != _contribution(new):
+            groups |= listing_groups(old) | listing_groups(new)
+    if groups:
+        transaction.on_commit(partial(mark_stale, sorted(groups)))
+    return bool(groups)
+
+
+def refresh_stale_statistics():
+    """
+    Пересчитывает срезы, помеченные устаревшими. Возвращает число срезов.
+    Пометки снимаются до пересчета: срез, измененный во время пересчета, будет помечен заново.
+    """
+    stale = StalePriceStatistic.objects.order_by("kind", "region", "locality", "property_type")
+    rows = list(stale.values_list("pk", "kind", "region", "locality", "property_type"))
+    with transaction.atomic():
+        for start in range(0, len(rows), STALE_BATCH_SIZE):
+            batch = rows[start:start + STALE_BATCH_SIZE]
+            StalePriceStatistic.objects.filter(pk__in=[row[0] for row in batch]).delete()
+    with transaction.atomic():
+        refresh_groups(row[1:] for row in rows)
+    return len(rows)
+
+
+def rebuild_price_statistics(listing_model=CatalogListing, statistic_model=PriceStatistic):
+    """
+    Полный пересчет по ленте одним проходом. Возвращает число срезов.
+    Модели передаются явно из миграции (исторические версии).
+    """
+    samples = {}
+    rows = listing_model.objects.filter(listing_status=PUBLISHED).values_list(*STAT_FIELDS)
+    for row in rows.iterator(chunk_size=5000):
+        values = dict(zip(STAT_FIELDS, row))
+        for group in listing_groups(values):
+            prices, prices_per_are = samples.setdefault(group, ([], []))
+            prices.append(values["price"])
+            if values["price_per_are"] is not None:
+                prices_per_are.append(values["price_per_are"])
+    statistics = []
+    for (kind, region, locality, property_type), (prices, prices_per_are) in samples.items():
+        stats = {**summarize(sorted(prices), "price"), **summarize(sorted(prices_per_are), "price_per_are")}
+        statistics.append(statistic_model(
+            kind=kind, region=region, locality=locality, property_type=property_type, **stats,
+        ))
+    with transaction.atomic():
+        statistic_model.objects.all().delete()
+        statistic_model.objects.bulk_create(statistics, batch_size=1000)
+    return len(statistics)
@@ -0,0 +1,248 @@
+"""
+Легкие строки для страниц списков каталога вместо экземпляров моделей.
+
+Страница списка участков/объектов сериализуется из нескольких колонок, а ModelIterable на каждую
+строку создает полный экземпляр модели (__dict__, ModelState, сигнал post_init), плюс отдельные
+экземпляры Location/категории на каждую строку select_related и экземпляры характеристик
+на каждую связь prefetch_related. Здесь queryset страницы выполняется через values_list
+в объекты классов со __slots__ (по классу на модель и набор колонок). Связи разделяются между
+строками - одна строка Location на все участки в этом местоположении: колонки select_related
+выбираются тем же запросом (JOIN), связи prefetch_related - одним пакетным запросом на связь.
+
+Строка повторяет то, что читают сериализаторы: колонки и аннотации запроса, pk, serializable_value,
+get_FOO_display, связи (FK - строка или None, M2M - список с .all()) и методы из ROW_METHODS.
+Отложенные (defer) колонки в строку не попадают. Если запрос устроен сложнее (вложенный
+select_related, Prefetch-объекты, extra), as_rows возвращает его без изменений.
+Включается настройкой CATALOG_ROW_OBJECTS (по умолчанию включено).
+"""
+import threading
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F
+from django.db.models.query import BaseIterable, ModelIterable, ValuesListIterable
+from django.db.models.sql.constants import GET_ITERATOR_CHUNK_SIZE
+from django.utils.encoding import force_str
+from django.utils.hashable import make_hashable
+
+from .models import PropertyType
+
+# Методы моделей, которые нужны сериализаторам и читают только колонки строки
+ROW_METHODS = {
+    PropertyType: ("get_attribute_properties",),
+}
+
+_classes = {}
+_iterables = {}
+_classes_lock = threading.Lock()
+
+
+def is_enabled():
+    return getattr(settings, "CATALOG_ROW_OBJECTS", True)
+
+
+class Row:
+    """ Базовый класс строк: конкретные классы создает row_class. """
+    __slots__ = ()
+    _model = None
+    _pk_attname = "id"
+
+    @property
+    def pk(self):
+        return getattr(self, self._pk_attname)
+
+    def serializable_value(self, field_name):
+        """ Как Model.serializable_value: для FK - значение колонки (id), без загрузки связи. """
+        try:
+            field = self._model._meta.get_field(field_name)
+        except FieldDoesNotExist:
+            return getattr(self, field_name)
+        return getattr(self, field.attname)
+
+    def __repr__(self):
+        return f"<{type(self).__name__}: {getattr(self, self._pk_attname, None)}>"
+
+
+class RowList(list):
+    """ Связанные строки M2M; .all() - как у менеджера связи (для сериализаторов). """
+    __slots__ = ()
+
+    def all(self):
+        return self
+
+
+def _display_method(field):
+    """ get_FOO_display как у модели (Model._get_FIELD_display). """
+    choices = dict(make_hashable(field.flatchoices))
+    attname = field.attname
+
+    def get_display(self):
+        value = getattr(self, attname)
+        return force_str(choices.get(make_hashable(value), value), strings_only=True)
+    return get_display
+
+
+def row_class(model, columns, relations=()):
+    """
+    Класс строки модели со __slots__ для колонок columns (заполняются конструктором по порядку)
+    и связей relations (присваиваются после загрузки).
+    """
+    key = (model, columns, relations)
+    cls = _classes.get(key)
+    if cls is None:
+        with _classes_lock:
+            cls = _classes.get(key)
+            if cls is None:
+                cls = _classes[key] = _build_row_class(model, columns, relations)
+    return cls
+
+
+def _build_row_class(model, columns, relations):
+    names = ", ".join(columns)
+    body = "".join(f"    self.{name} = {name}\n" for name in columns) or "    pass\n"
+    namespace = {}
+    exec(f"def __init__(self, {names}):\n{body}", namespace)
+    attrs = {
+        "__slots__": columns + relations,
+        "__init__": namespace["__init__"],
+        "_model": model,
+        "_pk_attname": model._meta.pk.attname,
+    }
+    for field in model._meta.concrete_fields:
+        if field.choices and field.attname in columns:
+            attrs[f"get_{field.name}_display"] = _display_method(field)
+    for name in ROW_METHODS.get(model, ()):
+        attrs[name] = getattr(model, name)
+    return type(f"{model.__name__}Row", (Row,), attrs)
+
+
+def _loaded_columns(queryset):
+    """ Колонки (attname), которые загрузил бы queryset с учетом defer()/only(). """
+    names, defer = queryset.query.deferred_loading
+    columns = []
+    for field in queryset.model._meta.concrete_fields:
+        if field.primary_key or (field.name not in names if defer else field.name in names):
+            columns.append(field.attname)
+    return tuple(columns)
+
+
+def _fetch(queryset, relations=(), many_relations=(), chunked_fetch=False, chunk_size=GET_ITERATOR_CHUNK_SIZE):
+    """
+    Строки запроса (колонки и аннотации) с присоединенными связями. Колонки FK-связей выбираются
+    тем же запросом через JOIN (как select_related), строка связанного объекта создается одна на pk.
+    """
+    opts = queryset.model._meta
+    columns = _loaded_columns(queryset) + tuple(queryset.query.annotation_select)
+    cls = row_class(queryset.model, columns, relations + many_relations)
+    selected, joined = list(columns), []
+    for name in relations:
+        related_model = opts.get_field(name).related_model
+        related_columns = tuple(field.attname for field in related_model._meta.concrete_fields)
+        start = len(selected)
+        selected += [f"{name}__{column}" for column in related_columns]
+        key_index = start + related_columns.index(related_model._meta.pk.attname)
+        joined.append((name, row_class(related_model, related_columns), key_index, start, len(selected), {}))
+    width = len(columns)
+    rows = []
+    for values in ValuesListIterable(queryset.values_list(*selected), chunked_fetch, chunk_size):
+        row = cls(*values[:width]) if joined else cls(*values)
+        for name, related_cls, key_index, start, end, shared in joined:
+            key = values[key_index]
+            obj = shared.get(key)
+            if obj is None and key is not None: # key None - пустая связь (LEFT JOIN)
+                obj = shared[key] = related_cls(*values[start:end])
+            setattr(row, name, obj)
+        rows.append(row)
+    if rows:
+        for name in many_relations:
+            _attach_many_related(rows, opts.get_field(name), queryset.db)
+    return rows
+
+
+def _attach_many_related(rows, field, using):
+    """
+    M2M: связанные строки одним запросом с тем же фильтром и порядком, что у prefetch_related;
+    одна строка на связанный объект, списки по владельцам.
+    """
+    query_name = field.related_query_name()
+    queryset = field.related_model._default_manager.db_manager(using).filter(
+        **{f"{query_name}__in": [row.pk for row in rows]}
+    )
+    columns = _loaded_columns(queryset)
+    cls, pk_index = row_class(field.related_model, columns), columns.index(field.related_model._meta.pk.attname)
+    shared, by_owner = {}, {}
+    for *values, owner in queryset.values_list(*columns, F(query_name)):
+        obj = shared.get(values[pk_index])
+        if obj is None:
+            obj = shared[values[pk_index]] = cls(*values)
+        by_owner.setdefault(owner, RowList()).append(obj)
+    for row in rows:
+        setattr(row, field.name, by_owner.get(row.pk) or RowList())
+
+
+class RowIterable(BaseIterable):
+    """ Итерация queryset строками Row; связи задают подклассы из as_rows. """
+    relations = ()
+    many_relations = ()
+
+    def __iter__(self):
+        yield from _fetch(self.queryset, self.relations, self.many_relations, self.chunked_fetch, self.chunk_size)
+
+
+def _row_iterable(relations, many_relations):
+    key = (relations, many_relations)
+    iterable = _iterables.get(key)
+    if iterable is None:
+        with _classes_lock:
+            iterable = _iterables.setdefault(key, type("RowIterable", (RowIterable,), {
+                "relations": relations, "many_relations": many_relations,
+            }))
+    return iterable
+
+
+def as_rows(queryset):
+    """
+    queryset, который при выполнении отдает строки Row вместо экземпляров модели.
+    Связи берутся из select_related (FK, один уровень) и prefetch_related (M2M по имени поля);
+    запрос, который так не описать, возвращается без изменений.
+    """
+    query, opts = queryset.query, queryset.model._meta
+    if queryset._iterable_class is not ModelIterable or query.extra_select or query.select_related is True:
+        return queryset
+    relations = []
+    for name, nested in (query.select_related or {}).items():
+        field = opts.get_field(name)
+        if nested or not field.concrete or not (field.many_to_one or field.one_to_one):
+            return queryset
+        relations.append(name)
+    many_relations = []
+    for lookup in queryset._prefetch_related_lookups:
+        if not isinstance(lookup, str) or "__" in lookup:
+            return queryset
+        try:
+            field = opts.get_field(lookup)
+        except FieldDoesNotExist:
+            return queryset
+        if not field.many_to_many or not field.concrete:
+            return queryset
+        many_relations.append(lookup)
+    queryset = queryset.select_related(None).prefetch_related(None)
+    queryset._iterable_class = _row_iterable(tuple(relations), tuple(many_relations))
+    return queryset
+
+
+class RowListMixin:
+    """
+    Список (action list) строками Row: фильтры, пагинация и сериализация работают как обычно,
+    но страница загружается через as_rows легкими строками вместо экземпляров моделей
+    (отключается CATALOG_ROW_OBJECTS). Деталь и запись используют экземпляры моделей.
+    """
+    row_actions = ("list",)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        request = getattr(self, "request", None)
+        if is_enabled() and getattr(self, "action", None) in self.row_actions and request is not None \
+                and request.method in ("GET", "HEAD"):
+            return as_rows(queryset)
+        return queryset
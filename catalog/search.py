@@ -0,0 +1,332 @@
+"""
+Полнотекстовый поиск по объявлениям и новостям на SQLite FTS5.
+
+Индекс - виртуальная таблица catalog_search_index (создается миграцией, только для SQLite).
+FTS5 не умеет стемминг русского языка, поэтому слова запроса приводятся к основе
+облегченным стеммером (по мотивам Snowball) и ищутся как префиксы: "чемальского" -> "чемальск*".
+Если индекс недоступен (другая СУБД, нет FTS5), фильтр откатывается на обычный SearchFilter.
+"""
+import logging
+import re
+
+from django.db import DatabaseError, connection
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+logger = logging.getLogger(__name__)
+
+SEARCH_TABLE = 'catalog_search_index'
+KIND_LAND_PLOT = 'land_plot'
+KIND_PROPERTY = 'property'
+KIND_NEWS = 'news'
+# rowid документа вычисляется из вида и id объекта - удаление/замена идут по первичному ключу FTS
+KIND_CODES = {KIND_LAND_PLOT: 1, KIND_PROPERTY: 2, KIND_NEWS: 3}
+
+CREATE_TABLE_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+    "kind UNINDEXED, object_id UNINDEXED, title, body, location, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4')"
+)
+DROP_TABLE_SQL = f"DROP TABLE IF EXISTS {SEARCH_TABLE}"
+
+# Веса bm25 по колонкам: kind, object_id, title, body, location
+BM25_WEIGHTS = '0.0, 0.0, 10.0, 1.0, 3.0'
+
+# --- Облегченный стеммер для русского языка ---
+
+_VOWELS = 'аеиоуыэюя'
+_PERFECTIVE_GERUND = (
+    ('ивши', 'ывши', 'ившись', 'ывшись', 'ив', 'ыв'),
+    ('вши', 'вшись', 'в'),  # только после а/я
+)
+_REFLEXIVE = ('ся', 'сь')
+_ADJECTIVE = (
+    'ими', 'ыми', 'его', 'ого', 'ему', 'ому', 'ее', 'ие', 'ые', 'ое', 'ей', 'ий', 'ый', 'ой',
+    'ем', 'им', 'ым', 'ом', 'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею',
+)
+_PARTICIPLE = (('ивш', 'ывш', 'ующ'), ('ем', 'нн', 'вш', 'ющ', 'щ'))
+_VERB = (
+    ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй', 'ил', 'ыл', 'им', 'ым',
+     'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'),
+    ('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет', 'ют', 'ны', 'ть', 'ешь', 'нно'),
+)
+_NOUN = (
+    'иями', 'ями', 'ами', 'ией', 'иям', 'ием', 'иях', 'ев', 'ов', 'ие', 'ье', 'еи', 'ии', 'ей', 'ой',
+    'ий', 'ям', 'ем', 'ам', 'ом', 'ах', 'ях', 'ию', 'ью', 'ия', 'ья', 'а', 'е', 'и', 'й', 'о', 'у',
+    'ы', 'ь', 'ю', 'я',
+)
+_SUPERLATIVE = ('ейше', 'ейш')
+_DERIVATIONAL = ('ость', 'ост')
+
+
+def _longest(suffixes):
+    return sorted(suffixes, key=len, reverse=True)
+
+
+_PERFECTIVE_GERUND = tuple(_longest(group) for group in _PERFECTIVE_GERUND)
+_ADJECTIVE = _longest(_ADJECTIVE)
+_PARTICIPLE = tuple(_longest(group) for group in _PARTICIPLE)
+_VERB = tuple(_longest(group) for group in _VERB)
+_NOUN = _longest(_NOUN)
+
+
+def _regions(word):
+    """ RV - после первой гласной, R2 - после второй пары гласная+согласная (как в Snowball). """
+    rv = next((i + 1 for i, char in enumerate(word) if char in _VOWELS), len(word))
+    r1 = next(
+        (i + 1 for i in range(1, len(word)) if word[i] not in _VOWELS and word[i - 1] in _VOWELS),
+        len(word),
+    )
+    r2 = next(
+        (i + 1 for i in range(r1 + 1, len(word)) if word[i] not in _VOWELS and word[i - 1] in _VOWELS),
+        len(word),
+    )
+    return rv, r2
+
+
+def _strip(word, start, suffixes, after_a=False):
+    for suffix in suffixes:
+        if word.endswith(suffix) and len(word) - len(suffix) >= start:
+            if after_a and (len(word) - len(suffix) - 1 < start or word[-len(suffix) - 1] not in 'ая'):
+                continue
+            return word[:-len(suffix)], True
+    return word, False
+
+
+def stem(word):
+    """ Основа слова для префиксного поиска (облегченный Snowball для русского). """
+    word = word.lower().replace('ё', 'е')
+    if not re.search(f'[{_VOWELS}]', word):
+        return word
+    rv, r2 = _regions(word)
+
+    word, done = _strip(word, rv, _PERFECTIVE_GERUND[0])
+    if not done:
+        word, done = _strip(word, rv, _PERFECTIVE_GERUND[1], after_a=True)
+    if not done:
+        word, _ = _strip(word, rv, _REFLEXIVE)
+        word, done = _strip(word, rv, _ADJECTIVE)
+        if done:
+            word, found = _strip(word, rv, _PARTICIPLE[0])
+            if not found:
+                word, _ = _strip(word, rv, _PARTICIPLE[1], after_a=True)
+        else:
+            word, done = _strip(word, rv, _VERB[0])
+            if not done:
+                word, done = _strip(word, rv, _VERB[1], after_a=True)
+            if not done:
+                word, _ = _strip(word, rv, _NOUN)
+
+    word, _ = _strip(word, rv, ('и',))
+    word, _ = _strip(word, r2, _DERIVATIONAL)
+    if word.endswith('нн') and len(word) - 1 >= rv:
+        word = word[:-1]
+    else:
+        word, found = _strip(word, rv, _SUPERLATIVE)
+        if found and word.endswith('нн'):
+            word = word[:-1]
+        elif not found:
+            word, _ = _strip(word, rv, ('ь',))
+    return word
+
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _variants(base):
+    """ Основа и ее формы с беглой гласной: "участк" -> "участок", "участек" (участки/участок). """
+    if len(base) >= 4 and base[-1] in 'кц' and base[-2] not in _VOWELS:
+        return [base, f'{base[:-1]}о{base[-1]}', f'{base[:-1]}е{base[-1]}']
+    return [base]
+
+
+def build_match_query(text):
+    """ Запрос FTS5: все слова обязательны (AND), каждое ищется по префиксу своей основы. """
+    terms = []
+    for word in _WORD_RE.findall(text.lower()):
+        base = stem(word)
+        if len(base) < 2:
+            base = word
+        base = base.replace('"', '')
+        if not base:
+            continue
+        variants = [f'"{variant}"*' for variant in _variants(base)]
+        terms.append(variants[0] if len(variants) == 1 else f"({' OR '.join(variants)})")
+    return ' AND '.join(terms)
+
+
+# --- Индекс ---
+
+_availability = {}
+
+
+def search_index_available():
+    """ Есть ли FTS5-индекс в текущей БД (проверяется один раз на базу). """
+    if connection.vendor != 'sqlite':
+        return False
+    key = str(connection.settings_dict['NAME'])
+    if key not in _availability:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [SEARCH_TABLE])
+            _availability[key] = cursor.fetchone() is not None
+    return _availability[key]
+
+
+def _rowid(kind, object_id):
+    return int(object_id) * 8 + KIND_CODES[kind]
+
+
+def _join(*parts):
+    return ' '.join(str(part) for part in parts if part)
+
+
+def build_document(kind, obj):
+    """ (title, body, location) для индексируемого объекта. """
+    if kind == KIND_NEWS:
+        return obj.title, obj.content, ''
+    location = obj.location
+    location_text = _join(location.region, location.locality, location.address_line)
+    if kind == KIND_LAND_PLOT:
+        return obj.title, _join(obj.description, obj.cadastral_numbers), location_text
+    attributes = obj.attributes if isinstance(obj.attributes, dict) else {}
+    strings = [value for value in attributes.values() if isinstance(value, str)]
+    return obj.title, _join(obj.description, obj.property_type.name, *strings), location_text
+
+
+def index_document(kind, obj):
+    if not search_index_available():
+        return
+    title, body, location = build_document(kind, obj)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [_rowid(kind, obj.pk)])
+            cursor.execute(
+                f"INSERT INTO {SEARCH_TABLE} (rowid, kind, object_id, title, body, location) "
+                "VALUES (%s, %s, %s, %s, %s, %s)",
+                [_rowid(kind, obj.pk), kind, obj.pk, title, body, location],
+            )
+    except DatabaseError:
+        logger.exception("Failed to index %s #%s for full-text search", kind, obj.pk)
+
+
+def remove_document(kind, object_id):
+    if not search_index_available():
+        return
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [_rowid(kind, object_id)])
+    except DatabaseError:
+        logger.exception("Failed to remove %s #%s from full-text search", kind, object_id)
+
+
+def rebuild_index(sources):
+    """ sources - пары (kind, queryset). Возвращает количество проиндексированных документов. """
+    with connection.cursor() as cursor:
+        cursor.execute(DROP_TABLE_SQL)
+        cursor.execute(CREATE_TABLE_SQL)
+    _availability.clear()
+    rows = []
+    for kind, queryset in sources:
+        for obj in queryset.iterator(chunk_size=500):
+            rows.append([_rowid(kind, obj.pk), kind, obj.pk, *build_document(kind, obj)])
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, kind, object_id, title, body, location) "
+            "VALUES (%s, %s, %s, %s, %s, %s)",
+            rows,
+        )
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')")
+    return len(rows)
+
+
+def matching_ids(kind, match):
+    """ Подзапрос id всех документов вида kind, подходящих под match (для pk__in, без ограничения числа). """
+    return RawSQL(f"SELECT object_id FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s AND kind = %s", (match, kind))
+
+
+def relevance(kind, match, model):
+    """
+    bm25 документа строки model (меньше - релевантнее). Коррелированный подзапрос по rowid
+    (первичный ключ FTS) считается только для строк, оставшихся после остальных фильтров.
+    """
+    qn = connection.ops.quote_name
+    object_id = f"{qn(model._meta.db_table)}.{qn(model._meta.pk.column)}"
+    return RawSQL(
+        f"SELECT bm25({SEARCH_TABLE}, {BM25_WEIGHTS}) FROM {SEARCH_TABLE} "
+        f"WHERE {SEARCH_TABLE} MATCH %s AND {SEARCH_TABLE}.rowid = {object_id} * 8 + %s",
+        (match, KIND_CODES[kind]),
+        output_field=FloatField(),
+    )
+
+
+class SearchSnippets:
+    """
+    Фрагменты с подсветкой для найденных объектов. Загружаются одним запросом на страницу:
+    при первом обращении к объекту - сразу для всех объектов переданной страницы.
+    """
+    batch_size = 500
+
+    def __init__(self, kind, match):
+        self.kind, self.match = kind, match
+        self._snippets = {}
+
+    def get(self, object_id, page=()):
+        if object_id not in self._snippets:
+            self._load(dict.fromkeys([object_id, *(item.pk for item in page)]))
+        return self._snippets.get(object_id)
+
+    def _load(self, object_ids):
+        object_ids = [object_id for object_id in object_ids if object_id not in self._snippets]
+        self._snippets.update(dict.fromkeys(object_ids))
+        with connection.cursor() as cursor:
+            for start in range(0, len(object_ids), self.batch_size):
+                chunk = object_ids[start:start + self.batch_size]
+                cursor.execute(
+                    f"SELECT object_id, snippet({SEARCH_TABLE}, -1, '<mark>', '</mark>', '…', 12) "
+                    f"FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s "
+                    f"AND rowid IN ({', '.join(['%s'] * len(chunk))})",
+                    [self.match, *(_rowid(self.kind, object_id) for object_id in chunk)],
+                )
+                self._snippets.update((int(object_id), snippet) for object_id, snippet in cursor.fetchall())
+
+
+# --- DRF-бэкенды ---
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    Поиск ?search= через FTS5 с сортировкой по релевантности (bm25).
+    Совпадения FTS подставляются в запрос подзапросом, поэтому остальные фильтры применяются
+    ко всем найденным документам, а не к первым N. Фрагменты с подсветкой - в request.search_snippets
+    (SearchSnippets). Вьюсет указывает вид документов в search_index_kind; search_fields остаются
+    для отката на LIKE-поиск, если индекса нет.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '').strip()
+        kind = getattr(view, 'search_index_kind', None)
+        if not text or kind is None or not search_index_available():
+            return super().filter_queryset(request, queryset, view)
+
+        match = build_match_query(text)
+        if not match:
+            return queryset.none()
+        request.search_snippets = SearchSnippets(kind, match)
+        return queryset.filter(pk__in=matching_ids(kind, match)).alias(
+            search_rank=relevance(kind, match, queryset.model)
+        ).order_by('search_rank', 'pk')
+
+
+class RelevanceOrderingFilter(filters.OrderingFilter):
+    """ OrderingFilter, который не перебивает сортировку по релевантности при ?search= без ?ordering=. """
+
+    def get_ordering(self, request, queryset, view):
+        searching = request.query_params.get(FullTextSearchFilter.search_param, '').strip()
+        if (
+            searching
+            and not request.query_params.get(self.ordering_param)
+            and getattr(view, 'search_index_kind', None)
+            and search_index_available()
+        ):
+            return None
+        return super().get_ordering(request, queryset, view)
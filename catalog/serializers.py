@@ -1,13 +1,24 @@
 from rest_framework import serializers
+from drf_spectacular.utils import extend_schema_field
 from django.contrib.auth import get_user_model
 from rest_framework.exceptions import ValidationError
+from django.core.exceptions import ValidationError as DjangoValidationError
 import jsonschema
 from jsonschema.exceptions import ValidationError as JsonSchemaValidationError
 from .models import (
     Location, Feature, LandUseType, LandCategory, MediaFile, LandPlot,
-    PropertyType, GenericProperty
+    PropertyType, GenericProperty, CatalogListing, PriceStatistic
 )
 
+from .fieldsets import SparseFieldsetSerializerMixin
+from .compiled import CompiledSerializerMixin
+from .dynamic_filters import attribute_filter_specs
+from . import geometry
+from .geo import haversine_km
+from .filters import BoundingBoxField
+from .clusters import MAX_ZOOM
+from .similar import SIMILAR_LIMIT, TOP_K
+
 User = get_user_model()
 
 class LocationSerializer(serializers.ModelSerializer):
@@ -15,6 +26,13 @@ class LocationSerializer(serializers.ModelSerializer):
         model = Location
         fields = ['id', 'region', 'locality', 'address_line', 'latitude', 'longitude']
 
+class LocationSuggestionSerializer(LocationSerializer):
+    """ Местоположение с коэффициентом сходства нечеткого поиска (0..1). """
+    similarity = serializers.FloatField(read_only=True)
+
+    class Meta(LocationSerializer.Meta):
+        fields = LocationSerializer.Meta.fields + ['similarity']
+
 class FeatureSerializer(serializers.ModelSerializer):
     type_display = serializers.CharField(source='get_type_display', read_only=True)
 
@@ -61,13 +79,93 @@ class MediaFileSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(obj.file.url)
         return None
 
-class LandPlotSerializer(serializers.ModelSerializer):
+@extend_schema_field(MediaFileSerializer(many=True))
+class MediaManifestField(serializers.Field):
+    """
+    Медиафайлы из денормализованного манифеста объекта (MediaManifestModel.media_manifest).
+    Формат совпадает с MediaFileSerializer, запросов к MediaFile нет.
+    """
+    def __init__(self, **kwargs):
+        kwargs.setdefault('source', 'media_manifest')
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, manifest):
+        request = self.context.get('request')
+        media = []
+        for entry in manifest or []:
+            entry = dict(entry)
+            entry['file_url'] = request.build_absolute_uri(entry['file_url']) if entry.get('file_url') and request else None
+            media.append(entry)
+        return media
+
+class MediaURLField(serializers.CharField):
+    """ Относительный URL файла (например, обложки), отдаваемый как абсолютный. """
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        request = self.context.get('request')
+        return request.build_absolute_uri(value) if request else value
+
+@extend_schema_field({'type': 'string', 'nullable': True})
+class SearchHighlightField(serializers.Field):
+    """
+    Фрагмент текста с подсветкой совпадений (<mark>) при полнотекстовом поиске ?search=.
+    Фрагменты подготавливает FullTextSearchFilter в request.search_snippets; без поиска - null.
+    В списке фрагменты загружаются одним запросом на всю страницу (instance родительского ListSerializer).
+    """
+    sparse_sources = () # Атрибуты модели для обрезки queryset при ?fields=: читается только pk
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, obj):
+        snippets = getattr(self.context.get('request'), 'search_snippets', None)
+        if snippets is None:
+            return None
+        page = getattr(getattr(self.parent, 'parent', None), 'instance', None)
+        return snippets.get(obj.pk, page if isinstance(page, list) else ())
+
+@extend_schema_field({'type': 'number', 'nullable': True})
+class DistanceField(serializers.Field):
+    """
+    Расстояние (км) от точки ?lat=&lon= до местоположения объявления; без центра или координат - null.
+    Считается по загруженному location, без запросов.
+    """
+    sparse_sources = ('location',) # Атрибуты модели для обрезки queryset при ?fields=
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, obj):
+        params = getattr(self.context.get('request'), 'query_params', None)
+        location = getattr(obj, 'location', None)
+        if not params or location is None or location.latitude is None or location.longitude is None:
+            return None
+        try:
+            lat, lon = float(params['lat']), float(params['lon'])
+        except (KeyError, ValueError):
+            return None
+        return round(haversine_km(lat, lon, location.latitude, location.longitude), 3)
+
+class LandPlotSerializer(CompiledSerializerMixin, SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     # Вложенные сериализаторы для чтения связанных объектов
     location = LocationSerializer(read_only=True)
     features = FeatureSerializer(many=True, read_only=True)
     land_use_types = LandUseTypeSerializer(many=True, read_only=True)
     land_category = LandCategorySerializer(read_only=True)
-    media_files = MediaFileSerializer(many=True, read_only=True)
+    media_files = MediaManifestField() # Из денормализованного манифеста, без запросов к MediaFile
+    cover_image = MediaURLField()
+    search_highlight = SearchHighlightField() # Фрагмент с подсветкой при ?search=
+    distance_km = DistanceField() # Расстояние от ?lat=&lon=
 
     # Поля PrimaryKeyRelatedField для записи связей по ID
     location_id = serializers.PrimaryKeyRelatedField(
@@ -110,16 +208,18 @@ class LandPlotSerializer(serializers.ModelSerializer):
             'plot_status', 'plot_status_display',
             'listing_status', 'listing_status_display',
             'created_at', 'updated_at',
-            'media_files' # Только чтение медиа, привязанных к участку
+            'cover_image', 'media_count',
+            'media_files', # Только чтение медиа, привязанных к участку
+            'search_highlight', 'distance_km',
+            'boundary', # Граница GeoJSON (Polygon/MultiPolygon), необязательна
         ]
-        read_only_fields = ['slug', 'price_per_are', 'created_at', 'updated_at', 'media_files'] # slug и price_per_are генерируются/рассчитываются
+        read_only_fields = ['slug', 'price_per_are', 'created_at', 'updated_at', 'media_count', 'media_files'] # slug и price_per_are генерируются/рассчитываются
 
-    # Передаем контекст в MediaFileSerializer для генерации URL
-    def to_representation(self, instance):
-        representation = super().to_representation(instance)
-        # Передаем контекст в MediaFileSerializer
-        representation['media_files'] = MediaFileSerializer(instance.media_files.all(), many=True, context=self.context).data
-        return representation 
+    def validate_boundary(self, value):
+        try:
+            return geometry.normalize_geometry(value)
+        except geometry.GeometryError as exc:
+            raise ValidationError(str(exc))
 
 class PropertyTypeSerializer(serializers.ModelSerializer):
     """ Сериализатор для Типа Объекта Недвижимости """
@@ -130,69 +230,12 @@ class PropertyTypeSerializer(serializers.ModelSerializer):
         fields = ["id", "name", "slug", "attribute_schema", "available_filters"]
         read_only_fields = ["slug"] # Slug генерируется автоматически
 
+    @extend_schema_field(serializers.ListField(child=serializers.DictField()))
     def get_available_filters(self, obj):
-        filters = []
-        schema = obj.attribute_schema
-
-        # 1. Убедимся, что schema вообще является словарем
-        if not isinstance(schema, dict):
-            return filters # Если не словарь (или null), возвращаем пусто
-
-        # 2. Определяем, где находятся описания свойств
-        properties_dict = None
-        if 'properties' in schema and isinstance(schema.get('properties'), dict):
-            # Стандартный случай: есть ключ 'properties' и его значение - словарь
-            properties_dict = schema['properties']
-        elif schema: # Если ключа 'properties' нет, но сам schema не пустой словарь
-            # Проверяем, похожи ли значения в schema на описания свойств (т.е. являются словарями)
-            # Это эвристика, чтобы случайно не обработать {"type": "object"} как свойство
-            is_likely_properties = all(isinstance(v, dict) for k, v in schema.items() if k != 'type') # Игнорируем ключ 'type' если он есть
-            if is_likely_properties:
-                 # Считаем, что атрибуты находятся прямо в корне schema
-                properties_dict = {k: v for k, v in schema.items() if k != 'type'} # Копируем все, кроме 'type'
-
-        # 3. Если не удалось найти словарь со свойствами, выходим
-        if not isinstance(properties_dict, dict):
-             return filters
-
-        # 4. Итерируем по найденному словарю свойств
-        for attr_name, attr_props in properties_dict.items():
-            # Убедимся, что описание свойства - это словарь
-            if not isinstance(attr_props, dict):
-                continue # Пропускаем, если описание некорректно
-
-            # Пытаемся получить 'title', потом 'label', иначе используем имя атрибута
-            label = attr_props.get('title', attr_props.get('label', attr_name))
-            attr_type = attr_props.get('type')
-            param_base = f"attr_{attr_name}"
-
-            # --- Логика генерации фильтров (остается без изменений) ---
-            if attr_type in ['integer', 'number']:
-                filters.append({
-                    "param_min": f"{param_base}_min",
-                    "param_max": f"{param_base}_max",
-                    "label": label,
-                    "type": "range",
-                    "units": attr_props.get('units', '')
-                })
-            elif attr_type == 'boolean':
-                 filters.append({
-                    "param": param_base,
-                    "label": label,
-                    "type": "boolean"
-                })
-            elif attr_type == 'string' and 'enum' in attr_props:
-                 filters.append({
-                    "param": f"{param_base}_in",
-                    "label": label,
-                    "type": "select",
-                    "options": attr_props.get('enum', [])
-                })
-            # ... можно добавить другие типы ...
-
-        return filters
-
-class GenericPropertySerializer(serializers.ModelSerializer):
+        # Те же описания, из которых компилируются фильтры списка объектов (catalog.dynamic_filters)
+        return attribute_filter_specs(obj.get_attribute_properties())
+
+class GenericPropertySerializer(CompiledSerializerMixin, SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """ Сериализатор для Универсального Объекта Недвижимости """
     # Вложенные сериализаторы для чтения
     property_type = PropertyTypeSerializer(read_only=True)
@@ -200,7 +243,8 @@ class GenericPropertySerializer(serializers.ModelSerializer):
     # media_files = MediaFileSerializer(many=True, read_only=True) # Media files handled by GenericRelation
     # parent = serializers.PrimaryKeyRelatedField(read_only=True) # Показываем только ID родителя
     parent_slug = serializers.SlugField(source="parent.slug", read_only=True) # Или slug родителя
-    children_count = serializers.IntegerField(source="children.count", read_only=True) # Кол-во дочерних элементов
+    # Агрегаты поддерева хранятся в модели (closure-таблица PropertyHierarchy), запросов к children нет
+    children_count = serializers.IntegerField(read_only=True) # Кол-во дочерних элементов
 
     # Поля для записи связей по ID
     property_type_id = serializers.PrimaryKeyRelatedField(
@@ -219,8 +263,11 @@ class GenericPropertySerializer(serializers.ModelSerializer):
     # Отображение choices
     listing_status_display = serializers.CharField(source="get_listing_status_display", read_only=True)
 
-    # Сериализатор для медиафайлов
-    media_files = serializers.SerializerMethodField()
+    # Медиафайлы из денормализованного манифеста (без запросов к MediaFile)
+    media_files = MediaManifestField()
+    cover_image = MediaURLField()
+    search_highlight = SearchHighlightField() # Фрагмент с подсветкой при ?search=
+    distance_km = DistanceField() # Расстояние от ?lat=&lon=
 
     class Meta:
         model = GenericProperty
@@ -228,23 +275,22 @@ class GenericPropertySerializer(serializers.ModelSerializer):
             "id", "title", "slug", "description",
             "property_type", "property_type_id",
             "parent", "parent_id", "parent_slug", "children_count", # Связи иерархии
+            "descendant_count", "descendant_price_min", "descendant_price_max", "descendant_status_counts",
             "location", "location_id",
             "price", "listing_status", "listing_status_display",
             "attributes", # Динамические атрибуты как JSON
             "created_at", "updated_at", "view_count",
-            "media_files" # Медиафайлы
+            "cover_image", "media_count",
+            "media_files", # Медиафайлы
+            "search_highlight", "distance_km"
         ]
         read_only_fields = [
-            "slug", "created_at", "updated_at", "view_count", "media_files",
-            "property_type", "location", "parent", "parent_slug", "children_count"
+            "slug", "created_at", "updated_at", "view_count", "media_count", "media_files",
+            "property_type", "location", "parent", "parent_slug", "children_count",
+            "descendant_count", "descendant_price_min", "descendant_price_max", "descendant_status_counts",
         ]
         # Важно: атрибуты (JSON) должны быть writable
 
-    def get_media_files(self, obj):
-        # Используем существующий MediaFileSerializer для представления медиафайлов
-        media = obj.media_files.all()
-        return MediaFileSerializer(media, many=True, context=self.context).data
-
     def validate(self, data):
         """ Валидируем атрибуты по схеме типа объекта """
         # Получаем property_type: либо из данных запроса (при создании/изменении типа),
@@ -279,4 +325,122 @@ class GenericPropertySerializer(serializers.ModelSerializer):
         elif attributes and not isinstance(attributes, dict):
              raise ValidationError({"attributes": "Атрибуты должны быть JSON-объектом (словарем)."})
 
-        return data
\ No newline at end of file
+        # Родитель не может быть самим объектом или его потомком
+        parent = data.get("parent")
+        if self.instance is not None and not self.instance.is_valid_parent(parent):
+            raise ValidationError({"parent_id": "Объект нельзя вложить в самого себя или в свой дочерний объект."})
+
+        return data
+
+class FacetBucketSerializer(serializers.Serializer):
+    """ Значение фасета и количество объявлений с ним (с учетом остальных фильтров) """
+    value = serializers.JSONField()
+    label = serializers.CharField()
+    count = serializers.IntegerField()
+    selected = serializers.BooleanField()
+
+class FacetsSerializer(serializers.Serializer):
+    """ Ответ эндпоинта фасетов: всего по текущим фильтрам и счетчики по каждому фасету """
+    total = serializers.IntegerField()
+    facets = serializers.DictField(child=FacetBucketSerializer(many=True))
+
+class CatalogListingSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
+    """ Карточка общей ленты каталога (только чтение, данные из CatalogListing) """
+    kind_display = serializers.CharField(source="get_kind_display", read_only=True)
+    cover_url = MediaURLField()
+
+    class Meta:
+        model = CatalogListing
+        fields = [
+            "id", "kind", "kind_display", "object_id", "property_type",
+            "title", "slug", "price", "area",
+            "region", "locality", "latitude", "longitude",
+            "cover_url", "listing_status", "created_at",
+        ]
+        read_only_fields = fields
+
+class PriceStatisticSerializer(serializers.ModelSerializer):
+    """ Статистика цен по срезу ленты (пустые region/locality/property_type - по всем значениям) """
+    kind_display = serializers.CharField(source="get_kind_display", read_only=True)
+
+    class Meta:
+        model = PriceStatistic
+        fields = [
+            "kind", "kind_display", "region", "locality", "property_type", "count",
+            "price_min", "price_p25", "price_median", "price_p75", "price_max",
+            "price_per_are_count", "price_per_are_min", "price_per_are_p25",
+            "price_per_are_median", "price_per_are_p75", "price_per_are_max",
+            "updated_at",
+        ]
+        read_only_fields = fields
+
+class MapClustersQuerySerializer(serializers.Serializer):
+    """ Параметры запроса кластеров карты """
+    bbox = serializers.CharField(help_text="Рамка карты: запад,юг,восток,север (градусы)")
+    zoom = serializers.IntegerField(min_value=0, max_value=MAX_ZOOM, help_text="Масштаб карты (0-22)")
+    kind = serializers.ChoiceField(choices=CatalogListing.KIND_CHOICES, required=False, help_text="Вид объявлений")
+
+    def validate_bbox(self, value):
+        try:
+            return BoundingBoxField().clean(value)
+        except DjangoValidationError as exc:
+            raise ValidationError(exc.messages)
+
+class MapClusterSerializer(serializers.Serializer):
+    """ Кластер: ячейка geohash, число объявлений, центроид и минимальная цена """
+    cell = serializers.CharField()
+    count = serializers.IntegerField()
+    latitude = serializers.FloatField()
+    longitude = serializers.FloatField()
+    price_min = serializers.DecimalField(max_digits=15, decimal_places=2, allow_null=True)
+
+class MapPointSerializer(serializers.ModelSerializer):
+    """ Отдельное объявление на карте (крупный масштаб) """
+    class Meta:
+        model = CatalogListing
+        fields = ["id", "kind", "object_id", "property_type", "title", "slug", "price", "latitude", "longitude"]
+        read_only_fields = fields
+
+class MapClustersSerializer(serializers.Serializer):
+    """ Ответ карты: кластеры до MAP_POINTS_ZOOM, отдельные объявления - начиная с него """
+    zoom = serializers.IntegerField()
+    precision = serializers.IntegerField(allow_null=True, help_text="Точность ячеек geohash (null - отдаются объявления)")
+    clusters = MapClusterSerializer(many=True)
+    points = MapPointSerializer(many=True)
+    truncated = serializers.BooleanField(help_text="Объявлений в рамке больше лимита, нужно приблизить карту")
+
+class PlotLocateQuerySerializer(serializers.Serializer):
+    """ Точка клика по карте """
+    lat = serializers.FloatField(min_value=-90, max_value=90, help_text="Широта")
+    lon = serializers.FloatField(min_value=-180, max_value=180, help_text="Долгота")
+
+class SimilarQuerySerializer(serializers.Serializer):
+    """ Параметры выдачи похожих объявлений """
+    limit = serializers.IntegerField(
+        required=False, default=SIMILAR_LIMIT, min_value=1, max_value=TOP_K, help_text="Сколько похожих вернуть"
+    )
+
+class BoundaryQuerySerializer(serializers.Serializer):
+    """ Параметры выдачи границ участков """
+    bbox = serializers.CharField(required=False, help_text="Рамка карты: запад,юг,восток,север (градусы)")
+    zoom = serializers.IntegerField(
+        required=False, min_value=0, max_value=MAX_ZOOM,
+        help_text="Масштаб карты: граница упрощается до размера пикселя (без zoom - исходная)",
+    )
+
+    def validate_bbox(self, value):
+        try:
+            return BoundingBoxField().clean(value)
+        except DjangoValidationError as exc:
+            raise ValidationError(exc.messages)
+
+class LandPlotBoundarySerializer(serializers.BaseSerializer):
+    """ Граница участка как GeoJSON Feature; context['zoom'] выбирает упрощенную версию геометрии """
+    def to_representation(self, plot):
+        return {
+            "type": "Feature",
+            "id": plot.pk,
+            "bbox": [plot.boundary_min_lon, plot.boundary_min_lat, plot.boundary_max_lon, plot.boundary_max_lat],
+            "geometry": geometry.pick_simplified(plot.boundary_simplified, plot.boundary, self.context.get("zoom")),
+            "properties": {"slug": plot.slug, "title": plot.title, "price": str(plot.price)},
+        }
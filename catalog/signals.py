@@ -0,0 +1,205 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import attributes, hierarchy, listings, search
+from .caching import bump_generation
+from .models import Feature, GenericProperty, LandCategory, LandPlot, LandUseType, Location, MediaFile, MediaManifestModel, PropertyType
+
+
+@receiver(post_save, sender=LandPlot)
+@receiver(post_delete, sender=LandPlot)
+@receiver(post_save, sender=GenericProperty)
+@receiver(post_delete, sender=GenericProperty)
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+def invalidate_listing_caches(sender, instance, **kwargs):
+    """ Любая запись объявления или местоположения сбрасывает кэши количеств. """
+    bump_generation(sender, changed=[instance.pk])
+
+
+@receiver(post_save, sender=Feature)
+@receiver(post_delete, sender=Feature)
+@receiver(post_save, sender=LandUseType)
+@receiver(post_delete, sender=LandUseType)
+@receiver(post_save, sender=LandCategory)
+@receiver(post_delete, sender=LandCategory)
+@receiver(post_save, sender=MediaFile)
+@receiver(post_delete, sender=MediaFile)
+def invalidate_reference_caches(sender, instance, **kwargs):
+    """ Справочники и медиа входят в ответы объявлений - сбрасываем кэш ответов, который от них зависит. """
+    bump_generation(sender, changed=[instance.pk])
+
+
+@receiver(m2m_changed, sender=LandPlot.features.through)
+@receiver(m2m_changed, sender=LandPlot.land_use_types.through)
+def invalidate_land_plot_relations(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        # reverse - изменение со стороны справочника (feature.land_plots.add(...)): участки в pk_set
+        if not reverse:
+            bump_generation(LandPlot, changed=[instance.pk])
+        else:
+            bump_generation(LandPlot, changed=pk_set)
+
+
+@receiver(post_save, sender=LandPlot)
+@receiver(post_save, sender=GenericProperty)
+def sync_catalog_listing(sender, instance, raw=False, **kwargs):
+    if not raw:
+        listings.sync_listing(instance)
+
+
+@receiver(post_delete, sender=LandPlot)
+@receiver(post_delete, sender=GenericProperty)
+def delete_catalog_listing(sender, instance, **kwargs):
+    listings.delete_listing(instance)
+
+
+@receiver(post_save, sender=Location)
+def sync_catalog_listing_location(sender, instance, raw=False, **kwargs):
+    if not raw:
+        listings.sync_location(instance)
+
+
+@receiver(post_save, sender=PropertyType)
+def sync_catalog_listing_property_type(sender, instance, raw=False, **kwargs):
+    if not raw:
+        listings.sync_property_type(instance)
+
+
+def _refresh_media_owner(content_type_id, object_id):
+    """ Обновляет манифест медиа объекта и обложку его карточки в ленте. """
+    model = ContentType.objects.get_for_id(content_type_id).model_class()
+    if model is None or not issubclass(model, MediaManifestModel):
+        return
+    owner = model.objects.filter(pk=object_id).first()
+    if owner is None:
+        return
+    owner.refresh_media_manifest()
+    bump_generation(model, changed=[owner.pk])
+    listings.sync_listing(owner)
+
+
+@receiver(pre_save, sender=MediaFile)
+def remember_media_owner(sender, instance, raw=False, **kwargs):
+    """ Запоминаем прежнего владельца: при переносе файла его манифест тоже нужно обновить. """
+    instance._media_previous_owner = None
+    if instance.pk and not raw:
+        instance._media_previous_owner = (
+            MediaFile.objects.filter(pk=instance.pk).values_list("content_type_id", "object_id").first()
+        )
+
+
+@receiver(post_save, sender=MediaFile)
+@receiver(post_delete, sender=MediaFile)
+def refresh_media_manifest(sender, instance, raw=False, **kwargs):
+    """ Обновляет манифест медиа владельца (и прежнего владельца при переносе) и обложку карточки. """
+    if raw:
+        return
+    owner = (instance.content_type_id, instance.object_id)
+    _refresh_media_owner(*owner)
+    previous = getattr(instance, "_media_previous_owner", None)
+    if previous is not None and tuple(previous) != owner:
+        _refresh_media_owner(*previous)
+
+
+@receiver(pre_save, sender=GenericProperty)
+def remember_hierarchy_state(sender, instance, raw=False, **kwargs):
+    """ Запоминаем старые значения полей, от которых зависят агрегаты предков. """
+    instance._hierarchy_previous = None
+    if instance.pk and not raw:
+        instance._hierarchy_previous = (
+            GenericProperty.objects.filter(pk=instance.pk).values(*hierarchy.TRACKED_FIELDS).first()
+        )
+        previous = instance._hierarchy_previous
+        if previous and instance.parent_id and previous["parent_id"] != instance.parent_id:
+            hierarchy.check_parent(instance)
+
+
+@receiver(post_save, sender=GenericProperty)
+def maintain_hierarchy(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, "_hierarchy_previous", None)
+    if created or previous is None:
+        hierarchy.insert_node(instance)
+        hierarchy.refresh_aggregates(hierarchy.get_ancestor_ids(instance.pk))
+        return
+    if all(previous[field] == getattr(instance, field) for field in hierarchy.TRACKED_FIELDS):
+        return
+    affected = set(hierarchy.get_ancestor_ids(instance.pk))
+    if previous["parent_id"] != instance.parent_id:
+        hierarchy.move_node(instance)
+        affected.update(hierarchy.get_ancestor_ids(instance.pk))
+    hierarchy.refresh_aggregates(affected)
+
+
+@receiver(pre_delete, sender=GenericProperty)
+def remember_hierarchy_ancestors(sender, instance, **kwargs):
+    instance._hierarchy_ancestors = hierarchy.get_ancestor_ids(instance.pk)
+
+
+@receiver(post_delete, sender=GenericProperty)
+def refresh_hierarchy_after_delete(sender, instance, **kwargs):
+    ancestor_ids = getattr(instance, "_hierarchy_ancestors", [])
+    existing = GenericProperty.objects.filter(pk__in=ancestor_ids).values_list("pk", flat=True)
+    hierarchy.refresh_aggregates(existing)
+
+
+@receiver(post_save, sender=LandPlot)
+@receiver(post_save, sender=GenericProperty)
+def index_search_document(sender, instance, raw=False, **kwargs):
+    if not raw:
+        kind = search.KIND_LAND_PLOT if sender is LandPlot else search.KIND_PROPERTY
+        search.index_document(kind, instance)
+
+
+@receiver(post_delete, sender=LandPlot)
+@receiver(post_delete, sender=GenericProperty)
+def remove_search_document(sender, instance, **kwargs):
+    kind = search.KIND_LAND_PLOT if sender is LandPlot else search.KIND_PROPERTY
+    search.remove_document(kind, instance.pk)
+
+
+@receiver(post_save, sender=Location)
+def reindex_location_documents(sender, instance, raw=False, **kwargs):
+    """ Адрес входит в документ объявления - переиндексируем объявления этого местоположения. """
+    if raw or not search.search_index_available():
+        return
+    for plot in LandPlot.objects.filter(location=instance).select_related("location"):
+        search.index_document(search.KIND_LAND_PLOT, plot)
+    for prop in GenericProperty.objects.filter(location=instance).select_related("location", "property_type"):
+        search.index_document(search.KIND_PROPERTY, prop)
+
+
+@receiver(post_save, sender=GenericProperty)
+def sync_property_attribute_values(sender, instance, raw=False, **kwargs):
+    if not raw:
+        attributes.sync_attribute_values(instance)
+        # Индекс атрибутов обновлен после общего сброса кэшей - сообщаем об изменении еще раз
+        bump_generation(GenericProperty, changed=[instance.pk])
+
+
+@receiver(pre_save, sender=PropertyType)
+def remember_attribute_schema(sender, instance, raw=False, **kwargs):
+    instance._previous_attribute_schema = None
+    if instance.pk and not raw:
+        instance._previous_attribute_schema = (
+            PropertyType.objects.filter(pk=instance.pk).values_list("attribute_schema", flat=True).first()
+        )
+
+
+@receiver(post_save, sender=PropertyType)
+def reindex_attribute_values(sender, instance, created, raw=False, **kwargs):
+    """ Схема типа определяет, какие атрибуты и в каких колонках индексируются. """
+    if raw:
+        return
+    bump_generation(PropertyType)
+    if not created and getattr(instance, "_previous_attribute_schema", None) != instance.attribute_schema:
+        attributes.rebuild_attribute_values(GenericProperty.objects.filter(property_type=instance))
+        bump_generation(GenericProperty)
+
+
+@receiver(post_delete, sender=PropertyType)
+def invalidate_property_types(sender, **kwargs):
+    bump_generation(PropertyType)
@@ -0,0 +1,388 @@
+"""
+Похожие объявления по предвычисленным ближайшим соседям (в памяти воркера, требует numpy).
+
+Каждое опубликованное объявление кодируется вектором признаков: логарифмы цены, площади
+и цены за сотку, координаты (z-нормировка по всем объявлениям), наборы характеристик и ВРИ
+(многозначные one-hot, нормированные на число значений), тип и категория (one-hot). Группы
+признаков взвешиваются (weights). Для каждого объявления заранее считаются TOP_K ближайших
+по евклидову расстоянию соседей, так что /similar/ - это поиск в словаре и загрузка одной страницы.
+
+Индекс обновляется по счетчикам поколений (catalog.caching), как колоночный движок: измененные
+строки перечитываются, их соседи считаются заново, а в списки остальных строк вливаются расстояния
+до измененных. Нормировка и словари one-hot фиксируются при полной сборке; полная пересборка
+происходит при неполном журнале, новом значении признака или если изменилось больше
+FULL_REBUILD_SHARE строк. Без numpy похожие подбираются запросом к БД (тот же тип, ближайшая цена).
+"""
+import math
+import threading
+
+from django.db.models import F
+from django.db.models.functions import Abs
+
+from .attributes import COLUMN_NUM, column_for_type, get_attribute_types
+from .caching import get_changes, get_generations
+from .models import GenericProperty, LandPlot, Location, PropertyAttributeValue, PropertyType
+from . import rows
+
+try:
+    import numpy as np
+except ImportError: # numpy - необязательная зависимость, без нее похожие подбираются запросом к БД
+    np = None
+
+TOP_K = 24
+SIMILAR_LIMIT = 12
+FULL_REBUILD_SHARE = 0.2
+# Строк запроса в одном блоке матрицы расстояний (блок x все строки)
+BLOCK_ROWS = 512
+
+
+def is_available():
+    return np is not None
+
+
+def _log(value):
+    return None if value is None else math.log1p(max(float(value), 0.0))
+
+
+def _float(value):
+    return None if value is None else float(value)
+
+
+class FeatureEncoder:
+    """
+    Нормировка числовых признаков и словари one-hot, зафиксированные по полной выборке.
+    batch: {"pk": [...], "numeric": {имя: [число или None]}, "categorical": {имя: [[значения], ...]}}.
+    """
+
+    def __init__(self, batch, weights):
+        self.weights = weights
+        self.numeric = {}
+        for name, values in batch["numeric"].items():
+            column = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+            known = column[~np.isnan(column)]
+            mean = float(known.mean()) if len(known) else 0.0
+            std = float(known.std()) if len(known) else 0.0
+            self.numeric[name] = (mean, std or 1.0)
+        self.vocab = {}
+        for name, rows in batch["categorical"].items():
+            vocab = self.vocab[name] = {}
+            for values in rows:
+                for value in values:
+                    vocab.setdefault(value, len(vocab))
+        self.width = len(self.numeric) + sum(len(vocab) for vocab in self.vocab.values())
+
+    def covers(self, batch):
+        """ Можно ли закодировать batch без пересборки: те же признаки и нет новых значений. """
+        if set(batch["numeric"]) != set(self.numeric) or set(batch["categorical"]) != set(self.vocab):
+            return False
+        return all(
+            value in self.vocab[name]
+            for name, rows in batch["categorical"].items() for values in rows for value in values
+        )
+
+    def weight(self, name):
+        return self.weights.get(name, self.weights.get(name.split(":")[0], 1.0))
+
+    def encode(self, batch):
+        size = len(batch["pk"])
+        vectors = np.zeros((size, self.width), dtype=np.float32)
+        offset = 0
+        for name, (mean, std) in self.numeric.items():
+            column = np.array([np.nan if value is None else value for value in batch["numeric"][name]], dtype=np.float64)
+            # Неизвестное значение - среднее (ноль после нормировки)
+            vectors[:, offset] = np.nan_to_num((column - mean) / std) * self.weight(name)
+            offset += 1
+        for name, vocab in self.vocab.items():
+            weight = self.weight(name)
+            for row, values in enumerate(batch["categorical"][name]):
+                if values:
+                    share = weight / math.sqrt(len(values))
+                    for value in values:
+                        vectors[row, offset + vocab[value]] = share
+            offset += len(vocab)
+        return vectors
+
+
+def top_k(queries, query_pks, vectors, pks, k):
+    """
+    (соседи, расстояния) для строк queries среди vectors: по k pk на строку в порядке близости,
+    без самой строки; недостающие места - pk -1 и расстояние inf.
+    """
+    size = len(queries)
+    neighbors = np.full((size, k), -1, dtype=np.int64)
+    distances = np.full((size, k), np.inf, dtype=np.float32)
+    if not size or not len(vectors):
+        return neighbors, distances
+    norms = np.einsum("ij,ij->i", vectors, vectors)
+    take = min(k + 1, len(vectors)) # +1: место для самой строки
+    for start in range(0, size, BLOCK_ROWS):
+        block = queries[start:start + BLOCK_ROWS]
+        block_pks = query_pks[start:start + BLOCK_ROWS]
+        squared = np.einsum("ij,ij->i", block, block)[:, None] + norms[None, :] - 2 * (block @ vectors.T)
+        squared[block_pks[:, None] == pks[None, :]] = np.inf
+        nearest = np.argpartition(squared, take - 1, axis=1)[:, :take]
+        nearest_squared = np.take_along_axis(squared, nearest, axis=1)
+        order = np.lexsort((pks[nearest], nearest_squared), axis=1)[:, :k]
+        chosen = np.take_along_axis(nearest, order, axis=1)
+        chosen_squared = np.take_along_axis(nearest_squared, order, axis=1)
+        found = np.isfinite(chosen_squared)
+        width = chosen.shape[1]
+        neighbors[start:start + len(block), :width] = np.where(found, pks[chosen], -1)
+        distances[start:start + len(block), :width] = np.sqrt(np.maximum(chosen_squared, 0))
+    return neighbors, distances
+
+
+def merge_neighbors(neighbors, distances, candidates, candidate_distances, k):
+    """ Слияние текущих списков соседей с кандидатами: k ближайших, при равенстве - меньший pk. """
+    merged = np.concatenate([neighbors, candidates], axis=1)
+    merged_distances = np.concatenate([distances, candidate_distances], axis=1)
+    order = np.lexsort((np.where(merged < 0, np.iinfo(np.int64).max, merged), merged_distances), axis=1)[:, :k]
+    return np.take_along_axis(merged, order, axis=1), np.take_along_axis(merged_distances, order, axis=1)
+
+
+class SimilarityState:
+    """ Неизменяемый снимок индекса: читатели работают с ним, обновление создает новый. """
+
+    def __init__(self, encoder, pk, location_id, vectors, neighbors, distances):
+        self.encoder = encoder
+        self.pk = pk
+        self.location_id = location_id
+        self.vectors = vectors
+        self.neighbors = neighbors
+        self.distances = distances
+        self.positions = {value: position for position, value in enumerate(pk.tolist())}
+
+
+class SimilarityIndex:
+    """
+    Ближайшие соседи опубликованных объявлений одной модели.
+    Подклассы описывают загрузку признаков (load_batch), веса и запасной подбор без numpy.
+    """
+    model = None
+    dependencies = ()
+    weights = {}
+    fallback_fields = ()
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.state = None
+        self.generations = None
+
+    def base_queryset(self):
+        return self.model.objects.filter(listing_status="published")
+
+    def load_batch(self, pks=None):
+        raise NotImplementedError
+
+    # --- Сборка ---
+
+    def build(self, batch, encoder=None):
+        """ Полная сборка по batch; encoder - зафиксированная нормировка (по умолчанию - по batch). """
+        encoder = encoder or FeatureEncoder(batch, self.weights)
+        pk = np.asarray(batch["pk"], dtype=np.int64)
+        vectors = encoder.encode(batch)
+        neighbors, distances = top_k(vectors, pk, vectors, pk, TOP_K)
+        location_id = np.asarray(batch["location_id"], dtype=np.int64)
+        return SimilarityState(encoder, pk, location_id, vectors, neighbors, distances)
+
+    def update(self, state, affected, batch):
+        """
+        Новый снимок после изменения строк affected (batch - их актуальные опубликованные версии)
+        или None, если нужна полная пересборка.
+        """
+        if not state.encoder.covers(batch):
+            return None
+        removed = np.fromiter(affected, dtype=np.int64)
+        keep = ~np.isin(state.pk, removed)
+        added_pk = np.asarray(batch["pk"], dtype=np.int64)
+        added_vectors = state.encoder.encode(batch)
+        pk = np.concatenate([state.pk[keep], added_pk])
+        vectors = np.concatenate([state.vectors[keep], added_vectors])
+        location_id = np.concatenate([state.location_id[keep], np.asarray(batch["location_id"], dtype=np.int64)])
+        neighbors, distances = state.neighbors[keep], state.distances[keep]
+        # Строки, у которых среди соседей была измененная: список теряет элементы - считаются заново
+        dirty = np.isin(neighbors, removed).any(axis=1)
+        clean = np.flatnonzero(~dirty)
+        if len(added_pk) and len(clean):
+            candidates, candidate_distances = top_k(vectors[clean], pk[clean], added_vectors, added_pk, TOP_K)
+            neighbors[clean], distances[clean] = merge_neighbors(
+                neighbors[clean], distances[clean], candidates, candidate_distances, TOP_K,
+            )
+        recompute = np.concatenate([np.flatnonzero(dirty), np.arange(int(keep.sum()), len(pk))])
+        neighbors = np.concatenate([neighbors, np.full((len(added_pk), TOP_K), -1, dtype=np.int64)])
+        distances = np.concatenate([distances, np.full((len(added_pk), TOP_K), np.inf, dtype=np.float32)])
+        if len(recompute):
+            neighbors[recompute], distances[recompute] = top_k(vectors[recompute], pk[recompute], vectors, pk, TOP_K)
+        return SimilarityState(state.encoder, pk, location_id, vectors, neighbors, distances)
+
+    # --- Обновление ---
+
+    def ensure_fresh(self):
+        generations = get_generations(*self.dependencies)
+        if generations == self.generations:
+            return
+        with self.lock:
+            if generations == self.generations:
+                return
+            state = None
+            affected = self._affected_pks(generations)
+            if affected is not None and len(affected) <= FULL_REBUILD_SHARE * max(len(self.state.pk), 1):
+                state = self.update(self.state, affected, self.load_batch(affected)) if affected else self.state
+            if state is None:
+                state = self.build(self.load_batch())
+            self.state = state
+            self.generations = generations
+
+    def _affected_pks(self, generations):
+        """ pk строк для перечитывания или None, если нужна полная пересборка. """
+        if self.state is None or self.generations is None:
+            return None
+        affected = set()
+        for model, old, new in zip(self.dependencies, self.generations, generations):
+            if old == new:
+                continue
+            changed = get_changes(model, old, new)
+            if changed is None:
+                return None
+            if model is self.model:
+                affected |= changed
+            elif model is Location:
+                mask = np.isin(self.state.location_id, np.fromiter(changed, dtype=np.int64))
+                affected |= set(self.state.pk[mask].tolist())
+            else:
+                return None
+        return affected
+
+    # --- Запрос ---
+
+    def neighbors(self, pk, limit):
+        """ pk похожих объявлений (ближайшие первыми) или пустой список, если объявления нет в индексе. """
+        self.ensure_fresh()
+        state = self.state
+        position = state.positions.get(pk)
+        if position is None:
+            return []
+        return [value for value in state.neighbors[position, :limit].tolist() if value >= 0]
+
+    def fallback(self, queryset, obj, limit):
+        """ Подбор без numpy: те же значения fallback_fields, ближайшая цена. """
+        queryset = queryset.exclude(pk=obj.pk).filter(
+            **{name: getattr(obj, name) for name in self.fallback_fields}
+        )
+        return list(queryset.annotate(price_gap=Abs(F("price") - obj.price)).order_by("price_gap", "pk")[:limit])
+
+
+class LandPlotSimilarityIndex(SimilarityIndex):
+    model = LandPlot
+    dependencies = (LandPlot, Location)
+    weights = {
+        "price": 1.0, "area": 1.0, "price_per_are": 0.5, "latitude": 1.5, "longitude": 1.5,
+        "features": 1.0, "land_use_types": 1.0, "land_type": 1.0, "land_category": 0.5,
+    }
+    fallback_fields = ("land_type",)
+
+    def load_batch(self, pks=None):
+        queryset = self.base_queryset()
+        if pks is not None:
+            queryset = queryset.filter(pk__in=list(pks))
+        rows = list(queryset.order_by().values_list(
+            "pk", "price", "area", "price_per_are", "location_id", "location__latitude", "location__longitude",
+            "land_type", "land_category_id",
+        ))
+        row_pks = [row[0] for row in rows]
+        related = {}
+        for name in ("features", "land_use_types"):
+            field = LandPlot._meta.get_field(name)
+            source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+            links = {}
+            for owner_id, related_id in field.remote_field.through.objects.filter(
+                **{f"{source}__in": queryset.values("pk")}
+            ).values_list(f"{source}_id", f"{target}_id"):
+                links.setdefault(owner_id, []).append(related_id)
+            related[name] = [sorted(links.get(pk, [])) for pk in row_pks]
+        return {
+            "pk": row_pks,
+            "location_id": [row[4] for row in rows],
+            "numeric": {
+                "price": [_log(row[1]) for row in rows],
+                "area": [_log(row[2]) for row in rows],
+                "price_per_are": [_log(row[3]) for row in rows],
+                "latitude": [_float(row[5]) for row in rows],
+                "longitude": [_float(row[6]) for row in rows],
+            },
+            "categorical": {
+                "land_type": [[row[7]] for row in rows],
+                "land_category": [[] if row[8] is None else [row[8]] for row in rows],
+                **related,
+            },
+        }
+
+
+class GenericPropertySimilarityIndex(SimilarityIndex):
+    model = GenericProperty
+    dependencies = (GenericProperty, Location, PropertyType)
+    # attr - числовые атрибуты схем типов (attr:<ключ>), parent - юниты одного комплекса
+    weights = {"price": 1.0, "latitude": 1.5, "longitude": 1.5, "property_type": 2.0, "parent": 0.5, "attr": 0.5}
+    fallback_fields = ("property_type_id",)
+
+    def load_batch(self, pks=None):
+        queryset = self.base_queryset()
+        if pks is not None:
+            queryset = queryset.filter(pk__in=list(pks))
+        rows = list(queryset.order_by().values_list(
+            "pk", "price", "location_id", "location__latitude", "location__longitude", "property_type_id", "parent_id",
+        ))
+        row_pks = [row[0] for row in rows]
+        positions = {pk: position for position, pk in enumerate(row_pks)}
+        # Числовые атрибуты: признаки фиксированы набором ключей числового типа в схемах
+        numeric_keys = sorted(key for key, type_ in get_attribute_types().items() if column_for_type(type_) == COLUMN_NUM)
+        attributes = {f"attr:{key}": [None] * len(row_pks) for key in numeric_keys}
+        for property_id, key, value in PropertyAttributeValue.objects.filter(
+            property__in=queryset.values("pk"), key__in=numeric_keys, num_value__isnull=False,
+        ).values_list("property_id", "key", "num_value"):
+            attributes[f"attr:{key}"][positions[property_id]] = float(value)
+        return {
+            "pk": row_pks,
+            "location_id": [row[2] for row in rows],
+            "numeric": {
+                "price": [_log(row[1]) for row in rows],
+                "latitude": [_float(row[3]) for row in rows],
+                "longitude": [_float(row[4]) for row in rows],
+                **attributes,
+            },
+            "categorical": {
+                "property_type": [[row[5]] for row in rows],
+                "parent": [[] if row[6] is None else [row[6]] for row in rows],
+            },
+        }
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+INDEX_CLASSES = {LandPlot: LandPlotSimilarityIndex, GenericProperty: GenericPropertySimilarityIndex}
+
+
+def get_index(model):
+    """ Индекс воркера для модели (создается при первом обращении). """
+    index = _indexes.get(model)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.setdefault(model, INDEX_CLASSES[model]())
+    return index
+
+
+class SimilarListingsMixin:
+    """
+    Похожие объявления для detail-действия similar (/{slug}/similar/): предвычисленные ближайшие соседи
+    из индекса и одна загрузка страницы.
+    """
+
+    def get_similar(self, obj, limit=SIMILAR_LIMIT):
+        queryset = self.get_queryset()
+        if not is_available():
+            return INDEX_CLASSES[queryset.model]().fallback(queryset, obj, limit)
+        ids = get_index(queryset.model).neighbors(obj.pk, limit)
+        if rows.is_enabled():
+            queryset = rows.as_rows(queryset)
+        objects = {item.pk: item for item in queryset.filter(pk__in=ids).order_by()}
+        return [objects[pk] for pk in ids if pk in objects]
@@ -0,0 +1,154 @@
+"""
+Генерация уникальных slug для моделей с полем slug (участки, объекты, типы объектов, квизы, категории новостей).
+
+slugify транслитерирует кириллицу ("Участок в Чемале" -> "uchastok-v-chemale") вместо пустой строки
+django.utils.text.slugify. allocate_slug одним запросом выбирает занятые slug вида base и base-N
+и берет первый свободный суффикс (вместо цикла exists() на каждый суффикс); allocate_slugs делает то же
+для пачки значений (импорт). UniqueSlugMixin подставляет slug при сохранении и повторяет выбор,
+если параллельное сохранение успело занять тот же slug (IntegrityError).
+"""
+import re
+
+from django.db import IntegrityError, router, transaction
+from django.db.models import Q
+from django.utils.text import slugify as django_slugify
+
+# Транслитерация как в адресах Яндекса/Википедии
+TRANSLITERATION = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e", "ж": "zh", "з": "z",
+    "и": "i", "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r",
+    "с": "s", "т": "t", "у": "u", "ф": "f", "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "shch",
+    "ъ": "", "ы": "y", "ь": "", "э": "e", "ю": "yu", "я": "ya",
+    # Алтайские и казахские буквы в названиях мест
+    "ј": "j", "ҥ": "ng", "ӧ": "o", "ӱ": "u", "і": "i", "ә": "a", "ғ": "g", "қ": "k", "ң": "ng",
+    "ө": "o", "ұ": "u", "ү": "u", "һ": "h",
+}
+_TRANSLATION_TABLE = str.maketrans(TRANSLITERATION)
+# Место под суффикс "-N", чтобы base-N помещался в max_length поля
+SUFFIX_RESERVE = 8
+# Сколько раз UniqueSlugMixin выбирает slug заново после конфликта при сохранении
+SAVE_ATTEMPTS = 5
+# Сколько базовых slug проверяется одним запросом в allocate_slugs
+BATCH_BASES = 100
+
+
+def slugify(value):
+    """ slug из строки с транслитерацией кириллицы; пустая строка, если букв и цифр нет. """
+    return django_slugify(str(value).lower().translate(_TRANSLATION_TABLE))
+
+
+def _base_slug(model, value, fallback, field):
+    max_length = model._meta.get_field(field).max_length
+    base = slugify(value) or slugify(fallback) or model._meta.model_name
+    return base[:max_length - SUFFIX_RESERVE].strip("-")
+
+
+def _taken_query(bases, field):
+    query = Q()
+    for base in bases:
+        query |= Q(**{field: base}) | Q(**{f"{field}__startswith": f"{base}-"})
+    return query
+
+
+def _taken_suffixes(base, slugs):
+    """ Занятые суффиксы base: 0 - сам base, N - base-N. """
+    pattern = re.compile(rf"{re.escape(base)}(?:-([1-9][0-9]*))?")
+    suffixes = set()
+    for slug in slugs:
+        match = pattern.fullmatch(slug)
+        if match:
+            suffixes.add(int(match.group(1) or 0))
+    return suffixes
+
+
+def _next_free(base, suffixes):
+    """ Первый свободный slug (base, base-1, base-2, ...); занимает его в suffixes. """
+    suffix = 0
+    while suffix in suffixes:
+        suffix += 1
+    suffixes.add(suffix)
+    return f"{base}-{suffix}" if suffix else base
+
+
+def allocate_slug(model, value, fallback="", field="slug", exclude_pk=None, using=None):
+    """ Свободный slug для value (или fallback, если из value slug не получается) одним запросом. """
+    base = _base_slug(model, value, fallback, field)
+    taken = model._default_manager.db_manager(using).filter(_taken_query([base], field))
+    if exclude_pk is not None:
+        taken = taken.exclude(pk=exclude_pk)
+    return _next_free(base, _taken_suffixes(base, taken.values_list(field, flat=True)))
+
+
+def allocate_slugs(model, values, fallback="", field="slug", using=None):
+    """
+    Свободные slug для пачки значений (по порядку): уникальны между собой и с уже сохраненными.
+    Занятые slug выбираются по запросу на BATCH_BASES разных базовых slug.
+    """
+    bases = [_base_slug(model, value, fallback, field) for value in values]
+    unique_bases = list(dict.fromkeys(bases))
+    manager = model._default_manager.db_manager(using)
+    suffixes = {base: set() for base in unique_bases}
+    for start in range(0, len(unique_bases), BATCH_BASES):
+        chunk = unique_bases[start:start + BATCH_BASES]
+        slugs = list(manager.filter(_taken_query(chunk, field)).values_list(field, flat=True))
+        for base in chunk:
+            suffixes[base] = _taken_suffixes(base, slugs)
+    allocated, result = set(), []
+    for base in bases:
+        slug = _next_free(base, suffixes[base])
+        while slug in allocated: # "uchastok-2" могла уже получить основа "uchastok"
+            slug = _next_free(base, suffixes[base])
+        allocated.add(slug)
+        result.append(slug)
+    return result
+
+
+def assign_slugs(objs, source, fallback="", field="slug"):
+    """ Заполняет пустые slug у несохраненных объектов перед bulk_create (по полю source). """
+    pending = [obj for obj in objs if not getattr(obj, field)]
+    if pending:
+        model = type(pending[0])
+        for obj, slug in zip(pending, allocate_slugs(model, [getattr(obj, source) for obj in pending], fallback, field)):
+            setattr(obj, field, slug)
+    return objs
+
+
+class UniqueSlugMixin:
+    """
+    Пустой slug заполняется при сохранении из поля slug_source через allocate_slug.
+    Если slug занят параллельным сохранением (IntegrityError при записи строки), выбирается следующий.
+    Повтор охватывает только запись строки (_save_table), а не сигналы: IntegrityError
+    из обработчика post_save не принимается за конфликт slug.
+    """
+    slug_source = "title"
+
+    def get_slug_fallback(self):
+        """ Основа slug, если из slug_source он не получается (только знаки препинания, эмодзи). """
+        return self._meta.model_name
+
+    def _allocate_slug(self, using):
+        return allocate_slug(
+            type(self), getattr(self, self.slug_source), self.get_slug_fallback(), exclude_pk=self.pk, using=using,
+        )
+
+    def save(self, *args, **kwargs):
+        self._slug_allocated = not self.slug
+        if self._slug_allocated:
+            using = kwargs.get("using") or router.db_for_write(type(self), instance=self)
+            self.slug = self._allocate_slug(using)
+        return super().save(*args, **kwargs)
+
+    def _save_table(self, raw=False, cls=None, force_insert=False, force_update=False, using=None, update_fields=None):
+        args = (raw, cls, force_insert, force_update, using, update_fields)
+        if not getattr(self, "_slug_allocated", False):
+            return super()._save_table(*args)
+        for attempt in range(SAVE_ATTEMPTS):
+            try:
+                with transaction.atomic(using=using):
+                    return super()._save_table(*args)
+            except IntegrityError:
+                conflict = type(self)._default_manager.db_manager(using).filter(slug=self.slug).exclude(pk=self.pk).exists()
+                if not conflict or attempt + 1 == SAVE_ATTEMPTS:
+                    self.slug = ""
+                    raise
+                self.slug = self._allocate_slug(using)
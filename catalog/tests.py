@@ -1,3 +1,1297 @@
-from django.test import TestCase
+import math
+import random
+from decimal import Decimal
+from importlib import import_module
+from unittest import skipIf
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+from django.apps import apps as django_apps
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.db.models.signals import post_save, pre_save
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import serializers
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from news.models import NewsArticle
+
+from . import columnar, geo, geometry, hierarchy, price_stats, search, slugs, trigram
+from .caching import bump_generation, get_generations
+from .fieldsets import get_sparse_field_sources
+from .filters import LandPlotFilter
+from .listings import get_listing_kind
+from .models import (
+    CacheGeneration, CatalogListing, Feature, GenericProperty, LandCategory, LandPlot, LandUseType, Location, MediaFile,
+    PriceStatistic, PropertyHierarchy, PropertyType, StalePriceStatistic,
+)
+from .pagination import CachedCountPagination
+from .rows import as_rows
+from .serializers import GenericPropertySerializer, LandPlotSerializer
+from .views import GenericPropertyViewSet, LandPlotViewSet
+
+LAND_PLOTS_URL = '/api/v1/catalog/land-plots/'
+PROPERTIES_URL = '/api/v1/catalog/properties/'
+
+# Варианты запроса в контексте: поля, зависящие от запроса (расстояние, абсолютные URL, ?fields=/?omit=)
+SERIALIZER_REQUEST_PARAMS = [
+    {},
+    {'lat': '51.4', 'lon': '86.0'},
+    {'fields': 'id,title,price,location,features,land_type_display,parent_slug,category_name,questions'},
+    {'omit': 'description,media_files,content'},
+]
+MEDIA_MANIFEST = [
+    {
+        'id': 1, 'file_url': '/media/landplots/photo.jpg', 'type': 'image', 'type_display': 'Изображение',
+        'is_main': True, 'order': 0, 'description': 'Вид на Катунь', 'uploaded_at': '2024-05-01T10:00:00+03:00',
+    },
+]
+
+
+def create_plot(title, location, features=(), land_use_types=(), **fields):
+    fields.setdefault('price', Decimal('500000'))
+    fields.setdefault('area', Decimal('10'))
+    fields.setdefault('listing_status', 'published')
+    plot = LandPlot.objects.create(title=title, location=location, **fields)
+    plot.features.set(features)
+    plot.land_use_types.set(land_use_types)
+    return plot
+
+
+class CompiledSerializerAssertions:
+    """ Проверки скомпилированного пути чтения (catalog.compiled) против обычного DRF; примесь к TestCase. """
+
+    @override_settings(CATALOG_COMPILED_SERIALIZERS=True)
+    def assertMatchesDRF(self, serializer_class, objects, expected_objects=None):
+        """ objects - что сериализует список (модели или строки Row), expected_objects - экземпляры для DRF. """
+        factory = APIRequestFactory()
+        for params in SERIALIZER_REQUEST_PARAMS:
+            serializer = serializer_class(context={'request': Request(factory.get('/', params))})
+            for obj, expected_obj in zip(objects, expected_objects or objects):
+                with self.subTest(serializer=serializer_class.__name__, pk=obj.pk, params=params):
+                    compiled, expected = serializer.to_representation(obj), serializer.drf_representation(expected_obj)
+                    self.assertEqual(compiled, expected)
+                    self.assertEqual(list(compiled), list(expected))
+
+
+class CatalogAPITestCase(TestCase):
+    """ Кэш ответов и генерации живут в LocMemCache - очищаем между тестами. """
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def get_results(self, url, params=None):
+        response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['results']
+
+
+class M2MFilterTests(CatalogAPITestCase):
+    """ ?features= / ?land_use_types= с режимами any и all (EXISTS / HAVING COUNT вместо JOIN). """
+
+    @classmethod
+    def setUpTestData(cls):
+        location = Location.objects.create(region='Республика Алтай', locality='Чемал')
+        cls.water, cls.power, cls.gas = (
+            Feature.objects.create(name=name, type='communication') for name in ('Вода', 'Свет', 'Газ')
+        )
+        cls.izhs, cls.lph = (LandUseType.objects.create(name=name) for name in ('ИЖС', 'ЛПХ'))
+        cls.all_three = create_plot('Все коммуникации', location, [cls.water, cls.power, cls.gas], [cls.izhs, cls.lph])
+        cls.water_power = create_plot('Вода и свет', location, [cls.water, cls.power], [cls.izhs])
+        cls.water_only = create_plot('Только вода', location, [cls.water], [cls.lph])
+        cls.nothing = create_plot('Без коммуникаций', location)
+        create_plot('Снят с публикации', location, [cls.water, cls.power], [cls.izhs], listing_status='hidden')
+
+    def filter_titles(self, params):
+        return sorted(LandPlotFilter(params, LandPlot.objects.all()).qs.values_list('title', flat=True))
+
+    def test_any_mode_matches_plots_with_any_feature(self):
+        params = {'features': f'{self.power.pk},{self.gas.pk}'}
+        results = self.get_results(LAND_PLOTS_URL, params)
+        self.assertEqual(sorted(plot['id'] for plot in results), sorted([self.all_three.pk, self.water_power.pk]))
+        self.assertEqual(self.filter_titles({**params, 'features_mode': 'any'}), self.filter_titles(params))
+
+    def test_all_mode_requires_every_feature(self):
+        params = {'features': f'{self.water.pk},{self.power.pk}', 'features_mode': 'all'}
+        self.assertEqual(self.filter_titles(params), ['Вода и свет', 'Все коммуникации', 'Снят с публикации'])
+        params['features'] += f',{self.gas.pk}'
+        self.assertEqual(self.filter_titles(params), ['Все коммуникации'])
+
+    def test_no_duplicate_rows(self):
+        ids = f'{self.water.pk},{self.power.pk},{self.gas.pk}'
+        for mode in ('any', 'all'):
+            with self.subTest(mode=mode):
+                queryset = LandPlotFilter({'features': ids, 'features_mode': mode}, LandPlot.objects.all()).qs
+                pks = list(queryset.values_list('pk', flat=True))
+                self.assertEqual(len(pks), len(set(pks)))
+                self.assertEqual(queryset.count(), len(pks))
+                results = self.get_results(LAND_PLOTS_URL, {'features': ids, 'features_mode': mode})
+                self.assertEqual(len(results), len({plot['id'] for plot in results}))
+
+    def test_land_use_types_mode(self):
+        ids = f'{self.izhs.pk},{self.lph.pk}'
+        self.assertEqual(
+            self.filter_titles({'land_use_types': ids}),
+            ['Вода и свет', 'Все коммуникации', 'Снят с публикации', 'Только вода'],
+        )
+        self.assertEqual(self.filter_titles({'land_use_types': ids, 'land_use_types_mode': 'all'}), ['Все коммуникации'])
+
+    def test_filter_is_single_query_for_any_number_of_ids(self):
+        for mode in ('any', 'all'):
+            for ids in ([self.water.pk], [self.water.pk, self.power.pk, self.gas.pk]):
+                with self.subTest(mode=mode, ids=ids):
+                    queryset = LandPlotFilter(
+                        {'features': ','.join(map(str, ids)), 'features_mode': mode}, LandPlot.objects.all()
+                    ).qs
+                    with self.assertNumQueries(1):
+                        list(queryset)
+
+    def test_list_query_count_does_not_depend_on_mode(self):
+        # Поколения кэша, валидаторы ETag, COUNT(*), страница, ВРИ и характеристики страницы (по запросу на связь)
+        for mode in ('any', 'all'):
+            with self.subTest(mode=mode):
+                cache.clear()
+                with self.assertNumQueries(6):
+                    self.get_results(LAND_PLOTS_URL, {'features': f'{self.water.pk},{self.power.pk}', 'features_mode': mode})
+
+
+class FacetCacheTests(CatalogAPITestCase):
+    """ Кэш фасетов сбрасывается и при изменении моделей подписей (характеристики, ВРИ, категории). """
+
+    @classmethod
+    def setUpTestData(cls):
+        location = Location.objects.create(region='Республика Алтай', locality='Чемал')
+        cls.water = Feature.objects.create(name='Вода', type='communication')
+        cls.izhs = LandUseType.objects.create(name='ИЖС')
+        cls.category = LandCategory.objects.create(name='Земли поселений')
+        create_plot('Участок', location, [cls.water], [cls.izhs], land_category=cls.category)
+
+    def labels(self):
+        response = self.client.get(f'{LAND_PLOTS_URL}facets/')
+        self.assertEqual(response.status_code, 200, response.content)
+        facets = response.json()['facets']
+        return {name: [bucket['label'] for bucket in facets[name]] for name in ('features', 'land_use_types', 'land_category')}
+
+    def test_renamed_labels_are_not_served_from_cache(self):
+        self.assertEqual(self.labels(), {'features': ['Вода'], 'land_use_types': ['ИЖС'], 'land_category': ['Земли поселений']})
+        for obj, name in ((self.water, 'Скважина'), (self.izhs, 'ЛПХ'), (self.category, 'Земли сельхозназначения')):
+            obj.name = name
+            obj.save()
+        self.assertEqual(
+            self.labels(), {'features': ['Скважина'], 'land_use_types': ['ЛПХ'], 'land_category': ['Земли сельхозназначения']},
+        )
+
+
+class CacheGenerationTests(CatalogAPITestCase):
+    """ Поколения кэша общие для процессов: их не сбрасывает ни очистка, ни вытеснение ключей кэша. """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.plot = create_plot('Участок у реки', Location.objects.create(region='Республика Алтай', locality='Чемал'))
+
+    def test_generations_survive_cache_clear(self):
+        before = get_generations(LandPlot, Location)
+        bump_generation(LandPlot, changed=[self.plot.pk])
+        cache.clear()
+        self.assertEqual(get_generations(LandPlot, Location), (before[0] + 1, before[1]))
+
+    @override_settings(CATALOG_RESPONSE_CACHE_TIMEOUT=300)
+    def test_bump_from_another_process_invalidates_cached_response(self):
+        self.assertEqual(self.client.get(LAND_PLOTS_URL)['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(LAND_PLOTS_URL)['X-Cache'], 'HIT')
+        # Другой воркер меняет участок: его кэш не общий с нашим, общая только таблица поколений
+        LandPlot.objects.filter(pk=self.plot.pk).update(title='Участок у Катуни')
+        CacheGeneration.objects.filter(key=LandPlot._meta.label_lower).update(generation=F('generation') + 1)
+        response = self.client.get(LAND_PLOTS_URL)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['results'][0]['title'], 'Участок у Катуни')
+
+
+@override_settings(CATALOG_RESPONSE_CACHE_TIMEOUT=300)
+class ResponseCacheFormatTests(CatalogAPITestCase):
+    """ Кэшируются только JSON-ответы: HTML Browsable API содержит CSRF-токен и форму входа. """
+
+    @classmethod
+    def setUpTestData(cls):
+        create_plot('Участок у реки', Location.objects.create(region='Республика Алтай', locality='Чемал'))
+
+    def test_browsable_api_is_not_cached(self):
+        for params, headers in (({}, {'HTTP_ACCEPT': 'text/html'}), ({'format': 'api'}, {})):
+            with self.subTest(params=params):
+                for _ in range(2):
+                    response = self.client.get(LAND_PLOTS_URL, params, **headers)
+                    self.assertEqual(response['Content-Type'], 'text/html; charset=utf-8')
+                    self.assertEqual(response['X-Cache'], 'MISS')
+
+    def test_json_is_cached(self):
+        for params, headers in (({}, {}), ({}, {'HTTP_ACCEPT': 'application/json'}), ({'format': 'json'}, {})):
+            with self.subTest(params=params, headers=headers):
+                self.assertEqual(self.client.get(LAND_PLOTS_URL, params, **headers)['X-Cache'], 'MISS')
+                self.assertEqual(self.client.get(LAND_PLOTS_URL, params, **headers)['X-Cache'], 'HIT')
+
+
+class ConditionalGetTests(CatalogAPITestCase):
+    """ ETag списка и детали меняется при правках, которые не трогают updated_at объявления. """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.location = Location.objects.create(region='Республика Алтай', locality='Чемал')
+        cls.category = LandCategory.objects.create(name='Земли поселений')
+        cls.water = Feature.objects.create(name='Вода', type='communication')
+        cls.plot = create_plot('Участок у реки', cls.location, land_category=cls.category)
+
+    def assertStaleETag(self, url, change):
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        updated_at = LandPlot.objects.values_list('updated_at', flat=True).get(pk=self.plot.pk)
+        change()
+        self.assertEqual(LandPlot.objects.values_list('updated_at', flat=True).get(pk=self.plot.pk), updated_at)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def toggle_feature(self):
+        if self.plot.features.exists():
+            self.plot.features.clear()
+        else:
+            self.plot.features.add(self.water)
+
+    def rename_category(self):
+        self.category.name += '*'
+        self.category.save()
+
+    def test_related_changes_invalidate_etag(self):
+        changes = {
+            'features': self.toggle_feature,
+            'location': lambda: Location.objects.get(pk=self.location.pk).save(),
+            'category': self.rename_category,
+        }
+        for url in (LAND_PLOTS_URL, f'{LAND_PLOTS_URL}{self.plot.slug}/'):
+            for name, change in changes.items():
+                with self.subTest(url=url, change=name):
+                    self.assertStaleETag(url, change)
+
+    def test_etag_changes_on_worker_that_missed_the_change(self):
+        url = f'{LAND_PLOTS_URL}{self.plot.slug}/'
+        etag = self.client.get(url)['ETag']
+        # Изменение обработал другой воркер: в кэш этого процесса оно не попало, общая только таблица поколений
+        LandPlot.features.through.objects.create(landplot=self.plot, feature=self.water)
+        CacheGeneration.objects.filter(key=LandPlot._meta.label_lower).update(generation=F('generation') + 1)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_if_modified_since_alone_does_not_return_304(self):
+        response = self.client.get(f'{LAND_PLOTS_URL}{self.plot.slug}/')
+        response = self.client.get(
+            f'{LAND_PLOTS_URL}{self.plot.slug}/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+class SparseFieldsetTests(CatalogAPITestCase):
+    """ ?fields=/?omit= обрезают запрос, но не откладывают колонки, которые читают оставшиеся поля. """
+    FIELDSETS = [
+        {'fields': 'id,distance_km', 'lat': '51.4', 'lon': '86.0'},
+        {'fields': 'id,land_type_display,listing_status_display'},
+        {'fields': 'id,title,cover_image,search_highlight'},
+        {'fields': 'id,parent_slug,children_count'},
+        {'omit': 'description,media_files'},
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        location = Location.objects.create(
+            region='Республика Алтай', locality='Чемал', latitude=Decimal('51.41'), longitude=Decimal('86.00'),
+        )
+        for index in range(3):
+            create_plot(f'Участок {index}', location)
+        property_type = PropertyType.objects.create(name='Дом')
+        parent = GenericProperty.objects.create(
+            property_type=property_type, title='Поселок', location=location, price=Decimal('0'), listing_status='published',
+        )
+        for index in range(3):
+            GenericProperty.objects.create(
+                property_type=property_type, parent=parent, title=f'Дом {index}', location=location,
+                price=Decimal('3000000'), listing_status='published',
+            )
+
+    def count_queries(self, url, params):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.get_results(url, params)
+        return len(queries)
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        for url in (LAND_PLOTS_URL, PROPERTIES_URL):
+            for params in self.FIELDSETS:
+                with self.subTest(url=url, params=params):
+                    self.assertEqual(
+                        self.count_queries(url, {**params, 'page_size': 1}),
+                        self.count_queries(url, {**params, 'page_size': 3}),
+                    )
+
+    def count_detail_queries(self, url, params):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(queries)
+
+    def test_detail_needs_no_extra_queries(self):
+        for url, model in ((LAND_PLOTS_URL, LandPlot), (PROPERTIES_URL, GenericProperty)):
+            url = f'{url}{model.objects.filter(listing_status="published").values_list("slug", flat=True).last()}/'
+            full = self.count_detail_queries(url, {})
+            for params in self.FIELDSETS:
+                with self.subTest(url=url, params=params):
+                    self.assertLessEqual(self.count_detail_queries(url, params), full)
+
+    def test_unknown_source_fields_disable_pruning(self):
+        class DescriptionLengthSerializer(LandPlotSerializer):
+            description_length = serializers.SerializerMethodField()
+
+            class Meta(LandPlotSerializer.Meta):
+                fields = LandPlotSerializer.Meta.fields + ['description_length']
+
+            def get_description_length(self, obj):
+                return len(obj.description or '')
+
+        class DeclaredSourcesSerializer(DescriptionLengthSerializer):
+            sparse_field_sources = {'description_length': 'description'}
+
+        requested = frozenset({'id', 'description_length'})
+        self.assertIsNone(get_sparse_field_sources(DescriptionLengthSerializer, requested, frozenset()))
+        self.assertEqual(get_sparse_field_sources(DeclaredSourcesSerializer, requested, frozenset()), {'id', 'description'})
+        # Без поля с неизвестными атрибутами обрезка работает как обычно
+        self.assertEqual(
+            get_sparse_field_sources(DescriptionLengthSerializer, frozenset({'id', 'title'}), frozenset()), {'id', 'title'},
+        )
+
+    def test_sources_are_cached_per_fieldset(self):
+        requested = frozenset({'id', 'distance_km'})
+        sources = get_sparse_field_sources(LandPlotSerializer, requested, frozenset())
+        self.assertEqual(sources, {'id', 'location'})
+        self.assertIs(get_sparse_field_sources(LandPlotSerializer, requested, frozenset()), sources)
+
+
+class MediaManifestTests(TestCase):
+    """ Манифест медиа и обложка карточки следуют за MediaFile, в том числе при переносе к другому владельцу. """
+
+    @classmethod
+    def setUpTestData(cls):
+        location = Location.objects.create(region='Республика Алтай', locality='Чемал')
+        cls.first = create_plot('Первый участок', location)
+        cls.second = create_plot('Второй участок', location)
+        property_type = PropertyType.objects.create(name='Дом')
+        cls.house = GenericProperty.objects.create(
+            property_type=property_type, title='Дом у реки', location=location, price=Decimal('3000000'),
+            listing_status='published',
+        )
+
+    def attach(self, owner):
+        return MediaFile.objects.create(content_object=owner, file='landplots/photo.jpg', is_main=True)
+
+    def assertMedia(self, owner, count):
+        owner.refresh_from_db()
+        self.assertEqual(owner.media_count, count)
+        self.assertEqual(len(owner.media_manifest), count)
+        listing = CatalogListing.objects.get(kind=get_listing_kind(owner), object_id=owner.pk)
+        self.assertEqual(listing.cover_url, owner.cover_image)
+        self.assertEqual(bool(owner.cover_image), bool(count))
+
+    def test_move_between_owners_refreshes_both(self):
+        media = self.attach(self.first)
+        self.assertMedia(self.first, 1)
+        media.object_id = self.second.pk
+        media.save()
+        self.assertMedia(self.first, 0)
+        self.assertMedia(self.second, 1)
+        media.content_object = self.house
+        media.save()
+        self.assertMedia(self.second, 0)
+        self.assertMedia(self.house, 1)
+
+    def test_delete_refreshes_owner(self):
+        self.attach(self.first).delete()
+        self.assertMedia(self.first, 0)
+
+
+@patch.object(CachedCountPagination, 'count_estimate_threshold', 3)
+class CountEstimateTests(CatalogAPITestCase):
+    """ При приблизительном количестве последняя страница неизвестна: только next до конца выдачи. """
+
+    @classmethod
+    def setUpTestData(cls):
+        location = Location.objects.create(region='Республика Алтай', locality='Чемал')
+        cls.plots = [create_plot(f'Участок {index}', location, price=Decimal(100000 * (index + 1))) for index in range(7)]
+
+    def get_page(self, params):
+        response = self.client.get(LAND_PLOTS_URL, {'ordering': 'price', 'page_size': 2, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_next_links_reach_the_real_end(self):
+        data = self.get_page({})
+        self.assertEqual((data['count'], data['count_is_estimate']), (3, True))
+        ids = [plot['id'] for plot in data['results']]
+        while data['next']:
+            response = self.client.get(data['next'])
+            self.assertEqual(response.status_code, 200, response.content)
+            data = response.json()
+            ids.extend(plot['id'] for plot in data['results'])
+        self.assertEqual(ids, [plot.pk for plot in self.plots])
+
+    def test_last_page_is_rejected(self):
+        response = self.client.get(LAND_PLOTS_URL, {'page': 'last', 'page_size': 2})
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('count_is_estimate', response.json()['detail'])
+        # Точное количество (не больше порога) - последняя страница известна
+        data = self.get_page({'page': 'last', 'price_max': '300000'})
+        self.assertEqual((data['count'], data['count_is_estimate'], len(data['results'])), (3, False, 1))
+
+    def test_browsable_api_links_stop_at_next_page(self):
+        response = self.client.get(LAND_PLOTS_URL, {'ordering': 'price', 'page_size': 2, 'page': 3}, HTTP_ACCEPT='text/html')
+        self.assertEqual(response.status_code, 200)
+        content = response.content.decode()
+        self.assertIn('page=4', content)
+        self.assertNotIn('page=5', content)
+
+
+class KeysetPaginationTests(CatalogAPITestCase):
+    """ Keyset-режим ?pagination=cursor. """
+
+    @classmethod
+    def setUpTestData(cls):
+        location = Location.objects.create(
+            region='Республика Алтай', locality='Чемал', latitude=Decimal('51.41'), longitude=Decimal('86.00'),
+        )
+        cls.plots = [create_plot(f'Участок {index}', location, price=Decimal(100000 * (index + 1))) for index in range(5)]
+
+    def test_expression_orderings_are_rejected(self):
+        for params in (
+            {'ordering': 'distance', 'lat': '51.4', 'lon': '86.0'},
+            {'ordering': '-distance', 'lat': '51.4', 'lon': '86.0'},
+            {'ordering': 'relevance', 'search': 'Участок'},
+        ):
+            with self.subTest(params=params):
+                response = self.client.get(LAND_PLOTS_URL, {**params, 'pagination': 'cursor'})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('ordering', response.json())
+        response = self.client.get(PROPERTIES_URL, {'ordering': '-attr_rooms', 'pagination': 'cursor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_field_orderings_are_kept(self):
+        for ordering in ('price', '-price', '-created_at'):
+            with self.subTest(ordering=ordering):
+                page_ids = [plot['id'] for plot in self.get_results(LAND_PLOTS_URL, {'ordering': ordering})]
+                cursor_ids = [
+                    plot['id'] for plot in self.get_results(LAND_PLOTS_URL, {'ordering': ordering, 'pagination': 'cursor'})
+                ]
+                self.assertEqual(cursor_ids, page_ids)
+
+
+class KeysetCursorTests(CatalogAPITestCase):
+    """ Переходы по курсорам keyset-режима: равные значения, NULL в поле сортировки, курсор другой сортировки. """
+
+    PRICES = ['300000', '100000', '200000', '100000', '300000', '100000', '200000', '400000', '100000']
+    PRICES_PER_ARE = [None, '10000', None, '20000', '10000', None, '30000', '10000', None]
+
+    @classmethod
+    def setUpTestData(cls):
+        location = Location.objects.create(region='Республика Алтай', locality='Чемал')
+        cls.plots = [
+            create_plot(f'Участок {index}', location, price=Decimal(price), area=Decimal('0'))
+            for index, price in enumerate(cls.PRICES)
+        ]
+        for plot, price_per_are in zip(cls.plots, cls.PRICES_PER_ARE):
+            LandPlot.objects.filter(pk=plot.pk).update(price_per_are=price_per_are and Decimal(price_per_are))
+
+    def expected_ids(self, ordering):
+        field, descending = ordering.lstrip('-'), ordering.startswith('-')
+        values = {plot.pk: getattr(LandPlot.objects.get(pk=plot.pk), field) for plot in self.plots}
+        non_null = sorted((pk for pk in values if values[pk] is not None), key=lambda pk: (values[pk], pk), reverse=descending)
+        nulls = sorted((pk for pk in values if values[pk] is None), reverse=descending)
+        return non_null + nulls # NULL - в конце при любом направлении
+
+    def get_page(self, url, params=None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        data = response.json()
+        return [plot['id'] for plot in data['results']], data['next'], data['previous']
+
+    def walk(self, ordering, page_size):
+        """ Страницы вперед по next до конца, затем назад по previous до начала. """
+        forward = []
+        ids, next_url, previous_url = self.get_page(
+            LAND_PLOTS_URL, {'ordering': ordering, 'pagination': 'cursor', 'page_size': page_size},
+        )
+        self.assertIsNone(previous_url)
+        forward.append(ids)
+        while next_url:
+            ids, next_url, previous_url = self.get_page(next_url)
+            self.assertIsNotNone(previous_url)
+            forward.append(ids)
+        backward = [ids]
+        while previous_url:
+            ids, _, previous_url = self.get_page(previous_url)
+            backward.append(ids)
+        return forward, backward[::-1]
+
+    def test_cursor_round_trip(self):
+        for ordering in ('price', '-price', 'price_per_are', '-price_per_are', '-created_at'):
+            for page_size in (1, 4):
+                with self.subTest(ordering=ordering, page_size=page_size):
+                    forward, backward = self.walk(ordering, page_size)
+                    self.assertEqual([pk for page in forward for pk in page], self.expected_ids(ordering))
+                    self.assertEqual(backward, forward)
+                    self.assertTrue(all(len(page) == page_size for page in forward[:-1]))
+
+    def test_page_boundary_inside_equal_values(self):
+        # Четыре участка по 100000: граница страницы внутри группы равных цен решается по id
+        first, next_url, _ = self.get_page(LAND_PLOTS_URL, {'ordering': 'price', 'pagination': 'cursor', 'page_size': 2})
+        second, _, _ = self.get_page(next_url)
+        cheapest = sorted(plot.pk for plot in self.plots if plot.price == Decimal('100000'))
+        self.assertEqual(first + second, cheapest)
+
+    def test_nulls_follow_values_in_both_directions(self):
+        for ordering in ('price_per_are', '-price_per_are'):
+            with self.subTest(ordering=ordering):
+                forward, _ = self.walk(ordering, 3)
+                ids = [pk for page in forward for pk in page]
+                nulls = {plot.pk for plot, value in zip(self.plots, self.PRICES_PER_ARE) if value is None}
+                self.assertEqual(set(ids[-len(nulls):]), nulls)
+
+    def test_cursor_for_other_ordering_is_rejected(self):
+        _, next_url, _ = self.get_page(LAND_PLOTS_URL, {'ordering': 'price', 'pagination': 'cursor', 'page_size': 2})
+        cursor = parse_qs(urlsplit(next_url).query)['cursor'][0]
+        for ordering in ('-price', 'price_per_are', None):
+            with self.subTest(ordering=ordering):
+                params = {'cursor': cursor, **({'ordering': ordering} if ordering else {})}
+                response = self.client.get(LAND_PLOTS_URL, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('cursor', response.json())
+        self.assertEqual(self.client.get(LAND_PLOTS_URL, {'cursor': 'not-a-cursor'}).status_code, 404)
+
+
+class SearchIndexTests(TestCase):
+    """ FTS5-индекс: заполнение миграцией совпадает с индексацией сигналами, сбои индекса не ломают запись. """
+
+    @classmethod
+    def setUpTestData(cls):
+        chemal = Location.objects.create(region='Республика Алтай', locality='Чемал', address_line='ул. Пчелкина, 1')
+        belokurikha = Location.objects.create(region='Алтайский край', locality='Белокуриха')
+        cls.plot = create_plot('Участок у реки', chemal, description='Вид на Катунь', cadastral_numbers='04:05:010101:1')
+        create_plot('Участок без описания', belokurikha)
+        house = PropertyType.objects.create(name='Дом')
+        GenericProperty.objects.create(
+            property_type=house, title='Дом из бруса', description='Баня', location=chemal, price=Decimal('3000000'),
+            attributes={'material': 'брус', 'rooms': 3},
+        )
+        GenericProperty.objects.create(property_type=house, title='Дом', location=belokurikha, price=Decimal('1'), attributes=[])
+        NewsArticle.objects.create(title='Новости каталога', content='Новые участки в Чемале')
+
+    def index_rows(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT rowid, kind, object_id, title, body, location FROM {search.SEARCH_TABLE} ORDER BY rowid')
+            return [tuple(' '.join(str(value).split()) for value in row) for row in cursor.fetchall()]
+
+    def test_migration_backfill_matches_signal_indexing(self):
+        indexed = self.index_rows()
+        self.assertEqual(len(indexed), 5)
+        migration = import_module('catalog.migrations.0009_search_index')
+        # Без входа в контекст: редактор схемы SQLite не работает внутри транзакции теста
+        migration.create_search_index(django_apps, connection.schema_editor(atomic=False))
+        self.assertEqual(self.index_rows(), indexed)
+
+    def test_missing_index_table_does_not_break_writes(self):
+        with patch.object(search, 'SEARCH_TABLE', 'catalog_missing_search_index'), \
+                patch.object(search, 'search_index_available', return_value=True), \
+                self.assertLogs('catalog.search', 'ERROR'):
+            self.plot.title = 'Участок у Катуни'
+            self.plot.save()
+            self.plot.delete()
+        self.assertFalse(LandPlot.objects.filter(pk=self.plot.pk).exists())
+
+
+class CompiledSerializerTests(CompiledSerializerAssertions, TestCase):
+    """ Скомпилированные сериализаторы каталога совпадают с DRF, в т.ч. на строках Row страницы списка. """
+
+    @classmethod
+    def setUpTestData(cls):
+        chemal = Location.objects.create(
+            region='Республика Алтай', locality='Чемал', address_line='ул. Пчелкина, 1',
+            latitude=Decimal('51.41'), longitude=Decimal('86.00'),
+        )
+        no_coordinates = Location.objects.create(region='Алтайский край', locality='Белокуриха')
+        category = LandCategory.objects.create(name='Земли населенных пунктов')
+        water = Feature.objects.create(name='Вода', type='communication')
+        forest = Feature.objects.create(name='Лес рядом', type='plot_feature')
+        izhs = LandUseType.objects.create(name='ИЖС')
+        create_plot(
+            'Участок у реки', chemal, [water, forest], [izhs], land_category=category,
+            land_type='river', description='Ровный участок', cadastral_numbers='04:05:0101:1',
+        )
+        create_plot('Участок без категории', no_coordinates, price=Decimal('0'), listing_status='hidden')
+        LandPlot.objects.update(media_manifest=MEDIA_MANIFEST, media_count=1, cover_image='/media/landplots/photo.jpg')
+        flat = PropertyType.objects.create(name='Квартира', attribute_schema={
+            'properties': {'rooms': {'type': 'integer'}, 'area_sqm': {'type': 'number'}},
+        })
+        complex_ = GenericProperty.objects.create(property_type=flat, title='ЖК Алтай', location=chemal, price=Decimal('0'))
+        GenericProperty.objects.create(
+            property_type=flat, parent=complex_, title='Квартира 12', location=no_coordinates,
+            price=Decimal('4500000'), attributes={'rooms': 2, 'area_sqm': 54.5},
+        )
+
+    def test_land_plot_serializer(self):
+        queryset = LandPlot.objects.select_related('location', 'land_category').prefetch_related(
+            'land_use_types', 'features',
+        ).order_by('pk')
+        self.assertMatchesDRF(LandPlotSerializer, list(queryset))
+        self.assertMatchesDRF(LandPlotSerializer, list(as_rows(queryset)), list(queryset))
+
+    def test_generic_property_serializer(self):
+        queryset = GenericProperty.objects.select_related('property_type', 'location', 'parent').order_by('pk')
+        self.assertMatchesDRF(GenericPropertySerializer, list(queryset))
+        self.assertMatchesDRF(GenericPropertySerializer, list(as_rows(queryset)), list(queryset))
+
+
+@skipIf(columnar.np is None, 'numpy is not installed')
+class ColumnarEngineTests(TestCase):
+    """ Колоночный движок возвращает те же id и в том же порядке, что ORM-путь списка. """
+
+    @classmethod
+    def setUpTestData(cls):
+        chemal = Location.objects.create(region='Республика Алтай', locality='Чемал')
+        belokurikha = Location.objects.create(region='Алтайский край', locality='Белокуриха')
+        cls.categories = [LandCategory.objects.create(name=name) for name in ('ИЖС', 'Сельхоз')]
+        cls.features = [Feature.objects.create(name=name, type='communication') for name in ('Вода', 'Свет', 'Газ')]
+        cls.land_use_types = [LandUseType.objects.create(name=name) for name in ('ИЖС', 'ЛПХ')]
+        for index in range(12):
+            create_plot(
+                f'Участок {index}', chemal if index % 2 else belokurikha,
+                cls.features[:index % 4], cls.land_use_types[index % 2:],
+                price=Decimal(100000 * (index % 5 + 1)), area=Decimal(6 + index % 3),
+                land_category=cls.categories[index % 2] if index % 3 else None,
+                plot_status=('available', 'sold', 'reserved')[index % 3],
+                land_type='new_territory' if index % 4 == 0 else 'standard',
+                listing_status='hidden' if index == 11 else 'published',
+            )
+        flat = PropertyType.objects.create(name='Квартира', attribute_schema={'properties': {
+            'rooms': {'type': 'integer'}, 'material': {'type': 'string', 'enum': ['brick', 'wood']},
+            'has_balcony': {'type': 'boolean'},
+        }})
+        house = PropertyType.objects.create(name='Дом')
+        for index in range(10):
+            GenericProperty.objects.create(
+                property_type=flat if index % 3 else house, title=f'Объект {index}',
+                location=chemal if index % 2 else belokurikha, price=Decimal(1000000 + 50000 * (index % 4)),
+                listing_status='published',
+                attributes={'rooms': index % 4 + 1, 'material': 'brick' if index % 2 else 'wood', 'has_balcony': bool(index % 2)},
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+        # Свой экземпляр движка: общий движок воркера помнит таблицы других тестов
+        self.engines = {model: engine_class() for model, engine_class in columnar.ENGINE_CLASSES.items()}
+
+    def assertEngineMatchesORM(self, viewset_class, cases):
+        engine = self.engines[viewset_class.queryset.model]
+        for params in cases:
+            with self.subTest(viewset=viewset_class.__name__, params=params):
+                view = viewset_class(action_map={'get': 'list'}, format_kwarg=None, args=(), kwargs={})
+                view.request = request = view.initialize_request(self.factory.get('/', params))
+                matched, engine_ids, orm_ids = engine.verify(view, request, view.filter_queryset(view.get_queryset()))
+                self.assertIsNotNone(matched, 'query was not handled by the engine')
+                self.assertEqual(engine_ids, orm_ids)
+
+    def land_plot_cases(self):
+        feature_ids = ','.join(str(feature.pk) for feature in self.features[:2])
+        cases = [
+            {}, {'price_min': '300000'}, {'price_max': '200000', 'area_min': '7'},
+            {'plot_status': 'sold'}, {'land_type': 'new_territory'}, {'land_category': self.categories[0].pk},
+            {'features': feature_ids}, {'features': feature_ids, 'features_mode': 'all'},
+            {'land_use_types': ','.join(str(item.pk) for item in self.land_use_types), 'land_use_types_mode': 'all'},
+            {'location_region': 'респ'}, {'location_locality': 'Белокуриха'}, {'listing_status': 'published'},
+            {'features': self.features[2].pk, 'price_min': '200000', 'ordering': '-price'},
+        ]
+        cases += [
+            {'ordering': f'{sign}{field}'} for field in LandPlotViewSet.ordering_fields for sign in ('', '-')
+        ]
+        return cases
+
+    def property_cases(self):
+        cases = [
+            {}, {'property_type': 'kvartira'}, {'price_min': '1100000'},
+            {'attr_rooms_min': '2', 'attr_rooms_max': '3'}, {'attr_material': 'brick'},
+            {'attr_has_balcony': 'true', 'ordering': '-attr_rooms'}, {'location_region': 'Алтайский'},
+        ]
+        cases += [
+            {'ordering': f'{sign}{field}'} for field in GenericPropertyViewSet.ordering_fields for sign in ('', '-')
+        ]
+        return cases
+
+    def test_land_plots_match_orm(self):
+        self.assertEngineMatchesORM(LandPlotViewSet, self.land_plot_cases())
+
+    def test_properties_match_orm(self):
+        self.assertEngineMatchesORM(GenericPropertyViewSet, self.property_cases())
+
+    def test_incremental_refresh_matches_orm(self):
+        engine = self.engines[LandPlot]
+        self.assertEngineMatchesORM(LandPlotViewSet, [{}])
+        loaded = []
+        load_batch = engine.load_batch
+        engine.load_batch = lambda pks=None: loaded.append(pks) or load_batch(pks)
+
+        plots = list(LandPlot.objects.order_by('pk'))
+        plots[0].price = Decimal('999000')
+        plots[0].save()
+        plots[1].listing_status = 'hidden'
+        plots[1].save()
+        plots[2].features.add(self.features[2])
+        location = plots[3].location
+        location.region = 'Алтайский край' if location.region == 'Республика Алтай' else 'Республика Алтай'
+        location.save()
+        create_plot('Новый участок', plots[4].location, self.features[:1], price=Decimal('50000'))
+
+        self.assertEngineMatchesORM(LandPlotViewSet, self.land_plot_cases())
+        self.assertTrue(loaded)
+        self.assertNotIn(None, loaded, 'expected an incremental refresh, got a full reload')
+
+
+class PriceStatisticTests(TestCase):
+    """ Статистика цен: сохранение карточки только помечает срезы, пересчет совпадает с полной пересборкой. """
+
+    @classmethod
+    def setUpTestData(cls):
+        chemal = Location.objects.create(region='Республика Алтай', locality='Чемал')
+        cls.belokurikha = Location.objects.create(region='Алтайский край', locality='Белокуриха')
+        cls.plots = [
+            create_plot(f'Участок {index}', chemal if index % 2 else cls.belokurikha, price=Decimal(100000 * (index + 1)))
+            for index in range(6)
+        ]
+        house = PropertyType.objects.create(name='Дом')
+        cls.house = GenericProperty.objects.create(
+            property_type=house, title='Дом', location=chemal, price=Decimal('3000000'), listing_status='published',
+        )
+        price_stats.rebuild_price_statistics()
+
+    def statistics(self):
+        return list(PriceStatistic.objects.order_by('kind', 'region', 'locality', 'property_type').values(
+            *(field.name for field in PriceStatistic._meta.fields if field.name not in ('id', 'updated_at'))
+        ))
+
+    def change_listings(self):
+        self.plots[0].price = Decimal('950000')
+        self.plots[0].save()
+        self.plots[1].listing_status = 'hidden'
+        self.plots[1].save()
+        self.plots[2].delete()
+        self.house.location = self.belokurikha
+        self.house.save()
+        self.belokurikha.locality = 'Бийск'
+        self.belokurikha.save()
+
+    def test_saves_only_mark_slices_stale(self):
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            self.change_listings()
+        self.assertFalse([query['sql'] for query in queries if PriceStatistic._meta.db_table in query['sql']])
+        self.assertTrue(StalePriceStatistic.objects.filter(kind='land_plot', region='', locality='').exists())
+
+        self.assertTrue(price_stats.refresh_stale_statistics())
+        self.assertFalse(StalePriceStatistic.objects.exists())
+        refreshed = self.statistics()
+        price_stats.rebuild_price_statistics()
+        self.assertEqual(refreshed, self.statistics())
+
+    def test_rolled_back_changes_are_not_marked(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.change_listings()
+                transaction.set_rollback(True)
+        self.assertFalse(StalePriceStatistic.objects.exists())
+
+
+class SlugTests(TestCase):
+    """ Выбор slug: заполнение пропусков, пачки, обрезка, запасная основа и повтор при конфликте. """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.location = Location.objects.create(region='Республика Алтай', locality='Чемал')
+
+    def test_first_free_suffix_fills_gaps(self):
+        for slug in ('uchastok', 'uchastok-1', 'uchastok-3', 'uchastok-v-chemale'):
+            create_plot('Участок', self.location, slug=slug)
+        self.assertEqual(slugs.allocate_slug(LandPlot, 'Участок'), 'uchastok-2')
+        self.assertEqual(create_plot('Участок', self.location).slug, 'uchastok-2')
+        self.assertEqual(create_plot('Участок', self.location).slug, 'uchastok-4')
+
+    def test_batch_slugs_do_not_collide_with_suffixed_bases(self):
+        create_plot('Участок', self.location)
+        allocated = slugs.allocate_slugs(LandPlot, ['Участок 2', 'Участок', 'Участок', 'Участок'])
+        self.assertEqual(allocated, ['uchastok-2', 'uchastok-1', 'uchastok-3', 'uchastok-4'])
+        plots = slugs.assign_slugs(
+            [LandPlot(title=title, location=self.location, price=Decimal('1'), area=Decimal('1')) for title in ('Участок', 'Участок 1')],
+            'title',
+        )
+        self.assertEqual([plot.slug for plot in plots], ['uchastok-1', 'uchastok-1-1'])
+
+    def test_long_titles_are_truncated_to_fit_suffix(self):
+        name = 'Очень длинное название типа объекта ' * 10
+        max_length = PropertyType._meta.get_field('slug').max_length
+        types = [PropertyType.objects.create(name=f'{name}{index}') for index in range(3)]
+        self.assertEqual(types[0].slug, slugs.slugify(name)[:max_length - slugs.SUFFIX_RESERVE].strip('-'))
+        self.assertEqual(types[1].slug, f'{types[0].slug}-1')
+        for property_type in types:
+            self.assertLessEqual(len(property_type.slug), max_length)
+            self.assertFalse(property_type.slug.endswith('-'))
+
+    def test_fallback_for_titles_without_letters(self):
+        self.assertEqual(create_plot('!!! ???', self.location).slug, 'landplot')
+        self.assertEqual(create_plot('🏔', self.location).slug, 'landplot-1')
+        self.assertEqual(PropertyType.objects.create(name='***').slug, 'type')
+        house = PropertyType.objects.create(name='Дом')
+        prop = GenericProperty.objects.create(property_type=house, title='—', location=self.location, price=Decimal('1'))
+        self.assertEqual(prop.slug, 'dom')
+
+    def test_conflicting_insert_allocates_next_slug(self):
+        allocate_slug = slugs.allocate_slug
+
+        def allocate_and_take(model, *args, **kwargs):
+            slug = allocate_slug(model, *args, **kwargs)
+            if not calls:
+                # Параллельное сохранение занимает выбранный slug между выбором и вставкой
+                LandPlot.objects.bulk_create([
+                    LandPlot(title='Соседний', slug=slug, location=self.location, price=Decimal('1'), area=Decimal('1')),
+                ])
+            calls.append(slug)
+            return slug
+
+        def count_save(instance, **kwargs):
+            saves.append(instance.slug)
+
+        calls, saves = [], []
+        pre_save.connect(count_save, sender=LandPlot)
+        self.addCleanup(pre_save.disconnect, count_save, sender=LandPlot)
+        with patch.object(slugs, 'allocate_slug', side_effect=allocate_and_take):
+            plot = create_plot('Участок', self.location)
+        self.assertEqual(calls, ['uchastok', 'uchastok-1'])
+        self.assertEqual(len(saves), 1, 'only the insert is retried, not the signals')
+        self.assertEqual(plot.slug, 'uchastok-1')
+        self.assertTrue(CatalogListing.objects.filter(kind='land_plot', object_id=plot.pk, slug='uchastok-1').exists())
+
+    def test_integrity_error_from_signal_is_not_retried(self):
+        def failing_receiver(**kwargs):
+            raise IntegrityError('post_save receiver failed')
+
+        post_save.connect(failing_receiver, sender=PropertyType)
+        self.addCleanup(post_save.disconnect, failing_receiver, sender=PropertyType)
+        with patch.object(slugs, 'allocate_slug', wraps=slugs.allocate_slug) as allocate, \
+                self.assertRaisesMessage(IntegrityError, 'post_save receiver failed'):
+            PropertyType.objects.create(name='Дом')
+        self.assertEqual(allocate.call_count, 1)
+
+    def test_property_type_slugs_are_unique(self):
+        self.assertEqual(
+            [PropertyType.objects.create(name=name).slug for name in ('Дом', 'Дом!', 'ДОМ')], ['dom', 'dom-1', 'dom-2'],
+        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            PropertyType.objects.create(name='Коттедж', slug='dom')
+
+
+class GeoCoverTests(TestCase):
+    """ Покрытие рамок и кругов диапазонами geohash: антимеридиан, полюса и сверка с полным перебором. """
+
+    CENTERS = [(51.5, 86.0), (0.5, 179.8), (-10.0, -179.9), (89.6, 30.0), (-89.4, -120.0)]
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(20241017)
+        locations = []
+        for center_lat, center_lon in cls.CENTERS:
+            for _ in range(40):
+                lat = max(-90.0, min(90.0, center_lat + rng.uniform(-4, 4)))
+                lon = (center_lon + rng.uniform(-6, 6) + 180.0) % 360.0 - 180.0
+                location = Location(
+                    region='Тест', locality='Тест', latitude=Decimal(f'{lat:.6f}'), longitude=Decimal(f'{lon:.6f}'),
+                )
+                location.geohash = location.compute_geohash()
+                locations.append(location)
+        Location.objects.bulk_create(locations)
+        LandPlot.objects.bulk_create([
+            LandPlot(title='Участок', slug=f'uchastok-{location.pk}', location=location, price=Decimal('1'), area=Decimal('1'))
+            for location in Location.objects.all()
+        ])
+        cls.points = list(Location.objects.values_list('pk', 'latitude', 'longitude'))
+
+    def filtered_locations(self, params):
+        return set(LandPlotFilter(params, LandPlot.objects.all()).qs.values_list('location_id', flat=True))
+
+    def assertRangesCover(self, bbox, points):
+        ranges = geo.cover_ranges(bbox)
+        for lat, lon in points:
+            geohash = geo.encode_geohash(lat, lon)
+            self.assertTrue(any(start <= geohash < end for start, end in ranges), (bbox, lat, lon, ranges))
+
+    def test_split_bbox_across_antimeridian(self):
+        self.assertEqual(geo.split_bbox((170.0, -5.0, -170.0, 5.0)), [(170.0, -5.0, 180.0, 5.0), (-180.0, -5.0, -170.0, 5.0)])
+        self.assertEqual(geo.split_bbox((-10.0, -5.0, 10.0, 5.0)), [(-10.0, -5.0, 10.0, 5.0)])
+
+    def test_radius_bbox_wraps_antimeridian(self):
+        west, south, east, north = geo.radius_bbox(0.5, 179.8, 100)
+        self.assertGreater(west, east)
+        self.assertAlmostEqual(west, 179.8 - 100 / geo.KM_PER_DEGREE / math.cos(math.radians(north)), places=6)
+        self.assertAlmostEqual(east, 179.8 + 100 / geo.KM_PER_DEGREE / math.cos(math.radians(north)) - 360.0, places=6)
+        self.assertTrue(geo.in_bbox((west, south, east, north), 0.5, -179.5))
+        self.assertFalse(geo.in_bbox((west, south, east, north), 0.5, 0.0))
+
+    def test_radius_bbox_over_the_pole_covers_all_longitudes(self):
+        for lat, lon in ((89.6, 30.0), (-89.4, -120.0), (85.0, 0.0)):
+            with self.subTest(lat=lat):
+                west, south, east, north = geo.radius_bbox(lat, lon, 700)
+                self.assertEqual((west, east), (-180.0, 180.0))
+                self.assertTrue(-90.0 <= south < north <= 90.0)
+        self.assertEqual(geo.radius_bbox(89.6, 30.0, 100)[3], 90.0)
+
+    def test_cover_cells_respect_limit_and_precision(self):
+        for bbox in ((85.0, 50.0, 87.0, 52.0), (-180.0, -90.0, 180.0, 90.0), (179.0, 89.0, 180.0, 90.0), (86.0, 51.0, 86.0, 51.0)):
+            with self.subTest(bbox=bbox):
+                cells = geo.cover_cells(bbox)
+                self.assertLessEqual(len(cells), geo.MAX_COVER_CELLS)
+                self.assertEqual(len({len(cell) for cell in cells}), 1)
+        self.assertEqual(geo.cover_cells((86.0, 51.0, 86.0, 51.0)), [geo.encode_geohash(51.0, 86.0)])
+        self.assertEqual(len(geo.cover_cells((86.0, 51.0, 86.0, 51.0), max_precision=4)[0]), 4)
+
+    def test_adjacent_cells_merge_into_one_range(self):
+        self.assertEqual(geo.cover_ranges((-180.0, -90.0, 180.0, 90.0)), [('0', 'z{')])
+        # Ячейки "b" и "c" соседние в порядке geohash, "f" (граница -90 включается) - отдельно
+        self.assertEqual(geo.cover_ranges((-180.0, 45.0, -90.5, 90.0), max_precision=1), [('b', 'c{')])
+        self.assertEqual(geo.cover_cells((-180.0, 45.0, -90.0, 90.0), max_precision=1), ['b', 'c', 'f'])
+        self.assertEqual(geo.cover_ranges((-180.0, 45.0, -90.0, 90.0), max_precision=1), [('b', 'c{'), ('f', 'f{')])
+        for bbox in ((85.0, 50.0, 87.0, 52.0), (170.0, -5.0, 180.0, 5.0), (-180.0, -5.0, -170.0, 5.0)):
+            ranges = geo.cover_ranges(bbox)
+            self.assertEqual(ranges, sorted(ranges))
+            self.assertLessEqual(len(ranges), len(geo.cover_cells(bbox)))
+            for (_, end), (start, _) in zip(ranges, ranges[1:]):
+                self.assertNotEqual(geo._geohash_number(end[:-1]) + 1, geo._geohash_number(start))
+
+    def test_ranges_cover_points_in_bbox(self):
+        rng = random.Random(7)
+        for bbox in ((85.0, 50.0, 87.0, 52.0), (175.0, -3.0, -175.0, 3.0), (-180.0, 86.0, 180.0, 90.0), (-30.0, -90.0, 30.0, -85.0)):
+            with self.subTest(bbox=bbox):
+                west, south, east, north = bbox
+                span = (east - west) % 360.0 or 360.0
+                points = [(south, west), (north, east % 360.0 - 360.0 if east == 180.0 else east)] + [
+                    (rng.uniform(south, north), (west + rng.uniform(0, span) + 180.0) % 360.0 - 180.0) for _ in range(200)
+                ]
+                self.assertRangesCover(bbox, points)
+
+    def test_radius_filter_matches_haversine_scan(self):
+        for lat, lon in self.CENTERS:
+            for radius in (50, 300, 1000):
+                with self.subTest(lat=lat, lon=lon, radius=radius):
+                    expected = {
+                        pk for pk, point_lat, point_lon in self.points
+                        if geo.haversine_km(lat, lon, point_lat, point_lon) <= radius
+                    }
+                    found = self.filtered_locations({'lat': lat, 'lon': lon, 'radius_km': radius})
+                    self.assertEqual(found, expected)
+                    self.assertTrue(expected or radius == 50)
+
+    def test_bbox_filter_matches_scan(self):
+        for bbox in ((84.0, 49.0, 88.0, 53.0), (178.0, -15.0, -178.0, 5.0), (-180.0, 87.0, 180.0, 90.0), (-130.0, -90.0, -110.0, -86.0)):
+            with self.subTest(bbox=bbox):
+                expected = {pk for pk, lat, lon in self.points if geo.in_bbox(bbox, float(lat), float(lon))}
+                self.assertTrue(expected)
+                self.assertEqual(self.filtered_locations({'bbox': ','.join(map(str, bbox))}), expected)
+
+
+def square(west, south, size):
+    return [[west, south], [west + size, south], [west + size, south + size], [west, south + size], [west, south]]
+
+
+def star_ring(rng, center, radius, count):
+    """ Звездообразное кольцо со случайными радиусами лучей (невыпуклое, без самопересечений). """
+    lon, lat = center
+    ring = []
+    for index in range(count):
+        angle = 2 * math.pi * index / count
+        length = radius * rng.uniform(0.3, 1.0)
+        ring.append([lon + length * math.cos(angle), lat + length * math.sin(angle)])
+    return ring + [ring[0]]
+
+
+class GeometryTests(TestCase):
+    """ Разбор GeoJSON, упрощение колец и точка в полигоне (с numpy и без). """
+
+    POLYGON_WITH_HOLE = {'type': 'Polygon', 'coordinates': [square(0, 0, 10), square(4, 4, 2)]}
+    MULTIPOLYGON = {'type': 'MultiPolygon', 'coordinates': [[square(0, 0, 10), square(4, 4, 2)], [square(20, 20, 2)]]}
+
+    def test_point_in_polygon_with_holes(self):
+        for lon, lat, expected in ((1, 1, True), (5, 5, False), (7, 5, True), (11, 5, False), (-1, -1, False)):
+            with self.subTest(lon=lon, lat=lat):
+                self.assertIs(geometry.contains_point(self.POLYGON_WITH_HOLE, lon, lat), expected)
+
+    def test_point_in_multipolygon(self):
+        for lon, lat, expected in ((1, 1, True), (5, 5, False), (21, 21, True), (15, 15, False), (21, 23, False)):
+            with self.subTest(lon=lon, lat=lat):
+                self.assertIs(geometry.contains_point(self.MULTIPOLYGON, lon, lat), expected)
+
+    @skipIf(geometry.np is None, 'numpy is not installed')
+    def test_numpy_matches_pure_python(self):
+        rng = random.Random(16)
+        rings = [star_ring(rng, (86.0, 51.0), 0.01, count) for count in (5, 40, 500)]
+        points = [(86.0 + rng.uniform(-0.012, 0.012), 51.0 + rng.uniform(-0.012, 0.012)) for _ in range(300)]
+        tolerances = [geometry.zoom_tolerance(zoom) for zoom in (*geometry.SIMPLIFY_ZOOMS, 18)]
+
+        def evaluate():
+            return (
+                [geometry.contains_point({'type': 'Polygon', 'coordinates': [ring]}, *point) for ring in rings for point in points],
+                [geometry.simplify_ring(ring, tolerance) for ring in rings for tolerance in tolerances],
+            )
+
+        with_numpy = evaluate()
+        with patch.object(geometry, 'np', None):
+            self.assertEqual(evaluate(), with_numpy)
+        self.assertTrue(any(with_numpy[0]) and not all(with_numpy[0]))
+
+    def test_simplified_rings_keep_three_distinct_points(self):
+        rng = random.Random(3)
+        rings = [square(86.0, 51.0, 0.0001), star_ring(rng, (86.0, 51.0), 0.0001, 200), [[0, 0], [1, 0], [2, 0.0001], [1, 1], [0, 0]]]
+        for ring in rings:
+            for tolerance in (geometry.zoom_tolerance(0), 10.0, 1000.0):
+                with self.subTest(points=len(ring), tolerance=tolerance):
+                    simplified = geometry.simplify_ring(ring, tolerance)
+                    self.assertEqual(simplified[0], simplified[-1])
+                    self.assertGreaterEqual(len({tuple(point) for point in simplified[:-1]}), 3)
+                    self.assertLessEqual(len(simplified), len(ring))
+        detailed = star_ring(rng, (86.0, 51.0), 0.01, 500)
+        self.assertEqual(geometry.simplify_ring(detailed, 0), detailed)
+        self.assertLess(len(geometry.simplify_ring(detailed, geometry.zoom_tolerance(13))), len(detailed))
+
+    def test_simplify_drops_collapsed_holes(self):
+        simplified = geometry.simplify_geometry(self.POLYGON_WITH_HOLE, 3.0)
+        self.assertEqual(len(simplified['coordinates']), 1)
+        self.assertEqual(len(geometry.simplify_geometry(self.POLYGON_WITH_HOLE, 1.0)['coordinates']), 2)
+
+    def test_normalize_closes_rings_and_unwraps_features(self):
+        open_ring = square(0, 0, 1)[:-1]
+        normalized = geometry.normalize_geometry({'type': 'Feature', 'geometry': {'type': 'Polygon', 'coordinates': [open_ring]}})
+        self.assertEqual(normalized, {'type': 'Polygon', 'coordinates': [square(0, 0, 1)]})
+        self.assertIsNone(geometry.normalize_geometry({}))
+
+    def test_invalid_geojson_is_rejected(self):
+        invalid = [
+            [[0, 0], [1, 1]],
+            {'type': 'Point', 'coordinates': [0, 0]},
+            {'type': 'Polygon', 'coordinates': []},
+            {'type': 'Polygon', 'coordinates': [[[0, 0], [1, 0], [0, 0]]]},
+            {'type': 'Polygon', 'coordinates': [[[0, 0], [1, 0], [1, 'x'], [0, 0]]]},
+            {'type': 'Polygon', 'coordinates': [[[0, 0], [181, 0], [1, 1], [0, 0]]]},
+            {'type': 'Polygon', 'coordinates': [[[0, 0], [1, 0], [float('nan'), 1], [0, 0]]]},
+            {'type': 'MultiPolygon', 'coordinates': [[]]},
+            {'type': 'Polygon', 'coordinates': [[[0, 0], [1, 0], [1, 1]] * 7000]},
+        ]
+        for value in invalid:
+            with self.subTest(value=str(value)[:60]):
+                with self.assertRaises(geometry.GeometryError):
+                    geometry.normalize_geometry(value)
+                serializer = LandPlotSerializer(data={'boundary': value}, partial=True)
+                self.assertFalse(serializer.is_valid())
+                self.assertIn('boundary', serializer.errors)
+
+
+class BoundaryAPITests(CatalogAPITestCase):
+    """ ?locate и ?boundaries: предварительный отбор по рамке границы, в том числе через антимеридиан. """
+
+    @classmethod
+    def setUpTestData(cls):
+        location = Location.objects.create(region='Республика Алтай', locality='Чемал')
+        cls.with_hole = create_plot('С дырой', location, boundary=GeometryTests.POLYGON_WITH_HOLE)
+        cls.multi = create_plot('Из двух частей', location, boundary={
+            'type': 'MultiPolygon', 'coordinates': [[square(30, 0, 2)], [square(40, 0, 2)]],
+        })
+        cls.triangle = create_plot('Треугольник', location, boundary={
+            'type': 'Polygon', 'coordinates': [[[50, 0], [52, 0], [50, 2], [50, 0]]],
+        })
+        cls.east = create_plot('У антимеридиана (восток)', location, boundary={'type': 'Polygon', 'coordinates': [square(179.2, 0, 0.5)]})
+        cls.west = create_plot('У антимеридиана (запад)', location, boundary={'type': 'Polygon', 'coordinates': [square(-179.7, 0, 0.5)]})
+        create_plot('Без границы', location)
+        create_plot('Снят с публикации', location, boundary={'type': 'Polygon', 'coordinates': [square(0, 0, 10)]}, listing_status='hidden')
+
+    def locate(self, lon, lat):
+        response = self.client.get(f'{LAND_PLOTS_URL}locate/', {'lat': lat, 'lon': lon})
+        self.assertEqual(response.status_code, 200, response.content)
+        return [plot['id'] for plot in response.json()]
+
+    def boundaries(self, params):
+        response = self.client.get(f'{LAND_PLOTS_URL}boundaries/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['features']
+
+    def test_locate_checks_polygon_after_bbox(self):
+        self.assertEqual(self.locate(1, 1), [self.with_hole.pk])
+        self.assertEqual(self.locate(5, 5), [])
+        self.assertEqual(self.locate(41, 1), [self.multi.pk])
+        self.assertEqual(self.locate(36, 1), [])
+        self.assertEqual(self.locate(50.5, 0.5), [self.triangle.pk])
+        self.assertEqual(self.locate(51.8, 1.8), [])
+        self.assertEqual(self.locate(179.5, 0.2), [self.east.pk])
+        self.assertEqual(self.locate(-179.5, 0.2), [self.west.pk])
+
+    def test_boundaries_bbox_across_antimeridian(self):
+        features = self.boundaries({'bbox': '179,-1,-179,1'})
+        self.assertEqual(sorted(feature['id'] for feature in features), sorted([self.east.pk, self.west.pk]))
+        features = self.boundaries({'bbox': '179.5,-1,-179.5,1'})
+        self.assertEqual(sorted(feature['id'] for feature in features), sorted([self.east.pk, self.west.pk]))
+        self.assertEqual([feature['id'] for feature in self.boundaries({'bbox': '179.5,-1,-179.9,1'})], [self.east.pk])
+        self.assertEqual([feature['id'] for feature in self.boundaries({'bbox': '35,-1,45,1'})], [self.multi.pk])
+        self.assertEqual(len(self.boundaries({})), 5)
+
+    def test_boundaries_use_simplified_geometry_for_zoom(self):
+        feature, = self.boundaries({'bbox': '-1,-1,11,11', 'zoom': 10})
+        self.assertEqual(feature['geometry'], self.with_hole.boundary_simplified['10'])
+        feature, = self.boundaries({'bbox': '-1,-1,11,11'})
+        self.assertEqual(feature['geometry'], self.with_hole.boundary)
+        self.assertEqual(feature['bbox'], [0, 0, 10, 10])
+
+
+class PropertyHierarchyTests(TestCase):
+    """ Closure-таблица и агрегаты поддерева после переносов и удалений совпадают с полной пересборкой. """
+
+    @classmethod
+    def setUpTestData(cls):
+        location = Location.objects.create(region='Республика Алтай', locality='Чемал')
+        property_type = PropertyType.objects.create(name='Дом')
+
+        def create(title, parent=None, price='1000000', listing_status='published'):
+            return GenericProperty.objects.create(
+                property_type=property_type, title=title, location=location, parent=parent,
+                price=Decimal(price), listing_status=listing_status,
+            )
+
+        cls.complex = create('Комплекс', price='0')
+        cls.building = create('Корпус', cls.complex, price='0', listing_status='hidden')
+        cls.flat = create('Квартира 1', cls.building, price='3500000')
+        cls.sold_flat = create('Квартира 2', cls.building, price='4200000', listing_status='sold')
+        cls.cottage = create('Коттедж', cls.complex, price='9000000')
+        cls.village = create('Поселок', price='0')
+        cls.house = create('Дом в поселке', cls.village, price='5000000', listing_status='reserved')
+
+    def snapshot(self):
+        links = set(PropertyHierarchy.objects.values_list('ancestor_id', 'descendant_id', 'depth'))
+        aggregates = {values.pop('pk'): values for values in GenericProperty.objects.values('pk', *hierarchy.AGGREGATE_FIELDS)}
+        return links, aggregates
+
+    def assertMatchesRebuild(self):
+        maintained = self.snapshot()
+        hierarchy.rebuild_hierarchy()
+        self.assertEqual(maintained, self.snapshot())
+
+    def move(self, prop, parent):
+        prop.refresh_from_db()
+        prop.parent = parent
+        prop.save()
+
+    def test_initial_tree_matches_rebuild(self):
+        self.assertMatchesRebuild()
+        self.complex.refresh_from_db()
+        self.assertEqual((self.complex.children_count, self.complex.descendant_count), (2, 4))
+        self.assertEqual(
+            (self.complex.descendant_price_min, self.complex.descendant_price_max), (Decimal('3500000'), Decimal('9000000')),
+        )
+        self.assertEqual(self.complex.descendant_status_counts, {'hidden': 1, 'published': 2, 'sold': 1})
+
+    def test_moves_match_rebuild(self):
+        self.move(self.building, self.village)
+        self.assertMatchesRebuild()
+        self.move(self.building, None)
+        self.assertMatchesRebuild()
+        self.move(self.village, self.flat)
+        self.assertMatchesRebuild()
+        self.assertEqual(
+            PropertyHierarchy.objects.get(ancestor=self.building, descendant=self.house).depth, 3,
+        )
+
+    def test_descendant_changes_match_rebuild(self):
+        self.flat.price = Decimal('100000')
+        self.flat.save()
+        self.sold_flat.listing_status = 'published'
+        self.sold_flat.save()
+        self.assertMatchesRebuild()
+        self.complex.refresh_from_db()
+        self.assertEqual(self.complex.descendant_price_min, Decimal('100000'))
+
+    def test_deletes_match_rebuild(self):
+        self.flat.delete()
+        self.assertMatchesRebuild()
+        self.building.delete() # Вместе с дочерней квартирой (CASCADE)
+        self.assertMatchesRebuild()
+        self.complex.refresh_from_db()
+        self.assertEqual((self.complex.children_count, self.complex.descendant_count), (1, 1))
+
+    def test_cycles_are_rejected(self):
+        before = self.snapshot()
+        for parent in (self.complex, self.building, self.flat):
+            with self.subTest(parent=parent.title):
+                self.complex.refresh_from_db()
+                self.complex.parent = parent
+                with self.assertRaises(hierarchy.HierarchyCycleError), transaction.atomic():
+                    self.complex.save()
+                with self.assertRaises(ValidationError):
+                    self.complex.clean()
+                serializer = GenericPropertySerializer(self.complex, data={'parent_id': parent.pk}, partial=True)
+                self.assertFalse(serializer.is_valid())
+                self.assertIn('parent_id', serializer.errors)
+        self.assertEqual(self.snapshot(), before)
+        self.move(self.building, self.cottage)
+        self.assertMatchesRebuild()
+
+
+class TrigramFilterTests(TestCase):
+    """ Нечеткий поиск: частые слова запроса не расширяют выдачу, фильтр получает ограниченный список id. """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.location = Location.objects.create(region='Республика Алтай', locality='Чемал')
+        LandPlot.objects.bulk_create([
+            LandPlot(
+                title=f'Участок у реки {index}', slug=f'uchastok-{index}', location=cls.location,
+                price=Decimal('1'), area=Decimal('1'), listing_status='published',
+            )
+            for index in range(trigram.MAX_MATCH_IDS + 100)
+        ])
+        cls.chemal = create_plot('Участок в Чемале', cls.location)
+
+    def setUp(self):
+        # Индексы процесса строятся заново по данным теста
+        registry = patch.dict(trigram._registry, clear=True)
+        registry.start()
+        self.addCleanup(registry.stop)
+
+    def test_common_words_are_ignored_next_to_selective_ones(self):
+        index = trigram.TrigramIndex([
+            *((pk, f'Республика Алтай {name}') for pk, name in enumerate(('Чемал', 'Эликманар', 'Манжерок', 'Усть-Сема'), 1)),
+            (5, 'Алтайский край Белокуриха'),
+        ])
+        self.assertEqual([pk for pk, _ in index.search('Республика Чемал')], [1])
+        self.assertEqual([pk for pk, _ in index.search('республика алтай чимал')], [1])
+        self.assertEqual(len(index.search('Республика Алтай')), 5)
+
+    def test_match_ids_are_capped(self):
+        index = trigram.get_index('land_plot_title')
+        self.assertEqual(len(index.search('участок')), LandPlot.objects.count())
+        self.assertEqual(len(index.match_ids('участок')), trigram.MAX_MATCH_IDS)
+        self.assertEqual(len(index.match_ids('участок', limit=10)), 10)
+
+    def test_filter_binds_at_most_max_match_ids(self):
+        self.assertEqual(LandPlotFilter({'title_fuzzy': 'участок'}, LandPlot.objects.all()).qs.count(), trigram.MAX_MATCH_IDS)
+        titles = LandPlotFilter({'title_fuzzy': 'участок чемале'}, LandPlot.objects.all()).qs.values_list('title', flat=True)
+        self.assertEqual(list(titles), ['Участок в Чемале'])
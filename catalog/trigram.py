@@ -0,0 +1,185 @@
+"""
+Нечеткий (устойчивый к опечаткам) поиск по триграммам для названий мест и заголовков объявлений.
+
+Индекс строится в памяти процесса (по аналогии с pg_trgm): каждое слово дополняется
+пробелами ("  чемал ") и раскладывается на триграммы, по ним строится инвертированный индекс
+триграмма -> слова словаря. Сходство слов - коэффициент Дайса по триграммам,
+сходство документа - среднее по словам запроса лучших совпадений среди слов документа.
+"Чемал", "чемальский" и "Чимал" находят одни и те же населенные пункты.
+Слова запроса, похожие на большую часть индекса, не учитываются, если есть более избирательные,
+а фильтр получает не больше MAX_MATCH_IDS лучших id.
+
+Индекс пересобирается лениво, когда меняется поколение исходных моделей (catalog.caching).
+"""
+import re
+import threading
+from collections import Counter, defaultdict
+
+from .caching import get_generations
+
+DEFAULT_THRESHOLD = 0.3
+# Кандидат должен разделять с словом запроса хотя бы столько триграмм
+MIN_SHARED_TRIGRAMS = 2
+# Слово запроса, похожее на большую долю документов индекса, не учитывается (если есть другие слова)
+COMMON_WORD_SHARE = 0.5
+# Сколько лучших id отдает match_ids: столько значений попадает в условие id IN (...) фильтра
+MAX_MATCH_IDS = 1000
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize(text):
+    return (text or '').lower().replace('ё', 'е')
+
+
+def split_words(text):
+    return _WORD_RE.findall(normalize(text))
+
+
+def word_trigrams(word):
+    """ Множество триграмм слова, как в pg_trgm: два пробела в начале, один в конце. """
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a, b):
+    """ Сходство двух строк по лучшим совпадениям слов (0..1). """
+    words_a, words_b = split_words(a), split_words(b)
+    if not words_a or not words_b:
+        return 0.0
+    trigrams_b = [word_trigrams(word) for word in words_b]
+    total = 0.0
+    for word in words_a:
+        grams = word_trigrams(word)
+        total += max(2 * len(grams & other) / (len(grams) + len(other)) for other in trigrams_b)
+    return total / len(words_a)
+
+
+class TrigramIndex:
+    """ Инвертированный индекс триграмм по документам [(id, text)]. """
+
+    def __init__(self, documents):
+        self.vocabulary = [] # слово -> позиция
+        self.word_grams = [] # позиция -> количество триграмм слова
+        self.word_documents = [] # позиция -> id документов со словом
+        self.postings = defaultdict(list) # триграмма -> позиции слов
+        positions = {}
+        for doc_id, text in documents:
+            for word in set(split_words(text)):
+                position = positions.get(word)
+                if position is None:
+                    position = positions[word] = len(self.vocabulary)
+                    grams = word_trigrams(word)
+                    self.vocabulary.append(word)
+                    self.word_grams.append(len(grams))
+                    self.word_documents.append([])
+                    for gram in grams:
+                        self.postings[gram].append(position)
+                self.word_documents[position].append(doc_id)
+        self.size = len({doc_id for doc_id, _ in documents}) if documents else 0
+
+    def _match_word(self, word):
+        """ {позиция слова словаря: сходство} для одного слова запроса. """
+        grams = word_trigrams(word)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        minimum = min(MIN_SHARED_TRIGRAMS, len(grams))
+        return {
+            position: 2 * count / (len(grams) + self.word_grams[position])
+            for position, count in shared.items() if count >= minimum
+        }
+
+    def search(self, text, threshold=DEFAULT_THRESHOLD, limit=None):
+        """ [(id, сходство)] по убыванию сходства, не ниже threshold. """
+        words = split_words(text)
+        if not words:
+            return []
+        matches = []
+        for word in words:
+            best = {}
+            for position, score in self._match_word(word).items():
+                for doc_id in self.word_documents[position]:
+                    if score > best.get(doc_id, 0.0):
+                        best[doc_id] = score
+            matches.append(best)
+        # Слова, похожие на большую часть документов ("республика", "участок"), почти не сужают выдачу:
+        # если в запросе есть более избирательные слова, ищем по ним
+        selective = [best for best in matches if len(best) <= COMMON_WORD_SHARE * self.size]
+        if selective:
+            matches = selective
+        scores = defaultdict(float)
+        for best in matches:
+            for doc_id, score in best.items():
+                scores[doc_id] += score
+        hits = [
+            (doc_id, round(total / len(matches), 4))
+            for doc_id, total in scores.items() if total / len(matches) >= threshold
+        ]
+        hits.sort(key=lambda hit: (-hit[1], hit[0]))
+        return hits[:limit] if limit else hits
+
+
+class GenerationalTrigramIndex:
+    """
+    Индекс, который пересобирается при смене поколения моделей-источников.
+    loader возвращает документы [(id, text)] текущего состояния БД.
+    """
+
+    def __init__(self, loader, models):
+        self.loader = loader
+        self.models = models
+        self._lock = threading.Lock()
+        self._index = None
+        self._generations = None
+
+    def get(self):
+        generations = get_generations(*self.models)
+        if self._index is None or generations != self._generations:
+            with self._lock:
+                if self._index is None or generations != self._generations:
+                    self._index = TrigramIndex(list(self.loader()))
+                    self._generations = generations
+        return self._index
+
+    def search(self, text, threshold=DEFAULT_THRESHOLD, limit=None):
+        return self.get().search(text, threshold=threshold, limit=limit)
+
+    def match_ids(self, text, threshold=DEFAULT_THRESHOLD, limit=MAX_MATCH_IDS):
+        """ id лучших совпадений (не больше limit) - для фильтра id__in. """
+        return [doc_id for doc_id, _ in self.search(text, threshold=threshold, limit=limit)]
+
+
+def _location_documents():
+    from .models import Location
+    for pk, region, locality in Location.objects.values_list('pk', 'region', 'locality').iterator():
+        yield pk, f'{region} {locality}'
+
+
+def _title_loader(model_name):
+    def load():
+        from . import models
+        yield from getattr(models, model_name).objects.values_list('pk', 'title').iterator()
+    return load
+
+
+def _indexes():
+    from .models import GenericProperty, LandPlot, Location
+    return {
+        'location': GenerationalTrigramIndex(_location_documents, [Location]),
+        'land_plot_title': GenerationalTrigramIndex(_title_loader('LandPlot'), [LandPlot]),
+        'property_title': GenerationalTrigramIndex(_title_loader('GenericProperty'), [GenericProperty]),
+    }
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def get_index(name):
+    """ Индекс процесса по имени: location, land_plot_title, property_title. """
+    if not _registry:
+        with _registry_lock:
+            if not _registry:
+                _registry.update(_indexes())
+    return _registry[name]
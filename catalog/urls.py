@@ -3,7 +3,8 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     LocationViewSet, FeatureViewSet, LandUseTypeViewSet,
     LandCategoryViewSet, MediaFileViewSet, LandPlotViewSet,
-    PropertyTypeViewSet, GenericPropertyViewSet
+    PropertyTypeViewSet, GenericPropertyViewSet, CatalogListingViewSet, MapViewSet,
+    PriceStatisticViewSet
 )
 
 router = DefaultRouter()
@@ -24,6 +25,15 @@ router.register(r'land-plots', LandPlotViewSet, basename='land-plot') # Реги
 router.register(r'property-types', PropertyTypeViewSet, basename='property-type')
 router.register(r'properties', GenericPropertyViewSet, basename='property')
 
+# Общая лента (денормализованная проекция участков и объектов)
+router.register(r'listings', CatalogListingViewSet, basename='catalog-listing')
+
+# Карта: кластеры по ячейкам geohash (GET /map/clusters/?bbox=&zoom=)
+router.register(r'map', MapViewSet, basename='map')
+
+# Статистика цен по регионам, населенным пунктам и типам объектов
+router.register(r'price-statistics', PriceStatisticViewSet, basename='price-statistic')
+
 urlpatterns = [
     path('', include(router.urls)),
     # Можно добавить вложенные роуты, если нужно, например:
@@ -1,25 +1,44 @@
 from django.shortcuts import render
 from rest_framework import viewsets, permissions
-from drf_spectacular.utils import extend_schema, extend_schema_view
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.exceptions import NotFound
+from django.db.models import Q
+from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter, OpenApiTypes
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
 
 # Импортируем наши кастомные фильтры
-from .filters import LandPlotFilter, GenericPropertyFilter
+from .filters import LandPlotFilter, GenericPropertyFilter, CatalogListingFilter, PriceStatisticFilter, AttributeOrderingFilter, DistanceOrderingFilter
+from .pagination import CachedCountPagination
+from .fieldsets import SPARSE_FIELDSET_PARAMETERS, SparseFieldsetViewSetMixin
+from .trigram import get_index
+from .dynamic_filters import PropertyTypeFilterBackend
+from .facets import Facet, FacetedViewSetMixin
+from .columnar import ColumnarListMixin
+from .rows import RowListMixin
+from .similar import SimilarListingsMixin
+from .caching import ConditionalGetMixin, ResponseCacheMixin
+from . import clusters, geometry, hierarchy
+from .search import KIND_LAND_PLOT, KIND_PROPERTY, FullTextSearchFilter
 
 # Исправляем импорты моделей
 from .models import (
     Location, Feature, LandUseType, LandCategory, MediaFile, LandPlot,
-    PropertyType, GenericProperty # Добавляем новые
+    PropertyType, GenericProperty, # Добавляем новые
+    CatalogListing, MapCell, PriceStatistic
     # ListingComplex, ListingUnit # Убираем старые
 )
 
 # Исправляем импорты сериализаторов
 from .serializers import (
-    LocationSerializer, FeatureSerializer, LandUseTypeSerializer,
+    LocationSerializer, LocationSuggestionSerializer, FeatureSerializer, LandUseTypeSerializer,
     LandCategorySerializer, MediaFileSerializer, LandPlotSerializer,
     # ListingComplexSerializer, ListingUnitSerializer # Убираем старые
-    PropertyTypeSerializer, GenericPropertySerializer # TODO: Создать эти сериализаторы
+    PropertyTypeSerializer, GenericPropertySerializer, # TODO: Создать эти сериализаторы
+    CatalogListingSerializer, PriceStatisticSerializer, FacetsSerializer,
+    MapClustersQuerySerializer, MapClustersSerializer,
+    PlotLocateQuerySerializer, BoundaryQuerySerializer, LandPlotBoundarySerializer, SimilarQuerySerializer
 )
 
 # --- Кастомные классы разрешений --- #
@@ -35,27 +54,57 @@ class IsAdminOrReadOnly(permissions.BasePermission):
         # Для остальных методов требуем права стаффа (админа)
         return request.user and request.user.is_staff
 
+# --- Общая база вьюсетов объявлений --- #
+
+class ListingViewSetMixin(ResponseCacheMixin, ConditionalGetMixin, ColumnarListMixin, FacetedViewSetMixin,
+                          SimilarListingsMixin, RowListMixin, SparseFieldsetViewSetMixin):
+    """
+    Общий набор миксинов для вьюсетов участков и объектов: кэш ответов и условные GET,
+    колоночный движок и строки для списков, фасеты, похожие объявления, ?fields=/?omit=.
+    Порядок важен: ResponseCacheMixin оборачивает dispatch и должен идти первым.
+    """
+
 @extend_schema_view(
     list=extend_schema(summary="Получить список местоположений"),
     retrieve=extend_schema(summary="Получить детали местоположения")
 )
 @extend_schema(tags=['Объявления - Справочники'])
-class LocationViewSet(viewsets.ModelViewSet):
+class LocationViewSet(ResponseCacheMixin, viewsets.ModelViewSet):
     """API для просмотра местоположений."""
+    response_cache_dependencies = [Location]
     queryset = Location.objects.all()
     serializer_class = LocationSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ["region", "locality", "address_line"]
     ordering_fields = ["region", "locality"]
+    suggest_limit = 10
+
+    @extend_schema(
+        summary="Подсказки местоположений с учетом опечаток",
+        parameters=[OpenApiParameter("q", OpenApiTypes.STR, OpenApiParameter.QUERY, required=True,
+                                     description="Название региона или населенного пункта, например: Чимал")],
+        responses=LocationSuggestionSerializer(many=True),
+    )
+    @action(detail=False, methods=["get"])
+    def suggest(self, request):
+        """ Нечеткий поиск по триграммному индексу: "Чемал", "чемальский", "Чимал" дают один результат. """
+        hits = get_index("location").search(request.query_params.get("q", ""), limit=self.suggest_limit)
+        locations = Location.objects.in_bulk([location_id for location_id, _ in hits])
+        for location_id, score in hits:
+            if location_id in locations:
+                locations[location_id].similarity = score
+        results = [locations[location_id] for location_id, _ in hits if location_id in locations]
+        return Response(LocationSuggestionSerializer(results, many=True).data)
 
 @extend_schema_view(
     list=extend_schema(summary="Получить список характеристик/особенностей"),
     retrieve=extend_schema(summary="Получить детали характеристики/особенности")
 )
 @extend_schema(tags=['Объявления - Справочники'])
-class FeatureViewSet(viewsets.ModelViewSet):
+class FeatureViewSet(ResponseCacheMixin, viewsets.ModelViewSet):
     """API для просмотра характеристик/особенностей (коммуникации, инфраструктура и т.д.)."""
+    response_cache_dependencies = [Feature]
     queryset = Feature.objects.all()
     serializer_class = FeatureSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
@@ -69,8 +118,9 @@ class FeatureViewSet(viewsets.ModelViewSet):
     retrieve=extend_schema(summary="Получить детали ВРИ")
 )
 @extend_schema(tags=['Объявления - Справочники'])
-class LandUseTypeViewSet(viewsets.ReadOnlyModelViewSet):
+class LandUseTypeViewSet(ResponseCacheMixin, viewsets.ReadOnlyModelViewSet):
     """API для просмотра видов разрешенного использования (ВРИ)."""
+    response_cache_dependencies = [LandUseType]
     queryset = LandUseType.objects.all()
     serializer_class = LandUseTypeSerializer
     permission_classes = [permissions.AllowAny]
@@ -80,8 +130,9 @@ class LandUseTypeViewSet(viewsets.ReadOnlyModelViewSet):
     retrieve=extend_schema(summary="Получить детали категории земель")
 )
 @extend_schema(tags=['Объявления - Справочники'])
-class LandCategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class LandCategoryViewSet(ResponseCacheMixin, viewsets.ReadOnlyModelViewSet):
     """API для просмотра категорий земель."""
+    response_cache_dependencies = [LandCategory]
     queryset = LandCategory.objects.all()
     serializer_class = LandCategorySerializer
     permission_classes = [permissions.AllowAny]
@@ -124,79 +175,184 @@ class MediaFileViewSet(viewsets.ModelViewSet):
         return context
 
 @extend_schema_view(
-    list=extend_schema(summary="Получить список земельных участков"),
-    retrieve=extend_schema(summary="Получить детали земельного участка"),
+    list=extend_schema(summary="Получить список земельных участков", parameters=SPARSE_FIELDSET_PARAMETERS),
+    retrieve=extend_schema(summary="Получить детали земельного участка", parameters=SPARSE_FIELDSET_PARAMETERS),
     create=extend_schema(summary="Создать объявление о земельном участке"),
     update=extend_schema(summary="Обновить объявление (полностью)"),
     partial_update=extend_schema(summary="Обновить объявление (частично)"),
     destroy=extend_schema(summary="Удалить объявление")
 )
 @extend_schema(tags=['Объявления - Земельные участки'])
-class LandPlotViewSet(viewsets.ModelViewSet):
+class LandPlotViewSet(ListingViewSetMixin, viewsets.ModelViewSet):
     """
     API для управления объявлениями о земельных участках.
     Поддерживает фильтрацию по диапазонам цены/площади, типу, статусу, ВРИ, характеристикам, местоположению.
-    Поддерживает поиск по заголовку, описанию, региону, населенному пункту.
+    Поддерживает полнотекстовый поиск по заголовку, описанию, кадастровым номерам и адресу.
     Поддерживает сортировку по цене, площади, дате создания.
     """
     queryset = LandPlot.objects.select_related(
         'location', 'land_category'
     ).prefetch_related(
-        'land_use_types', 'features', 'media_files'
+        'land_use_types', 'features' # Медиа берутся из media_manifest, без prefetch
     ).filter(listing_status='published') # По умолчанию показываем только опубликованные
     serializer_class = LandPlotSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = CachedCountPagination # ?pagination=cursor включает keyset-режим без COUNT(*)
+    cache_dependencies = [LandPlot, Location] # Модели, изменение которых сбрасывает кэш количеств
+    # Кэш ответов анонимным клиентам: сам участок, справочники в его ответе и медиа
+    response_cache_dependencies = [LandPlot, Location, LandCategory, LandUseType, Feature, MediaFile]
     lookup_field = 'slug'
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, DistanceOrderingFilter] # ?ordering=distance
     filterset_class = LandPlotFilter
+    search_index_kind = KIND_LAND_PLOT # Документы FTS-индекса; search_fields - запасной LIKE-поиск
     search_fields = ["title", "description", "cadastral_numbers", "location__locality", "location__address_line"]
     ordering_fields = ["created_at", "updated_at", "price", "area", "price_per_are", "view_count"]
     ordering = ["-created_at"]
+    boundaries_limit = 500
+    facet_definitions = (
+        Facet("land_category", param="land_category", column="land_category_id", label_model=LandCategory),
+        Facet("land_use_types", param="land_use_types", m2m="land_use_types", label_model=LandUseType,
+              mode_param="land_use_types_mode"),
+        Facet("features", param="features", m2m="features", label_model=Feature, mode_param="features_mode"),
+        Facet("plot_status", param="plot_status", column="plot_status", choices=LandPlot.PLOT_STATUS_CHOICES),
+        Facet("land_type", param="land_type", column="land_type", choices=LandPlot.LAND_TYPE_CHOICES),
+        Facet("location__region", param="location_region", column="location__region", match="icontains"),
+    )
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context.update({"request": self.request})
         return context
 
+    @extend_schema(
+        summary="Получить количества для фильтров (фасеты) участков",
+        description="Счетчики по категориям земель, ВРИ, характеристикам, статусу, типу участка и региону. "
+                    "Каждый фасет учитывает все активные фильтры, кроме собственного.",
+        responses=FacetsSerializer,
+    )
+    @action(detail=False, methods=["get"])
+    def facets(self, request):
+        return Response(self.get_facets(request))
+
+    @extend_schema(
+        summary="Найти участок по точке на карте",
+        description="Участки, в границу которых попадает точка: кандидаты отбираются по рамке границы, "
+                    "затем проверяется попадание точки в полигон.",
+        parameters=[PlotLocateQuerySerializer],
+        responses=LandPlotSerializer(many=True),
+    )
+    @action(detail=False, methods=["get"])
+    def locate(self, request):
+        query = PlotLocateQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        lat, lon = query.validated_data["lat"], query.validated_data["lon"]
+        candidates = self.get_queryset().filter(
+            boundary_min_lat__lte=lat, boundary_max_lat__gte=lat,
+            boundary_min_lon__lte=lon, boundary_max_lon__gte=lon,
+        )
+        plots = [plot for plot in candidates if geometry.contains_point(plot.boundary, lon, lat)]
+        return Response(self.get_serializer(plots, many=True).data)
+
+    @extend_schema(
+        summary="Получить границы участков для карты",
+        description="GeoJSON FeatureCollection границ опубликованных участков, пересекающих рамку ?bbox=. "
+                    "С ?zoom= отдаются заранее упрощенные версии геометрии.",
+        parameters=[BoundaryQuerySerializer],
+        responses=OpenApiTypes.OBJECT,
+    )
+    @action(detail=False, methods=["get"])
+    def boundaries(self, request):
+        query = BoundaryQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        plots = self.get_queryset().filter(boundary_min_lon__isnull=False).select_related(None).prefetch_related(None)
+        bbox = query.validated_data.get("bbox")
+        if bbox is not None:
+            west, south, east, north = bbox
+            plots = plots.filter(boundary_min_lat__lte=north, boundary_max_lat__gte=south)
+            if west <= east:
+                plots = plots.filter(boundary_min_lon__lte=east, boundary_max_lon__gte=west)
+            else: # Рамка через 180-й меридиан
+                plots = plots.filter(Q(boundary_max_lon__gte=west) | Q(boundary_min_lon__lte=east))
+        plots = plots.only("pk", "slug", "title", "price", "boundary", *LandPlot.BOUNDARY_DERIVED_FIELDS)
+        features = LandPlotBoundarySerializer(
+            plots[:self.boundaries_limit], many=True, context={"zoom": query.validated_data.get("zoom")}
+        ).data
+        return Response({"type": "FeatureCollection", "features": features})
+
+    @extend_schema(
+        summary="Получить границу участка",
+        parameters=[OpenApiParameter("zoom", OpenApiTypes.INT, OpenApiParameter.QUERY,
+                                     description="Масштаб карты: граница упрощается до размера пикселя")],
+        responses=OpenApiTypes.OBJECT,
+    )
+    @action(detail=True, methods=["get"])
+    def boundary(self, request, slug=None):
+        query = BoundaryQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        plot = self.get_object()
+        if plot.boundary is None:
+            raise NotFound("Граница участка не задана.")
+        return Response(LandPlotBoundarySerializer(plot, context={"zoom": query.validated_data.get("zoom")}).data)
+
+    @extend_schema(
+        summary="Получить похожие участки",
+        description="Ближайшие по цене, площади, расположению, характеристикам, ВРИ и типу опубликованные участки "
+                    "(ближайшие первыми). Соседи считаются заранее и обновляются при изменении объявлений.",
+        parameters=[SimilarQuerySerializer, *SPARSE_FIELDSET_PARAMETERS],
+        responses=LandPlotSerializer(many=True),
+    )
+    @action(detail=True, methods=["get"])
+    def similar(self, request, slug=None):
+        query = SimilarQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        plots = self.get_similar(self.get_object(), query.validated_data["limit"])
+        return Response(self.get_serializer(plots, many=True).data)
+
 @extend_schema_view(
     list=extend_schema(summary="Получить список типов объектов недвижимости"),
     retrieve=extend_schema(summary="Получить детали типа объекта недвижимости")
 )
 @extend_schema(tags=["Объявления - Типы объектов"])
-class PropertyTypeViewSet(viewsets.ModelViewSet):
+class PropertyTypeViewSet(ResponseCacheMixin, viewsets.ModelViewSet):
     """ API для просмотра типов объектов недвижимости (квартира, апарт-отель и т.д.) и их схем атрибутов. """
     queryset = PropertyType.objects.all()
     serializer_class = PropertyTypeSerializer
     permission_classes = [IsAdminOrReadOnly]
+    response_cache_dependencies = [PropertyType]
     lookup_field = "slug"
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ["name"]
     ordering_fields = ["name"]
 
 @extend_schema_view(
-    list=extend_schema(summary="Получить список универсальных объектов недвижимости"),
-    retrieve=extend_schema(summary="Получить детали объекта недвижимости"),
+    list=extend_schema(summary="Получить список универсальных объектов недвижимости", parameters=SPARSE_FIELDSET_PARAMETERS),
+    retrieve=extend_schema(summary="Получить детали объекта недвижимости", parameters=SPARSE_FIELDSET_PARAMETERS),
     create=extend_schema(summary="Создать объект недвижимости"),
     update=extend_schema(summary="Обновить объект (полностью)"),
     partial_update=extend_schema(summary="Обновить объект (частично)"),
     destroy=extend_schema(summary="Удалить объект")
 )
 @extend_schema(tags=["Объявления - Универсальные объекты"])
-class GenericPropertyViewSet(viewsets.ModelViewSet):
+class GenericPropertyViewSet(ListingViewSetMixin, viewsets.ModelViewSet):
     """
     API для управления универсальными объектами недвижимости (квартиры, апартаменты, коттеджи и т.д.).
-    Поддерживает фильтрацию по типу, цене, местоположению и некоторым атрибутам (area_sqm, rooms и т.д.).
+    Поддерживает фильтрацию по типу, цене, местоположению и любым атрибутам схем типов (attr_<ключ>).
     """
     queryset = (
         GenericProperty.objects.select_related("property_type", "location", "parent")
-        .prefetch_related("children", "media_files")
         .filter(listing_status="published") # По умолчанию показываем только опубликованные
     )
     serializer_class = GenericPropertySerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = CachedCountPagination # ?pagination=cursor включает keyset-режим без COUNT(*)
+    cache_dependencies = [GenericProperty, Location] # Модели, изменение которых сбрасывает кэш количеств
+    conditional_detail_fields = hierarchy.AGGREGATE_FIELDS # Агрегаты поддерева пишутся через bulk_update
+    response_cache_dependencies = [GenericProperty, Location, PropertyType, MediaFile]
     lookup_field = "slug"
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    # Фильтры атрибутов компилируются из схемы типа (?property_type=<slug>) или по всем типам
+    filter_backends = [PropertyTypeFilterBackend, FullTextSearchFilter, AttributeOrderingFilter] # ?ordering=attr_<ключ>, distance
     filterset_class = GenericPropertyFilter
+    search_index_kind = KIND_PROPERTY # Документы FTS-индекса; search_fields - запасной LIKE-поиск
     search_fields = [
         "title", "description",
         "location__region", "location__locality",
@@ -205,8 +361,127 @@ class GenericPropertyViewSet(viewsets.ModelViewSet):
     ]
     ordering_fields = ["created_at", "updated_at", "price", "view_count"]
     ordering = ["-created_at"]
+    facet_definitions = (
+        Facet("property_type", param="property_type", column="property_type__slug",
+              label_model=PropertyType, label_key="slug"),
+        Facet("location__region", param="location_region", column="location__region", match="icontains"),
+    )
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context.update({"request": self.request})
         return context
+
+    @extend_schema(
+        summary="Получить количества для фильтров (фасеты) объектов",
+        description="Счетчики по типам объектов и регионам; каждый фасет учитывает все активные фильтры, кроме собственного.",
+        responses=FacetsSerializer,
+    )
+    @action(detail=False, methods=["get"])
+    def facets(self, request):
+        return Response(self.get_facets(request))
+
+    @extend_schema(
+        summary="Получить все объекты поддерева (юниты комплекса)",
+        parameters=SPARSE_FIELDSET_PARAMETERS,
+        responses=GenericPropertySerializer(many=True),
+    )
+    @action(detail=True, methods=["get"])
+    def subtree(self, request, slug=None):
+        """ Все потомки объекта на любой глубине одним запросом через closure-таблицу. """
+        complex_obj = self.get_object()
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            ancestor_links__ancestor=complex_obj, ancestor_links__depth__gt=0
+        )
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(queryset, many=True).data)
+
+    @extend_schema(
+        summary="Получить похожие объекты",
+        description="Ближайшие по типу, цене, расположению, числовым атрибутам и комплексу опубликованные объекты "
+                    "(ближайшие первыми). Соседи считаются заранее и обновляются при изменении объявлений.",
+        parameters=[SimilarQuerySerializer, *SPARSE_FIELDSET_PARAMETERS],
+        responses=GenericPropertySerializer(many=True),
+    )
+    @action(detail=True, methods=["get"])
+    def similar(self, request, slug=None):
+        query = SimilarQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        objects = self.get_similar(self.get_object(), query.validated_data["limit"])
+        return Response(self.get_serializer(objects, many=True).data)
+
+@extend_schema_view(
+    list=extend_schema(summary="Получить общую ленту объявлений (участки и объекты)", parameters=SPARSE_FIELDSET_PARAMETERS),
+    retrieve=extend_schema(summary="Получить карточку ленты", parameters=SPARSE_FIELDSET_PARAMETERS)
+)
+@extend_schema(tags=["Объявления - Лента"])
+class CatalogListingViewSet(ResponseCacheMixin, SparseFieldsetViewSetMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Общая лента каталога для главной страницы и поиска.
+    Данные читаются из денормализованной таблицы CatalogListing (одна таблица, без JOIN-ов),
+    которая поддерживается в актуальном состоянии при сохранении участков и объектов.
+    """
+    queryset = CatalogListing.objects.filter(listing_status="published")
+    serializer_class = CatalogListingSerializer
+    permission_classes = [permissions.AllowAny]
+    pagination_class = CachedCountPagination
+    cache_dependencies = [CatalogListing]
+    response_cache_dependencies = [CatalogListing]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filterset_class = CatalogListingFilter
+    search_fields = ["title", "locality"]
+    ordering_fields = ["created_at", "price", "area"]
+    ordering = ["-created_at"]
+
+@extend_schema_view(
+    list=extend_schema(summary="Получить статистику цен по регионам, населенным пунктам и типам объектов"),
+    retrieve=extend_schema(summary="Получить статистику цен по срезу")
+)
+@extend_schema(tags=["Объявления - Статистика цен"])
+class PriceStatisticViewSet(ResponseCacheMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Минимум, квартили, медиана и максимум цены и цены за сотку опубликованных объявлений.
+    Читается из таблицы PriceStatistic: срезы, затронутые изменением карточек ленты, пересчитываются
+    командой manage.py refresh_price_statistics (полный пересчет - с --full).
+    Пустые region/locality/property_type в строке означают "по всем значениям".
+    """
+    queryset = PriceStatistic.objects.all()
+    serializer_class = PriceStatisticSerializer
+    permission_classes = [permissions.AllowAny]
+    response_cache_dependencies = [CatalogListing, PriceStatistic]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_class = PriceStatisticFilter
+    ordering_fields = ["count", "price_median", "price_per_are_median"]
+
+@extend_schema(tags=["Объявления - Карта"])
+class MapViewSet(ResponseCacheMixin, viewsets.ViewSet):
+    """
+    Карта каталога: кластеры по предвычисленным ячейкам geohash (MapCell) вместо выгрузки всех объявлений.
+    Учитываются только опубликованные объявления (те же, что показывают списки).
+    """
+    permission_classes = [permissions.AllowAny]
+    response_cache_dependencies = [CatalogListing, MapCell]
+
+    @extend_schema(
+        summary="Получить кластеры объявлений для карты",
+        description=(
+            "Для масштаба ниже MAP_POINTS_ZOOM (14) возвращает кластеры: ячейку, число объявлений, "
+            "центроид и минимальную цену. Начиная с него - отдельные объявления в рамке (не больше 2000)."
+        ),
+        parameters=[MapClustersQuerySerializer],
+        responses=MapClustersSerializer,
+    )
+    @action(detail=False, methods=["get"])
+    def clusters(self, request):
+        query = MapClustersQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        bbox, zoom = query.validated_data["bbox"], query.validated_data["zoom"]
+        kinds = [query.validated_data["kind"]] if query.validated_data.get("kind") else None
+        data = {"zoom": zoom, "precision": None, "clusters": [], "points": [], "truncated": False}
+        if zoom >= clusters.MAP_POINTS_ZOOM:
+            data["points"], data["truncated"] = clusters.get_points(bbox, kinds)
+        else:
+            data["precision"], data["clusters"] = clusters.get_clusters(bbox, zoom, kinds)
+        return Response(MapClustersSerializer(data).data)
@@ -0,0 +1,78 @@
+"""
+Быстрый JSON-рендерер API.
+
+Ответы каталога - это в основном Decimal (цены, площади), даты и кириллица. Стандартный
+JSONRenderer DRF кодирует их через json.dumps с Python-кодировщиком. FastJSONRenderer
+кодирует через orjson (если установлен): datetime, date, time и UUID кодируются в C,
+Decimal и остальные типы DRF - через тот же default, что у стандартного кодировщика.
+Без orjson используется json из стандартной библиотеки с тем же результатом.
+Кириллица не экранируется (UTF-8), \\u2028/\\u2029 экранируются, как в DRF.
+
+Бэкенд выбирается настройкой API_JSON_BACKEND: "auto" (orjson, если установлен), "orjson" или "json".
+Для отступов (?format=json; indent=4, browsable API) используется стандартный рендерер.
+"""
+import json
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError: # orjson - необязательная зависимость, без него используется json
+    orjson = None
+
+BACKEND_AUTO = "auto"
+BACKEND_ORJSON = "orjson"
+BACKEND_JSON = "json"
+BACKENDS = (BACKEND_AUTO, BACKEND_ORJSON, BACKEND_JSON)
+
+# Экранирование разделителей строк: JSON остается подмножеством JavaScript (как в JSONRenderer)
+_LINE_SEPARATORS = (("\u2028", "\\u2028"), ("\u2029", "\\u2029"))
+_LINE_SEPARATOR_BYTES = tuple((raw.encode(), escaped.encode()) for raw, escaped in _LINE_SEPARATORS)
+
+# Запасное преобразование типов, которых нет в orjson/json (Decimal, timedelta, QuerySet, ленивые строки...)
+_default = JSONEncoder().default
+
+
+def get_backend():
+    """ Имя бэкенда кодирования по настройке API_JSON_BACKEND. """
+    backend = getattr(settings, "API_JSON_BACKEND", BACKEND_AUTO)
+    if backend not in BACKENDS:
+        raise ImproperlyConfigured(f"API_JSON_BACKEND должен быть одним из: {', '.join(BACKENDS)}.")
+    if backend == BACKEND_AUTO:
+        return BACKEND_ORJSON if orjson is not None else BACKEND_JSON
+    if backend == BACKEND_ORJSON and orjson is None:
+        raise ImproperlyConfigured("API_JSON_BACKEND = 'orjson', но пакет orjson не установлен.")
+    return backend
+
+
+def dumps_orjson(data):
+    # OPT_UTC_Z: UTC как "Z", так же как кодировщик DRF; OPT_NON_STR_KEYS: числовые ключи словарей
+    content = orjson.dumps(data, default=_default, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+    for raw, escaped in _LINE_SEPARATOR_BYTES:
+        if raw in content:
+            content = content.replace(raw, escaped)
+    return content
+
+
+def dumps_json(data, allow_nan=False):
+    content = json.dumps(data, default=_default, ensure_ascii=False, allow_nan=allow_nan, separators=(",", ":"))
+    for raw, escaped in _LINE_SEPARATORS:
+        if raw in content:
+            content = content.replace(raw, escaped)
+    return content.encode("utf-8")
+
+
+class FastJSONRenderer(JSONRenderer):
+    """ JSONRenderer с кодированием через orjson (или json без Python-кодировщика) для компактного вывода. """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if self.ensure_ascii or not self.compact or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        if get_backend() == BACKEND_ORJSON:
+            return dumps_orjson(data)
+        return dumps_json(data, allow_nan=not self.strict)
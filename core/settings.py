@@ -85,6 +85,45 @@ DATABASES = {
 }
 
 
+# Cache
+# Кэш используется для количеств, фасетов и ответов каталога. Поколения, по которым устаревают
+# ключи, хранятся в БД (catalog.CacheGeneration), поэтому инвалидация видна всем воркерам
+# и при LocMemCache, но тогда у каждого воркера gunicorn своя копия кэша.
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.environ.get("CACHE_LOCATION", "altailands"),
+    }
+}
+# Бэкенды кэша, общие для всех процессов
+SHARED_CACHE_BACKENDS = (
+    "django.core.cache.backends.redis.RedisCache",
+    "django.core.cache.backends.memcached.PyMemcacheCache",
+    "django.core.cache.backends.memcached.PyLibMCCache",
+)
+
+
+# Колоночный движок каталога (catalog.columnar): фильтрация и сортировка опубликованных
+# объявлений в памяти воркера. Требует numpy; по умолчанию выключен.
+CATALOG_COLUMNAR_ENGINE = os.environ.get("CATALOG_COLUMNAR_ENGINE", "").lower() in ("1", "true", "yes")
+
+# Скомпилированный путь чтения сериализаторов списков (catalog.compiled); совпадение с DRF проверяют тесты (catalog, news, quizzes)
+CATALOG_COMPILED_SERIALIZERS = os.environ.get("CATALOG_COMPILED_SERIALIZERS", "1").lower() in ("1", "true", "yes")
+
+# Страницы списков участков/объектов легкими строками со __slots__ вместо экземпляров моделей (catalog.rows)
+CATALOG_ROW_OBJECTS = os.environ.get("CATALOG_ROW_OBJECTS", "1").lower() in ("1", "true", "yes")
+
+# Кэш ответов на анонимные GET-запросы каталога, новостей и квизов (catalog.caching.ResponseCacheMixin).
+# Инвалидируется сигналами моделей; срок жизни ограничивает устаревание из-за изменений в обход сигналов
+# (queryset.update(), например счетчики просмотров). 0 выключает кэш. По умолчанию включен только
+# с общим бэкендом кэша (SHARED_CACHE_BACKENDS); с кэшем в памяти процесса - предупреждение catalog.W001.
+CATALOG_RESPONSE_CACHE_TIMEOUT = int(os.environ.get(
+    "CATALOG_RESPONSE_CACHE_TIMEOUT", 300 if CACHES["default"]["BACKEND"] in SHARED_CACHE_BACKENDS else 0
+))
+# Ответы от этого размера (байт) хранятся в кэше и со сжатым gzip-вариантом
+CATALOG_RESPONSE_COMPRESS_MIN_SIZE = int(os.environ.get("CATALOG_RESPONSE_COMPRESS_MIN_SIZE", 1024))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -154,10 +193,17 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.FastJSONRenderer', # orjson/json без Python-кодировщика, см. API_JSON_BACKEND
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
 }
 
+# Бэкенд FastJSONRenderer: "auto" (orjson, если установлен), "orjson" или "json" (стандартная библиотека)
+API_JSON_BACKEND = os.environ.get("API_JSON_BACKEND", "auto")
+
 # CORS Settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost",
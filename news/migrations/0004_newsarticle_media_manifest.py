@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("news", "0003_remove_newsarticle_image"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="newsarticle",
+            name="cover_image",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                max_length=500,
+                verbose_name="Обложка (URL файла)",
+            ),
+        ),
+        migrations.AddField(
+            model_name="newsarticle",
+            name="media_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Количество медиафайлов"
+            ),
+        ),
+        migrations.AddField(
+            model_name="newsarticle",
+            name="media_manifest",
+            field=models.JSONField(
+                blank=True,
+                default=list,
+                editable=False,
+                verbose_name="Манифест медиафайлов",
+            ),
+        ),
+        migrations.AddField(
+            model_name="newsarticle",
+            name="media_version",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Версия медиа"
+            ),
+        ),
+    ]
@@ -1,7 +1,8 @@
 from rest_framework import serializers
 from .models import Category, NewsArticle
-# Импортируем MediaFileSerializer из приложения catalog
-from catalog.serializers import MediaFileSerializer
+# Импортируем поля медиа-манифеста из приложения catalog
+from catalog.serializers import MediaManifestField, MediaURLField, SearchHighlightField
+from catalog.compiled import CompiledSerializerMixin
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -9,14 +10,16 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'slug']
         read_only_fields = ['slug'] # Slug генерируется автоматически
 
-class NewsArticleSerializer(serializers.ModelSerializer):
+class NewsArticleSerializer(CompiledSerializerMixin, serializers.ModelSerializer):
     # Показываем название категории вместо ID
     category_name = serializers.CharField(source='category.name', read_only=True)
     # Убираем старое поле image_url
     # image_url = serializers.ImageField(source='image', read_only=True)
 
-    # Добавляем поле для медиафайлов
-    media_files = serializers.SerializerMethodField()
+    # Медиафайлы из денормализованного манифеста статьи (без запросов к MediaFile)
+    media_files = MediaManifestField()
+    cover_image = MediaURLField()
+    search_highlight = SearchHighlightField() # Фрагмент с подсветкой при ?search=
 
     class Meta:
         model = NewsArticle
@@ -32,22 +35,19 @@ class NewsArticleSerializer(serializers.ModelSerializer):
             'category_name', # Название категории для чтения
             'created_at',
             'updated_at',
+            'cover_image',
+            'media_count',
             # Добавляем новое поле media_files
-            'media_files'
+            'media_files',
+            'search_highlight'
         ]
         # Убираем image_url из read_only_fields
-        read_only_fields = ['created_at', 'updated_at', 'category_name', 'media_files']
+        read_only_fields = ['created_at', 'updated_at', 'category_name', 'media_count', 'media_files']
         # Убираем extra_kwargs для image
         extra_kwargs = {
             'category': {'write_only': True, 'required': False, 'allow_null': True},
         }
 
-    def get_media_files(self, obj):
-        """ Получает и сериализует связанные медиафайлы. """
-        media = obj.media_files.all()
-        # Передаем контекст (request) из ViewSet в MediaFileSerializer для генерации полных URL
-        return MediaFileSerializer(media, many=True, context=self.context).data
-
     # Переопределяем to_representation для надежной передачи контекста
     # (хотя context должен передаваться и через SerializerMethodField)
     # def to_representation(self, instance):
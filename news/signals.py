@@ -0,0 +1,27 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from catalog import search
+from catalog.caching import bump_generation
+
+from .models import Category, NewsArticle
+
+
+@receiver(post_save, sender=NewsArticle)
+@receiver(post_delete, sender=NewsArticle)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_news_caches(sender, instance, **kwargs):
+    """ Сбрасывает кэш ответов API новостей (catalog.caching.ResponseCacheMixin). """
+    bump_generation(sender, changed=[instance.pk])
+
+
+@receiver(post_save, sender=NewsArticle)
+def index_news_article(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_document(search.KIND_NEWS, instance)
+
+
+@receiver(post_delete, sender=NewsArticle)
+def remove_news_article(sender, instance, **kwargs):
+    search.remove_document(search.KIND_NEWS, instance.pk)
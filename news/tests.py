@@ -1,3 +1,34 @@
+from django.db import IntegrityError, transaction
 from django.test import TestCase
 
-# Create your tests here.
+from catalog.tests import MEDIA_MANIFEST, CompiledSerializerAssertions
+from .models import Category, NewsArticle
+from .serializers import NewsArticleSerializer
+
+
+class NewsArticleSerializerTests(CompiledSerializerAssertions, TestCase):
+    """ Скомпилированный NewsArticleSerializer совпадает с DRF. """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Рынок земли')
+        NewsArticle.objects.create(title='Цены на участки в Чемале', content='Рост цен на землю', category=category)
+        NewsArticle.objects.create(title='Без категории', content='')
+        NewsArticle.objects.filter(category=category).update(
+            media_manifest=MEDIA_MANIFEST, media_count=1, cover_image='/media/news/photo.jpg',
+        )
+
+    def test_matches_drf(self):
+        articles = list(NewsArticle.objects.select_related('category').order_by('pk'))
+        self.assertMatchesDRF(NewsArticleSerializer, articles)
+
+
+class CategorySlugTests(TestCase):
+    """ slug категорий уникален: совпадающие после транслитерации названия получают суффикс. """
+
+    def test_slugs_are_unique(self):
+        self.assertEqual(
+            [Category.objects.create(name=name).slug for name in ('Рынок', 'Рынок!', '?')], ['rynok', 'rynok-1', 'category'],
+        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Category.objects.create(name='Аналитика', slug='rynok')
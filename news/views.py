@@ -1,6 +1,10 @@
 from django.shortcuts import render
 from rest_framework import viewsets, permissions
+from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiTypes
+from catalog.caching import ConditionalGetMixin, ResponseCacheMixin
+from catalog.models import MediaFile
+from catalog.search import KIND_NEWS, FullTextSearchFilter, RelevanceOrderingFilter
 from .models import Category, NewsArticle
 from .serializers import CategorySerializer, NewsArticleSerializer
 
@@ -11,8 +15,9 @@ from .serializers import CategorySerializer, NewsArticleSerializer
     retrieve=extend_schema(summary="Получить детали категории новостей")
 )
 @extend_schema(tags=['Новости - Категории'])
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class CategoryViewSet(ResponseCacheMixin, viewsets.ReadOnlyModelViewSet):
     """API эндпоинт для просмотра категорий новостей."""
+    response_cache_dependencies = [Category]
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [permissions.AllowAny] # Категории могут смотреть все
@@ -70,15 +75,21 @@ class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
     destroy=extend_schema(summary="Удалить новость")
 )
 @extend_schema(tags=['Новости - Статьи'])
-class NewsArticleViewSet(viewsets.ModelViewSet):
+class NewsArticleViewSet(ResponseCacheMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """
     API эндпоинт для управления новостями.
     Позволяет создавать, просматривать, редактировать и удалять новости.
     Доступ к созданию/редактированию/удалению только для аутентифицированных пользователей.
+    ?search= - полнотекстовый поиск по заголовку и тексту с сортировкой по релевантности.
+    Список и деталь отдают ETag/Last-Modified; совпавший If-None-Match получает 304 без сериализации.
     """
-    queryset = NewsArticle.objects.select_related('category').prefetch_related('media_files').all()
+    queryset = NewsArticle.objects.select_related('category').all() # Медиа берутся из media_manifest
     serializer_class = NewsArticleSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly] # Чтение для всех, запись для аутентифицированных
+    response_cache_dependencies = [NewsArticle, Category, MediaFile] # Кэш ответов анонимным клиентам
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, RelevanceOrderingFilter]
+    search_index_kind = KIND_NEWS
+    search_fields = ['title', 'content'] # Запасной LIKE-поиск, если FTS-индекса нет
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
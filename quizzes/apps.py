@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class QuizzesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "quizzes"
+
+    def ready(self):
+        from . import signals  # noqa: F401 - сброс кэша ответов API квизов
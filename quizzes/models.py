@@ -1,7 +1,8 @@
 from django.db import models
-from django.utils.text import slugify
 
-class Quiz(models.Model):
+from catalog.slugs import UniqueSlugMixin
+
+class Quiz(UniqueSlugMixin, models.Model):
     title = models.CharField(max_length=200, verbose_name='Заголовок квиза')
     slug = models.SlugField(max_length=220, unique=True, blank=True, help_text='Уникальный идентификатор для URL (если квизов будет несколько)')
     description = models.TextField(blank=True, verbose_name='Описание квиза', help_text='Краткое описание или введение к квизу')
@@ -14,17 +15,6 @@ class Quiz(models.Model):
         verbose_name_plural = 'Квизы'
         ordering = ['-created_at']
 
-    def save(self, *args, **kwargs):
-        if not self.slug:
-            self.slug = slugify(self.title)
-            # Простая логика для уникальности slug, можно усложнить при необходимости
-            original_slug = self.slug
-            counter = 1
-            while Quiz.objects.filter(slug=self.slug).exclude(pk=self.pk).exists():
-                self.slug = f'{original_slug}-{counter}'
-                counter += 1
-        super().save(*args, **kwargs)
-
     def __str__(self):
         return self.title
 
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from catalog.compiled import CompiledSerializerMixin
 from .models import Quiz, Question, Answer
 
 class AnswerSerializer(serializers.ModelSerializer):
@@ -15,7 +16,7 @@ class QuestionSerializer(serializers.ModelSerializer):
         fields = ['id', 'text', 'order', 'answers']
         read_only_fields = ['id']
 
-class QuizSerializer(serializers.ModelSerializer):
+class QuizSerializer(CompiledSerializerMixin, serializers.ModelSerializer):
     # Используем QuestionSerializer для вложенного представления вопросов
     questions = QuestionSerializer(many=True, read_only=True)
 
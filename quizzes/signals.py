@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from catalog.caching import bump_generation
+
+from .models import Answer, Question, Quiz
+
+
+@receiver(post_save, sender=Quiz)
+@receiver(post_delete, sender=Quiz)
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+@receiver(post_save, sender=Answer)
+@receiver(post_delete, sender=Answer)
+def invalidate_quiz_caches(sender, instance, **kwargs):
+    """ Квиз отдается вместе с вопросами и ответами - любое их изменение сбрасывает кэш ответов API. """
+    bump_generation(sender, changed=[instance.pk])
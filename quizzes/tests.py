@@ -1,3 +1,22 @@
 from django.test import TestCase
 
-# Create your tests here.
+from catalog.tests import CompiledSerializerAssertions
+from .models import Answer, Question, Quiz
+from .serializers import QuizSerializer
+
+
+class QuizSerializerTests(CompiledSerializerAssertions, TestCase):
+    """ Скомпилированный QuizSerializer (вложенные вопросы и ответы) совпадает с DRF. """
+
+    @classmethod
+    def setUpTestData(cls):
+        quiz = Quiz.objects.create(title='Подбор участка', description='Ответьте на вопросы', is_active=True)
+        question = Question.objects.create(quiz=quiz, text='Какая площадь нужна?', order=1)
+        Answer.objects.create(question=question, text='До 10 соток', order=1)
+        Answer.objects.create(question=question, text='Больше 10 соток', order=2)
+        Question.objects.create(quiz=quiz, text='Вопрос без ответов', order=2)
+        Quiz.objects.create(title='Пустой квиз')
+
+    def test_matches_drf(self):
+        quizzes = list(Quiz.objects.prefetch_related('questions__answers').order_by('pk'))
+        self.assertMatchesDRF(QuizSerializer, quizzes)
@@ -1,7 +1,8 @@
 from django.shortcuts import render
 from rest_framework import viewsets, permissions
 from drf_spectacular.utils import extend_schema, extend_schema_view
-from .models import Quiz # Question, Answer не нужны напрямую во ViewSet
+from catalog.caching import ResponseCacheMixin
+from .models import Answer, Question, Quiz
 from .serializers import QuizSerializer
 
 # Create your views here.
@@ -15,7 +16,7 @@ from .serializers import QuizSerializer
     destroy=extend_schema(summary="Удалить квиз (только админ)")
 )
 @extend_schema(tags=['Квизы'])
-class QuizViewSet(viewsets.ModelViewSet):
+class QuizViewSet(ResponseCacheMixin, viewsets.ModelViewSet):
     """
     API для управления квизами.
     Возвращает структуру квиза с вложенными вопросами и вариантами ответов.
@@ -29,6 +30,7 @@ class QuizViewSet(viewsets.ModelViewSet):
     serializer_class = QuizSerializer
     lookup_field = 'slug' # Используем slug для доступа
     filterset_fields = ['is_active'] # Фильтр по активным квизам
+    response_cache_dependencies = [Quiz, Question, Answer] # Кэш ответов анонимным клиентам
 
     def get_permissions(self):
         """Чтение разрешено всем, запись - только админам."""